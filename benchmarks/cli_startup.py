@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks the cold start latency of the dftimewolf command line tool.
+
+Every measurement runs in a fresh interpreter. Reports the time to import the
+command line tool, to print its help with and without an up to date recipe
+catalog, and to read the recipes by parsing each file or from the catalog.
+The slowest imports are listed from the output of python -X importtime.
+
+Usage:
+  python -m benchmarks.cli_startup [--runs 5] [--imports 15]
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+from dftimewolf.lib.recipes import manager as recipes_manager
+
+
+_RECIPES_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'data', 'recipes')
+
+
+def _Read(mode: str, catalog_path: str) -> None:
+  """Reads the recipes once and prints the duration in milliseconds."""
+  manager = recipes_manager.RecipesManager()
+  start = time.perf_counter()
+  manager.ReadRecipesFromDirectory(
+      _RECIPES_PATH, catalog_path=catalog_path if mode == 'catalog' else None)
+  print((time.perf_counter() - start) * 1000)
+
+
+def _Time(command: List[str],
+          env: Dict[str, str],
+          runs: int,
+          catalog_path: Optional[str] = None) -> float:
+  """Returns the fastest wall time of a command, in milliseconds.
+
+  If a catalog path is given, the catalog is removed before each run.
+  """
+  durations = []
+  for _ in range(runs):
+    if catalog_path and os.path.exists(catalog_path):
+      os.remove(catalog_path)
+    start = time.perf_counter()
+    subprocess.run(
+        command, env=env, check=True, stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL)
+    durations.append((time.perf_counter() - start) * 1000)
+  return min(durations)
+
+
+def _TimeRead(mode: str, env: Dict[str, str], runs: int,
+              catalog_path: str) -> float:
+  """Returns the fastest duration of reading the recipes, in milliseconds."""
+  durations = []
+  for _ in range(runs):
+    output = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.cli_startup', '--read', mode,
+         '--catalog', catalog_path],
+        env=env, check=True, capture_output=True, text=True).stdout
+    durations.append(float(output))
+  return min(durations)
+
+
+def _SlowestImports(env: Dict[str, str], count: int) -> List[Tuple[int, str]]:
+  """Returns the imports of the command line tool with the most own time."""
+  stderr = subprocess.run(
+      [sys.executable, '-X', 'importtime', '-c',
+       'import dftimewolf.cli.dftimewolf_recipes'],
+      env=env, check=True, capture_output=True, text=True).stderr
+  imports = []
+  for line in stderr.splitlines():
+    if not line.startswith('import time:') or 'self [us]' in line:
+      continue
+    self_time, _, name = line[len('import time:'):].split('|')
+    imports.append((int(self_time), name.strip()))
+  return sorted(imports, reverse=True)[:count]
+
+
+def Main() -> None:
+  """Runs the benchmark."""
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument(
+      '--runs', type=int, default=5,
+      help='Number of runs of each measurement; the fastest is reported.')
+  parser.add_argument(
+      '--imports', type=int, default=15,
+      help='Number of slowest imports to list.')
+  parser.add_argument('--read', help=argparse.SUPPRESS)
+  parser.add_argument('--catalog', help=argparse.SUPPRESS)
+  args = parser.parse_args()
+
+  if args.read:
+    _Read(args.read, args.catalog)
+    return
+
+  cache_dir = tempfile.mkdtemp(prefix='dftimewolf-startup-benchmark')
+  try:
+    env = dict(os.environ, XDG_CACHE_HOME=cache_dir)
+    catalog_path = os.path.join(cache_dir, 'dftimewolf', 'recipes.json')
+    help_command = [
+        sys.executable, '-m', 'dftimewolf.cli.dftimewolf_recipes', '-h']
+
+    print(f'{len(os.listdir(_RECIPES_PATH))} recipes')
+    import_time = _Time(
+        [sys.executable, '-c', 'import dftimewolf.cli.dftimewolf_recipes'],
+        env, args.runs)
+    print(f'{"Import command line tool":<32} {import_time:8.1f} ms')
+    cold_time = _Time(help_command, env, args.runs, catalog_path=catalog_path)
+    print(f'{"dftimewolf -h, catalog rebuilt":<32} {cold_time:8.1f} ms')
+    warm_time = _Time(help_command, env, args.runs)
+    print(f'{"dftimewolf -h, catalog":<32} {warm_time:8.1f} ms')
+    parse_time = _TimeRead('parse', env, args.runs, catalog_path)
+    print(f'{"Read recipes, parse each file":<32} {parse_time:8.1f} ms')
+    catalog_time = _TimeRead('catalog', env, args.runs, catalog_path)
+    print(f'{"Read recipes, catalog":<32} {catalog_time:8.1f} ms')
+
+    print('\nSlowest imports (self time):')
+    for self_time, name in _SlowestImports(env, args.imports):
+      print(f'  {self_time / 1000:8.1f} ms  {name}')
+  finally:
+    shutil.rmtree(cache_dir)
+
+
+if __name__ == '__main__':
+  Main()
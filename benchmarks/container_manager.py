@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks ContainerManager storage, retrieval and removal.
+
+Usage:
+  python -m benchmarks.container_manager [--containers 100000]
+"""
+
+import argparse
+import logging
+import time
+from typing import Any, Callable
+
+import pandas as pd
+
+from dftimewolf.lib.containers import containers
+from dftimewolf.lib.containers import manager
+
+
+_RECIPE = {
+    'modules': [
+        {'name': 'Collector', 'wants': []},
+        {'name': 'Processor', 'wants': ['Collector']},
+        {'name': 'Exporter', 'wants': ['Collector', 'Processor']},
+    ]
+}
+
+
+def _Timed(label: str, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+  """Runs func, prints its wall time and returns its result."""
+  start = time.perf_counter()
+  result = func(*args, **kwargs)
+  print(f'{label:<40} {time.perf_counter() - start:8.3f}s')
+  return result
+
+
+def _StoreFiles(container_manager: manager.ContainerManager, count: int) -> None:
+  """Stores count File containers, plus a duplicate of each."""
+  for i in range(count):
+    container_manager.StoreContainer(
+        'Collector', containers.File(name=f'file{i}', path=f'/tmp/file{i}'))
+  for i in range(count):
+    container_manager.StoreContainer(
+        'Collector', containers.File(name=f'file{i}', path=f'/tmp/file{i}'))
+
+
+def _StoreDataFrames(
+    container_manager: manager.ContainerManager, count: int) -> None:
+  """Stores count small DataFrame containers."""
+  for i in range(count):
+    df = pd.DataFrame({'a': [i, i + 1], 'b': [str(i), str(i + 1)]})
+    container_manager.StoreContainer(
+        'Processor',
+        containers.DataFrame(data_frame=df, description='', name=f'df{i}'))
+
+
+def Main() -> None:
+  """Runs the benchmark."""
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument(
+      '--containers', type=int, default=100000,
+      help='Number of File containers to store.')
+  parser.add_argument(
+      '--dataframes', type=int, default=10000,
+      help='Number of DataFrame containers to store.')
+  args = parser.parse_args()
+
+  logger = logging.getLogger('benchmark')
+  logger.addHandler(logging.NullHandler())
+  logger.propagate = False
+  container_manager = manager.ContainerManager(logger)
+  container_manager.ParseRecipe(_RECIPE)
+
+  _Timed(f'Store {args.containers} File (+ duplicates)',
+         _StoreFiles, container_manager, args.containers)
+  _Timed(f'Store {args.dataframes} DataFrame',
+         _StoreDataFrames, container_manager, args.dataframes)
+  _Timed('GetContainers File',
+         container_manager.GetContainers, 'Exporter', containers.File)
+  _Timed('GetContainers File (pop)',
+         container_manager.GetContainers, 'Collector', containers.File,
+         pop=True)
+  _Timed('GetContainers DataFrame (pop)',
+         container_manager.GetContainers, 'Processor', containers.DataFrame,
+         pop=True)
+  container_manager.WaitForCallbackCompletion()
+
+
+if __name__ == '__main__':
+  Main()
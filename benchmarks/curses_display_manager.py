@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks CursesDisplayManager updates from concurrent module threads.
+
+Draws to a fake window that counts the lines written. Each run reports how
+long module threads took to report their messages and progress, and how much
+was drawn.
+
+Usage:
+  python -m benchmarks.curses_display_manager [--threads 8] [--messages 1000]
+"""
+
+import argparse
+import threading
+import time
+from typing import Any, Tuple
+from unittest import mock
+
+from dftimewolf.cli import curses_display_manager as cdm_lib
+
+
+class _FakeWindow:
+  """Curses window that counts what is drawn."""
+
+  def __init__(self, size: Tuple[int, int]) -> None:
+    self.size = size
+    self.lines_written = 0
+    self.clears = 0
+
+  def getmaxyx(self) -> Tuple[int, int]:  # pylint: disable=invalid-name
+    return self.size
+
+  def addstr(self, *unused_args: Any) -> None:  # pylint: disable=invalid-name
+    self.lines_written += 1
+
+  def clear(self) -> None:  # pylint: disable=invalid-name
+    self.clears += 1
+
+  def clrtoeol(self) -> None:  # pylint: disable=invalid-name
+    pass
+
+  def move(self, *unused_args: Any) -> None:  # pylint: disable=invalid-name
+    pass
+
+  def refresh(self) -> None:  # pylint: disable=invalid-name
+    pass
+
+  def keypad(self, *unused_args: Any) -> None:  # pylint: disable=invalid-name
+    pass
+
+
+class _FullRedrawDisplayManager(cdm_lib.CursesDisplayManager):
+  """Clears the window and wraps messages again on each draw, as before."""
+
+  def Draw(self) -> None:
+    self._frame = None
+    self._wrap_key = None
+    super().Draw()
+
+
+def _Run(label: str,
+         cdm: cdm_lib.CursesDisplayManager,
+         threads: int,
+         messages: int) -> None:
+  """Reports messages and progress from module threads, and prints timings."""
+  window = _FakeWindow((50, 160))
+  with mock.patch('curses.initscr', return_value=window), \
+      mock.patch('curses.noecho'), mock.patch('curses.cbreak'), \
+      mock.patch('curses.nocbreak'), mock.patch('curses.echo'), \
+      mock.patch('curses.endwin'), mock.patch('signal.signal'):
+    cdm.StartCurses()
+    for index in range(threads):
+      cdm.EnqueueModule(f'Module{index}', [], None)
+      cdm.UpdateModuleStatus(f'Module{index}', cdm_lib.Status.RUNNING)
+
+    def _Module(index: int) -> None:
+      for i in range(index, messages, threads):
+        cdm.EnqueueMessage(
+            f'Module{index}', f'Processed container {i} of {messages}, '
+            'which is long enough a message to wrap on a narrow terminal')
+        cdm.SetModuleProgress(f'Module{index}', i + 1, messages)
+
+    start = time.perf_counter()
+    module_threads = [
+        threading.Thread(target=_Module, args=(index,))
+        for index in range(threads)]
+    for thread in module_threads:
+      thread.start()
+    for thread in module_threads:
+      thread.join()
+    duration = time.perf_counter() - start
+    cdm.EndCurses()
+
+  print(f'{label:<26} {duration:8.3f}s in module threads '
+        f'{window.clears:8d} clears {window.lines_written:10d} lines written')
+
+
+def Main() -> None:
+  """Runs the benchmark."""
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument(
+      '--threads', type=int, default=8,
+      help='Number of module threads reporting progress.')
+  parser.add_argument(
+      '--messages', type=int, default=1000,
+      help='Number of messages reported by all threads.')
+  args = parser.parse_args()
+
+  _Run('Full redraw per update', _FullRedrawDisplayManager(),
+       args.threads, args.messages)
+  _Run('Incremental per update', cdm_lib.CursesDisplayManager(),
+       args.threads, args.messages)
+  _Run('Incremental, 10 frames/s', cdm_lib.CursesDisplayManager(frame_rate=10),
+       args.threads, args.messages)
+
+
+if __name__ == '__main__':
+  Main()
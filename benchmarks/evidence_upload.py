@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks EvidenceUploader against a local stand-in upload server.
+
+The server implements the resumable.js chunk endpoint that OpenRelik exposes
+at /files/upload, with a configurable delay per request to stand in for the
+network round trip.
+
+Usage:
+  python -m benchmarks.evidence_upload [--files 16] [--size 64] [--latency 50]
+"""
+
+import argparse
+from http import server
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Dict, Set, Tuple
+from urllib import parse
+
+import requests
+
+from dftimewolf.lib import uploads
+
+
+class _ChunkStore:
+  """Chunks received by the stand-in server, by resumable identifier."""
+
+  def __init__(self) -> None:
+    self.lock = threading.Lock()
+    self.chunks: Dict[str, Set[int]] = {}
+    self.next_id = 1
+    self.bytes = 0
+
+
+def _ParseFilePart(body: bytes, content_type: str) -> bytes:
+  """Returns the content of the file part of a multipart/form-data body.
+
+  The email parser of the standard library is too slow for large binary parts,
+  so the body is split on the boundary directly.
+  """
+  boundary = content_type.split('boundary=', 1)[1].strip('"').encode()
+  for part in body.split(b'--' + boundary):
+    headers, _, content = part.partition(b'\r\n\r\n')
+    if b'name="file"' in headers:
+      return content[:-2] if content.endswith(b'\r\n') else content
+  return b''
+
+
+def _MakeHandler(store: _ChunkStore, latency: float) -> type:
+  """Returns a request handler class for the stand-in server."""
+
+  class _UploadHandler(server.BaseHTTPRequestHandler):
+    """Handles resumable.js chunk uploads."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args, **kwargs) -> None:  # type: ignore
+      pass
+
+    def _Reply(self, status: int, body: bytes = b'') -> None:
+      self.send_response(status)
+      self.send_header('Content-Type', 'application/json')
+      self.send_header('Content-Length', str(len(body)))
+      self.end_headers()
+      self.wfile.write(body)
+
+    def do_POST(self) -> None:  # pylint: disable=invalid-name
+      """Stores a chunk, and completes the file once all chunks arrived."""
+      url = parse.urlparse(self.path)
+      params = dict(parse.parse_qsl(url.query))
+      body = self.rfile.read(int(self.headers['Content-Length']))
+      data = _ParseFilePart(body, self.headers['Content-Type'])
+      if len(data) != int(params['resumableCurrentChunkSize']):
+        self._Reply(400)
+        return
+      time.sleep(latency)
+
+      identifier = params['resumableIdentifier']
+      with store.lock:
+        received = store.chunks.setdefault(identifier, set())
+        received.add(int(params['resumableChunkNumber']))
+        store.bytes += len(data)
+        complete = len(received) == int(params['resumableTotalChunks'])
+        if complete:
+          file_id = store.next_id
+          store.next_id += 1
+      if complete:
+        self._Reply(201, f'{{"id": {file_id}}}'.encode())
+      else:
+        self._Reply(200)
+
+  return _UploadHandler
+
+
+def _Run(label: str,
+         url: str,
+         paths: Tuple[str, ...],
+         concurrency: int,
+         store: _ChunkStore) -> None:
+  """Uploads the files from one thread per file and prints throughput."""
+  uploads.EvidenceUploader._MAX_CONCURRENT_UPLOADS = concurrency  # pylint: disable=protected-access
+  uploader = uploads.EvidenceUploader()
+  logger = logging.getLogger('benchmark')
+  with store.lock:
+    store.bytes = 0
+    store.chunks.clear()
+  session = requests.Session()
+  # One transport per run, so that runs do not deduplicate each other.
+  transport = uploads.ResumableChunkTransport(
+      session, url, {'folder_id': label},
+      chunk_size=8 * 1024 * 1024)
+
+  start = time.monotonic()
+  threads = [
+      threading.Thread(target=uploader.Upload, args=(path, transport, logger))
+      for path in paths]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  duration = time.monotonic() - start
+
+  total = sum(os.path.getsize(path) for path in paths)
+  print(
+      f'{label}: {len(paths)} files, {total / 1024 / 1024:.0f} MiB in '
+      f'{duration:.2f}s ({total / duration / 1024 / 1024:.1f} MiB/s), '
+      f'{uploader.stats.uploaded} uploaded, {uploader.stats.skipped} '
+      f'deduplicated, {store.bytes / 1024 / 1024:.0f} MiB sent')
+
+
+def Main() -> None:
+  """Runs the benchmark."""
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument(
+      '--files', type=int, default=16, help='Number of files to upload.')
+  parser.add_argument(
+      '--size', type=int, default=64, help='Size of each file, in MiB.')
+  parser.add_argument(
+      '--duplicates', type=int, default=4,
+      help='Number of files that are copies of another file.')
+  parser.add_argument(
+      '--latency', type=int, default=50,
+      help='Server delay per chunk, in milliseconds.')
+  args = parser.parse_args()
+
+  store = _ChunkStore()
+  httpd = server.ThreadingHTTPServer(
+      ('127.0.0.1', 0), _MakeHandler(store, args.latency / 1000))
+  threading.Thread(target=httpd.serve_forever, daemon=True).start()
+  url = f'http://127.0.0.1:{httpd.server_address[1]}/files/upload'
+
+  temp_dir = tempfile.mkdtemp(prefix='dftimewolf-upload-benchmark')
+  try:
+    paths = []
+    unique = max(1, args.files - args.duplicates)
+    for index in range(args.files):
+      path = os.path.join(temp_dir, f'evidence{index}.bin')
+      if index < unique:
+        with open(path, 'wb') as evidence_file:
+          evidence_file.write(os.urandom(args.size * 1024 * 1024))
+      else:
+        shutil.copy(paths[index % unique], path)
+      paths.append(path)
+
+    for concurrency in (1, 2, 4, 8):
+      _Run(f'{concurrency} concurrent', url, tuple(paths), concurrency, store)
+  finally:
+    httpd.shutdown()
+    shutil.rmtree(temp_dir)
+
+
+if __name__ == '__main__':
+  Main()
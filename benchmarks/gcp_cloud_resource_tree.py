@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks the offline mode of GCPCloudResourceTree on a synthetic log.
+
+Each parser runs in its own process, so that its peak memory use is measured
+separately.
+
+Usage:
+  python -m benchmarks.gcp_cloud_resource_tree [--lines 2000000]
+"""
+
+import argparse
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from dftimewolf import config
+from dftimewolf.lib import state
+from dftimewolf.lib.containers import containers
+from dftimewolf.lib.processors import gcp_cloud_resource_tree as gcp_crt
+
+
+_PROJECT = 'ketchup-research'
+_ZONE = 'europe-west1-b'
+
+
+def _WriteProjectLog(path: str, lines: int, supported_percent: int) -> None:
+  """Writes a synthetic project log of the given length.
+
+  One line in every 100 / supported_percent creates a Compute Engine instance,
+  the others are data access logs of other services.
+  """
+  every = max(1, 100 // max(1, supported_percent))
+  with open(path, 'w', encoding='utf-8') as log_file:
+    for i in range(lines):
+      timestamp = f'2021-11-09T{(i // 3600) % 24:02d}:{(i // 60) % 60:02d}:' \
+                  f'{i % 60:02d}Z'
+      if i % every == 0:
+        name = f'vm-{i}'
+        proto_payload = {
+            '@type': 'type.googleapis.com/google.cloud.audit.AuditLog',
+            'authenticationInfo': {'principalEmail': f'user{i % 100}@ex.com'},
+            'requestMetadata': {'callerIp': f'10.0.{(i // 256) % 256}.'
+                                            f'{i % 256}'},
+            'serviceName': 'compute.googleapis.com',
+            'methodName': 'v1.compute.instances.insert',
+            'resourceName': f'projects/{_PROJECT}/zones/{_ZONE}/instances/'
+                            f'{name}',
+            'request': {
+                '@type': 'type.googleapis.com/compute.instances.insert',
+                'name': name,
+            },
+            'response': {
+                '@type': 'type.googleapis.com/operation',
+                'operationType': 'insert',
+                'targetId': str(1000000 + i),
+                'targetLink': f'https://www.googleapis.com/compute/v1/'
+                              f'projects/{_PROJECT}/zones/{_ZONE}/'
+                              f'instances/{name}',
+                'insertTime': f'{timestamp[:-1]}.000-00:00',
+                'user': f'user{i % 100}@ex.com',
+            },
+        }
+        resource_type = 'gce_instance'
+      else:
+        proto_payload = {
+            '@type': 'type.googleapis.com/google.cloud.audit.AuditLog',
+            'authenticationInfo': {'principalEmail': f'user{i % 100}@ex.com'},
+            'serviceName': 'storage.googleapis.com',
+            'methodName': 'storage.objects.get',
+            'resourceName': f'projects/_/buckets/evidence/objects/file-{i}',
+            'request': {'@type': 'type.googleapis.com/storage.objects.get'},
+        }
+        resource_type = 'gcs_bucket'
+      log_record = {
+          'logName': f'projects/{_PROJECT}/logs/'
+                     'cloudaudit.googleapis.com%2Factivity',
+          'resource': {
+              'type': resource_type,
+              'labels': {'project_id': _PROJECT, 'zone': _ZONE},
+          },
+          'severity': 'NOTICE',
+          'timestamp': timestamp,
+          'protoPayload': proto_payload,
+      }
+      log_file.write(json.dumps(log_record))
+      log_file.write('\n')
+
+
+def _Parse(path: str, parser: str) -> None:
+  """Parses the log with one parser and prints its duration and memory use."""
+  logging.disable(logging.WARNING)
+  processor = gcp_crt.GCPCloudResourceTree(
+      state.DFTimewolfState(config.Config))
+  start = time.perf_counter()
+  # pylint: disable=protected-access
+  if parser == 'load-all':
+    # The parser before streaming: decode every line, then parse them all.
+    with open(path, 'r', encoding='utf-8') as input_file:
+      log_messages = [json.loads(line) for line in input_file]
+    processor._ParseLogMessages(log_messages)
+  else:
+    if parser == 'streaming':
+      processor._CHUNK_SIZE = os.path.getsize(path) + 1
+    processor._ParseLogMessagesFromFileContainer(
+        containers.File(name='benchmark', path=path))
+  # pylint: enable=protected-access
+  duration = time.perf_counter() - start
+  max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  print(f'{parser:<12} {duration:8.2f}s {max_rss / 1024:10.0f} MiB peak RSS '
+        f'{len(processor.resources_dict):8d} resources')
+
+
+def Main() -> None:
+  """Runs the benchmark."""
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument(
+      '--lines', type=int, default=2000000,
+      help='Number of lines of the synthetic project log.')
+  parser.add_argument(
+      '--supported', type=int, default=2,
+      help='Percentage of lines of a resource type the module parses.')
+  parser.add_argument('--parse', help=argparse.SUPPRESS)
+  parser.add_argument('--path', help=argparse.SUPPRESS)
+  args = parser.parse_args()
+
+  if args.parse:
+    _Parse(args.path, args.parse)
+    return
+
+  with tempfile.NamedTemporaryFile(suffix='.jsonl', delete=False) as log_file:
+    path = log_file.name
+  try:
+    _WriteProjectLog(path, args.lines, args.supported)
+    print(f'{args.lines} lines, {os.path.getsize(path) / 1024 / 1024:.0f} MiB, '
+          f'{os.cpu_count()} CPUs')
+    for parser_name in ('load-all', 'streaming', 'chunked'):
+      subprocess.run(
+          [sys.executable, '-m', 'benchmarks.gcp_cloud_resource_tree',
+           '--parse', parser_name, '--path', path],
+          check=True)
+  finally:
+    os.remove(path)
+
+
+if __name__ == '__main__':
+  Main()
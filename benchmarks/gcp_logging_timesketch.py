@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks GCPLoggingTimesketch on a synthetic audit log.
+
+Usage:
+  python -m benchmarks.gcp_logging_timesketch [--lines 1000000]
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from dftimewolf import config
+from dftimewolf.lib import state
+from dftimewolf.lib.containers import containers
+from dftimewolf.lib.processors import gcp_logging_timesketch
+
+
+def _WriteAuditLog(path: str, lines: int) -> None:
+  """Writes a synthetic Compute Engine audit log of the given length."""
+  with open(path, 'w', encoding='utf-8') as log_file:
+    for i in range(lines):
+      log_record = {
+          'logName': 'projects/ketchup-research/logs/'
+                     'cloudaudit.googleapis.com%2Factivity',
+          'resource': {
+              'type': 'gce_instance',
+              'labels': {
+                  'instance_id': str(1000000 + i),
+                  'project_id': 'ketchup-research',
+                  'zone': 'europe-west1-b',
+              },
+          },
+          'severity': 'NOTICE',
+          'timestamp': f'2019-06-06T09:{(i // 60) % 60:02d}:{i % 60:02d}Z',
+          'protoPayload': {
+              '@type': 'type.googleapis.com/google.cloud.audit.AuditLog',
+              'authenticationInfo': {
+                  'principalEmail': f'user{i % 100}@ketchup-research.com',
+              },
+              'requestMetadata': {
+                  'callerIp': f'10.0.{(i // 256) % 256}.{i % 256}',
+                  'callerSuppliedUserAgent': 'google-cloud-sdk gcloud/249.0.0',
+              },
+              'serviceName': 'compute.googleapis.com',
+              'methodName': 'v1.compute.instances.start',
+              'resourceName': f'projects/ketchup-research/zones/'
+                              f'europe-west1-b/instances/vm-{i}',
+              'request': {
+                  '@type': 'type.googleapis.com/compute.instances.start',
+              },
+          },
+      }
+      log_file.write(json.dumps(log_record))
+      log_file.write('\n')
+
+
+def _Run(label: str,
+         processor: gcp_logging_timesketch.GCPLoggingTimesketch,
+         container: containers.File,
+         lines: int) -> None:
+  """Transforms the log once and prints its throughput."""
+  outputs = []
+  processor.StoreContainer = outputs.append  # type: ignore[method-assign,assignment]
+  start = time.perf_counter()
+  processor._ProcessLogContainer(container)  # pylint: disable=protected-access
+  duration = time.perf_counter() - start
+  print(f'{label:<40} {duration:8.3f}s {lines / duration:12.0f} lines/s')
+  for output in outputs:
+    os.remove(output.path)
+
+
+def Main() -> None:
+  """Runs the benchmark."""
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument(
+      '--lines', type=int, default=1000000,
+      help='Number of lines of the synthetic audit log.')
+  args = parser.parse_args()
+
+  with tempfile.NamedTemporaryFile(suffix='.jsonl', delete=False) as log_file:
+    path = log_file.name
+  try:
+    _WriteAuditLog(path, args.lines)
+    container = containers.File(name='benchmark', path=path)
+    processor = gcp_logging_timesketch.GCPLoggingTimesketch(
+        state.DFTimewolfState(config.Config))
+    chunk_size = processor._CHUNK_SIZE  # pylint: disable=protected-access
+    has_orjson = gcp_logging_timesketch.HAS_ORJSON
+
+    processor._CHUNK_SIZE = os.path.getsize(path) + 1  # pylint: disable=protected-access
+    gcp_logging_timesketch.HAS_ORJSON = False
+    _Run('Single process, json', processor, container, args.lines)
+    if has_orjson:
+      gcp_logging_timesketch.HAS_ORJSON = True
+      _Run('Single process, orjson', processor, container, args.lines)
+
+    # The parallel run uses whichever backend is installed, as the workers
+    # import the module afresh.
+    processor._CHUNK_SIZE = chunk_size  # pylint: disable=protected-access
+    _Run(f'Chunked, {os.cpu_count()} CPUs', processor, container, args.lines)
+  finally:
+    os.remove(path)
+
+
+if __name__ == '__main__':
+  Main()
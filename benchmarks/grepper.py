@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks GrepperSearch throughput on a synthetic corpus of text files.
+
+Each run reports the throughput in MB/s of searching the corpus for the same
+keywords. The corpus is then searched again as zip archives, extracting their
+members with an empty text cache, and then from the cache.
+
+Usage:
+  python -m benchmarks.grepper [--files 400] [--size 512] [--keywords 8]
+"""
+
+import argparse
+import logging
+import os
+import random
+import re
+import shutil
+import string
+import tempfile
+import time
+import zipfile
+from typing import List, Optional, Set
+from unittest import mock
+
+from dftimewolf import config
+from dftimewolf.lib import state
+from dftimewolf.lib.containers import containers
+from dftimewolf.lib.processors import grepper
+
+
+_WORDS = [
+    'alpha', 'beta', 'gamma', 'delta', 'system', 'error', 'user', 'session',
+    'login', 'kernel', 'network', 'packet', 'service', 'started', 'stopped']
+
+
+def _WriteCorpus(path: str, files: int, size: int, keywords: List[str]) -> None:
+  """Writes text files of about size KiB each, mentioning some keywords."""
+  rng = random.Random(0)
+  for index in range(files):
+    directory = os.path.join(path, f'dir{index % 16:02d}')
+    os.makedirs(directory, exist_ok=True)
+    lines = []
+    written = 0
+    while written < size * 1024:
+      line = ' '.join(rng.choice(_WORDS) for _ in range(12))
+      if rng.random() < 0.001:
+        line += ' ' + rng.choice(keywords).upper()
+      lines.append(line)
+      written += len(line) + 1
+    with open(os.path.join(directory, f'file{index:05d}.log'), 'w',
+              encoding='utf-8') as corpus_file:
+      corpus_file.write('\n'.join(lines))
+
+
+def _LineByLine(path: str, keywords: str) -> None:
+  """Searches the corpus one line at a time, as before the matcher."""
+  for root, _, files in os.walk(path):
+    for filename in sorted(files):
+      found: Set[str] = set()
+      with open(os.path.join(root, filename), 'r', encoding='utf-8') as fp:
+        for line in fp:
+          found.update(set(x.lower() for x in re.findall(
+              keywords, line, re.IGNORECASE)))
+
+
+def _ZipCorpus(path: str, archive_path: str) -> None:
+  """Writes each directory of the corpus to a zip archive."""
+  os.makedirs(archive_path)
+  for directory in sorted(os.listdir(path)):
+    with zipfile.ZipFile(
+        os.path.join(archive_path, f'{directory}.zip'), 'w',
+        zipfile.ZIP_DEFLATED) as zip_file:
+      for filename in sorted(os.listdir(os.path.join(path, directory))):
+        zip_file.write(os.path.join(path, directory, filename), filename)
+
+
+def _Run(label: str, path: str, keywords: str, total_size: int,
+         min_parallel_size: int, cache_dir: Optional[str] = None) -> None:
+  """Searches the corpus with GrepperSearch and prints the throughput."""
+  test_state = state.DFTimewolfState(config.Config)
+  processor = grepper.GrepperSearch(test_state)
+  processor.SetUp(keywords, cache_dir=cache_dir)
+  # pylint: disable=protected-access
+  test_state._container_manager.ParseRecipe(
+      {'modules': [{'name': processor.name}]})
+  processor._MIN_PARALLEL_SIZE = min_parallel_size
+  processor.StoreContainer(containers.File(name='corpus', path=path))
+  start = time.perf_counter()
+  processor.Process()
+  duration = time.perf_counter() - start
+  shutil.rmtree(processor._output_path)
+  # pylint: enable=protected-access
+  print(f'{label:<32} {duration:8.2f}s {total_size / duration / 1e6:8.1f} MB/s')
+
+
+def Main() -> None:
+  """Runs the benchmark."""
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument(
+      '--files', type=int, default=400,
+      help='Number of files in the corpus.')
+  parser.add_argument(
+      '--size', type=int, default=512,
+      help='Size of each file, in KiB.')
+  parser.add_argument(
+      '--keywords', type=int, default=8,
+      help='Number of keywords to search for.')
+  args = parser.parse_args()
+  logging.disable(logging.WARNING)
+
+  rng = random.Random(1)
+  keyword_list = [
+      ''.join(rng.choice(string.ascii_lowercase)
+              for _ in range(rng.randint(5, 10)))
+      for _ in range(args.keywords)]
+  keywords = '|'.join(keyword_list)
+  path = tempfile.mkdtemp(prefix='dftimewolf-grepper-benchmark')
+  try:
+    _WriteCorpus(path, args.files, args.size, keyword_list)
+    total_size = sum(
+        os.path.getsize(os.path.join(root, filename))
+        for root, _, files in os.walk(path) for filename in files)
+    print(f'{args.files} files, {total_size / 1e6:.0f} MB, '
+          f'{args.keywords} keywords, {os.cpu_count()} CPUs')
+
+    start = time.perf_counter()
+    _LineByLine(path, keywords)
+    duration = time.perf_counter() - start
+    print(f'{"Line by line regex":<32} {duration:8.2f}s '
+          f'{total_size / duration / 1e6:8.1f} MB/s')
+    if grepper.HAS_AHOCORASICK:
+      _Run('Automaton, 1 process', path, keywords, total_size, total_size + 1)
+    with mock.patch.object(grepper, 'HAS_AHOCORASICK', False):
+      _Run('Regex on bytes, 1 process', path, keywords, total_size,
+           total_size + 1)
+    _Run('Matcher, process pool', path, keywords, total_size, 0)
+
+    archive_path = os.path.join(path, 'archives')
+    cache_dir = os.path.join(path, 'cache')
+    _ZipCorpus(path, archive_path)
+    _Run('Zip archives, empty cache', archive_path, keywords, total_size,
+         total_size + 1, cache_dir=cache_dir)
+    _Run('Zip archives, cached text', archive_path, keywords, total_size,
+         total_size + 1, cache_dir=cache_dir)
+  finally:
+    shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+  Main()
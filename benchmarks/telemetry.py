@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks telemetry logging against a local SQLite database.
+
+Module threads log telemetry concurrently. Each run reports how long module
+threads were blocked in LogTelemetry, and how long it took until all entries
+were stored. A delay per transaction stands in for the round trip to a remote
+database such as Spanner.
+
+Usage:
+  python -m benchmarks.telemetry [--entries 2000] [--threads 8] [--latency 20]
+"""
+
+import argparse
+import datetime
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List
+
+from dftimewolf.lib import telemetry
+
+
+class _SlowSQLiteTelemetry(telemetry.SQLiteTelemetry):
+  """SQLite telemetry with a delay per transaction."""
+
+  def __init__(self, latency: float, *args: Any, **kwargs: Any) -> None:
+    super().__init__(*args, **kwargs)
+    self.latency = latency
+
+  def _WriteBatch(self, rows: List[Dict[str, str]]) -> None:
+    time.sleep(self.latency)
+    super()._WriteBatch(rows)
+
+
+class _SynchronousSQLiteTelemetry(_SlowSQLiteTelemetry):
+  """Writes each entry on the caller thread, as before batching."""
+
+  def LogTelemetry(
+      self,
+      key: str,
+      value: str,
+      src_module_name: str,
+      recipe_name: str) -> None:
+    row = [
+        str(self.uuid),
+        datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+        recipe_name,
+        src_module_name,
+        key,
+        value,
+    ]
+    time.sleep(self.latency)
+    try:
+      connection = self._Connect()
+      with connection:
+        connection.execute(
+            'INSERT INTO Telemetry VALUES (?, ?, ?, ?, ?, ?)', row)
+      connection.close()
+    except sqlite3.Error as error:
+      print(f'Could not send telemetry: {error}')
+
+
+def _Run(label: str,
+         sink: telemetry.BatchedTelemetry,
+         entries: int,
+         threads: int) -> None:
+  """Logs entries from module threads and prints how long it took."""
+  blocked = [0.0] * threads
+
+  def _Module(index: int) -> None:
+    for i in range(index, entries, threads):
+      start = time.perf_counter()
+      sink.LogTelemetry(f'key{i}', str(i), f'Module{index}', 'benchmark')
+      blocked[index] += time.perf_counter() - start
+
+  start = time.perf_counter()
+  module_threads = [
+      threading.Thread(target=_Module, args=(index,))
+      for index in range(threads)]
+  for thread in module_threads:
+    thread.start()
+  for thread in module_threads:
+    thread.join()
+  sink.Close()
+  duration = time.perf_counter() - start
+
+  connection = sqlite3.connect(sink.database_path)
+  stored = connection.execute(
+      'SELECT COUNT(*) FROM Telemetry WHERE workflow_uuid = ?',
+      (sink.uuid,)).fetchone()[0]
+  connection.close()
+  print(f'{label:<24} {max(blocked):8.3f}s blocked per thread '
+        f'{duration:8.3f}s until stored {stored:8d} entries')
+
+
+def Main() -> None:
+  """Runs the benchmark."""
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument(
+      '--entries', type=int, default=2000,
+      help='Number of telemetry entries to log.')
+  parser.add_argument(
+      '--threads', type=int, default=8,
+      help='Number of module threads logging telemetry.')
+  parser.add_argument(
+      '--latency', type=int, default=20,
+      help='Delay per database transaction, in milliseconds.')
+  args = parser.parse_args()
+
+  temp_dir = tempfile.mkdtemp(prefix='dftimewolf-telemetry-benchmark')
+  try:
+    database_path = os.path.join(temp_dir, 'telemetry.db')
+    latency = args.latency / 1000
+    _Run('Synchronous, per entry',
+         _SynchronousSQLiteTelemetry(latency, database_path),
+         args.entries, args.threads)
+    _Run('Batched, background',
+         _SlowSQLiteTelemetry(latency, database_path),
+         args.entries, args.threads)
+  finally:
+    shutil.rmtree(temp_dir)
+
+
+if __name__ == '__main__':
+  Main()
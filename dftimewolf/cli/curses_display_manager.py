@@ -1,13 +1,15 @@
 # -*- coding: utf-8 -*-
 """Curses output management class."""
 
+import collections
 import dataclasses
 from enum import Enum
 import io
 import textwrap
 import threading
+import time
 import traceback
-from typing import Any, Callable, Dict, List, Optional, Union
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
 import curses
 import shutil
@@ -183,10 +185,23 @@ class Message:
 
 class CursesDisplayManager:
   """Handles the curses based console output, based on information passed in.
+
+  Updates are drawn as they happen, or, when a frame rate is set, by a render
+  thread that draws at most that many frames per second, so that modules
+  reporting progress never wait for the terminal. Only the lines that changed
+  since the previous frame are written.
   """
 
-  def __init__(self) -> None:
-    """Intializes the CursesDisplayManager."""
+  # Number of wrapped message lines kept for display.
+  _MAX_MESSAGE_LINES = 1000
+
+  def __init__(self, frame_rate: Optional[float] = None) -> None:
+    """Intializes the CursesDisplayManager.
+
+    Args:
+      frame_rate: Maximum number of frames drawn per second by the render
+          thread. If not set, updates are drawn on the thread making them.
+    """
     self._recipe_name: str = ''
     self._exception: Union[Exception, None] = None
     self._preflights: Dict[str, Module] = {}
@@ -195,6 +210,19 @@ class CursesDisplayManager:
     self._messages_longest_source_len: int = 0
     self._lock = threading.Lock()
     self._stdscr: curses.window = None  # type: ignore
+    self._frame_rate = frame_rate
+    # Lines written by the previous frame, None to redraw the whole window.
+    self._frame: Optional[List[Tuple[int, str]]] = None
+    self._resized = False
+    # Most recent messages, wrapped for the (width, source length) in
+    # _wrap_key, and the number of messages wrapped so far.
+    self._message_lines: collections.deque[str] = collections.deque(
+        maxlen=self._MAX_MESSAGE_LINES)
+    self._wrap_key: Optional[Tuple[int, int]] = None
+    self._wrapped_count = 0
+    self._render_thread: Optional[threading.Thread] = None
+    self._draw_requested: Optional[threading.Event] = None
+    self._rendering = False
 
   def StartCurses(self) -> None:
     """Start the curses display."""
@@ -203,9 +231,16 @@ class CursesDisplayManager:
     curses.cbreak()
     self._stdscr.keypad(True)
     signal.signal(signal.SIGWINCH, self.SIGWINCH_Handler)
+    if self._frame_rate:
+      self._draw_requested = threading.Event()
+      self._rendering = True
+      self._render_thread = threading.Thread(
+          target=self._RenderLoop, name='CursesRenderer', daemon=True)
+      self._render_thread.start()
 
   def EndCurses(self) -> None:
     """Curses finalisation actions."""
+    self._StopRenderer()
     if True in [m.is_error for m in self._messages] or self._exception:
       self.Pause()
 
@@ -241,7 +276,7 @@ class CursesDisplayManager:
 
     self.EnqueueMessage(module, message, True)
 
-    self.Draw()
+    self._RequestDraw()
 
   def EnqueueMessage(self,
                      source: str,
@@ -260,7 +295,7 @@ class CursesDisplayManager:
       if line:
         self._messages.append(Message(source, line, is_error))
 
-    self.Draw()
+    self._RequestDraw()
 
   def PrepareMessagesForDisplay(self, available_lines: int) -> List[str]:
     """Prepares the list of messages to be displayed.
@@ -272,17 +307,27 @@ class CursesDisplayManager:
       A list of strings, formatted for display."""
     _, x = self._stdscr.getmaxyx()
 
-    lines = []
     width = max(x - self._messages_longest_source_len - 8, 1)
-
-    for m in self._messages:
-      lines.extend(
+    wrap_key = (width, self._messages_longest_source_len)
+    messages_count = len(self._messages)
+    start = self._wrapped_count
+    if wrap_key != self._wrap_key:
+      # The window was resized, or a longer source changed the padding.
+      self._message_lines.clear()
+      self._wrap_key = wrap_key
+      start = 0
+    # Each message is at least a line, so older messages are not displayed.
+    start = max(start, messages_count - self._MAX_MESSAGE_LINES)
+
+    for m in self._messages[start:messages_count]:
+      self._message_lines.extend(
         textwrap.wrap(m.Stringify(self._messages_longest_source_len),
                       width=width,
                       initial_indent='  ', subsequent_indent='    ',
                       replace_whitespace=False, break_long_words=False))
+    self._wrapped_count = messages_count
 
-    return lines[-available_lines:]
+    return list(self._message_lines)[-available_lines:]
 
   def EnqueuePreflight(self,
                        name: str,
@@ -321,7 +366,7 @@ class CursesDisplayManager:
     if module in self._modules:
       self._modules[module].SetStatus(status)
 
-    self.Draw()
+    self._RequestDraw()
 
   def SetThreadedModuleContainerCount(self, module: str, count: int) -> None:
     """Set the container count that a threaded module will operate on.
@@ -351,7 +396,7 @@ class CursesDisplayManager:
     if module in self._modules:
       self._modules[module].SetThreadState(thread, status, container)
 
-    self.Draw()
+    self._RequestDraw()
 
   def SetModuleProgress(self,
                         module_name: str,
@@ -372,7 +417,7 @@ class CursesDisplayManager:
 
     self._modules[module_name].SetProgress(steps_taken, steps_expected)
 
-    self.Draw()
+    self._RequestDraw()
 
   def SetModuleThreadProgress(self,
                               module_name: str,
@@ -395,62 +440,122 @@ class CursesDisplayManager:
 
     self._modules[module_name].SetThreadProgress(
         thread_id, steps_taken, steps_expected)
+    self._RequestDraw()
+
+  def _RequestDraw(self) -> None:
+    """Draws the window, or asks the render thread to draw it if running."""
+    if self._draw_requested is not None and self._rendering:
+      self._draw_requested.set()
+    else:
+      self.Draw()
+
+  def _RenderLoop(self) -> None:
+    """Draws requested frames, at most _frame_rate per second."""
+    assert self._draw_requested is not None and self._frame_rate
+    while self._rendering:
+      self._draw_requested.wait()
+      self._draw_requested.clear()
+      if not self._rendering:
+        break
+      self.Draw()
+      # Updates made until the next frame are drawn together.
+      time.sleep(1 / self._frame_rate)
+
+  def _StopRenderer(self) -> None:
+    """Stops the render thread, drawing the last updates."""
+    if self._render_thread is None or self._draw_requested is None:
+      return
+    self._rendering = False
+    self._draw_requested.set()
+    self._render_thread.join()
+    self._render_thread = None
     self.Draw()
 
+  def _BuildFrame(self, y: int, x: int) -> List[Tuple[int, str]]:
+    """Returns the lines of the window, with their row.
+
+    Args:
+      y: Number of rows of the window.
+      x: Number of columns of the window.
+    """
+    frame = []
+    curr_line = 0
+    frame.append((curr_line, f' {self._recipe_name}'[:x]))
+    curr_line += 1
+
+    # Preflights
+    if self._preflights:
+      frame.append((curr_line, '   Preflights:'[:x]))
+      curr_line += 1
+      for _, module in self._preflights.items():
+        for line in module.Stringify():
+          frame.append((curr_line, line[:x]))
+          curr_line += 1
+
+    # Modules
+    frame.append((curr_line, '   Modules:'[:x]))
+    curr_line += 1
+    for status in Status:  # Print the modules in Status order
+      for _, module in self._modules.items():
+        if module.status != status:
+          continue
+        for line in module.Stringify():
+          frame.append((curr_line, line[:x]))
+          curr_line += 1
+
+    # Messages
+    curr_line += 1
+    frame.append((curr_line, ' Messages:'[:x]))
+    curr_line += 1
+
+    message_space = y - 4 - curr_line
+    for m in self.PrepareMessagesForDisplay(message_space):
+      frame.append((curr_line, m[:x]))
+      curr_line += 1
+
+    # Exceptions
+    if self._exception:
+      frame.append(
+          (y - 2, f' Exception encountered: {str(self._exception)}'[:x]))
+
+    return frame
+
   def Draw(self) -> None:
-    """Draws the window."""
+    """Draws the window, rewriting the lines changed since the last frame."""
     if not self._stdscr:
       return
 
     with self._lock:
-      self._stdscr.clear()
+      if self._resized:
+        self._resized = False
+        self._frame = None
+        size = shutil.get_terminal_size()
+        curses.resizeterm(size.lines, size.columns)
       y, x = self._stdscr.getmaxyx()
+      frame = self._BuildFrame(y, x)
+      previous = dict(self._frame) if self._frame is not None else None
+      if previous is None:
+        self._stdscr.clear()
 
       try:
-        curr_line = 0
-        self._stdscr.addstr(curr_line, 0, f' {self._recipe_name}'[:x])
-        curr_line += 1
-
-        # Preflights
-        if self._preflights:
-          self._stdscr.addstr(curr_line, 0, '   Preflights:'[:x])
-          curr_line += 1
-          for _, module in self._preflights.items():
-            for line in module.Stringify():
-              self._stdscr.addstr(curr_line, 0, line[:x])
-              curr_line += 1
-
-        # Modules
-        self._stdscr.addstr(curr_line, 0, '   Modules:'[:x])
-        curr_line += 1
-        for status in Status:  # Print the modules in Status order
-          for _, module in self._modules.items():
-            if module.status != status:
-              continue
-            for line in module.Stringify():
-              self._stdscr.addstr(curr_line, 0, line[:x])
-              curr_line += 1
-
-        # Messages
-        curr_line += 1
-        self._stdscr.addstr(curr_line, 0, ' Messages:'[:x])
-        curr_line += 1
-
-        message_space = y - 4 - curr_line
-        for m in self.PrepareMessagesForDisplay(message_space):
-          self._stdscr.addstr(curr_line, 0, m[:x])
-          curr_line += 1
-
-        # Exceptions
-        if self._exception:
-          self._stdscr.addstr(y - 2, 0,
-              f' Exception encountered: {str(self._exception)}'[:x])
+        for row, line in frame:
+          if previous is None:
+            self._stdscr.addstr(row, 0, line)
+          elif previous.pop(row, None) != line:
+            self._stdscr.addstr(row, 0, line)
+            self._stdscr.clrtoeol()
+        # Lines of the previous frame that are now empty.
+        for row in previous or {}:
+          self._stdscr.move(row, 0)
+          self._stdscr.clrtoeol()
+        self._frame = frame
       except curses.error:
         # pylint: disable=line-too-long
         self._stdscr.addstr(y - 3, 0, '*********************************************************************** '[:x])
         self._stdscr.addstr(y - 2, 0, '*** Terminal not large enough, consider increasing your window size *** '[:x])
         self._stdscr.addstr(y - 1, 0, '*********************************************************************** '[:x])
         # pylint: enable=line-too-long
+        self._frame = None
 
       self._stdscr.move(y - 1, 0)
       self._stdscr.refresh()
@@ -481,8 +586,8 @@ class CursesDisplayManager:
 
   def SIGWINCH_Handler(self, *unused_argvs: Any) -> None:
     """Redraw the window when SIGWINCH is raised."""
-    curses.resizeterm(*shutil.get_terminal_size())
-    self.Draw()
+    self._resized = True
+    self._RequestDraw()
 
 
 class CDMStringIOWrapper(io.StringIO):
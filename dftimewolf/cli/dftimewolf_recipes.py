@@ -19,7 +19,7 @@ from dftimewolf.lib.validators import manager as validators_manager
 from dftimewolf.cli.curses_display_manager import CursesDisplayManager
 from dftimewolf.cli.curses_display_manager import CDMStringIOWrapper
 
-# The following import makes sure validators are registered.
+# The following import declares the modules that register validators.
 from dftimewolf.lib import validators # pylint: disable=unused-import
 
 # pylint: disable=wrong-import-position
@@ -36,6 +36,9 @@ if TYPE_CHECKING:
 
 TELEMETRY = telemetry
 
+# Maximum number of times per second the curses display is redrawn.
+CURSES_FRAME_RATE = 10
+
 # pylint: disable=line-too-long
 MODULES = {
   'AWSAccountCheck': 'dftimewolf.lib.preflights.cloud_token',
@@ -76,6 +79,7 @@ MODULES = {
   'LocalFilesystemCopy': 'dftimewolf.lib.exporters.local_filesystem',
   'LocalPlasoProcessor': 'dftimewolf.lib.processors.localplaso',
   'LocalYaraCollector': 'dftimewolf.lib.collectors.yara',
+  'LocalYaraScanner': 'dftimewolf.lib.processors.localyara',
   'OsqueryCollector': 'dftimewolf.lib.collectors.osquery',
   'S3ToGCSCopy': 'dftimewolf.lib.exporters.s3_to_gcs',
   'SCPExporter': 'dftimewolf.lib.exporters.scp_ex',
@@ -142,6 +146,24 @@ class DFTimewolfTool(object):
     """
     argument_parser.add_argument('--dry_run', help='Tool dry run',
                                  default=False, action='store_true')
+    argument_parser.add_argument(
+        '--max-parallel-modules', dest='max_parallel_modules', type=int,
+        default=0, help='Maximum number of modules processing at the same '
+        'time, weighted by the optional "weight" of each recipe module. '
+        '0 (default) means no limit.')
+    argument_parser.add_argument(
+        '--thread-per-module', dest='thread_per_module', default=False,
+        action='store_true', help='Start one thread per module that waits '
+        'for its dependencies, instead of using the module scheduler.')
+    argument_parser.add_argument(
+        '--container-memory-limit', dest='container_memory_limit', type=int,
+        default=0, help='Memory, in MiB, that DataFrames held by containers '
+        'can use before the least recently used ones are spilled to disk. '
+        '0 (default) means no limit.')
+    argument_parser.add_argument(
+        '--container-spill-dir', dest='container_spill_dir', default=None,
+        help='Directory to spill container DataFrames to. Defaults to the '
+        'system temporary directory.')
 
     subparsers = argument_parser.add_subparsers()
 
@@ -300,6 +322,7 @@ class DFTimewolfTool(object):
       state = DFTimewolfState(config.Config)
     state.telemetry = self.telemetry
     self._state = state
+    self._state.command_line_options = vars(self._command_line_options)
 
     logger.info('Loading recipe {0:s}...'.format(self._recipe['name']))
     # Raises errors.RecipeParseError on error.
@@ -310,8 +333,6 @@ class DFTimewolfTool(object):
     logger.info('Loaded recipe {0:s} with {1:d} modules'.format(
         self._recipe['name'], module_cnt))
 
-    self._state.command_line_options = vars(self._command_line_options)
-
   def ValidateArguments(self, dry_run: bool=False) -> None:
     """Validate the arguments.
 
@@ -378,12 +399,30 @@ class DFTimewolfTool(object):
     logger.info('Running preflights...')
     self.state.RunPreflights()
 
+  def _GetRecipeCatalogPath(self) -> Optional[str]:
+    """Returns the path of the recipe catalog, or None if it is disabled.
+
+    The path is specified in the DFTIMEWOLF_RECIPE_CATALOG environment
+    variable. If the variable is not specified, the catalog is stored in the
+    user cache directory, $XDG_CACHE_HOME or ~/.cache. The catalog is disabled
+    if the DFTIMEWOLF_NO_RECIPE_CATALOG environment variable is set.
+    """
+    if os.environ.get('DFTIMEWOLF_NO_RECIPE_CATALOG'):
+      return None
+    catalog_path = os.environ.get('DFTIMEWOLF_RECIPE_CATALOG')
+    if catalog_path:
+      return catalog_path
+    cache_directory = os.environ.get('XDG_CACHE_HOME') or os.path.join(
+        os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_directory, 'dftimewolf', 'recipes.json')
+
   def ReadRecipes(self) -> None:
-    """Reads the recipe files."""
+    """Reads the recipe files, through the recipe catalog if enabled."""
     if os.path.isdir(self._data_files_path):
       recipes_path = os.path.join(self._data_files_path, 'recipes')
       if os.path.isdir(recipes_path):
-        self._recipes_manager.ReadRecipesFromDirectory(recipes_path)
+        self._recipes_manager.ReadRecipesFromDirectory(
+            recipes_path, catalog_path=self._GetRecipeCatalogPath())
 
   def RunModules(self) -> None:
     """Runs the modules."""
@@ -600,7 +639,7 @@ def Main() -> int:
   if any([not enable_curses, '-h' in sys.argv, '--help' in sys.argv]):
     return RunTool()
 
-  cursesdisplaymanager = CursesDisplayManager()
+  cursesdisplaymanager = CursesDisplayManager(frame_rate=CURSES_FRAME_RATE)
   cursesdisplaymanager.StartCurses()
   cursesdisplaymanager.EnqueueMessage(
     'dftimewolf', f'Debug log: {logging_utils.DEFAULT_LOG_FILE}')
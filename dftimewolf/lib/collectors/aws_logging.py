@@ -1,22 +1,86 @@
 # -*- coding: utf-8 -*-
 """Reads logs from an AWS account"""
 
+from concurrent import futures
+import dataclasses
+import datetime
+import heapq
 import json
+import os
 import tempfile
-import datetime
-from typing import Any, Dict, Optional
+import threading
+from typing import Any, Dict, Iterator, List, Optional
 
 from boto3 import session as boto3_session
 from botocore import exceptions as boto_exceptions
 
 from dftimewolf.lib import module
+from dftimewolf.lib import utils
 from dftimewolf.lib.containers import containers
 from dftimewolf.lib.modules import manager as modules_manager
 from dftimewolf.lib.state import DFTimewolfState
 
 
+_MIN_EVENT_TIME = datetime.datetime.min.replace(tzinfo=datetime.timezone.utc)
+
+
+def _LineEventTime(line: str) -> datetime.datetime:
+  """Returns the time of a CloudTrail event saved as a line of JSON."""
+  event_time = json.loads(line).get('EventTime')
+  if not isinstance(event_time, str):
+    return _MIN_EVENT_TIME
+  try:
+    parsed_time = datetime.datetime.fromisoformat(event_time)
+  except ValueError:
+    return _MIN_EVENT_TIME
+  if not parsed_time.tzinfo:
+    parsed_time = parsed_time.replace(tzinfo=datetime.timezone.utc)
+  return parsed_time
+
+
+@dataclasses.dataclass
+class TrailSlice:
+  """A time slice of a CloudTrail lookup in one region, and its progress.
+
+  Attributes:
+    index: position of the slice in the lookup time window.
+    region: AWS region the slice's events are looked up in.
+    output_path: path of the file the slice's events are saved to.
+    start_time: start of the slice.
+    end_time: end of the slice.
+    include_end_time: whether events at end_time belong to the slice.
+    next_token: NextToken of the next page of events to request, the slice's
+        checkpoint. Empty before the first page.
+    event_count: number of events saved.
+  """
+  index: int
+  region: str
+  output_path: str
+  start_time: datetime.datetime
+  end_time: datetime.datetime
+  include_end_time: bool = True
+  next_token: str = ''
+  event_count: int = 0
+
+
 class AWSLogsCollector(module.BaseModule):
-  """Collector for Amazon Web Services (AWS) logs."""
+  """Collector for Amazon Web Services (AWS) logs.
+
+  The lookup time window is split in slices for each region, that are
+  collected concurrently under a request rate limit per region. The lookup
+  stops at the first slice that fails.
+  """
+
+  _MAX_SLICES = 8
+  _MIN_SLICE_DURATION = datetime.timedelta(hours=1)
+  _MAX_WORKERS = 32
+  # CloudTrail allows 2 LookupEvents requests per second per account and
+  # region.
+  _REQUEST_RATE = 2.0
+  # CloudTrail event history is kept for 90 days.
+  _EVENT_HISTORY_DURATION = datetime.timedelta(days=90)
+  # Consecutive throttled requests of a slice before the lookup fails.
+  _MAX_THROTTLING_RETRIES = 10
 
   def __init__(self,
                state: DFTimewolfState,
@@ -29,6 +93,175 @@ class AWSLogsCollector(module.BaseModule):
     self._start_time: Optional[datetime.datetime] = None
     self._end_time: Optional[datetime.datetime] = None
     self._region: str = None  # type: ignore
+    self._regions: List[str] = []
+    # Set to stop collecting the slices that are still running.
+    self._stop_slices = threading.Event()
+
+  def SliceTimeWindow(self) -> List[TrailSlice]:
+    """Splits the lookup time window of each region in slices.
+
+    A missing end time defaults to now, and a missing start time to the
+    start of the CloudTrail event history. Times without a timezone are UTC.
+
+    Returns:
+      The slices, in region order and in ascending time order per region.
+    """
+    end_time = self._end_time or datetime.datetime.now(datetime.timezone.utc)
+    start_time = self._start_time or end_time - self._EVENT_HISTORY_DURATION
+    if not start_time.tzinfo:
+      start_time = start_time.replace(tzinfo=datetime.timezone.utc)
+    if not end_time.tzinfo:
+      end_time = end_time.replace(tzinfo=datetime.timezone.utc)
+
+    count = int(max(1, min(
+        self._MAX_SLICES,
+        (end_time - start_time) // self._MIN_SLICE_DURATION)))
+    step = (end_time - start_time) / count
+    bounds = [start_time + step * i for i in range(count)] + [end_time]
+    return [
+        TrailSlice(index=i,
+                   region=region,
+                   output_path=self._SliceOutputPath(),
+                   start_time=bounds[i],
+                   end_time=bounds[i + 1],
+                   include_end_time=i == count - 1)
+        for region in self._regions for i in range(count)]
+
+  def _SliceOutputPath(self) -> str:
+    """Returns the path of a new temporary file for a slice's events."""
+    with tempfile.NamedTemporaryFile(
+        mode='w', delete=False, encoding='utf-8', suffix='.jsonl') as slice_file:
+      return slice_file.name
+
+  def _LookupParameters(self, trail_slice: TrailSlice) -> Dict[str, Any]:
+    """Returns the LookupEvents parameters of the next page of a slice.
+
+    Args:
+      trail_slice: the slice to collect.
+
+    Returns:
+      The LookupEvents parameters, resuming from the slice's checkpoint.
+    """
+    request_params: Dict[str, Any] = {}
+    if self._query_filter:
+      k, v = self._query_filter.split(',')
+      filters = [{'AttributeKey': k, 'AttributeValue': v}]
+      request_params['LookupAttributes'] = filters
+    request_params['StartTime'] = trail_slice.start_time
+    request_params['EndTime'] = trail_slice.end_time
+    if trail_slice.next_token:
+      request_params['NextToken'] = trail_slice.next_token
+    return request_params
+
+  def CollectSlice(self,
+                   trail_slice: TrailSlice,
+                   cloudtrail_client: Any,
+                   rate_limiter: utils.TokenBucket) -> None:
+    """Saves the CloudTrail events of a slice to disk, newest first.
+
+    The slice is checkpointed after every page. On a ThrottlingException, the
+    request rate of the slice's region is lowered, and the slice resumes from
+    its checkpoint after an exponential backoff. Collection stops early once
+    another slice failed.
+
+    Args:
+      trail_slice: the slice to collect.
+      cloudtrail_client: CloudTrail client of the slice's region.
+      rate_limiter: limits LookupEvents requests in the slice's region.
+
+    Raises:
+      botocore.exceptions.ClientError: if the lookup fails, or is still
+          throttled after _MAX_THROTTLING_RETRIES retries.
+    """
+    retries = 0
+    with open(trail_slice.output_path, 'a', encoding='utf-8') as output_file:
+      while rate_limiter.Acquire(self._stop_slices):
+        if self._stop_slices.is_set():
+          return
+        try:
+          results = cloudtrail_client.lookup_events(
+              **self._LookupParameters(trail_slice))
+        except boto_exceptions.ClientError as exception:
+          error_code = exception.response.get('Error', {}).get('Code')
+          if (error_code != 'ThrottlingException' or
+              retries >= self._MAX_THROTTLING_RETRIES):
+            raise
+          retries += 1
+          if rate_limiter.SlowDown(2):
+            self.logger.debug(
+                f'Lowered the LookupEvents rate in {trail_slice.region} to '
+                f'{rate_limiter.rate:.2f} requests per second')
+          self.logger.debug(
+              f'Throttled, resuming slice {trail_slice.index:d} in '
+              f'{trail_slice.region} in {2 ** retries} seconds.')
+          self._stop_slices.wait(min(2 ** retries, 60))
+          continue
+
+        retries = 0
+        for event in results.get('Events', []):
+          event_time = event.get('EventTime')
+          if (not trail_slice.include_end_time and
+              isinstance(event_time, datetime.datetime) and
+              event_time >= trail_slice.end_time):
+            # The event belongs to the next slice.
+            continue
+          # The default serializer str() accounts for datetime objects.
+          output_file.write(json.dumps(event, default=str))
+          output_file.write('\n')
+          trail_slice.event_count += 1
+
+        trail_slice.next_token = results.get('NextToken', '')
+        if not trail_slice.next_token:
+          return
+
+  def _RemoveSlices(self, slices: List[TrailSlice]) -> None:
+    """Removes the files of slices that were not read.
+
+    Args:
+      slices: the slices.
+    """
+    for trail_slice in slices:
+      try:
+        os.remove(trail_slice.output_path)
+      except FileNotFoundError:
+        pass
+
+  def _ReadSlices(self, slices: List[TrailSlice]) -> Iterator[str]:
+    """Yields the saved events of slices, and removes their files.
+
+    Args:
+      slices: the collected slices.
+
+    Yields:
+      The events, one JSON line at a time.
+    """
+    for trail_slice in slices:
+      with open(trail_slice.output_path, 'r', encoding='utf-8') as slice_file:
+        yield from slice_file
+      os.remove(trail_slice.output_path)
+
+  def MergeSlices(self, slices: List[TrailSlice], output_file: Any) -> None:
+    """Writes the events of all slices to the output file, newest first.
+
+    The slices of a region are concatenated in descending time order, and the
+    regions are merged by event time.
+
+    Args:
+      slices: the collected slices.
+      output_file: the output file.
+    """
+    streams = []
+    for region in self._regions:
+      region_slices = sorted(
+          (trail_slice for trail_slice in slices
+           if trail_slice.region == region),
+          key=lambda trail_slice: trail_slice.index, reverse=True)
+      streams.append(self._ReadSlices(region_slices))
+    if len(streams) == 1:
+      output_file.writelines(streams[0])
+    else:
+      output_file.writelines(
+          heapq.merge(*streams, key=_LineEventTime, reverse=True))
 
   # pylint: disable=arguments-differ
   def SetUp(self,
@@ -40,7 +273,7 @@ class AWSLogsCollector(module.BaseModule):
     """Sets up an AWS logs collector
 
     Args:
-      region: An AWS region name.
+      region: An AWS region name, or a comma separated list of region names.
       profile_name: Optional. The profile name to collect logs with.
       query_filter: Optional. The CloudTrail query filter in the form
         'key,value'
@@ -48,6 +281,8 @@ class AWSLogsCollector(module.BaseModule):
       end_time: Optional. The end time for the query.
     """
     self._region = region
+    self._regions = list(dict.fromkeys(
+        name.strip() for name in region.split(',') if name.strip()))
     self._profile_name = profile_name
     self._query_filter = query_filter
     self._start_time = start_time
@@ -79,39 +314,45 @@ class AWSLogsCollector(module.BaseModule):
           'configured. See https://docs.aws.amazon.com/cli/latest/userguide/cli-configure-profiles.html')  # pylint: disable=line-too-long
       self.ModuleError(str(exception), critical=True)
 
-    cloudtrail_client = session.client('cloudtrail', region_name=self._region)
-
-    request_params: Dict[str, Any] = {}
-    if self._query_filter:
-      k, v = self._query_filter.split(',')
-      filters = [{'AttributeKey': k, 'AttributeValue': v}]
-      request_params['LookupAttributes'] = filters
-    if self._start_time:
-      request_params['StartTime'] = self._start_time
-    if self._end_time:
-      request_params['EndTime'] = self._end_time
-
-    while True:
-      try:
-        results = cloudtrail_client.lookup_events(**request_params)
-        events = results.get('Events', [])
-        for event in events:
-          # Set the default serializer to str() to account for datetime objects.
-          event_string = json.dumps(event, default=str)
-          output_file.write(event_string)
-          output_file.write('\n')
-
-        next_token = results.get('NextToken')
-        if not next_token:
-          break
-        request_params['NextToken'] = next_token
-      except boto_exceptions.ClientError as exception:
-        self.ModuleError('Boto3 client error, check that lookup parameters '
-          'are correct https://docs.aws.amazon.com/awscloudtrail/latest/APIReference/API_LookupEvents.html')  # pylint: disable=line-too-long
-        self.ModuleError(str(exception), critical=True)
+    slices = self.SliceTimeWindow()
+    cloudtrail_clients = {
+        region: session.client('cloudtrail', region_name=region)
+        for region in self._regions}
+    rate_limiters = {
+        region: utils.TokenBucket(
+            self._REQUEST_RATE, capacity=int(self._REQUEST_RATE))
+        for region in self._regions}
 
-    self.logger.info(f'Downloaded logs to {output_path}')
-    output_file.close()
+    # Slices are collected concurrently and checkpointed, so that they
+    # resume where they stopped when throttled.
+    self._stop_slices.clear()
+    executor = futures.ThreadPoolExecutor(
+        max_workers=min(len(slices), self._MAX_WORKERS))
+    try:
+      slice_futures = [
+          executor.submit(
+              self.CollectSlice, trail_slice,
+              cloudtrail_clients[trail_slice.region],
+              rate_limiters[trail_slice.region])
+          for trail_slice in slices]
+      for slice_future in futures.as_completed(slice_futures):
+        slice_future.result()
+      self.MergeSlices(slices, output_file)
+    except boto_exceptions.ClientError as exception:
+      self.ModuleError('Boto3 client error, check that lookup parameters '
+        'are correct https://docs.aws.amazon.com/awscloudtrail/latest/APIReference/API_LookupEvents.html')  # pylint: disable=line-too-long
+      self.ModuleError(str(exception), critical=True)
+    finally:
+      # Stops the running slices, cancels the pending ones, and removes the
+      # files of slices that were not merged.
+      self._stop_slices.set()
+      executor.shutdown(cancel_futures=True)
+      self._RemoveSlices(slices)
+      output_file.close()
+    event_count = sum(trail_slice.event_count for trail_slice in slices)
+    self.logger.info(
+        f'Downloaded {event_count:d} events in {len(slices):d} slices to '
+        f'{output_path}')
 
     logs_report = containers.File('AWSLogsCollector result', output_path)
     self.StoreContainer(logs_report)
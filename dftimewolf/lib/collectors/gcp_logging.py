@@ -1,10 +1,15 @@
 # -*- coding: utf-8 -*-
 """Reads logs from a GCP cloud project."""
+from concurrent import futures
+import dataclasses
 import datetime
 import json
+import os
+import shutil
 import tempfile
+import threading
 import time
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 from google.api_core import exceptions as google_api_exceptions
 from google.auth import exceptions as google_auth_exceptions
@@ -13,6 +18,7 @@ from google.cloud.logging_v2 import entries
 from googleapiclient.errors import HttpError
 
 from dftimewolf.lib import module
+from dftimewolf.lib import utils
 from dftimewolf.lib.containers import containers
 from dftimewolf.lib.modules import manager as modules_manager
 from dftimewolf.lib.state import DFTimewolfState
@@ -31,8 +37,42 @@ def _CustomToAPIRepr(self: entries.ProtobufEntry) -> Dict[str, Any]:
 entries.ProtobufEntry.to_api_repr = _CustomToAPIRepr  # type: ignore
 
 
+@dataclasses.dataclass
+class LogSlice:
+  """A time slice of a GCP logs query, and its collection progress.
+
+  Attributes:
+    index: position of the slice in the query time window.
+    output_path: path of the file the slice's entries are saved to.
+    start_time: start of the slice, None if unbounded.
+    end_time: end of the slice, None if unbounded.
+    include_end_time: whether entries at end_time belong to the slice.
+    last_timestamp: timestamp of the last entry saved.
+    last_insert_id: insertId of the last entry saved.
+    entry_count: number of entries saved.
+  """
+  index: int
+  output_path: str
+  start_time: Optional[datetime.datetime] = None
+  end_time: Optional[datetime.datetime] = None
+  include_end_time: bool = True
+  last_timestamp: str = ''
+  last_insert_id: str = ''
+  entry_count: int = 0
+
+
 class GCPLogsCollector(module.BaseModule):
-  """Collector for Google Cloud Platform logs."""
+  """Collector for Google Cloud Platform logs.
+
+  If the filter expression bounds the query with the <START_TIME> and
+  <END_TIME> placeholders, the query time window is split in slices that are
+  collected concurrently, under a shared request rate limit. Entries are
+  collected in ascending timestamp order, so that a query interrupted by API
+  quotas resumes after the last entry it saved.
+  """
+
+  _MAX_SLICES = 8
+  _MIN_SLICE_DURATION = datetime.timedelta(minutes=10)
 
   def __init__(self,
                state: DFTimewolfState,
@@ -44,6 +84,7 @@ class GCPLogsCollector(module.BaseModule):
     self._project_name = ''
     self._backoff = False
     self._delay = 0
+    self._time_bounded = False
     self.start_time: Optional[datetime.datetime] = None
     self.end_time: Optional[datetime.datetime] = None
 
@@ -66,82 +107,151 @@ class GCPLogsCollector(module.BaseModule):
                                         project=self._project_name)
     return logging.Client(_use_grpc=False)
 
-  def ListPages(self, logging_client: Any) -> Any:
-    """Returns pages based on a Cloud Logging filter
+  def ListPages(self, logging_client: Any, filter_expression: str) -> Any:
+    """Returns pages of log entries matching a Cloud Logging filter.
+
+    Entries are returned in ascending timestamp order, and in insertId order
+    for equal timestamps, which lets an interrupted query resume after the
+    last entry it returned.
 
     Args:
       logging_client: A GCP Cloud Logging client
+      filter_expression: Cloud Logging filter expression.
 
-    Yields:
-      results: Query result entries generator
+    Returns:
+      Iterator over pages of log entries. Every page is fetched with one API
+      request.
     """
     results = logging_client.list_entries(
-          order_by=logging.DESCENDING,
-          filter_=self._filter_expression,
+          order_by=logging.ASCENDING,
+          filter_=filter_expression,
           page_size=1000)
+    return results.pages
 
-    # list_entries() returns a Generator object
-    yield results
+  def SliceTimeWindow(self) -> List[LogSlice]:
+    """Splits the query time window in slices to be collected concurrently.
 
-  def ProcessPages(self, pages: Any, backoff_multiplier: int,
-    output_file: Any, output_path: str) -> str:
-    """Iterates through a generator and saves logs to disk.
-    Can optionally perform exponential backoff if query API limits are exceeded.
+    Returns:
+      The slices, in time order. A single unbounded slice is returned if the
+      filter expression does not use both the start and end time.
+    """
+    start_time, end_time = self.start_time, self.end_time
+    if not self._time_bounded or not start_time or not end_time:
+      return [LogSlice(index=0, output_path=self._SliceOutputPath())]
+
+    if not start_time.tzinfo:
+      start_time = start_time.replace(tzinfo=datetime.timezone.utc)
+    if not end_time.tzinfo:
+      end_time = end_time.replace(tzinfo=datetime.timezone.utc)
+    count = int(max(1, min(
+        self._MAX_SLICES,
+        (end_time - start_time) // self._MIN_SLICE_DURATION)))
+    step = (end_time - start_time) / count
+    bounds = [start_time + step * i for i in range(count)] + [end_time]
+    return [
+        LogSlice(index=i,
+                 output_path=self._SliceOutputPath(),
+                 start_time=bounds[i],
+                 end_time=bounds[i + 1],
+                 include_end_time=i == count - 1)
+        for i in range(count)]
+
+  def _SliceOutputPath(self) -> str:
+    """Returns the path of a new temporary file for a slice's entries."""
+    with tempfile.NamedTemporaryFile(
+        mode='w', delete=False, encoding='utf-8', suffix='.jsonl') as slice_file:
+      return slice_file.name
+
+  def SliceFilter(self, log_slice: LogSlice) -> str:
+    """Returns the Cloud Logging filter for the remaining entries of a slice.
 
     Args:
-      pages (generator): A google cloud logging list_entries \
-        generator pages object
-      backoff_multiplier (str): Query delay multiplier if the API quota is met \
-        and backoff is enabled
-      output_file (str): Output file name
-      output_path (str): Output file path
+      log_slice: the slice to collect.
 
     Returns:
-      output_path (str): Log output path (may have been updated if API quota \
-        was exceeded)
+      The filter expression of the query, restricted to the slice's time
+      window and to entries after its checkpoint.
     """
-    while True:
-      try:
-        time.sleep(self._delay)
-        page = next(pages)
-        for entry in page:
-          log_dictionary = entry.to_api_repr()
-          output_file.write(json.dumps(log_dictionary))
-          output_file.write('\n')
-      except google_api_exceptions.TooManyRequests as exception:
-        self.logger.warning("Hit quota limit requesting GCP logs.")
-        self.logger.debug(f"exception: {exception}")
-        if self._backoff is True:
-          self.logger.debug(
-            "Retrying in 60 seconds with a slower query \
-            rate."
-          )
+    clauses = []
+    if self._filter_expression:
+      clauses.append(f'({self._filter_expression})')
+    if log_slice.start_time:
+      clauses.append(f'timestamp >= "{log_slice.start_time.isoformat()}"')
+    if log_slice.end_time:
+      operator = '<=' if log_slice.include_end_time else '<'
+      clauses.append(
+          f'timestamp {operator} "{log_slice.end_time.isoformat()}"')
+    if log_slice.last_timestamp:
+      clauses.append(
+          f'(timestamp > "{log_slice.last_timestamp}" OR '
+          f'(timestamp = "{log_slice.last_timestamp}" AND '
+          f'insertId > "{log_slice.last_insert_id}"))')
+    return ' AND '.join(clauses)
+
+  def CollectSlice(self,
+                   log_slice: LogSlice,
+                   rate_limiter: utils.TokenBucket,
+                   backoff_multiplier: int) -> None:
+    """Saves the log entries of a slice to disk.
+
+    The slice is checkpointed after every page. If API quotas are exceeded
+    and backoff is enabled, the request rate of all slices is lowered and
+    the slice resumes from its checkpoint.
+
+    Args:
+      log_slice: the slice to collect.
+      rate_limiter: limits page requests of all slices.
+      backoff_multiplier: Query delay multiplier if the API quota is met and
+          backoff is enabled.
+    """
+    logging_client = self.SetupLoggingClient()
+    with open(log_slice.output_path, 'a', encoding='utf-8') as output_file:
+      while True:
+        try:
+          pages = self.ListPages(logging_client, self.SliceFilter(log_slice))
+          while True:
+            rate_limiter.Acquire()
+            page = next(pages, None)
+            if page is None:
+              return
+            for entry in page:
+              log_dictionary = entry.to_api_repr()
+              output_file.write(json.dumps(log_dictionary))
+              output_file.write('\n')
+              log_slice.last_timestamp = log_dictionary.get('timestamp', '')
+              log_slice.last_insert_id = log_dictionary.get('insertId', '')
+              log_slice.entry_count += 1
+        except google_api_exceptions.TooManyRequests as exception:
+          self.logger.warning("Hit quota limit requesting GCP logs.")
+          self.logger.debug(f"exception: {exception}")
+          if self._backoff is not True:
+            self.logger.warning(
+              "Exponential backoff was not enabled, so query has exited."
+            )
+            self.logger.warning(
+              "The collection is most likely incomplete.",
+            )
+            return
+          if rate_limiter.SlowDown(backoff_multiplier):
+            self.logger.debug(
+                f"Lowered the API request rate to 1 per "
+                f"{1 / rate_limiter.rate:.1f}s")
           self.logger.debug(
-            "Due to the GCP logging API, the query must \
-            restart from the beginning"
-          )
+              f"Resuming slice {log_slice.index:d} after "
+              f"{log_slice.last_timestamp or 'its start'} in 60 seconds.")
           time.sleep(60)
-          if self._delay == 0:
-            self._delay = 1
-          else:
-            self._delay *= backoff_multiplier
-          self.logger.debug("Setting up new logging client.")
-          logging_client = self.SetupLoggingClient()
-          pages = self.ListPages(logging_client)
-          self.logger.debug(f"Restarting query with an API request rate \
-            of 1 per {self._delay}s")
-          output_file, output_path = self.OutputFile()
-        else:
-          self.logger.warning(
-            "Exponential backoff was not enabled, so query has exited."
-          )
-          self.logger.warning(
-            "The collection is most likely incomplete.",
-          )
-      except StopIteration:
-        break
-
-    return output_path
+
+  def MergeSlices(self, slices: List[LogSlice], output_file: Any) -> None:
+    """Appends the entries of all slices to the output file, in time order.
+
+    Args:
+      slices: the collected slices, in time order.
+      output_file: the output file.
+    """
+    for log_slice in slices:
+      with open(log_slice.output_path, 'r', encoding='utf-8') as slice_file:
+        shutil.copyfileobj(slice_file, output_file)
+      os.remove(log_slice.output_path)
 
   # pylint: disable=arguments-differ
   def SetUp(
@@ -170,6 +280,10 @@ class GCPLogsCollector(module.BaseModule):
     self._project_name = project_name
     self._backoff = backoff
     self._delay = int(delay)
+    # Only queries bounded by the start and end time are split in slices.
+    self._time_bounded = bool(
+        start_time and end_time and '<START_TIME>' in filter_expression and
+        '<END_TIME>' in filter_expression)
 
     self.start_time = start_time
     self.end_time = end_time
@@ -195,16 +309,20 @@ class GCPLogsCollector(module.BaseModule):
     """Copies logs from a cloud project."""
 
     output_file, output_path = self.OutputFile()
+    slices = self.SliceTimeWindow()
+    # Without a delay, requests are not limited until API quotas are exceeded.
+    rate = 1 / self._delay if self._delay else 0
+    rate_limiter = utils.TokenBucket(rate, capacity=len(slices))
 
     try:
-      # Set up a logging client
-      logging_client = self.SetupLoggingClient()
-
-      # Get a generator of query results
-      pages = self.ListPages(logging_client)
-
-      # Iterate through query result pages and save json logs to disk
-      output_path = self.ProcessPages(pages, 2, output_file, output_path)
+      # Slices are collected concurrently, in ascending time order, and
+      # checkpointed so that they resume where they stopped on quota errors.
+      with futures.ThreadPoolExecutor(max_workers=len(slices)) as executor:
+        slice_futures = [
+            executor.submit(self.CollectSlice, log_slice, rate_limiter, 2)
+            for log_slice in slices]
+        for slice_future in slice_futures:
+          slice_future.result()
 
     except google_api_exceptions.NotFound as exception:
       self.ModuleError(
@@ -232,8 +350,12 @@ class GCPLogsCollector(module.BaseModule):
             'GCP resource not found. Maybe a typo in the project name?')
       self.ModuleError(str(exception), critical=True)
 
-    self.logger.info(f'Downloaded logs to {output_path}')
+    self.MergeSlices(slices, output_file)
     output_file.close()
+    entry_count = sum(log_slice.entry_count for log_slice in slices)
+    self.logger.info(
+        f'Downloaded {entry_count:d} log entries in {len(slices):d} slices '
+        f'to {output_path}')
 
     logs_report = containers.File(self._filter_expression, output_path)
     self.StoreContainer(logs_report)
@@ -1,18 +1,507 @@
 """Base GRR module class. GRR modules should extend it."""
 
+from concurrent import futures
+import dataclasses
+import hashlib
+import os
+import pathlib
+import random
 import tempfile
+import threading
 import time
 from logging import Logger
-from typing import Any, Callable, Optional, Union
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+from typing import TYPE_CHECKING
 
 from grr_api_client import api as grr_api
 from grr_api_client import errors as grr_errors
 from grr_api_client.client import Client
 from grr_api_client.flow import Flow
 from grr_api_client.hunt import Hunt
+from grr_response_proto import flows_pb2
 
 from dftimewolf.lib.errors import DFTimewolfError
 
+if TYPE_CHECKING:
+  from dftimewolf.lib import state as state_lib
+
+
+class GRRClientResolver:
+  """Searches GRR clients by selector, caching results for all GRR modules.
+
+  Searches for different selectors run concurrently on a bounded thread pool.
+  Concurrent requests for the same selector share a single search, and results
+  are cached for _CACHE_TTL_SEC seconds. Failed searches are not cached.
+
+  Attributes:
+    api: GRR HTTP API client used for searches.
+  """
+
+  _CACHE_TTL_SEC = 300
+  _MAX_CONCURRENT_SEARCHES = 10
+
+  # Guards the creation of shared resolvers.
+  _shared_lock = threading.Lock()
+
+  def __init__(self, api: grr_api.GrrApi) -> None:
+    """Initializes a GRR client resolver.
+
+    Args:
+      api: GRR HTTP API client used for searches.
+    """
+    self.api = api
+    self._lock = threading.Lock()
+    # Selector to (search future, completion time) tuples.
+    self._searches: Dict[str, Tuple[futures.Future[List[Client]], float]] = {}
+    self._executor = futures.ThreadPoolExecutor(
+        max_workers=self._MAX_CONCURRENT_SEARCHES,
+        thread_name_prefix='GRRClientResolver')
+
+  @classmethod
+  def GetShared(
+      cls,
+      state: 'state_lib.DFTimewolfState',
+      api: grr_api.GrrApi,
+      grr_server_url: str,
+      grr_username: str) -> 'GRRClientResolver':
+    """Returns the resolver shared by modules of a recipe for a GRR server.
+
+    API clients for the same server and user are interchangeable, so the
+    resolver uses the API client of the module that last set up.
+
+    Args:
+      state: The recipe state, whose cache holds the resolver.
+      api: GRR HTTP API client to use for searches.
+      grr_server_url: GRR server URL.
+      grr_username: GRR username.
+
+    Returns:
+      The shared resolver.
+    """
+    name = f'grr_client_resolver_{grr_server_url}_{grr_username}'
+    with cls._shared_lock:
+      resolver = state.GetFromCache(name)
+      if not resolver:
+        resolver = cls(api)
+        state.AddToCache(name, resolver)
+      resolver.api = api
+    return resolver  # type: ignore[no-any-return]
+
+  def _Search(self, selector: str) -> List[Client]:
+    """Searches GRR clients, fetching all result pages."""
+    return list(self.api.SearchClients(selector))
+
+  def _SearchDone(
+      self, selector: str, future: futures.Future[List[Client]]) -> None:
+    """Records the completion time of a search, or forgets failed ones."""
+    with self._lock:
+      if self._searches.get(selector, (None,))[0] is not future:
+        return
+      if future.exception():
+        del self._searches[selector]
+      else:
+        self._searches[selector] = (future, time.monotonic())
+
+  def _GetSearch(self, selector: str) -> futures.Future[List[Client]]:
+    """Returns a pending or cached search for a selector, or starts one."""
+    with self._lock:
+      search = self._searches.get(selector)
+      if search:
+        future, completed = search
+        if (not future.done() or not completed or
+            time.monotonic() - completed < self._CACHE_TTL_SEC):
+          return future
+      future = self._executor.submit(self._Search, selector)
+      self._searches[selector] = (future, 0.0)
+    future.add_done_callback(lambda f: self._SearchDone(selector, f))
+    return future
+
+  def Prefetch(self, selectors: Iterable[str]) -> None:
+    """Starts searching for selectors in the background.
+
+    Args:
+      selectors: FQDNs or client IDs to search for.
+    """
+    for selector in selectors:
+      self._GetSearch(selector)
+
+  def Search(self, selector: str) -> List[Client]:
+    """Searches GRR clients matching a selector.
+
+    Args:
+      selector: FQDN or client ID to search for.
+
+    Returns:
+      The GRR clients returned by the search.
+
+    Raises:
+      grr_errors.Error: If the search failed.
+    """
+    return self._GetSearch(selector).result()
+
+
+class _FlowWatch:
+  """A flow watched by a GRRFlowWatcher.
+
+  Attributes:
+    client: GRR client the flow runs on.
+    flow_id: GRR identifier of the flow.
+    future: Resolved with the final flow status, or None if skipped.
+    max_interval: Maximum time between two polls, in seconds.
+    max_offline_time: Time after which an offline client is skipped, in
+        seconds. None to wait for offline clients.
+    interval: Time until the next poll, before jitter, in seconds.
+    next_poll: Monotonic time of the next poll.
+  """
+
+  def __init__(self,
+               client: Client,
+               flow_id: str,
+               max_interval: float,
+               max_offline_time: Optional[float]) -> None:
+    self.client = client
+    self.flow_id = flow_id
+    self.future: futures.Future[Any] = futures.Future()
+    self.max_interval = max_interval
+    self.max_offline_time = max_offline_time
+    self.interval = 0.0
+    self.next_poll = time.monotonic()
+
+
+class GRRFlowWatcher:
+  """Polls the status of GRR flows for all GRR modules, from a single thread.
+
+  Each flow is polled immediately, then at intervals starting at
+  _MIN_INTERVAL_SEC and growing by _BACKOFF_FACTOR up to the flow's maximum
+  interval. Intervals are randomized by _JITTER so that flows launched together
+  are not polled in lockstep. The polling thread exits when no flows are
+  watched, and is restarted on demand.
+  """
+
+  _MIN_INTERVAL_SEC = 1.0
+  _BACKOFF_FACTOR = 1.5
+  _JITTER = 0.2
+
+  # Flow states after which a flow will not change, CLIENT_CRASHED included.
+  _FINAL_STATES = frozenset([
+      flows_pb2.FlowContext.TERMINATED,
+      flows_pb2.FlowContext.ERROR,
+      flows_pb2.FlowContext.CLIENT_CRASHED,
+  ])
+
+  _shared_lock = threading.Lock()
+
+  def __init__(self) -> None:
+    """Initializes a GRR flow watcher."""
+    self._condition = threading.Condition()
+    self._watches: List[_FlowWatch] = []
+    self._thread: Optional[threading.Thread] = None
+
+  @classmethod
+  def GetShared(
+      cls,
+      state: 'state_lib.DFTimewolfState',
+      grr_server_url: str) -> 'GRRFlowWatcher':
+    """Returns the watcher shared by modules of a recipe for a GRR server.
+
+    Args:
+      state: The recipe state, whose cache holds the watcher.
+      grr_server_url: GRR server URL.
+
+    Returns:
+      The shared watcher.
+    """
+    name = f'grr_flow_watcher_{grr_server_url}'
+    with cls._shared_lock:
+      watcher = state.GetFromCache(name)
+      if not watcher:
+        watcher = cls()
+        state.AddToCache(name, watcher)
+    return watcher  # type: ignore[no-any-return]
+
+  def Watch(self,
+            client: Client,
+            flow_id: str,
+            max_interval: float,
+            max_offline_time: Optional[float] = None
+            ) -> futures.Future[Any]:
+    """Starts watching a flow.
+
+    Args:
+      client: GRR client the flow runs on.
+      flow_id: GRR identifier of the flow.
+      max_interval: Maximum time between two polls, in seconds.
+      max_offline_time: If set, stop waiting for a flow that has not completed
+          on a client last seen more than max_offline_time seconds ago.
+
+    Returns:
+      A future resolved with the flow status (an ApiFlow proto) once the flow
+      has terminated, failed or crashed, or with None if the client was
+      skipped for being offline. It holds the exception raised when polling,
+      if any.
+    """
+    watch = _FlowWatch(client, flow_id, max_interval, max_offline_time)
+    with self._condition:
+      self._watches.append(watch)
+      if not self._thread:
+        self._thread = threading.Thread(
+            target=self._Run, name='GRRFlowWatcher', daemon=True)
+        self._thread.start()
+      self._condition.notify()
+    return watch.future
+
+  def _Run(self) -> None:
+    """Polls flows as they become due, until none are watched."""
+    while True:
+      with self._condition:
+        while True:
+          if not self._watches:
+            self._thread = None
+            return
+          now = time.monotonic()
+          due = [w for w in self._watches if w.next_poll <= now]
+          if due:
+            break
+          self._condition.wait(
+              min(w.next_poll for w in self._watches) - now)
+
+      for watch in due:
+        if self._Poll(watch):
+          with self._condition:
+            self._watches.remove(watch)
+
+  def _Poll(self, watch: _FlowWatch) -> bool:
+    """Polls a flow and resolves its future if it is done.
+
+    Args:
+      watch: The flow to poll.
+
+    Returns:
+      True if the flow no longer needs to be watched.
+    """
+    try:
+      status = watch.client.Flow(watch.flow_id).Get().data
+    except Exception as exception:  # pylint: disable=broad-except
+      watch.future.set_exception(exception)
+      return True
+
+    if status.state in self._FINAL_STATES:
+      watch.future.set_result(status)
+      return True
+
+    if watch.max_offline_time is not None:
+      last_seen = watch.client.data.last_seen_at / 1000000
+      if time.time() - last_seen > watch.max_offline_time:
+        watch.future.set_result(None)
+        return True
+
+    watch.interval = min(
+        max(watch.interval * self._BACKOFF_FACTOR, self._MIN_INTERVAL_SEC),
+        watch.max_interval)
+    jitter = random.uniform(1 - self._JITTER, 1 + self._JITTER)
+    watch.next_poll = time.monotonic() + watch.interval * jitter
+    return False
+
+
+@dataclasses.dataclass
+class GRRBlob:
+  """A file collected by a GRR flow.
+
+  Attributes:
+    vfspath: Path of the file in the client's GRR VFS.
+    size: Size of the file in bytes, None if unknown.
+    sha256: SHA-256 digest of the file reported by GRR, if any.
+  """
+  vfspath: str
+  size: Optional[int] = None
+  sha256: bytes = b''
+
+
+@dataclasses.dataclass
+class GRRDownloadStats:
+  """Statistics of a GRRBlobDownloader.Download call.
+
+  Attributes:
+    downloaded: Number of files downloaded.
+    skipped: Number of files already on disk.
+    failed: Number of files that could not be downloaded.
+    bytes: Number of bytes downloaded.
+    seconds: Time taken by the download, in seconds.
+  """
+  downloaded: int = 0
+  skipped: int = 0
+  failed: int = 0
+  bytes: int = 0
+  seconds: float = 0.0
+
+  @property
+  def bytes_per_second(self) -> float:
+    """Download throughput."""
+    return self.bytes / self.seconds if self.seconds else 0.0
+
+
+class GRRBlobDownloader:
+  """Downloads files collected by GRR flows, for all GRR modules.
+
+  Files are downloaded concurrently, with at most _MAX_CONNECTIONS downloads
+  from the GRR server and _MAX_CONNECTIONS_PER_CLIENT downloads from the same
+  client at any time. Files already on disk with the expected size (and
+  SHA-256 digest, if GRR reported one) are not downloaded again, so that an
+  interrupted collection resumes where it stopped when it is run again with
+  the same download directory. Files are downloaded to a temporary `.part`
+  file which is renamed once complete.
+  """
+
+  _MAX_CONNECTIONS = 16
+  _MAX_CONNECTIONS_PER_CLIENT = 4
+  _PART_SUFFIX = '.part'
+  _HASH_CHUNK_SIZE = 1024 * 1024
+
+  _shared_lock = threading.Lock()
+
+  def __init__(self) -> None:
+    """Initializes a GRR blob downloader."""
+    self._connections = threading.BoundedSemaphore(self._MAX_CONNECTIONS)
+    self._lock = threading.Lock()
+    self._client_connections: Dict[str, threading.BoundedSemaphore] = {}
+
+  @classmethod
+  def GetShared(
+      cls,
+      state: 'state_lib.DFTimewolfState',
+      grr_server_url: str) -> 'GRRBlobDownloader':
+    """Returns the downloader shared by modules of a recipe for a GRR server.
+
+    Args:
+      state: The recipe state, whose cache holds the downloader.
+      grr_server_url: GRR server URL.
+
+    Returns:
+      The shared downloader.
+    """
+    name = f'grr_blob_downloader_{grr_server_url}'
+    with cls._shared_lock:
+      downloader = state.GetFromCache(name)
+      if not downloader:
+        downloader = cls()
+        state.AddToCache(name, downloader)
+    return downloader  # type: ignore[no-any-return]
+
+  def _GetClientConnections(self, client_id: str) -> threading.BoundedSemaphore:
+    """Returns the semaphore limiting downloads from a client."""
+    with self._lock:
+      if client_id not in self._client_connections:
+        self._client_connections[client_id] = threading.BoundedSemaphore(
+            self._MAX_CONNECTIONS_PER_CLIENT)
+      return self._client_connections[client_id]
+
+  def _IsDownloaded(self, blob: GRRBlob, path: str) -> bool:
+    """Whether a file was already downloaded to path.
+
+    Args:
+      blob: The file to download.
+      path: The local path of the file.
+
+    Returns:
+      True if the local file has the size and digest reported by GRR.
+    """
+    if blob.size is None or not os.path.isfile(path):
+      return False
+    if os.path.getsize(path) != blob.size:
+      return False
+    if not blob.sha256:
+      return True
+    digest = hashlib.sha256()
+    with open(path, 'rb') as local_file:
+      for chunk in iter(lambda: local_file.read(self._HASH_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    return digest.digest() == blob.sha256
+
+  def _DownloadBlob(
+      self,
+      client: Client,
+      blob: GRRBlob,
+      output_dir: str,
+      stats: GRRDownloadStats,
+      logger: Logger) -> None:
+    """Downloads a single file, unless it is already on disk.
+
+    Args:
+      client: GRR client to download the file from.
+      blob: The file to download.
+      output_dir: Directory to store the file in, under its VFS path.
+      stats: Statistics to update.
+      logger: The logger to use.
+    """
+    path = os.path.join(output_dir, blob.vfspath)
+    filename = os.path.basename(blob.vfspath)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    if self._IsDownloaded(blob, path):
+      logger.debug(f'Skipping {filename}, already downloaded to {path}')
+      with self._lock:
+        stats.skipped += 1
+      return
+
+    if blob.size == 0:
+      pathlib.Path(path).touch()
+      with self._lock:
+        stats.downloaded += 1
+      return
+
+    part_path = path + self._PART_SUFFIX
+    logger.debug(f'Downloading {filename} to: {path}')
+    try:
+      with self._GetClientConnections(client.client_id), self._connections:
+        with open(part_path, 'wb') as out:
+          client.File(blob.vfspath).GetBlob().WriteToStream(out)
+      size = os.path.getsize(part_path)
+      os.replace(part_path, path)
+    except grr_errors.ResourceNotFoundError as exception:
+      logger.warning(
+          f'Failed to download blob {filename} from {blob.vfspath}: '
+          f'{exception}')
+      if os.path.exists(part_path):
+        os.remove(part_path)
+      with self._lock:
+        stats.failed += 1
+      return
+
+    with self._lock:
+      stats.downloaded += 1
+      stats.bytes += size
+
+  def Download(
+      self,
+      client: Client,
+      blobs: Iterable[GRRBlob],
+      output_dir: str,
+      logger: Logger) -> GRRDownloadStats:
+    """Downloads files collected from a client.
+
+    Args:
+      client: GRR client to download the files from.
+      blobs: The files to download.
+      output_dir: Directory to store the files in, under their VFS path.
+      logger: The logger to use.
+
+    Returns:
+      Download statistics.
+    """
+    stats = GRRDownloadStats()
+    start = time.monotonic()
+    with futures.ThreadPoolExecutor(
+        max_workers=self._MAX_CONNECTIONS_PER_CLIENT,
+        thread_name_prefix='GRRBlobDownloader') as executor:
+      downloads = [
+          executor.submit(
+              self._DownloadBlob, client, blob, output_dir, stats, logger)
+          for blob in blobs]
+      for download in downloads:
+        download.result()
+    stats.seconds = time.monotonic() - start
+    return stats
+
 
 class GRRBaseModule:
   """Base module for GRR hunt and flow modules.
@@ -44,6 +533,9 @@ class GRRBaseModule:
     self.approvers = []  # type: list[str]
     self.output_path = str()
     self.message_callback: Callable[[str, bool], None] = None  # type: ignore
+    self.client_resolver: GRRClientResolver = None  # type: ignore
+    self.flow_watcher: GRRFlowWatcher = None  # type: ignore
+    self.blob_downloader: GRRBlobDownloader = None  # type: ignore
 
   # pylint: disable=arguments-differ
   def GrrSetUp(
@@ -54,7 +546,9 @@ class GRRBaseModule:
       grr_password: str,
       message_callback: Callable[[str, bool], None],
       approvers: Optional[str]=None,
-      verify: bool=True) -> None:
+      verify: bool=True,
+      state: Optional['state_lib.DFTimewolfState']=None,
+      download_dir: Optional[str]=None) -> None:
     """Initializes a GRR hunt result collector.
 
     Args:
@@ -67,6 +561,11 @@ class GRRBaseModule:
       approvers (Optional[str]): comma-separated GRR approval recipients.
       verify (Optional[bool]): True to indicate GRR server's x509 certificate
           should be verified.
+      state (Optional[DFTimewolfState]): recipe state. If set, client searches
+          flow polling and file downloads are shared by all the GRR modules
+          of the recipe.
+      download_dir (Optional[str]): directory to download results to.
+          Defaults to a new temporary directory.
     """
     grr_auth = (grr_username, grr_password)
     if approvers:
@@ -75,9 +574,23 @@ class GRRBaseModule:
                                     auth=grr_auth,
                                     verify=verify)
     self.grr_url = grr_server_url
-    self.output_path = tempfile.mkdtemp()
+    if download_dir:
+      self.output_path = os.path.abspath(download_dir)
+      os.makedirs(self.output_path, exist_ok=True)
+    else:
+      self.output_path = tempfile.mkdtemp()
     self.reason = reason
     self.message_callback = message_callback
+    if state:
+      self.client_resolver = GRRClientResolver.GetShared(
+          state, self.grr_api, grr_server_url, grr_username)
+      self.flow_watcher = GRRFlowWatcher.GetShared(state, grr_server_url)
+      self.blob_downloader = GRRBlobDownloader.GetShared(
+          state, grr_server_url)
+    else:
+      self.client_resolver = GRRClientResolver(self.grr_api)
+      self.flow_watcher = GRRFlowWatcher()
+      self.blob_downloader = GRRBlobDownloader()
 
   # TODO: change object to more specific GRR type information.
   def _WrapGRRRequestWithApproval(
@@ -3,21 +3,21 @@
 
 import datetime
 import os
-import pathlib
 import re
 import stat
-import time
 from concurrent.futures import ThreadPoolExecutor
-from typing import List, Optional, Tuple, Type
+from typing import Iterable, List, Optional, Tuple, Type
 
 import pandas as pd
 from grr_api_client import errors as grr_errors
-from grr_api_client import flow, utils
+from grr_api_client import flow
 from grr_api_client.client import Client
 from grr_response_proto import flows_pb2, jobs_pb2, timeline_pb2
 from grr_response_proto import osquery_pb2 as osquery_flows
 
 from dftimewolf.lib import module
+from dftimewolf.lib import utils
+from dftimewolf.lib.collectors import grr_base
 from dftimewolf.lib.collectors.grr_base import GRRBaseModule
 from dftimewolf.lib.containers import containers, interface
 from dftimewolf.lib.errors import DFTimewolfError
@@ -40,7 +40,7 @@ class GRRFlow(GRRBaseModule, module.ThreadAwareModule):
   Modules that use GRR flows or interact with hosts should extend this class.
   """
   _CHECK_APPROVAL_INTERVAL_SEC = 10
-  _CHECK_FLOW_INTERVAL_SEC = 10
+  _CHECK_FLOW_INTERVAL_SEC = 30
   _MAX_OFFLINE_TIME_SEC = 3600  # One hour
   _LARGE_FILE_SIZE_THRESHOLD = 1 * 1024 * 1024 * 1024  # 1 GB
   _MISSING_FILE_MESSAGE = ('%s was found on the client but not collected, '
@@ -74,7 +74,8 @@ class GRRFlow(GRRBaseModule, module.ThreadAwareModule):
       grr_password: str,
       approvers: Optional[str]=None,
       verify: bool=True,
-      skip_offline_clients: bool=False) -> None:
+      skip_offline_clients: bool=False,
+      download_dir: Optional[str]=None) -> None:
     """Initializes a GRR hunt result collector.
 
     Args:
@@ -87,11 +88,15 @@ class GRRFlow(GRRBaseModule, module.ThreadAwareModule):
           should be verified.
       skip_offline_clients (Optional[bool]): Whether to wait for flows
           to complete on clients that have been offline for more than an hour.
+      download_dir (Optional[str]): directory to download flow results to,
+          under the client FQDN and flow ID. Defaults to a new temporary
+          directory.
     """
     self.skip_offline_clients = skip_offline_clients
     self.GrrSetUp(
         reason, grr_server_url, grr_username, grr_password, approvers=approvers,
-        verify=verify, message_callback=self.PublishMessage)
+        verify=verify, message_callback=self.PublishMessage, state=self.state,
+        download_dir=download_dir)
 
   def _SeenLastMonth(self, timestamp: int) -> bool:
     """Take a UTC timestamp and check if it is in the last month.
@@ -127,7 +132,7 @@ class GRRFlow(GRRBaseModule, module.ThreadAwareModule):
   def _FilterSelectionCriteria(
       self,
       selector: str,
-      search_result: utils.ItemsIterator[Client]) -> List[Tuple[int, Client]]:
+      search_result: Iterable[Client]) -> List[Tuple[int, Client]]:
     result = []
     selector = selector.lower()
     for client in search_result:
@@ -159,7 +164,7 @@ class GRRFlow(GRRBaseModule, module.ThreadAwareModule):
     # Search for the selector in GRR
     self.logger.debug(f"Searching for client: {selector:s}")
     try:
-      search_result = self.grr_api.SearchClients(selector)
+      search_result = self.client_resolver.Search(selector)
     except grr_errors.UnknownError as exception:
       self.ModuleError('Could not search for host {0:s}: {1!s}'.format(
           selector, exception
@@ -214,7 +219,8 @@ class GRRFlow(GRRBaseModule, module.ThreadAwareModule):
     Returns:
       list[object]: GRR client objects.
     """
-    # TODO(tomchop): Thread this
+    # Search for all selectors concurrently, then filter results in order.
+    self.client_resolver.Prefetch(selectors)
     clients = []
     for selector in selectors:
       client = self._GetClientBySelector(selector)
@@ -310,6 +316,9 @@ class GRRFlow(GRRBaseModule, module.ThreadAwareModule):
   def _AwaitFlow(self, client: Client, flow_id: str) -> None:
     """Waits for a specific GRR flow to complete.
 
+    The flow is polled by the flow watcher shared by the recipe's GRR modules,
+    backing off up to _CHECK_FLOW_INTERVAL_SEC between polls.
+
     Args:
       client (object): GRR Client object in which to await the flow.
       flow_id (str): GRR identifier of the flow to await.
@@ -318,54 +327,101 @@ class GRRFlow(GRRBaseModule, module.ThreadAwareModule):
       DFTimewolfError: If a Flow error was encountered.
     """
     self.logger.info(f"{flow_id:s}: Waiting to finish")
+    max_offline_time = None
     if self.skip_offline_clients:
       self.logger.debug("Client will be skipped if offline.")
+      max_offline_time = self._MAX_OFFLINE_TIME_SEC
 
-    while True:
-      try:
-        status = client.Flow(flow_id).Get().data
-      except grr_errors.UnknownError:
-        msg = (
-          f"Unknown error retrieving flow {flow_id} for host "
-          f"{client.data.os_info.fqdn.lower()}"
-        )
-        self.ModuleError(msg, critical=True)
+    try:
+      status = self.flow_watcher.Watch(
+          client, flow_id, self._CHECK_FLOW_INTERVAL_SEC,
+          max_offline_time=max_offline_time).result()
+    except grr_errors.UnknownError:
+      msg = (
+        f"Unknown error retrieving flow {flow_id} for host "
+        f"{client.data.os_info.fqdn.lower()}"
+      )
+      self.ModuleError(msg, critical=True)
 
-      if status.state == flows_pb2.FlowContext.ERROR:
-        # TODO(jbn): If one artifact fails, what happens? Test.
-        message = status.context.backtrace
-        if "ArtifactNotRegisteredError" in status.context.backtrace:
-          message = status.context.backtrace.split("\n")[-2]
-        self.ModuleError(
-          f"{flow_id:s}: FAILED! Message from GRR:\n{message:s}",
-          critical=True,
+    if status is None:
+      self.logger.warning(
+        "Client {0:s} has been offline for more than {1:.1f} minutes"
+        ", skipping...".format(
+          client.client_id, self._MAX_OFFLINE_TIME_SEC / 60
         )
+      )
+      self._skipped_flows.append((client.client_id, flow_id))
+      return
 
-      if status.state == 4:  # Flow crashed, no enum in flows_pb2
-        self.ModuleError(f"{flow_id:s}: Crashed", critical=False)
-        break
+    if status.state == flows_pb2.FlowContext.ERROR:
+      # TODO(jbn): If one artifact fails, what happens? Test.
+      message = status.context.backtrace
+      if "ArtifactNotRegisteredError" in status.context.backtrace:
+        message = status.context.backtrace.split("\n")[-2]
+      self.ModuleError(
+        f"{flow_id:s}: FAILED! Message from GRR:\n{message:s}",
+        critical=True,
+      )
 
-      if status.state == flows_pb2.FlowContext.TERMINATED:
-        self.logger.info(f"{flow_id:s}: Complete")
-        break
+    if status.state == flows_pb2.FlowContext.CLIENT_CRASHED:
+      self.ModuleError(f"{flow_id:s}: Crashed", critical=False)
+      return
 
-      time.sleep(self._CHECK_FLOW_INTERVAL_SEC)
-      if not self.skip_offline_clients:
-        continue
+    self.logger.info(f"{flow_id:s}: Complete")
 
-      client_last_seen = datetime.datetime.fromtimestamp(
-        client.data.last_seen_at / 1000000, datetime.timezone.utc
-      )
-      now = datetime.datetime.now(datetime.timezone.utc)
-      if (now - client_last_seen).total_seconds() > self._MAX_OFFLINE_TIME_SEC:
-        self.logger.warning(
-          "Client {0:s} has been offline for more than {1:.1f} minutes"
-          ", skipping...".format(
-            client.client_id, self._MAX_OFFLINE_TIME_SEC / 60
-          )
-        )
-        self._skipped_flows.append((client.client_id, flow_id))
-        break
+  @staticmethod
+  def _GetBlob(
+      payload: jobs_pb2.StatEntry
+      | jobs_pb2.PathSpec
+      | flows_pb2.FileFinderResult
+      | flows_pb2.CollectFilesByKnownPathResult
+      | flows_pb2.CollectBrowserHistoryResult
+  ) -> Optional[grr_base.GRRBlob]:
+    """Returns the file to download for a flow result payload.
+
+    Args:
+      payload: A flow result payload.
+
+    Returns:
+      The file to download, or None if the payload is a directory.
+
+    Raises:
+      RuntimeError: if the file collection is not supported.
+    """
+    stats: Optional[jobs_pb2.StatEntry] = None
+    pathspec: jobs_pb2.PathSpec
+    sha256 = b''
+
+    match type(payload):
+      case jobs_pb2.StatEntry:
+        if not hasattr(payload, 'pathspec'):
+          raise RuntimeError('Unsupported file collection attempted')
+        stats = payload
+      case jobs_pb2.PathSpec:
+        pathspec = payload
+      case flows_pb2.FileFinderResult:
+        stats = payload.stat_entry
+        sha256 = payload.hash_entry.sha256
+      case flows_pb2.CollectFilesByKnownPathResult:
+        stats = payload.stat
+        sha256 = payload.hash.sha256
+      case flows_pb2.CollectBrowserHistoryResult:
+        stats = payload.stat_entry
+      case _:
+        raise RuntimeError('Unsupported file collection attempted')
+
+    size = None
+    if stats:
+      if stat.S_ISDIR(stats.st_mode):
+        return None
+      pathspec = stats.pathspec
+      size = stats.st_size
+
+    if pathspec.nested_path.pathtype == jobs_pb2.PathSpec.NTFS:
+      vfspath = f'fs/ntfs{pathspec.path}{pathspec.nested_path.path}'
+    else:
+      vfspath = re.sub('^([a-zA-Z]:)?/(.*)$', 'fs/os/\\1/\\2', pathspec.path)
+    return grr_base.GRRBlob(vfspath=vfspath, size=size, sha256=sha256)
 
   def _DownloadBlobs(
       self,
@@ -378,72 +434,27 @@ class GRRFlow(GRRBaseModule, module.ThreadAwareModule):
           | flows_pb2.CollectBrowserHistoryResult
       ],
       flow_output_dir: str,
-  ) -> None:
+  ) -> grr_base.GRRDownloadStats:
     """Download individual collected files from GRR to the local filesystem.
 
+    Files are downloaded concurrently, and files already present in
+    flow_output_dir from a previous run are not downloaded again.
+
     Args:
       client: GRR Client object to download blobs from.
       payloads: List of pathspecs to download blobs from.
       flow_output_dir: Directory to store the downloaded files.
 
+    Returns:
+      Download statistics.
+
     Raises:
       RuntimeError: if the file collection is not supported.
     """
-    stats: jobs_pb2.StatEntry = None
-    pathspec: jobs_pb2.PathSpec = None
-    size: int = 0
-    vfspath: str = ''
-
-    for payload in payloads:
-      match type(payload):
-        case jobs_pb2.StatEntry:
-          if not hasattr(payload, 'pathspec'):
-            raise RuntimeError('Unsupported file collection attempted')
-          pathspec = payload.pathspec
-          size = payload.st_size
-          if stat.S_ISDIR(payload.st_mode):
-            continue
-        case (
-            jobs_pb2.PathSpec
-            | flows_pb2.FileFinderResult
-            | flows_pb2.CollectFilesByKnownPathResult
-            | flows_pb2.CollectBrowserHistoryResult
-        ):
-          if hasattr(payload, 'stat'):
-            stats = payload.stat
-          elif hasattr(payload, 'stat_entry'):
-            stats = payload.stat_entry
-          size = stats.st_size
-          if stat.S_ISDIR(stats.st_mode):
-            continue
-        case _:
-          raise RuntimeError('Unsupported file collection attempted')
-
-      if stats:
-        pathspec = stats.pathspec
-      if pathspec.nested_path.pathtype == jobs_pb2.PathSpec.NTFS:
-        vfspath = f'fs/ntfs{pathspec.path}{pathspec.nested_path.path}'
-      else:
-        vfspath = re.sub('^([a-zA-Z]:)?/(.*)$', 'fs/os/\\1/\\2', pathspec.path)
-
-      filename = os.path.basename(vfspath)
-      base_dir = os.path.join(flow_output_dir, os.path.dirname(vfspath))
-      os.makedirs(base_dir, exist_ok=True)
-
-      f = client.File(vfspath)
-      self.logger.debug(f'Downloading blob {filename} from {vfspath}')
-      try:
-        path = os.path.join(base_dir, filename)
-        if size:
-          with open(path, 'wb') as out:
-            self.logger.debug(f"Downloading {filename} to: {path}")
-            f.GetBlob().WriteToStream(out)
-        else:
-          pathlib.Path(path).touch()
-      except grr_errors.ResourceNotFoundError as e:
-        self.logger.warning(
-            f'Failed to download blob {filename} from {vfspath}: {e}'
-        )
+    blobs = [self._GetBlob(payload) for payload in payloads]
+    return self.blob_downloader.Download(
+        client, [blob for blob in blobs if blob], flow_output_dir,
+        self.logger)
 
   def _DownloadTimeline(
     self,
@@ -553,8 +564,9 @@ class GRRFlow(GRRBaseModule, module.ThreadAwareModule):
       self._DownloadOsquery(client, flow_id, flow_output_dir)
       return flow_output_dir
 
+    results = list(flow_handle.ListResults())
     try:
-      missing = self._CheckForMissingFiles(flow_handle)
+      missing = self._CheckForMissingFiles(flow_handle, results)
       if missing:
         message = '\n'.join([self._MISSING_FILE_MESSAGE % (path, size)
                              for path, size in missing])
@@ -562,27 +574,36 @@ class GRRFlow(GRRBaseModule, module.ThreadAwareModule):
     except GRRError:
       pass
 
-    payloads = []
-    for r in flow_handle.ListResults():
-      payloads.append(r.payload)
+    payloads = [result.payload for result in results]
     self.logger.info('Downloading data blobs from GRR')
-    self._DownloadBlobs(client, payloads, flow_output_dir)
+    download_stats = self._DownloadBlobs(client, payloads, flow_output_dir)
+    self.logger.info(
+        f'{flow_id}: Downloaded {download_stats.downloaded} files '
+        f'({download_stats.bytes} bytes) in {download_stats.seconds:.2f}s, '
+        f'{download_stats.bytes_per_second:.0f} bytes/sec. Skipped '
+        f'{download_stats.skipped} files already downloaded, '
+        f'{download_stats.failed} failed.')
 
     return flow_output_dir
 
   def _CheckForMissingFiles(
-      self, flow_handle: flow.Flow) -> list[tuple[str, int]]:
+      self,
+      flow_handle: flow.Flow,
+      results: Optional[List[flow.FlowResult]] = None
+  ) -> list[tuple[str, int]]:
     """Check a ClientFileFinder result list for files that weren't collected.
 
     Args:
       flow_handle: A flow to check for missing files.
+      results: The flow results, if already listed.
 
     Returns:
       A list of tuples of:
         A file where collection was skipped or failed
         The file size in bytes
     """
-    results = list(flow_handle.ListResults())
+    if results is None:
+      results = list(flow_handle.ListResults())
     if not results:
       raise DFTimewolfError(
           f'No FileFinder results for {flow_handle.flow_id}')
@@ -626,13 +647,6 @@ Scanned rules:
 Flow ID: {3:s}
   """
 
-  YARA_MODULES = {
-    "hash.": "import \"hash\"",
-    "pe.": "import \"pe\"",
-    "elf.": "import \"elf\"",
-    "math.": "import \"math\"",
-  }
-
   FLOW_NAME = 'YaraProcessScan'
 
   # pylint: disable=arguments-differ
@@ -724,16 +738,8 @@ Flow ID: {3:s}
       self.logger.warning('No Yara rules found.')
       return
 
-    selected_headers = set()
-    for rule in yara_containers:
-      for prefix, header in self.YARA_MODULES.items():
-        condition = rule.rule_text.split("condition:")[1]
-        if prefix in condition:
-          selected_headers.add(header)
-
-    concatenated_rules = '\n\n'.join([r.rule_text for r in yara_containers])
-    final_rule_text = '\n'.join(selected_headers) + '\n\n' + concatenated_rules
-    self.rule_text = final_rule_text
+    self.rule_text = utils.BuildYaraRuleset(
+        rule.rule_text for rule in yara_containers)
     self.rule_count = len(yara_containers)
     self.rule_names = ', '.join([r.name for r in yara_containers])
     self._grouping = f'# GRR Yara Scan - {datetime.datetime.now()}'
@@ -938,7 +944,8 @@ class GRRArtifactCollector(GRRFlow):
             max_file_size: Optional[str],
             approvers: Optional[str]=None,
             verify: bool=True,
-            skip_offline_clients: bool=False
+            skip_offline_clients: bool=False,
+            download_dir: Optional[str]=None
             ) -> None:  # pytype: disable=signature-mismatch
     """Initializes a GRR artifact collector.
 
@@ -958,10 +965,13 @@ class GRRArtifactCollector(GRRFlow):
           should be verified.
       skip_offline_clients (Optional[bool]): Whether to wait for flows
           to complete on clients that have been offline for more than an hour.
+      download_dir (Optional[str]): directory to download the collected
+          files to. Defaults to a new temporary directory.
     """
     super(GRRArtifactCollector, self).SetUp(
         reason, grr_server_url, grr_username, grr_password, approvers=approvers,
-        verify=verify, skip_offline_clients=skip_offline_clients)
+        verify=verify, skip_offline_clients=skip_offline_clients,
+        download_dir=download_dir)
 
     if artifacts is not None:
       self.artifacts = [item.strip() for item in artifacts.strip().split(',')]
@@ -1098,7 +1108,8 @@ class GRRFileCollector(GRRFlow):
             approvers: Optional[str]=None,
             verify: bool=True,
             skip_offline_clients: bool=False,
-            action: str='download'
+            action: str='download',
+            download_dir: Optional[str]=None
             ) -> None:  # pytype: disable=signature-mismatch
     """Initializes a GRR file collector.
 
@@ -1118,11 +1129,13 @@ class GRRFileCollector(GRRFlow):
       skip_offline_clients (Optional[bool]): Whether to wait for flows
           to complete on clients that have been offline for more than an hour.
       action (Optional[str]): Action (download/hash/stat) (default: download).
+      download_dir (Optional[str]): directory to download the collected
+          files to. Defaults to a new temporary directory.
     """
     super(GRRFileCollector, self).SetUp(
         reason, grr_server_url, grr_username, grr_password,
         approvers=approvers, verify=verify,
-        skip_offline_clients=skip_offline_clients)
+        skip_offline_clients=skip_offline_clients, download_dir=download_dir)
 
     if files is not None:
       self.files = [item.strip() for item in files.strip().split(',')]
@@ -1480,7 +1493,8 @@ class GRRFlowCollector(GRRFlow):
             grr_password: str,
             approvers: Optional[str]=None,
             verify: bool=True,
-            skip_offline_clients: bool=False
+            skip_offline_clients: bool=False,
+            download_dir: Optional[str]=None
             ) -> None:  # pytype: disable=signature-mismatch
     """Initializes a GRR flow collector.
 
@@ -1496,15 +1510,19 @@ class GRRFlowCollector(GRRFlow):
           should be verified.
       skip_offline_clients (Optional[bool]): Whether to wait for flows
           to complete on clients that have been offline for more than an hour.
+      download_dir (Optional[str]): directory to download the flow results
+          to. Results already downloaded to it by a previous run are not
+          downloaded again. Defaults to a new temporary directory.
     """
     super(GRRFlowCollector, self).SetUp(
         reason, grr_server_url, grr_username, grr_password,
         approvers=approvers, verify=verify,
-        skip_offline_clients=skip_offline_clients)
+        skip_offline_clients=skip_offline_clients, download_dir=download_dir)
 
     flows = flow_ids.strip().split(',')
-    for item in hostnames.strip().split(','):
-      host = item.strip()
+    hosts = [item.strip() for item in hostnames.strip().split(',')]
+    self.client_resolver.Prefetch(host for host in hosts if host)
+    for host in hosts:
       if host:
         client = self._GetClientBySelector(host)
         for flow_id in flows:
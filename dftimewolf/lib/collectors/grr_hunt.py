@@ -2,10 +2,15 @@
 """Definition of modules for collecting data from GRR Hunts."""
 
 import os
+import queue
 import re
+import struct
 import tempfile
+import threading
 import zipfile
-from typing import List, Optional, Set, Tuple, Union, Dict
+import zlib
+from typing import (
+    Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union)
 
 import pandas as pd
 import yaml
@@ -14,6 +19,7 @@ from grr_response_proto import flows_pb2 as grr_flows
 from grr_response_proto import osquery_pb2 as osquery_flows
 
 from dftimewolf.lib import module
+from dftimewolf.lib import utils
 from dftimewolf.lib.collectors import grr_base
 from dftimewolf.lib.containers import containers
 from dftimewolf.lib.errors import DFTimewolfError
@@ -204,7 +210,7 @@ class GRRHuntArtifactCollector(GRRHunt):
     """
     self.GrrSetUp(
         reason, grr_server_url, grr_username, grr_password, approvers=approvers,
-        verify=verify, message_callback=self.PublishMessage)
+        verify=verify, message_callback=self.PublishMessage, state=self.state)
 
     self.artifacts = [item.strip() for item in artifacts.strip().split(',')]
     if not artifacts:
@@ -290,7 +296,7 @@ class GRRHuntFileCollector(GRRHunt):
     """
     self.GrrSetUp(
         reason, grr_server_url, grr_username, grr_password, approvers=approvers,
-        verify=verify, message_callback=self.PublishMessage)
+        verify=verify, message_callback=self.PublishMessage, state=self.state)
     self.file_path_list = [item.strip() for item
                            in file_path_list.strip().split(',')]
     if max_file_size:
@@ -387,7 +393,7 @@ class GRRHuntOsqueryCollector(GRRHunt):
     """
     self.GrrSetUp(
         reason, grr_server_url, grr_username, grr_password, approvers=approvers,
-        verify=verify, message_callback=self.PublishMessage)
+        verify=verify, message_callback=self.PublishMessage, state=self.state)
 
     self.HuntSetup(match_mode, client_operating_systems, client_labels)
 
@@ -424,13 +430,6 @@ class GRRHuntYaraScanner(GRRHunt):
 
   DEFAULT_OSQUERY_TIMEOUT_MILLIS = 300000
 
-  YARA_MODULES = {
-    "hash.": "import \"hash\"",
-    "pe.": "import \"pe\"",
-    "elf.": "import \"elf\"",
-    "math.": "import \"math\"",
-  }
-
   FLOW_NAME = 'YaraProcessScan'
 
   def __init__(self,
@@ -501,7 +500,7 @@ class GRRHuntYaraScanner(GRRHunt):
     """
     self.GrrSetUp(
         reason, grr_server_url, grr_username, grr_password, approvers=approvers,
-        verify=verify, message_callback=self.PublishMessage)
+        verify=verify, message_callback=self.PublishMessage, state=self.state)
 
     self.dump_process_on_match = dump_process_on_match
 
@@ -568,18 +567,8 @@ class GRRHuntYaraScanner(GRRHunt):
     """Starts a new Osquery GRR hunt."""
     yara_containers = self.GetContainers(containers.YaraRule)
 
-    selected_headers = set()
-    for rule in yara_containers:
-      for prefix, header in self.YARA_MODULES.items():
-        condition = rule.rule_text.split("condition:")[1]
-        if prefix in condition:
-          selected_headers.add(header)
-
-    concatenated_rules = "\n\n".join(
-        [container.rule_text for container in yara_containers])
-
-    final_rule_text = ("\n".join(sorted(selected_headers)) +
-                      "\n\n" + concatenated_rules)
+    final_rule_text = utils.BuildYaraRuleset(
+        container.rule_text for container in yara_containers)
 
     flow_args = grr_flows.YaraProcessScanRequest(
       yara_signature=final_rule_text,
@@ -645,7 +634,7 @@ class GRRHuntDownloaderBase(GRRHunt):
     """
     self.GrrSetUp(
         reason, grr_server_url, grr_username, grr_password, approvers=approvers,
-        verify=verify, message_callback=self.PublishMessage)
+        verify=verify, message_callback=self.PublishMessage, state=self.state)
     self.hunt_id = hunt_id
     self.output_path = tempfile.mkdtemp()
 
@@ -681,9 +670,403 @@ class GRRHuntDownloaderBase(GRRHunt):
       self.StoreContainer(container)
 
 
+class _UnsupportedArchiveError(Exception):
+  """Raised when a hunt archive cannot be decoded as a stream."""
+
+
+class _StreamedZipMember:
+  """A member of a ZIP archive decoded by _StreamingZipReader.
+
+  Attributes:
+    filename (str): path of the member in the archive.
+  """
+
+  def __init__(self, filename: str, chunks: Iterator[bytes]) -> None:
+    """Initializes a streamed ZIP member.
+
+    Args:
+      filename (str): path of the member in the archive.
+      chunks (Iterator[bytes]): decompressed contents of the member.
+    """
+    self.filename = filename
+    self._chunks = chunks
+
+  def IsDirectory(self) -> bool:
+    """Whether the member is a directory entry."""
+    return self.filename.endswith('/')
+
+  def Read(self) -> Iterator[bytes]:
+    """Yields the decompressed contents of the member."""
+    yield from self._chunks
+
+
+class _StreamingZipReader:
+  """Decodes a ZIP archive from its local file headers, as it is downloaded.
+
+  GRR generates hunt archives on the fly, so every member is preceded by a
+  local file header and deflated members are followed by a data descriptor.
+  This lets members be decompressed in order without the central directory at
+  the end of the archive, which is only read to detect the end of the members.
+  """
+
+  _LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+  _DATA_DESCRIPTOR_SIGNATURE = b'PK\x07\x08'
+  _END_SIGNATURES = (b'PK\x01\x02', b'PK\x06\x06', b'PK\x05\x06')
+  _LOCAL_HEADER = struct.Struct('<HHHHHIIIHH')
+  _ZIP64_EXTRA_ID = 0x0001
+  _READ_SIZE = 1024 * 1024
+
+  def __init__(self, chunks: Iterable[bytes]) -> None:
+    """Initializes a streaming ZIP reader.
+
+    Args:
+      chunks (Iterable[bytes]): the archive, as downloaded.
+    """
+    self._chunks = iter(chunks)
+    self._buffer = bytearray()
+    self._exhausted = False
+    self.bytes_read = 0
+
+  def _Fill(self, size: int) -> None:
+    """Buffers at least size bytes, unless the archive ends first."""
+    while len(self._buffer) < size and not self._exhausted:
+      try:
+        chunk = next(self._chunks)
+      except StopIteration:
+        self._exhausted = True
+        break
+      self._buffer += chunk
+      self.bytes_read += len(chunk)
+
+  def _Peek(self, size: int) -> bytes:
+    """Returns up to size bytes without consuming them."""
+    self._Fill(size)
+    return bytes(self._buffer[:size])
+
+  def _ReadExactly(self, size: int) -> bytes:
+    """Consumes exactly size bytes.
+
+    Raises:
+      zipfile.BadZipfile: if the archive ends first.
+    """
+    self._Fill(size)
+    if len(self._buffer) < size:
+      raise zipfile.BadZipfile('Truncated archive')
+    data = bytes(self._buffer[:size])
+    del self._buffer[:size]
+    return data
+
+  def _ReadSome(self, size: int) -> bytes:
+    """Consumes between one and size bytes.
+
+    Raises:
+      zipfile.BadZipfile: if the archive ends first.
+    """
+    if not self._buffer:
+      self._Fill(1)
+    if not self._buffer:
+      raise zipfile.BadZipfile('Truncated archive')
+    data = bytes(self._buffer[:size])
+    del self._buffer[:len(data)]
+    return data
+
+  def _ParseZip64Extra(
+      self, extra: bytes, compressed_size: int, size: int) -> Tuple[int, int]:
+    """Reads sizes that overflow the local header from the ZIP64 extra field.
+
+    Returns:
+      tuple[int, int]: the compressed and uncompressed sizes.
+    """
+    offset = 0
+    while offset + 4 <= len(extra):
+      field_id, field_size = struct.unpack_from('<HH', extra, offset)
+      offset += 4
+      if field_id == self._ZIP64_EXTRA_ID:
+        values = list(struct.unpack_from(
+            f'<{field_size // 8}Q', extra, offset))
+        if size == 0xFFFFFFFF and values:
+          size = values.pop(0)
+        if compressed_size == 0xFFFFFFFF and values:
+          compressed_size = values.pop(0)
+        break
+      offset += field_size
+    return compressed_size, size
+
+  def _ReadStored(self, compressed_size: int) -> Iterator[bytes]:
+    """Yields the contents of a member stored without compression."""
+    remaining = compressed_size
+    while remaining:
+      data = self._ReadSome(min(remaining, self._READ_SIZE))
+      remaining -= len(data)
+      yield data
+
+  def _ReadDeflated(
+      self, compressed_size: Optional[int],
+      sizes: List[int]) -> Iterator[bytes]:
+    """Yields the contents of a deflated member.
+
+    Args:
+      compressed_size (Optional[int]): size of the compressed data, None if
+          it is only known from the data descriptor after the data.
+      sizes (List[int]): receives the compressed size of the data.
+    """
+    decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+    consumed = 0
+    while not decompressor.eof:
+      to_read = self._READ_SIZE
+      if compressed_size is not None:
+        to_read = min(to_read, compressed_size - consumed)
+        if not to_read:
+          raise zipfile.BadZipfile('Truncated deflate stream')
+      data = self._ReadSome(to_read)
+      consumed += len(data)
+      output = decompressor.decompress(data)
+      if decompressor.unused_data:
+        # Give back what follows the end of the deflate stream.
+        self._buffer[:0] = decompressor.unused_data
+        consumed -= len(decompressor.unused_data)
+      if output:
+        yield output
+    tail = decompressor.flush()
+    if tail:
+      yield tail
+    sizes.append(consumed)
+
+  def _ReadDataDescriptor(
+      self, compressed_size: int, size: int) -> int:
+    """Consumes the data descriptor following a member.
+
+    The descriptor holds 4 or 8 byte sizes, depending on whether the writer
+    used ZIP64, which the local header does not always say; the variant whose
+    sizes match the decoded data is used.
+
+    Returns:
+      int: the CRC-32 of the member.
+
+    Raises:
+      zipfile.BadZipfile: if no descriptor matches the decoded data.
+    """
+    if self._Peek(4) == self._DATA_DESCRIPTOR_SIGNATURE:
+      self._ReadExactly(4)
+    header = self._Peek(22)
+    for layout in ('<III', '<IQQ'):
+      length = struct.calcsize(layout)
+      if len(header) < length:
+        continue
+      crc, descriptor_compressed_size, descriptor_size = struct.unpack_from(
+          layout, header)
+      # Both layouts can match the sizes of an empty member, in which case
+      # only the one followed by another record is right.
+      following = header[length:length + 2]
+      if ((descriptor_compressed_size, descriptor_size) == (
+          compressed_size, size) and following in (b'', b'PK')):
+        self._ReadExactly(length)
+        return int(crc)
+    raise zipfile.BadZipfile('Data descriptor does not match member sizes')
+
+  def _ReadMember(
+      self, method: int, flags: int, crc: int, compressed_size: int
+  ) -> Iterator[bytes]:
+    """Yields the decompressed contents of the member at the read position.
+
+    Raises:
+      _UnsupportedArchiveError: if the member cannot be decoded as a stream.
+      zipfile.BadZipfile: if the member is corrupted.
+    """
+    has_descriptor = bool(flags & 0x08)
+    size = 0
+    actual_crc = 0
+    sizes: List[int] = []
+    if method == zipfile.ZIP_STORED:
+      if has_descriptor:
+        raise _UnsupportedArchiveError(
+            'Stored member without sizes in its local header')
+      chunks = self._ReadStored(compressed_size)
+    elif method == zipfile.ZIP_DEFLATED:
+      chunks = self._ReadDeflated(
+          None if has_descriptor else compressed_size, sizes)
+    else:
+      raise _UnsupportedArchiveError(f'Compression method {method:d}')
+
+    for chunk in chunks:
+      size += len(chunk)
+      actual_crc = zlib.crc32(chunk, actual_crc)
+      yield chunk
+
+    if has_descriptor:
+      crc = self._ReadDataDescriptor(sizes[0], size)
+    if crc != actual_crc:
+      raise zipfile.BadZipfile('Bad CRC-32')
+
+  def Members(self) -> Iterator[_StreamedZipMember]:
+    """Yields the members of the archive, in order.
+
+    The contents of a member must be read before the next member is
+    requested; whatever was not read is skipped.
+
+    Raises:
+      _UnsupportedArchiveError: if the archive cannot be decoded as a stream.
+      zipfile.BadZipfile: if the archive is corrupted.
+    """
+    while True:
+      signature = self._Peek(4)
+      if not signature or signature in self._END_SIGNATURES:
+        return
+      if signature != self._LOCAL_HEADER_SIGNATURE:
+        raise zipfile.BadZipfile('Bad local file header signature')
+      self._ReadExactly(4)
+      (_, flags, method, _, _, crc, compressed_size, size, name_length,
+       extra_length) = self._LOCAL_HEADER.unpack(
+           self._ReadExactly(self._LOCAL_HEADER.size))
+      if flags & 0x01:
+        raise _UnsupportedArchiveError('Encrypted member')
+      raw_name = self._ReadExactly(name_length)
+      extra = self._ReadExactly(extra_length)
+      compressed_size, size = self._ParseZip64Extra(
+          extra, compressed_size, size)
+      filename = raw_name.decode('utf-8' if flags & 0x800 else 'cp437')
+
+      chunks = self._ReadMember(method, flags, crc, compressed_size)
+      yield _StreamedZipMember(filename, chunks)
+      for _ in chunks:
+        pass
+
+
+class _HuntArchiveExtractor:
+  """Writes the members of a streamed hunt archive to disk.
+
+  Every client directory is assigned to one of a pool of worker threads, so
+  that files of different clients are written concurrently while the archive
+  is still being decoded. Queues are bounded so that decoding does not run
+  ahead of the disk.
+  """
+
+  _QUEUE_SIZE = 64
+
+  def __init__(
+      self,
+      output_path: str,
+      workers: int,
+      client_callback: Callable[[str, str], None]) -> None:
+    """Initializes a hunt archive extractor.
+
+    Args:
+      output_path (str): directory to extract the archive to.
+      workers (int): number of worker threads.
+      client_callback (Callable[[str, str], None]): called from a worker with
+          the name and directory of a client once its files are written.
+    """
+    self._output_path = os.path.abspath(output_path)
+    self._client_callback = client_callback
+    self._queues: List['queue.Queue[Optional[Tuple[str, object]]]'] = [
+        queue.Queue(maxsize=self._QUEUE_SIZE) for _ in range(workers)]
+    self._client_queues: Dict[str, 'queue.Queue[Optional[Tuple[str, object]]]'] = {}  # pylint: disable=line-too-long
+    self._threads = [
+        threading.Thread(target=self._Work, args=(work_queue,), daemon=True)
+        for work_queue in self._queues]
+    self._error: Optional[Exception] = None
+    for thread in self._threads:
+      thread.start()
+
+  def _Work(
+      self, work_queue: 'queue.Queue[Optional[Tuple[str, object]]]') -> None:
+    """Writes files for the clients assigned to a worker."""
+    output_file = None
+    while True:
+      item = work_queue.get()
+      if item is None:
+        break
+      action, value = item
+      if self._error:
+        # Keep draining the queue so that the reader never blocks.
+        continue
+      try:
+        if action == 'open':
+          path = str(value)
+          os.makedirs(os.path.dirname(path), exist_ok=True)
+          output_file = open(path, 'wb')  # pylint: disable=consider-using-with
+        elif action == 'write' and output_file:
+          output_file.write(value)  # type: ignore[arg-type]
+        elif action == 'close' and output_file:
+          output_file.close()
+          output_file = None
+        elif action == 'done':
+          name, directory = value  # type: ignore[misc]
+          self._client_callback(name, directory)
+      except Exception as exception:  # pylint: disable=broad-except
+        self._error = exception
+    if output_file:
+      output_file.close()
+
+  def _GetQueue(
+      self, client_id: str) -> 'queue.Queue[Optional[Tuple[str, object]]]':
+    """Returns the queue of the worker assigned to a client."""
+    if client_id not in self._client_queues:
+      self._client_queues[client_id] = self._queues[
+          len(self._client_queues) % len(self._queues)]
+    return self._client_queues[client_id]
+
+  def _CheckError(self) -> None:
+    """Raises the first error encountered by a worker, if any."""
+    if self._error:
+      raise OSError(str(self._error)) from self._error
+
+  def ExtractMember(self, client_id: str, member: _StreamedZipMember) -> None:
+    """Queues a member of a client directory for extraction.
+
+    Args:
+      client_id (str): GRR client identifier.
+      member (_StreamedZipMember): the archive member.
+
+    Raises:
+      OSError: if a worker failed to write a file.
+      zipfile.BadZipfile: if the member path escapes the output directory.
+    """
+    self._CheckError()
+    path = os.path.normpath(os.path.join(self._output_path, member.filename))
+    if not path.startswith(self._output_path + os.sep):
+      raise zipfile.BadZipfile(f'Unsafe member path {member.filename:s}')
+    if member.IsDirectory():
+      os.makedirs(path, exist_ok=True)
+      return
+    work_queue = self._GetQueue(client_id)
+    work_queue.put(('open', path))
+    for chunk in member.Read():
+      work_queue.put(('write', chunk))
+    work_queue.put(('close', None))
+
+  def ClientDone(self, client_id: str, name: str, directory: str) -> None:
+    """Reports a client once all its queued files are written.
+
+    Args:
+      client_id (str): GRR client identifier.
+      name (str): human-readable name of the client.
+      directory (str): directory holding the client's files.
+    """
+    self._GetQueue(client_id).put(('done', (name, directory)))
+
+  def Close(self) -> None:
+    """Waits for the workers to write all queued files.
+
+    Raises:
+      OSError: if a worker failed to write a file.
+    """
+    for work_queue in self._queues:
+      work_queue.put(None)
+    for thread in self._threads:
+      thread.join()
+    self._CheckError()
+
+
 class GRRHuntDownloader(GRRHuntDownloaderBase):
   """Downloads a file archive from a GRR hunt.
 
+  The archive is extracted while it downloads, which overlaps downloading and
+  extraction. A File container is stored for every client once the whole
+  archive is extracted, as the archive tells that a client is complete only
+  at its end. Archives that cannot be decoded as a stream are written to disk
+  and extracted afterwards.
+
   Attributes:
     reason (str): justification for GRR access.
     approvers (str): comma-separated GRR approval recipients.
@@ -706,6 +1089,8 @@ class GRRHuntDownloader(GRRHuntDownloaderBase):
     super(GRRHuntDownloader, self).__init__(
         state, name=name, critical=critical)
 
+  _EXTRACTION_WORKERS = 4
+
   # TODO: change object to more specific GRR type information.
   def _CollectHuntResults(self, hunt: Hunt) -> List[Tuple[str, str]]:
     """Downloads the current set of files in results.
@@ -731,6 +1116,22 @@ class GRRHuntDownloader(GRRHuntDownloaderBase):
       self.logger.debug(f"{output_file_path:s} already exists: Skipping")
       return []
 
+    try:
+      self._WrapGRRRequestWithApproval(
+        hunt,
+        self._StreamHuntResults,
+        self.logger,
+        self.LogTelemetry,
+        hunt,
+      )
+      return []
+    except _UnsupportedArchiveError as exception:
+      self.logger.warning(
+          f'Hunt archive cannot be extracted while downloading ({exception!s})'
+          ', downloading it first')
+    except DFTimewolfError as exception:
+      self.ModuleError(exception.message, critical=exception.critical)
+
     try:
       self._WrapGRRRequestWithApproval(
         hunt,
@@ -761,6 +1162,80 @@ class GRRHuntDownloader(GRRHuntDownloaderBase):
     hunt_archive = hunt.GetFilesArchive()
     hunt_archive.WriteToFile(output_file_path)
 
+  def _StreamHuntResults(self, hunt: Hunt) -> None:
+    """Extracts a hunt archive while it downloads.
+
+    Files are written while the archive downloads. GRR writes the files of
+    all clients in batches of results, so the members of a client directory
+    are not necessarily contiguous, and the client_info.yaml files only
+    after the files of every client. No client is known to be complete
+    before then, so File containers are stored for all clients once the
+    whole archive has been read, rather than for a client whose directory
+    may still grow.
+
+    Function is necessary for the _WrapGRRRequestWithApproval to work.
+
+    Args:
+      hunt (object): GRR hunt object.
+
+    Raises:
+      _UnsupportedArchiveError: if the archive cannot be decoded as a stream.
+      DFTimewolfError: if the archive could not be extracted.
+    """
+    reader = _StreamingZipReader(hunt.GetFilesArchive().GenerateChunks())
+    client_id_to_fqdn: Dict[str, str] = {}
+    client_directories: Dict[str, str] = {}
+    stored: List[str] = []
+    stored_lock = threading.Lock()
+
+    def _StoreClientResults(name: str, directory: str) -> None:
+      self.StoreContainer(containers.File(name=name, path=directory))
+      with stored_lock:
+        stored.append(name)
+      self.logger.debug(f'Extracted results of {name:s} to {directory:s}')
+
+    extractor = _HuntArchiveExtractor(
+        self.output_path, self._EXTRACTION_WORKERS, _StoreClientResults)
+
+    try:
+      try:
+        for member in reader.Members():
+          parts = member.filename.split('/')
+          client_id = parts[1] if len(parts) > 2 else ''
+          if not client_id.startswith('C.'):
+            continue
+
+          # client_info.yaml maps the client ID to its FQDN and is not
+          # extracted.
+          if parts[-1] == 'client_info.yaml':
+            info_client_id, fqdn = self._GetClientFQDN(b''.join(member.Read()))
+            client_id_to_fqdn[info_client_id] = fqdn
+            continue
+          client_directories.setdefault(
+              client_id, os.path.join(self.output_path, parts[0], client_id))
+          extractor.ExtractMember(client_id, member)
+
+        for client_id, directory in client_directories.items():
+          extractor.ClientDone(
+              client_id, client_id_to_fqdn.get(client_id, client_id),
+              directory)
+      finally:
+        extractor.Close()
+    except OSError as exception:
+      raise DFTimewolfError(
+          f'Error extracting hunt archive: {exception!s}',
+          critical=True) from exception
+    except zipfile.BadZipfile as exception:
+      raise DFTimewolfError(
+          f'Bad zipfile: {exception!s}', critical=True) from exception
+
+    if not stored:
+      raise DFTimewolfError(
+          'Nothing was extracted from the hunt archive', critical=True)
+    self.logger.info(
+        f'Extracted results of {hunt.hunt_id} for {len(stored):d} clients '
+        f'from {reader.bytes_read:d} bytes to {self.output_path:s}')
+
   def _GetClientFQDN(self, client_info_contents: bytes) -> Tuple[str, str]:
     """Extracts a GRR client's FQDN from its client_info.yaml file.
 
@@ -926,7 +1401,7 @@ class GRRHuntOsqueryDownloader(GRRHuntDownloaderBase):
       payload = result.payload
 
       client_id = result.client.client_id
-      grr_client = list(self.grr_api.SearchClients(client_id))[0]
+      grr_client = self.client_resolver.Search(client_id)[0]
       client_hostname = grr_client.data.os_info.fqdn.lower()
 
       if isinstance(payload, osquery_flows.OsqueryCollectedFile):
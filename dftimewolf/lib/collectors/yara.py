@@ -1,10 +1,15 @@
 # -*- coding: utf-8 -*-
 """Definition of modules for collecting Yara rules from TIPs."""
 
+from concurrent import futures
+import glob
 import os
-from typing import Optional
+import re
+from typing import Any, Dict, List, Optional, Tuple
 
 import requests
+from requests import adapters
+from urllib3.util import retry
 
 from dftimewolf.lib import module
 from dftimewolf.lib.containers import containers
@@ -12,16 +17,35 @@ from dftimewolf.lib.modules import manager as modules_manager
 from dftimewolf.lib.state import DFTimewolfState
 
 
+# Start of each rule declaration in a Yara rules file.
+_RULE_DECLARATION_RE = re.compile(
+    r'^\s*(?:(?:private|global)\s+)*rule\s+\w+', re.MULTILINE)
+
+
+def _CountRules(rules: str) -> int:
+  """Returns the number of rules declared in Yara rules text."""
+  return len(_RULE_DECLARATION_RE.findall(rules))
+
+
 class YetiYaraCollector(module.BaseModule):
   """Collector of Yara rules from Yeti TBB instances.
 
   Yeti TBB is Apache 2.0 licensed. Stores them in container.YaraRule containers.
 
+  Indicators are listed one page at a time over a pooled HTTP session.
+  Indicators listed without their rule are fetched one by one.
+
   Attributes:
     rule_name_filter: A string by which to filter Yara rule names
     api_key: The Yeti API key to use.
     api_root: The Yeti HTTP API root, e.g. http://localhost:8080/api/
   """
+
+  # Number of indicators requested per page.
+  _PAGE_SIZE = 500
+  # Number of rules fetched at once, and of pooled connections.
+  _MAX_FETCH_WORKERS = 8
+
   def __init__(self,
               state: DFTimewolfState,
               name: Optional[str]=None,
@@ -46,6 +70,93 @@ class YetiYaraCollector(module.BaseModule):
     self.api_key = api_key
     self.api_root = api_root
 
+  def _CreateSession(self) -> requests.Session:
+    """Creates an HTTP session that pools and retries connections."""
+    session = requests.Session()
+    session.headers['X-Yeti-API'] = self.api_key
+    # Listing and fetching indicators does not modify them, so POST
+    # requests are retried too.
+    session_retries = retry.Retry(
+        total=3,
+        backoff_factor=1,
+        allowed_methods=None,
+        raise_on_status=False,
+        status_forcelist=[
+            requests.codes.too_many_requests,
+            requests.codes.internal_server_error,
+            requests.codes.bad_gateway,
+            requests.codes.service_unavailable,
+            requests.codes.gateway_timeout
+        ]
+    )
+    adapter = adapters.HTTPAdapter(
+        pool_maxsize=self._MAX_FETCH_WORKERS, max_retries=session_retries)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+  def _ListIndicators(
+      self, session: requests.Session) -> Optional[List[Dict[str, Any]]]:
+    """Lists the Yara indicators matching the name filter, page by page.
+
+    Args:
+      session: the HTTP session.
+
+    Returns:
+      The indicators, or None if Yeti returned an error.
+    """
+    indicators: List[Dict[str, Any]] = []
+    seen_ids = set()
+    page = 1
+    while True:
+      response = session.post(
+          f'{self.api_root}/indicators/filter/',
+          json={
+              'name': self.rule_name_filter,
+              'type': 'x-yara',
+              'page': page,
+              'count': self._PAGE_SIZE},
+      )
+      response_json = response.json()
+      if response.status_code != 200:
+        self.logger.error(
+          f'Error (HTTP {response.status_code}) retrieving indicators'
+          f' from Yeti: {response_json}'
+        )
+        return None
+
+      new_indicators = [
+          indicator for indicator in response_json
+          if indicator['id'] not in seen_ids]
+      seen_ids.update(indicator['id'] for indicator in new_indicators)
+      indicators.extend(new_indicators)
+      # Servers that do not paginate return every indicator on each page.
+      if len(response_json) < self._PAGE_SIZE or not new_indicators:
+        return indicators
+      page += 1
+
+  def _FetchIndicator(
+      self,
+      session: requests.Session,
+      indicator_id: str) -> Optional[Dict[str, Any]]:
+    """Fetches one indicator, with its rule.
+
+    Args:
+      session: the HTTP session.
+      indicator_id: id of the indicator.
+
+    Returns:
+      The indicator, or None if Yeti returned an error.
+    """
+    response = session.get(f'{self.api_root}/indicators/{indicator_id}')
+    if response.status_code != 200:
+      self.logger.error(
+          f'Error (HTTP {response.status_code}) retrieving indicator'
+          f' {indicator_id} from Yeti: {response.text}')
+      return None
+    indicator: Dict[str, Any] = response.json()
+    return indicator
+
   def Process(self) -> None:
     """Collects Yara rules from a Yeti instance.
 
@@ -54,23 +165,26 @@ class YetiYaraCollector(module.BaseModule):
 
     self.logger.debug(f'Connecting to {self.api_root}...')
     self.api_root = self.api_root.strip('/')
-    response = requests.post(
-        f'{self.api_root}/indicators/filter/',
-        json={'name': self.rule_name_filter, 'type': 'x-yara'},
-        headers={'X-Yeti-API': self.api_key},
-    )
+    with self._CreateSession() as session:
+      indicators = self._ListIndicators(session)
+      if indicators is None:
+        return
 
-    response_json = response.json()
-    if response.status_code != 200:
-      self.logger.error(
-        f'Error (HTTP {response.status_code}) retrieving indicators'
-        f' from Yeti: {response_json}'
-      )
-      return
+      intel = {}
+      to_fetch = []
+      for indicator in indicators:
+        if 'pattern' in indicator:
+          intel[indicator['id']] = indicator
+        else:
+          to_fetch.append(indicator['id'])
 
-    intel = {}
-    for rule in response_json:
-      intel[rule["id"]] = rule
+      with futures.ThreadPoolExecutor(
+          max_workers=self._MAX_FETCH_WORKERS) as executor:
+        for indicator in executor.map(
+            lambda indicator_id: self._FetchIndicator(session, indicator_id),
+            to_fetch):
+          if indicator is not None:
+            intel[indicator['id']] = indicator
     self.logger.info(f'Collected {len(intel)} Yara rules from Yeti')
 
     for rule in intel.values():
@@ -83,8 +197,15 @@ class LocalYaraCollector(module.BaseModule):
   """Collect of Yara rules from the local filesystem.
 
   Attributes:
-    rules_path: Local filesystem path towards a file containing Yara rules.
+    rules_path: Comma-separated paths of files containing Yara rules,
+        directories of such files, or glob patterns of such files.
   """
+
+  # Suffixes of the Yara rules files in directories.
+  _RULE_FILE_SUFFIXES = ('.yar', '.yara')
+  # Number of rules files read at once.
+  _MAX_READ_WORKERS = 16
+
   def __init__(self,
               state: DFTimewolfState,
               name: Optional[str]=None,
@@ -98,25 +219,77 @@ class LocalYaraCollector(module.BaseModule):
     """Sets up the YaraCollector module.
 
     Args:
-      rules_path: Path to a file containing Yara rules.
+      rules_path: Comma-separated paths of files containing Yara rules,
+          directories of .yar and .yara files, or glob patterns.
     """
     self.rules_path = rules_path
 
+  def _ListRuleFiles(self) -> List[str]:
+    """Lists the rules files at the rules paths.
+
+    Returns:
+      The paths of the rules files, without duplicates, in a deterministic
+      order.
+    """
+    file_paths: List[str] = []
+    for path in self.rules_path.split(','):
+      path = path.strip()
+      if not path:
+        continue
+      if os.path.isdir(path):
+        for root, directories, files in os.walk(path):
+          directories.sort()
+          file_paths.extend(
+              os.path.join(root, filename) for filename in sorted(files)
+              if filename.lower().endswith(self._RULE_FILE_SUFFIXES))
+      elif any(character in path for character in '*?['):
+        file_paths.extend(
+            file_path for file_path in sorted(glob.glob(path, recursive=True))
+            if os.path.isfile(file_path))
+      else:
+        file_paths.append(path)
+    return list(dict.fromkeys(file_paths))
+
+  def _ReadRuleFile(self, path: str) -> Tuple[str, str]:
+    """Reads a rules file.
+
+    Args:
+      path: path of the file.
+
+    Returns:
+      The path and the contents of the file.
+    """
+    with open(path, 'r', encoding='utf-8', errors='replace') as rules_file:
+      return path, rules_file.read()
+
   def Process(self) -> None:
-    """Collects Yara rules from a path in the local filesystem."""
+    """Collects Yara rules from paths in the local filesystem."""
     if not self.rules_path:
       return
 
-    with open(self.rules_path, 'r') as rules_file:
-      rules = rules_file.read()
+    file_paths = self._ListRuleFiles()
+    if not file_paths:
+      self.ModuleError(
+          f'No Yara rules files found at {self.rules_path}', critical=True)
 
-    filename = os.path.basename(self.rules_path)
-    rule_count = rules.count('rule ')
-    self.logger.info(
-        f'Collected {rule_count} Yara rules from {self.rules_path}')
+    try:
+      with futures.ThreadPoolExecutor(
+          max_workers=min(len(file_paths), self._MAX_READ_WORKERS)
+      ) as executor:
+        rule_files = list(executor.map(self._ReadRuleFile, file_paths))
+    except OSError as exception:
+      self.ModuleError(
+          f'Unable to read Yara rules: {exception!s}', critical=True)
 
-    container = containers.YaraRule(name=filename, rule_text=rules)
-    self.StoreContainer(container)
+    rule_count = 0
+    for path, rules in rule_files:
+      rule_count += _CountRules(rules)
+      container = containers.YaraRule(
+          name=os.path.basename(path), rule_text=rules)
+      self.StoreContainer(container)
+    self.logger.info(
+        f'Collected {rule_count} Yara rules from {len(rule_files)} files '
+        f'in {self.rules_path}')
 
 
 modules_manager.ModulesManager.RegisterModules([
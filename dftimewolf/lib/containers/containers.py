@@ -6,11 +6,11 @@ from __future__ import annotations
 import datetime
 
 from typing import Optional, Union, List, TYPE_CHECKING, Dict, Any
-import pandas as pd
 
 from dftimewolf.lib.containers import interface
 
 if TYPE_CHECKING:
+  import pandas as pd
   from libcloudforensics.providers.aws.internal.ebs import AWSVolume as AWSVol
   from libcloudforensics.providers.azure.internal.compute import AZComputeDisk
   from libcloudforensics.providers.gcp.internal.compute import GoogleComputeDisk
@@ -1,9 +1,54 @@
 # -*- coding: utf-8 -*-
 """The attribute container interface."""
 
-from typing import Any, Dict, List, Optional
+import hashlib
+import sys
+from typing import Any, cast, Dict, Hashable, List, Optional
 
-import pandas as pd
+
+def IsDataFrame(value: Any) -> bool:
+  """Checks whether a value is a pandas DataFrame, without importing pandas.
+
+  A value can only be a DataFrame once pandas has been imported, so modules
+  that never handle DataFrames do not pay for importing pandas.
+
+  Args:
+    value: The value to check.
+
+  Returns:
+    True if the value is a DataFrame.
+  """
+  pandas = sys.modules.get('pandas')
+  return pandas is not None and isinstance(value, pandas.DataFrame)
+
+
+def _FingerprintValue(value: Any) -> Hashable:
+  """Converts an attribute value into a hashable representation.
+
+  Args:
+    value: The attribute value.
+
+  Returns:
+    A hashable representation of the value. Values that compare equal produce
+    equal representations.
+
+  Raises:
+    TypeError: If the value cannot be represented as a hashable.
+  """
+  if IsDataFrame(value):
+    row_hashes = sys.modules['pandas'].util.hash_pandas_object(
+        value, index=True)
+    digest = hashlib.sha256(row_hashes.to_numpy().tobytes()).hexdigest()
+    return ('DataFrame', tuple(value.columns), value.shape, digest)
+  if isinstance(value, (list, tuple)):
+    return tuple(_FingerprintValue(v) for v in value)
+  if isinstance(value, (set, frozenset)):
+    return frozenset(_FingerprintValue(v) for v in value)
+  if isinstance(value, dict):
+    return frozenset(
+        (k, _FingerprintValue(v)) for k, v in value.items())
+  hash(value)
+  return cast(Hashable, value)
 
 
 class AttributeContainer():
@@ -63,6 +108,31 @@ class AttributeContainer():
     """
     self.metadata[key] = value
 
+  def Fingerprint(self) -> Optional[Hashable]:
+    """Returns a hashable fingerprint of the container contents.
+
+    Containers that are equal (see __eq__) have equal fingerprints, which lets
+    the container manager index containers by content instead of comparing
+    them one by one. Metadata is ignored, as it is for equality. DataFrame
+    members are hashed with pandas.util.hash_pandas_object.
+
+    Child classes can override this method to provide a cheaper fingerprint,
+    or return None to opt out of indexing.
+
+    Returns:
+      A hashable fingerprint, or None if the container has members that cannot
+      be fingerprinted.
+    """
+    fingerprint: List[Hashable] = [self.CONTAINER_TYPE]
+    for k in sorted(self.__dict__.keys()):
+      if k == 'metadata':
+        continue
+      try:
+        fingerprint.append((k, _FingerprintValue(self.__dict__[k])))
+      except TypeError:
+        return None
+    return tuple(fingerprint)
+
   def __eq__(self, other: "AttributeContainer") -> bool:
     """Override the `==` operator. Equality ignores metadata."""
     if self.CONTAINER_TYPE != other.CONTAINER_TYPE:
@@ -76,8 +146,7 @@ class AttributeContainer():
       # Edge case for child classes that have Dataframe members, which cannot
       # be compared with `==`. We do this here, so every child class that has
       # a dataframe doesn't have to reimplement this method.
-      if (isinstance(v, pd.DataFrame) or
-          isinstance(other.__dict__[k], pd.DataFrame)):
+      if IsDataFrame(v) or IsDataFrame(other.__dict__[k]):
         if v is None or other.__dict__[k] is None:
           return False
         if not v.equals(other.__dict__[k]):
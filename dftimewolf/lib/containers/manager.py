@@ -1,19 +1,259 @@
 """A ContainerManager class."""
 
 
+import collections
 from concurrent import futures
 import dataclasses
+import hashlib
 import logging
 import threading
-from typing import Any, cast, Sequence, Type, TypeVar, Callable
+from typing import Any, cast, Hashable, Iterator, Sequence, Type, TypeVar, Callable
 
 from dftimewolf.lib.containers import interface
+from dftimewolf.lib.containers import spill
 
 # pylint: disable=line-too-long
 
 T = TypeVar("T", bound="interface.AttributeContainer")
 
 
+class _ContainerIndex():
+  """Hash indexed storage for containers of a single type.
+
+  Containers are kept in insertion order, keyed by their id(), and indexed by
+  their fingerprint (see AttributeContainer.Fingerprint) so that duplicate
+  detection and removal are O(1) amortized. Containers that cannot be
+  fingerprinted fall back to equality comparison.
+
+  Attributes:
+    _loader: Called on stored containers before they are compared, to read
+        back any members spilled to disk.
+    _entries: A dict, keyed by container id, of (container, origin) tuples.
+    _fingerprints: A dict of container ids, keyed by fingerprint.
+    _unindexed: Ids of stored containers that have no fingerprint.
+    _fingerprint_by_id: The fingerprint of each stored container, by id.
+  """
+
+  def __init__(
+      self,
+      loader: Callable[[interface.AttributeContainer], None] | None = None
+  ) -> None:
+    """Initialise a _ContainerIndex.
+
+    Args:
+      loader: Called on stored containers before they are compared.
+    """
+    self._loader = loader
+    self._entries: dict[int, tuple[interface.AttributeContainer, str]] = {}
+    self._fingerprints: dict[Hashable, list[int]] = {}
+    self._unindexed: set[int] = set()
+    self._fingerprint_by_id: dict[int, Hashable | None] = {}
+
+  def __len__(self) -> int:
+    """Returns the number of stored containers."""
+    return len(self._entries)
+
+  def __iter__(self) -> Iterator[tuple[interface.AttributeContainer, str]]:
+    """Iterates over (container, origin) tuples, in insertion order."""
+    return iter(list(self._entries.values()))
+
+  def Contains(self,
+               container: interface.AttributeContainer,
+               fingerprint: Hashable | None) -> bool:
+    """Checks if an equal container is already stored.
+
+    Args:
+      container: The container to look for.
+      fingerprint: The container fingerprint, or None if it has none.
+
+    Returns:
+      True if an equal container is stored, False otherwise.
+    """
+    if fingerprint is None:
+      candidates = list(self._entries)
+    else:
+      candidates = self._fingerprints.get(fingerprint, []) + list(self._unindexed)
+
+    for key in candidates:
+      stored, _ = self._entries[key]
+      if stored is container:
+        return True
+      if self._loader:
+        self._loader(stored)
+      if stored == container:
+        return True
+    return False
+
+  def Add(self,
+          container: interface.AttributeContainer,
+          origin: str,
+          fingerprint: Hashable | None) -> bool:
+    """Stores a container, unless an equal container is already stored.
+
+    Args:
+      container: The container to store.
+      origin: The module that generated the container.
+      fingerprint: The container fingerprint, or None if it has none.
+
+    Returns:
+      True if the container was stored, False if it was a duplicate.
+    """
+    if self.Contains(container, fingerprint):
+      return False
+
+    key = id(container)
+    self._entries[key] = (container, origin)
+    self._fingerprint_by_id[key] = fingerprint
+    if fingerprint is None:
+      self._unindexed.add(key)
+    else:
+      self._fingerprints.setdefault(fingerprint, []).append(key)
+    return True
+
+  def Remove(self, container: interface.AttributeContainer, origin: str) -> bool:
+    """Removes a container from storage, if it was stored by origin.
+
+    Args:
+      container: The container to remove.
+      origin: The module requesting the removal.
+
+    Returns:
+      True if the container was removed, False otherwise.
+    """
+    key = id(container)
+    entry = self._entries.get(key)
+    if entry is None or entry[0] is not container or entry[1] != origin:
+      return False
+
+    del self._entries[key]
+    fingerprint = self._fingerprint_by_id.pop(key)
+    if fingerprint is None:
+      self._unindexed.discard(key)
+    else:
+      keys = self._fingerprints[fingerprint]
+      keys.remove(key)
+      if not keys:
+        del self._fingerprints[fingerprint]
+    return True
+
+
+class _ContainerStream():
+  """A bounded stream of containers from upstream modules to a module.
+
+  Upstream modules (producers) block in Put() when the stream queue is full, or
+  when the number of their containers queued or being processed downstream
+  reaches the in-flight limit. This applies backpressure to producers that are
+  faster than the consuming module.
+
+  Duplicates are detected by a digest of each container fingerprint, so that
+  the stream holds no reference to the containers it delivered. Containers
+  without a fingerprint are never considered duplicates.
+
+  Attributes:
+    container_type: The type of container streamed.
+  """
+
+  def __init__(self,
+               container_type: str,
+               producers: list[str],
+               queue_size: int,
+               in_flight_limit: int) -> None:
+    """Initialise a _ContainerStream.
+
+    Args:
+      container_type: The type of container streamed.
+      producers: The modules that can store containers into the stream. The
+          stream is exhausted once they have all completed.
+      queue_size: Maximum number of containers waiting to be consumed.
+      in_flight_limit: Maximum number of containers, per producer, that are
+          waiting to be consumed or being processed.
+    """
+    self.container_type = container_type
+    self._condition = threading.Condition()
+    self._queue: collections.deque[tuple[interface.AttributeContainer, str]] = collections.deque()
+    self._queue_size = max(queue_size, 1)
+    self._in_flight_limit = max(in_flight_limit, 1)
+    self._in_flight: collections.Counter[str] = collections.Counter()
+    self._open_producers = set(producers)
+    self._abandoned = False
+    self._seen: set[bytes] = set()
+
+  def Put(self,
+          container: interface.AttributeContainer,
+          producer: str,
+          fingerprint: Hashable | None) -> bool:
+    """Adds a container to the stream, blocking while the stream is full.
+
+    Containers with the same fingerprint as one already streamed are silently
+    dropped.
+
+    Args:
+      container: The container to stream.
+      producer: The module that generated the container.
+      fingerprint: The container fingerprint, or None if it has none.
+
+    Returns:
+      False if the consumer abandoned the stream, True otherwise.
+    """
+    with self._condition:
+      self._condition.wait_for(
+          lambda: self._abandoned or (
+              len(self._queue) < self._queue_size and
+              self._in_flight[producer] < self._in_flight_limit))
+      if self._abandoned:
+        return False
+      if fingerprint is not None:
+        digest = hashlib.sha256(repr(fingerprint).encode('utf-8')).digest()
+        if digest in self._seen:
+          return True
+        self._seen.add(digest)
+      self._in_flight[producer] += 1
+      self._queue.append((container, producer))
+      self._condition.notify_all()
+    return True
+
+  def Get(self) -> tuple[interface.AttributeContainer, str] | None:
+    """Removes a container from the stream, blocking until one is available.
+
+    Returns:
+      A (container, producer) tuple, or None once all producers have completed
+      and the stream is empty.
+    """
+    with self._condition:
+      self._condition.wait_for(
+          lambda: self._queue or not self._open_producers or self._abandoned)
+      if not self._queue:
+        return None
+      item = self._queue.popleft()
+      self._condition.notify_all()
+    return item
+
+  def TaskDone(self, producer: str) -> None:
+    """Signals that a container from producer has been processed."""
+    with self._condition:
+      self._in_flight[producer] -= 1
+      self._condition.notify_all()
+
+  def CloseProducer(self, producer: str) -> None:
+    """Signals that a producer will not store any more containers."""
+    with self._condition:
+      self._open_producers.discard(producer)
+      self._condition.notify_all()
+
+  def Abandon(self) -> list[tuple[interface.AttributeContainer, str]]:
+    """Stops the stream, unblocking any waiting producer.
+
+    Returns:
+      The (container, producer) tuples that were never consumed.
+    """
+    with self._condition:
+      self._abandoned = True
+      remaining = list(self._queue)
+      self._queue.clear()
+      self._condition.notify_all()
+    return remaining
+
+
 @dataclasses.dataclass
 class _MODULE():
   """A helper class for tracking module storage and dependency info.
@@ -21,16 +261,18 @@ class _MODULE():
   Attributes:
     name:  The module name.
     dependencies: A list of modules that this module depends on.
-    storage: A dict, keyed by container type, of:
-        A tuple of:
+    storage: A dict, keyed by container type, of _ContainerIndex objects
+        holding tuples of:
             The container (a ref)
             The originating module
     callback_map: A dict, keyed by container type of callback methods
+    stream: The stream delivering containers from dependencies, if any.
   """
   name: str
   dependencies: list[str] = dataclasses.field(default_factory=list)
-  storage: dict[str, list[tuple[interface.AttributeContainer, str]]] = dataclasses.field(default_factory=dict)
+  storage: dict[str, _ContainerIndex] = dataclasses.field(default_factory=dict)
   callback_map: dict[str, list[Callable[[interface.AttributeContainer], None]]] = dataclasses.field(default_factory=dict)
+  stream: _ContainerStream | None = None
 
   def RegisterCallback(
       self, container_type: str, callback: Callable[[interface.AttributeContainer], None]) -> None:
@@ -56,6 +298,7 @@ class ContainerManager():
   Attributes:
     _mutex: Practice safe container access.
     _modules: Container storage and dependency information.
+    _spill: Keeps stored DataFrames within a memory budget, if one is set.
   """
 
   def __init__(self, logger: logging.Logger) -> None:
@@ -63,11 +306,36 @@ class ContainerManager():
     self._logger = logger
     self._mutex = threading.Lock()
     self._modules: dict[str, _MODULE] = {}
+    self._preflights: set[str] = set()
     self._callback_pool = futures.ThreadPoolExecutor()
+    self._spill: spill.SpillStore | None = None
 
   def __del__(self) -> None:
     """Clean up the ContainerManager."""
     self.WaitForCallbackCompletion()
+    if self._spill:
+      self._spill.Close()
+
+  def SetMemoryLimit(self, memory_limit: int, scratch_dir: str | None = None) -> None:
+    """Sets a memory budget for the DataFrames held by stored containers.
+
+    Once stored DataFrames use more than memory_limit bytes, the least recently
+    retrieved ones are spilled to disk, and read back when retrieved with
+    GetContainers. Containers stored or retrieved by a module that has not
+    completed yet are never spilled.
+
+    Args:
+      memory_limit: Maximum memory used by stored DataFrames, in bytes. 0 means
+          no limit.
+      scratch_dir: Directory to spill DataFrames to. Defaults to the system
+          temporary directory.
+    """
+    with self._mutex:
+      if self._spill:
+        self._spill.Close()
+      self._spill = None
+      if memory_limit > 0:
+        self._spill = spill.SpillStore(memory_limit, self._logger, scratch_dir)
 
   def ParseRecipe(self, recipe: dict[str, Any]) -> None:
     """Parses a recipe to build the dependency graph.
@@ -80,6 +348,7 @@ class ContainerManager():
     """
     with self._mutex:
       self._modules = {}
+      self._preflights = set()
 
       for module in recipe.get('preflights', []) + recipe.get('modules', []):
         name = module.get('runtime_name', module.get('name', None))
@@ -88,6 +357,9 @@ class ContainerManager():
 
         self._modules[name] = _MODULE(name=name, dependencies=module.get('wants', []) + [name])
 
+      for module in recipe.get('preflights', []):
+        self._preflights.add(module.get('runtime_name', module.get('name')))
+
   def StoreContainer(self,
                      source_module: str,
                      container: interface.AttributeContainer,
@@ -96,7 +368,9 @@ class ContainerManager():
 
     This method will also invoke any applicable callbacks that have been
     registered (callbacks for the same module are never invoked to prevent
-    infinite recursion.)
+    infinite recursion.) It also delivers the container to dependant modules
+    that have registered a stream for its type, which blocks while the stream
+    is full.
 
     Args:
       source_module: The module that generated the container.
@@ -113,24 +387,82 @@ class ContainerManager():
     with self._mutex:
       self._logger.debug(f'{source_module} is storing a {container.CONTAINER_TYPE} container: {str(container)}')
 
+      # Computed lazily, and only once for all receiving modules.
+      fingerprint: Hashable | None = None
+      fingerprint_computed = False
+      streams: list[tuple[_MODULE, _ContainerStream]] = []
+      callback_modules: list[str] = []
+
       for _, module in self._modules.items():
         if source_module in module.dependencies:
           if for_self_only and module.name != source_module:
             continue
           callbacks = module.GetCallbacksForContainer(container.CONTAINER_TYPE)
-          if callbacks and module.name != source_module:
+          stream = module.stream
+          if (stream and stream.container_type == container.CONTAINER_TYPE and
+              module.name != source_module and not callbacks):
+            # Delivered once the mutex is released, as this can block
+            streams.append((module, stream))
+          elif callbacks and module.name != source_module:
             # This module has registered callbacks - Use those, rather than storing
             for callback in callbacks:
               self._logger.debug('Executing callback for %s with container %s', module.name, str(container))
               self._callback_pool.submit(callback, container)
+            callback_modules.append(module.name)
           else:
-            if container.CONTAINER_TYPE not in module.storage:
-              module.storage[container.CONTAINER_TYPE] = []
+            if not fingerprint_computed:
+              fingerprint = container.Fingerprint()
+              fingerprint_computed = True
+
+            # If the container to add exists already in the state, it is not
+            # added again
+            self._StoreInModule(module, container, source_module, fingerprint)
+
+      if streams and not fingerprint_computed:
+        fingerprint = container.Fingerprint()
+      if self._spill:
+        # The source module may still use the container, and callbacks run
+        # asynchronously, so the container must stay resident
+        for name in callback_modules + [source_module]:
+          self._spill.Pin(container, name)
+        self._spill.Enforce()
+
+    for module, stream in streams:
+      self._logger.debug('Streaming %s to %s', str(container), module.name)
+      if not stream.Put(container, source_module, fingerprint):
+        # The consuming module stopped reading from the stream
+        with self._mutex:
+          self._StoreInModule(module, container, source_module, fingerprint)
+          if self._spill:
+            self._spill.Pin(container, source_module)
+
+  def _StoreInModule(self,
+                     module: _MODULE,
+                     container: interface.AttributeContainer,
+                     source_module: str,
+                     fingerprint: Hashable | None) -> None:
+    """Adds a container to a module's storage. The mutex must be held.
+
+    Args:
+      module: The module to store the container for.
+      container: The container to store.
+      source_module: The module that generated the container.
+      fingerprint: The container fingerprint, or None if it has none.
+    """
+    if container.CONTAINER_TYPE not in module.storage:
+      module.storage[container.CONTAINER_TYPE] = _ContainerIndex(self._LoadSpilled)
+    if module.storage[container.CONTAINER_TYPE].Add(container, source_module, fingerprint):
+      if self._spill:
+        self._spill.Add(container)
 
-            # If the container to add exists already in the state, don't add it again
-            if container in [c for c, _ in module.storage[container.CONTAINER_TYPE]]:
-              continue
-            module.storage[container.CONTAINER_TYPE].append((container, source_module))
+  def _LoadSpilled(self, container: interface.AttributeContainer) -> None:
+    """Reads back the spilled members of a container. The mutex must be held.
+
+    Args:
+      container: The container to load.
+    """
+    if self._spill:
+      self._spill.Load(container)
 
   def GetContainers(self,
                     requesting_module: str,
@@ -173,9 +505,17 @@ class ContainerManager():
           continue
         collected_containers.append((container, origin))
 
+      if self._spill:
+        for container, _ in collected_containers:
+          self._spill.Load(container)
+          self._spill.Pin(container, requesting_module)
+
       if pop:
         self._RemoveStoredContainers([c for c, _ in collected_containers], requesting_module)
 
+      if self._spill:
+        self._spill.Enforce()
+
     self._logger.debug(f'{requesting_module} is retrieving {len(collected_containers)} '
                        f'{container_class.CONTAINER_TYPE} containers (pop == {pop})')
     for container, origin in collected_containers:
@@ -188,7 +528,8 @@ class ContainerManager():
 
     Containers can consume large amounts of memory. Marking a module as
     completed tells the container manager that containers no longer needed can
-    be removed from storage to free up that memory.
+    be removed from storage to free up that memory. Streams that the module
+    delivers to are notified that it will not store any more containers.
 
     Args:
       module_name: The module that has completed running.
@@ -200,7 +541,17 @@ class ContainerManager():
       raise RuntimeError("Container manager has not parsed a recipe yet")
 
     with self._mutex:
+      if self._spill:
+        for index in self._modules[module_name].storage.values():
+          for container, _ in index:
+            self._spill.Discard(container)
+        self._spill.Unpin(module_name)
+        self._spill.Enforce()
+        self._logger.debug(f'Resident container bytes after {module_name} completed: {self._GetResidentBytes()}')
       self._modules[module_name].storage = {}
+      for module in self._modules.values():
+        if module.stream:
+          module.stream.CloseProducer(module_name)
 
   def RegisterStreamingCallback(
       self,
@@ -221,6 +572,107 @@ class ContainerManager():
 
     self._modules[module_name].RegisterCallback(container_type.CONTAINER_TYPE, callback)
 
+  def RegisterStream(self,
+                     module_name: str,
+                     container_type: Type[T],
+                     queue_size: int,
+                     in_flight_limit: int) -> None:
+    """Registers a container stream for a module and container type.
+
+    Once registered, containers of that type stored by the modules that
+    module_name depends on are delivered through the stream (see
+    GetStreamedContainer) rather than stored. Containers stored before the
+    stream is registered remain available through GetContainers.
+
+    Args:
+      module_name: The module name registering the stream.
+      container_type: The container type to stream.
+      queue_size: Maximum number of containers waiting to be consumed.
+      in_flight_limit: Maximum number of containers, per upstream module, that
+          are waiting to be consumed or being processed.
+
+    Raises:
+      RuntimeError: If the manager has not been configured with a recipe yet,
+          or the module does not exist.
+    """
+    if not self._modules:
+      raise RuntimeError('Container manager has not parsed a recipe yet')
+    if module_name not in self._modules:
+      raise RuntimeError('Registering a stream for a non-existent module')
+
+    with self._mutex:
+      module = self._modules[module_name]
+      producers = [
+          d for d in module.dependencies
+          if d != module_name and d not in self._preflights]
+      module.stream = _ContainerStream(
+          container_type.CONTAINER_TYPE, producers, queue_size, in_flight_limit)
+
+  def GetStreamedContainer(
+      self, module_name: str) -> tuple[interface.AttributeContainer, str] | None:
+    """Retrieves the next container from a module's stream.
+
+    Blocks until a container is available, or all the upstream modules have
+    completed (see CompleteModule). StreamedContainerDone must be called once
+    the container has been processed.
+
+    Args:
+      module_name: The module name reading from its stream.
+
+    Returns:
+      A (container, origin) tuple, or None when the stream is exhausted.
+
+    Raises:
+      RuntimeError: If the module has not registered a stream.
+    """
+    stream = self._modules[module_name].stream
+    if not stream:
+      raise RuntimeError(f'{module_name} has not registered a stream')
+    streamed = stream.Get()
+    if streamed and self._spill:
+      with self._mutex:
+        self._spill.Load(streamed[0])
+        self._spill.Pin(streamed[0], module_name)
+    return streamed
+
+  def StreamedContainerDone(
+      self,
+      module_name: str,
+      origin: str,
+      container: interface.AttributeContainer | None = None) -> None:
+    """Signals that a streamed container has been processed.
+
+    Args:
+      module_name: The module name that processed the container.
+      origin: The module that generated the container.
+      container: If set, the processed container is kept in the module's
+          storage, as if it had not been streamed.
+    """
+    module = self._modules[module_name]
+    if container is not None:
+      with self._mutex:
+        self._StoreInModule(module, container, origin, container.Fingerprint())
+    stream = module.stream
+    if stream:
+      stream.TaskDone(origin)
+
+  def CloseStream(self, module_name: str) -> None:
+    """Stops delivering containers to a module's stream.
+
+    Containers that were streamed but never retrieved, and any stored
+    afterwards, are put back in the module's storage.
+
+    Args:
+      module_name: The module name that registered the stream.
+    """
+    with self._mutex:
+      module = self._modules[module_name]
+      stream = module.stream
+      module.stream = None
+      if stream:
+        for container, origin in stream.Abandon():
+          self._StoreInModule(module, container, origin, container.Fingerprint())
+
   def WaitForCallbackCompletion(self) -> None:
     """Waits for all scheduled callbacks to be completed."""
     self._callback_pool.shutdown(wait=True)
@@ -239,18 +691,45 @@ class ContainerManager():
 
     # All the containers will be the same type
     container_type = containers[0].CONTAINER_TYPE
-    ids = [id(c) for c in containers]
 
     for _, module in self._modules.items():
-      filtered = []
-      for c, origin in module.storage.get(container_type, []):
-        if not (origin == requesting_module and id(c) in ids):
-          filtered.append((c, origin))
-      module.storage[container_type] = filtered
+      index = module.storage.get(container_type)
+      if not index:
+        continue
+      for c in containers:
+        if index.Remove(c, requesting_module) and self._spill:
+          self._spill.Discard(c)
+
+  def GetResidentBytes(self) -> dict[str, int]:
+    """Returns the memory used by the DataFrames stored for each module.
+
+    Containers shared between modules count towards each of them. Spilled
+    DataFrames do not count.
+
+    Returns:
+      The number of bytes, keyed by module name.
+    """
+    with self._mutex:
+      return self._GetResidentBytes()
+
+  def _GetResidentBytes(self) -> dict[str, int]:
+    """Implements GetResidentBytes. The mutex must be held."""
+    resident_bytes = {}
+    for name, module in self._modules.items():
+      total = 0
+      for index in module.storage.values():
+        for container, _ in index:
+          if self._spill:
+            total += self._spill.ResidentBytes(container)
+          else:
+            total += spill.DataFrameBytes(container)
+      resident_bytes[name] = total
+    return resident_bytes
 
   def __str__(self) -> str:
     """Used for debugging."""
     lines = []
+    resident_bytes = self.GetResidentBytes()
 
     for name, module in self._modules.items():
       lines.append(f'Module: {name}')
@@ -259,11 +738,14 @@ class ContainerManager():
       lines.append('  Callbacks:')
       for type_, cb in module.callback_map.items():
         lines.append(f'    {type_}:{cb}')
-      lines.append('  Containers:')
+      lines.append(f'  Containers ({resident_bytes[name]} resident bytes):')
       for type_ in module.storage.keys():
         lines.append(f'    {type_}')
         for c, origin in module.storage[type_]:
-          lines.append(f'      {origin}:{c}')
+          if self._spill and self._spill.IsSpilled(c):
+            lines.append(f'      {origin}:<spilled {type_} container>')
+          else:
+            lines.append(f'      {origin}:{c}')
       lines.append('')
 
     return '\n'.join(lines)
@@ -0,0 +1,240 @@
+"""Memory budgeted storage of DataFrame members of stored containers."""
+
+import collections
+import dataclasses
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+from typing import TYPE_CHECKING
+
+from dftimewolf.lib.containers import interface
+
+if TYPE_CHECKING:
+  import pandas as pd
+
+
+def DataFrameBytes(container: interface.AttributeContainer) -> int:
+  """Returns the memory used by the DataFrame members of a container.
+
+  Args:
+    container: The container to measure.
+
+  Returns:
+    The deep memory usage of the container's DataFrame members, in bytes.
+  """
+  return sum(
+      int(value.memory_usage(deep=True).sum())
+      for value in vars(container).values()
+      if interface.IsDataFrame(value))
+
+
+@dataclasses.dataclass
+class _Entry():
+  """Spill tracking information for a stored container.
+
+  Attributes:
+    container: The container.
+    references: The number of module storages holding the container.
+    size: Memory used by the container's DataFrame members, in bytes.
+    pinned_by: Modules that stored or retrieved the container and have not
+        completed.
+    spilled: Paths of spilled DataFrame members, keyed by attribute name.
+  """
+  container: interface.AttributeContainer
+  references: int = 0
+  size: int = 0
+  pinned_by: set[str] = dataclasses.field(default_factory=set)
+  spilled: dict[str, str] = dataclasses.field(default_factory=dict)
+
+
+class SpillStore():
+  """Keeps the DataFrames held by stored containers within a memory budget.
+
+  When the DataFrames of tracked containers use more than the memory limit, the
+  least recently used containers have their DataFrame members written to a
+  scratch directory and set to None. They are read back by Load().
+
+  DataFrames are pickled, as other formats such as Parquet do not read back
+  every DataFrame unchanged (e.g. object columns holding None, or dicts), and
+  spilling must not be visible to modules.
+
+  A container stored or retrieved by a module is pinned until that module
+  completes, as the module may still hold a reference to it. Pinned containers
+  are never spilled.
+
+  This class is not thread safe, the ContainerManager mutex guards it.
+  """
+
+  def __init__(self,
+               memory_limit: int,
+               logger: logging.Logger,
+               scratch_dir: str | None = None) -> None:
+    """Initialise a SpillStore.
+
+    Args:
+      memory_limit: Maximum memory used by resident DataFrames, in bytes.
+      logger: The logger to use.
+      scratch_dir: Directory in which to create the spill directory. Defaults
+          to the system temporary directory.
+    """
+    self._memory_limit = memory_limit
+    self._logger = logger
+    self._scratch_dir = scratch_dir
+    self._spill_dir: str | None = None
+    # Least recently used first.
+    self._entries: collections.OrderedDict[int, _Entry] = collections.OrderedDict()
+    self.resident_bytes = 0
+
+  def Add(self, container: interface.AttributeContainer) -> None:
+    """Tracks a container that has been added to a module's storage.
+
+    Args:
+      container: The stored container.
+    """
+    entry = self._entries.get(id(container))
+    if entry is None:
+      entry = _Entry(container=container, size=DataFrameBytes(container))
+      self._entries[id(container)] = entry
+      self.resident_bytes += entry.size
+    else:
+      self._entries.move_to_end(id(container))
+    entry.references += 1
+
+  def Discard(self, container: interface.AttributeContainer) -> None:
+    """Stops tracking a container that was removed from a module's storage.
+
+    Containers are forgotten, and their spill files deleted, once they have
+    been removed from every storage they were added to.
+
+    Args:
+      container: The removed container.
+    """
+    entry = self._entries.get(id(container))
+    if entry is None or entry.container is not container:
+      return
+    entry.references -= 1
+    if entry.references > 0:
+      return
+
+    del self._entries[id(container)]
+    if entry.spilled:
+      for path in entry.spilled.values():
+        os.remove(path)
+    else:
+      self.resident_bytes -= entry.size
+
+  def Pin(self, container: interface.AttributeContainer, module_name: str) -> None:
+    """Prevents a container from being spilled until a module completes.
+
+    Args:
+      container: The container to pin.
+      module_name: The module holding a reference to the container.
+    """
+    entry = self._entries.get(id(container))
+    if entry is not None and entry.container is container:
+      entry.pinned_by.add(module_name)
+
+  def Unpin(self, module_name: str) -> None:
+    """Releases all the containers pinned by a module.
+
+    Args:
+      module_name: The module that completed.
+    """
+    for entry in self._entries.values():
+      entry.pinned_by.discard(module_name)
+
+  def IsSpilled(self, container: interface.AttributeContainer) -> bool:
+    """Whether the DataFrame members of a container are on disk."""
+    entry = self._entries.get(id(container))
+    return bool(entry and entry.container is container and entry.spilled)
+
+  def ResidentBytes(self, container: interface.AttributeContainer) -> int:
+    """Returns the memory used by a tracked container's DataFrames."""
+    entry = self._entries.get(id(container))
+    if entry is None or entry.container is not container or entry.spilled:
+      return 0
+    return entry.size
+
+  def Load(self, container: interface.AttributeContainer) -> None:
+    """Reads back the spilled DataFrame members of a container, if any.
+
+    Args:
+      container: The container about to be handed to a module.
+    """
+    entry = self._entries.get(id(container))
+    if entry is None or entry.container is not container:
+      return
+    self._entries.move_to_end(id(container))
+    if not entry.spilled:
+      return
+
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+
+    for attribute, path in entry.spilled.items():
+      setattr(container, attribute, pd.read_pickle(path))
+      os.remove(path)
+    entry.spilled = {}
+    entry.size = DataFrameBytes(container)
+    self.resident_bytes += entry.size
+    self._logger.debug(
+        f'Loaded {entry.size} spilled bytes for a {container.CONTAINER_TYPE} '
+        'container')
+
+  def Enforce(self) -> None:
+    """Spills unpinned containers until resident DataFrames fit the limit."""
+    if self.resident_bytes <= self._memory_limit:
+      return
+
+    for entry in list(self._entries.values()):
+      if self.resident_bytes <= self._memory_limit:
+        break
+      if entry.spilled or entry.pinned_by or not entry.size:
+        continue
+      self._Spill(entry)
+
+  def _Spill(self, entry: _Entry) -> None:
+    """Writes the DataFrame members of a container to the spill directory.
+
+    Args:
+      entry: The entry of the container to spill.
+    """
+    if not self._spill_dir:
+      self._spill_dir = tempfile.mkdtemp(
+          prefix='dftimewolf-spill-', dir=self._scratch_dir)
+
+    for attribute, value in vars(entry.container).items():
+      if not interface.IsDataFrame(value):
+        continue
+      path = self._WriteDataFrame(
+          value, os.path.join(self._spill_dir, uuid.uuid4().hex))
+      entry.spilled[attribute] = path
+      setattr(entry.container, attribute, None)
+
+    self.resident_bytes -= entry.size
+    self._logger.debug(
+        f'Spilled {entry.size} bytes for a {entry.container.CONTAINER_TYPE} '
+        'container to disk')
+
+  @staticmethod
+  def _WriteDataFrame(data_frame: 'pd.DataFrame', path: str) -> str:
+    """Writes a DataFrame to disk.
+
+    Args:
+      data_frame: The DataFrame to write.
+      path: The file path, without extension.
+
+    Returns:
+      The path of the written file.
+    """
+    data_frame.to_pickle(f'{path}.pkl')
+    return f'{path}.pkl'
+
+  def Close(self) -> None:
+    """Deletes all spill files."""
+    if self._spill_dir:
+      shutil.rmtree(self._spill_dir, ignore_errors=True)
+      self._spill_dir = None
+    self._entries.clear()
+    self.resident_bytes = 0
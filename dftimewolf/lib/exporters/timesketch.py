@@ -140,10 +140,6 @@ class TimesketchExporter(module.ThreadAwareModule):
       self.sketch_id = self.sketch.id
       self.logger.info('New sketch created: {0:d}'.format(self.sketch_id))
 
-    # register callback in timesketch module
-    self.RegisterStreamingCallback(callback=self.Process,  # type: ignore
-                                   container_type=containers.File)
-
   def _CreateSketch(
       self, incident_id: Optional[str] = None) -> ts_sketch.Sketch:
     """Creates a new Timesketch sketch.
@@ -272,6 +268,9 @@ class TimesketchExporter(module.ThreadAwareModule):
   def GetThreadPoolSize(self) -> int:
     return 5
 
+  def StreamContainers(self) -> bool:
+    return True
+
   def PreProcess(self) -> None:
     pass
 
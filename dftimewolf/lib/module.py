@@ -276,6 +276,11 @@ class ThreadAwareModule(BaseModule):
   number of containers of the nominated type generated by previous modules.
   Process will be passed one container of the type specified by
   GetThreadOnContainerType().
+
+  * If StreamContainers() returns True, the module starts running while the
+  modules it depends on are still running, and Process is called as soon as
+  they store a container of the nominated type. PreProcess may then run before
+  upstream modules have completed; PostProcess runs once they all have.
   """
 
   def __init__(self,
@@ -334,6 +339,24 @@ class ThreadAwareModule(BaseModule):
     method to return false to pop them from the state."""
     return True
 
+  def StreamContainers(self) -> bool:
+    """Whether Process should be called on containers as soon as upstream
+    modules store them, rather than once upstream modules have completed.
+    Default behaviour is not to stream. Override this method to return True to
+    stream containers."""
+    return False
+
+  def GetStreamQueueSize(self) -> int:
+    """Returns the maximum number of streamed containers waiting for a free
+    thread. Upstream modules block in StoreContainer when the queue is full."""
+    return self.GetThreadPoolSize()
+
+  def GetStreamInFlightLimit(self) -> int:
+    """Returns the maximum number of containers from a single upstream module
+    that are queued or being processed at once, when streaming. The upstream
+    module blocks in StoreContainer once the limit is reached."""
+    return self.GetThreadPoolSize() * 2
+
   def ThreadProgressUpdate(self, steps_taken: int, steps_expected: int) -> None:
     """Send an update to the state on progress."""
     thread_id = threading.current_thread().name
@@ -1,15 +1,22 @@
 # -*- coding: utf-8 -*-
 """Generates a GCP cloud resource tree."""
 
+import collections
+from concurrent import futures
 import datetime
 import json
+import multiprocessing
+import os
+import re
 import tempfile
-from typing import Any, Dict, List, Optional, TYPE_CHECKING
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple, TYPE_CHECKING
 
 from libcloudforensics.providers.gcp.internal import common as gcp_common
 from libcloudforensics.providers.gcp.internal import log as gcp_log
 
 from dftimewolf.lib import module
+from dftimewolf.lib import utils
 from dftimewolf.lib.containers import containers
 from dftimewolf.lib.modules import manager as modules_manager
 from dftimewolf.lib.processors import (gcp_cloud_resource_tree_helper as
@@ -18,6 +25,13 @@ from dftimewolf.lib.processors import (gcp_cloud_resource_tree_helper as
 if TYPE_CHECKING:
   from dftimewolf.lib import state
 
+# Matches log lines whose request type may be parsed by _ParseLogMessages,
+# so that other lines are skipped without decoding them.
+_SUPPORTED_LOG_LINE_RE = re.compile(
+    rb'type\.googleapis\.com\\?/compute\.(?:instances|regionInstances|disks|'
+    rb'regionDisks|machineImages|image|instanceTemplates|'
+    rb'regionInstanceTemplates|snapshots)')
+
 
 class GCPCloudResourceTree(module.BaseModule):
   """GCP Cloud Resource Tree Creator.
@@ -29,11 +43,25 @@ class GCPCloudResourceTree(module.BaseModule):
     resource_name (str): Name of the resource to build the tree for.
     resource_type (str): Resource type.
     mode (gcp_crt_helper.OperatingMode): Module operation mode
-    resources_dict (Dict[str, Resource]): Dictionary of resources
+    resources_dict (IndexedResources): Dictionary of resources
     period_covered_by_retrieved_logs (Dict[str, datetime]): Dictionary of the
       time range of logs retrieved and processed
   """
 
+  # Compute and logging API requests are sent concurrently, under a shared
+  # rate limit: Cloud Logging allows 60 read requests per minute per project.
+  _MAX_CONCURRENT_REQUESTS = 8
+  _REQUEST_RATE = 1.0
+  # Maximum number of resource IDs in the log filter of a deleted resources
+  # search.
+  _MAX_IDS_PER_FILTER = 20
+  # Offline log files are decoded in byte ranges of at most this size, in
+  # parallel processes when decode_workers is more than 1.
+  _CHUNK_SIZE = 64 * 1024 * 1024
+  # Maximum total size of the ranges decoded ahead of the parsing, as the
+  # decoded log messages of every such range are held in memory.
+  _MAX_DECODE_AHEAD_BYTES = 256 * 1024 * 1024
+
   def __init__(self,
                state: 'state.DFTimewolfState',
                name: Optional[str] = None,
@@ -57,7 +85,14 @@ class GCPCloudResourceTree(module.BaseModule):
     self.mode: gcp_crt_helper.OperatingMode = (
         gcp_crt_helper.OperatingMode.ONLINE)
     self.period_covered_by_retrieved_logs: Dict[str, datetime.datetime] = {}
-    self.resources_dict: Dict[str, gcp_crt_helper.Resource] = {}
+    self.resources_dict = gcp_crt_helper.IndexedResources()
+    self.decode_workers = 1
+    self._rate_limiter = utils.TokenBucket(
+        self._REQUEST_RATE, capacity=self._MAX_CONCURRENT_REQUESTS)
+    # Resolved parent trees by resource object id, while building the
+    # parent relationships.
+    self._parent_trees: Optional[Dict[int, Tuple[
+        gcp_crt_helper.Resource, Optional[gcp_crt_helper.Resource]]]] = None
 
   # pylint: disable=arguments-differ
   def SetUp(self,
@@ -66,7 +101,8 @@ class GCPCloudResourceTree(module.BaseModule):
             resource_type: str,
             mode: str,
             resource_id: Optional[str] = None,
-            resource_name: Optional[str] = None) -> None:
+            resource_name: Optional[str] = None,
+            decode_workers: Optional[int] = None) -> None:
     """Sets up the resource we want to build the tree for.
 
     Args:
@@ -78,6 +114,8 @@ class GCPCloudResourceTree(module.BaseModule):
       mode: operational mode (online or offline).
       resource_id: Resource id.
       resource_name: Resource name.
+      decode_workers: Number of processes decoding offline log files, 1 to
+        decode them in the module's process.
     """
     if not resource_id and not resource_name:
       self.ModuleError(
@@ -93,6 +131,7 @@ class GCPCloudResourceTree(module.BaseModule):
       self.mode = gcp_crt_helper.OperatingMode.ONLINE
     else:
       self.ModuleError('Operational mode not set.', critical=True)
+    self.decode_workers = max(1, int(decode_workers or 1))
 
   def Process(self) -> None:
     """Creates the GCP Cloud Resource Tree."""
@@ -172,31 +211,58 @@ class GCPCloudResourceTree(module.BaseModule):
     Args:
       project_id: Project id to get list of resources from.
     """
-    compute_api_client = gcp_common.CreateService('compute', 'v1')
-
-    # Retrieve list of disks in a project
-    self.resources_dict.update(
-        self._RetrieveListOfDisks(project_id, compute_api_client))
+    listings = [
+        (self._RetrieveListOfDisks, 'disks', 'aggregatedList'),
+        (self._RetrieveListOfDiskImages, 'images', 'list'),
+        (self._RetrieveListOfSnapshots, 'snapshots', 'list'),
+        (self._RetrieveListOfInstances, 'instances', 'aggregatedList'),
+        (self._RetrieveListOfInstanceTemplates, 'instanceTemplates', 'list'),
+        (self._RetrieveListOfMachineImages, 'machineImages', 'list'),
+    ]
+
+    # The listings are fetched concurrently, but parsed in order: instances,
+    # instance templates and machine images refer to the resources listed
+    # before them.
+    with futures.ThreadPoolExecutor(len(listings)) as executor:
+      pages = [
+          executor.submit(self._ListPages, project_id, collection, method)
+          for _, collection, method in listings]
+      for (retrieve, _, _), listing_pages in zip(listings, pages):
+        self.resources_dict.update(
+            retrieve(project_id, None, pages=listing_pages.result()))
+
+  def _ListPages(self,
+                 project_id: str,
+                 collection: str,
+                 method: str,
+                 compute_api_client: Any = None) -> List[Dict[str, Any]]:
+    """Lists the resources of a compute API collection.
 
-    # Retrieve list of disk images in a project
-    self.resources_dict.update(
-        self._RetrieveListOfDiskImages(project_id, compute_api_client))
-
-    # Retrieve list of snapshots in a project
-    self.resources_dict.update(
-        self._RetrieveListOfSnapshots(project_id, compute_api_client))
+    Args:
+      project_id: Project id to list the resources of.
+      collection: Compute API collection, e.g. 'disks'.
+      method: List method of the collection, 'list' or 'aggregatedList'.
+      compute_api_client: Compute API object. A new one is created if not
+        set, as compute API objects can not be shared between threads.
 
-    # Retrieve list of instances in a project
-    self.resources_dict.update(
-        self._RetrieveListOfInstances(project_id, compute_api_client))
+    Returns:
+      Responses to the list request, one per page.
+    """
+    if compute_api_client is None:
+      compute_api_client = gcp_common.CreateService('compute', 'v1')
 
-    # Retrieve list of instance templates in a project
-    self.resources_dict.update(
-        self._RetrieveListOfInstanceTemplates(project_id, compute_api_client))
+    request = getattr(getattr(compute_api_client, collection)(), method)(
+        project=project_id)
+    pages = []
+    while request is not None:
+      self._rate_limiter.Acquire()
+      response = request.execute()
+      pages.append(response)
+      list_next = getattr(
+          getattr(compute_api_client, collection)(), f'{method}_next')
+      request = list_next(previous_request=request, previous_response=response)
 
-    # Retrieve list of machine images in a project
-    self.resources_dict.update(
-        self._RetrieveListOfMachineImages(project_id, compute_api_client))
+    return pages
 
   def _GetResourcesMetaDataFromLogs(self, project_id: str) -> None:
     """Enriches resources with meta data from GCP Logs.
@@ -246,11 +312,16 @@ class GCPCloudResourceTree(module.BaseModule):
                 resource.creation_timestamp + datetime.timedelta(hours=1))
             time_ranges.append(time_range)
 
-    # Retrieve and parse logs for each of the time ranges.
+    # Retrieve and parse logs for each of the time ranges. The periods are
+    # reserved in order, as each extends the period covered by the logs
+    # retrieved before, and then retrieved concurrently.
+    periods = []
     for time_range in time_ranges:
-      log_messages = self._GetLogMessages(project_id,
-                                          time_range['start_timestamp'],
-                                          time_range['end_timestamp'])
+      period = self._ReserveLogPeriod(time_range['start_timestamp'],
+                                      time_range['end_timestamp'])
+      if period:
+        periods.append((period[0], period[1], None))
+    for log_messages in self._QueryLogPeriods(project_id, periods):
       self._ParseLogMessages(log_messages)
 
   def _GetResourceParentTree(
@@ -267,27 +338,12 @@ class GCPCloudResourceTree(module.BaseModule):
     if not resource:
       return None
 
-    parent_resource: Optional[gcp_crt_helper.Resource] = None
+    if self._parent_trees is not None:
+      resolved = self._parent_trees.get(id(resource))
+      if resolved:
+        return resolved[1]
 
-    # The resource should at least have the name and type of the parent
-    # resource. This is filled during the parsing of log messages in
-    # _ParesLogMessages() and/or _GetListOfResources
-    if resource.parent and resource.parent.name and resource.parent.type:
-      if resource.parent.id:
-        # If the parent resource is deleted or it's one of the stock disk images
-        # (for ex Debian), we will have the parent id but it's not in the list
-        # of resources we parsed.
-        parent_resource = self.resources_dict.get(resource.parent.id,
-                                                  resource.parent)
-      else:
-        matched_parent_resource = self._FindResource(resource.parent.name,
-                                                     resource.parent.type,
-                                                     resource.parent.location,
-                                                     resource.parent.project_id)
-        if matched_parent_resource:
-          parent_resource = matched_parent_resource
-        else:
-          parent_resource = resource.parent
+    parent_resource = self._ResolveParent(resource)
 
     if parent_resource:
       if (parent_resource.IsDeleted() and
@@ -304,9 +360,44 @@ class GCPCloudResourceTree(module.BaseModule):
       parent_resource.parent = self._GetResourceParentTree(parent_resource)
       parent_resource.children.add(resource)  # pytype: disable=attribute-error
 
+    if self._parent_trees is not None:
+      # The resource is kept in the value so that its id is not reused.
+      self._parent_trees[id(resource)] = (resource, parent_resource)
+
     # Return the resource with all the parent chain filled
     return parent_resource
 
+  def _ResolveParent(
+      self,
+      resource: gcp_crt_helper.Resource) -> Optional[gcp_crt_helper.Resource]:
+    """Returns the parent of a resource, as found in the resources dictionary.
+
+    Args:
+      resource: The resource object to get the parent of.
+
+    Returns:
+      The stored resource matching the parent, the parent itself if no stored
+      resource matches, or None if the resource has no parent.
+    """
+    # The resource should at least have the name and type of the parent
+    # resource. This is filled during the parsing of log messages in
+    # _ParesLogMessages() and/or _GetListOfResources
+    if not resource.parent or not resource.parent.name or (
+        not resource.parent.type):
+      return None
+
+    if resource.parent.id:
+      # If the parent resource is deleted or it's one of the stock disk images
+      # (for ex Debian), we will have the parent id but it's not in the list
+      # of resources we parsed.
+      return self.resources_dict.get(resource.parent.id, resource.parent)
+
+    matched_parent_resource = self._FindResource(resource.parent.name,
+                                                 resource.parent.type,
+                                                 resource.parent.location,
+                                                 resource.parent.project_id)
+    return matched_parent_resource or resource.parent
+
   def _FindResource(
       self,
       resource_name: str,
@@ -327,44 +418,23 @@ class GCPCloudResourceTree(module.BaseModule):
       Resource object that match the name and type or None if a matching
           resource is not found.
     """
-    # Search for the resource with the same name and type in the parsed logs.
-    for resource in self.resources_dict.values():
-
-      if resource.name == resource_name and resource.type == resource_type:
-        # Filter list by location if it is supplied
-        if location and resource.location != location:
-          continue
-        # Check is project id match if project id was supplied as a filter
-        # criteria
-        if project_id and resource.project_id != project_id:
-          continue
-
-        return resource
+    return self.resources_dict.Find(
+        resource_name, resource_type, location, project_id)
 
-    return None
-
-  def _GetLogMessages(
-      self,
-      project_id: str,
-      start_timestamp: datetime.datetime,
-      end_timestamp: datetime.datetime,
-      resource_id: Optional[str] = None) -> List[Dict[str, Any]]:
-    """Acquires log messages from GCP logs.
-
-    Acquires log messages from GCP logs for a specific project id and time
-    range.
+  def _ReserveLogPeriod(
+      self, start_timestamp: datetime.datetime,
+      end_timestamp: datetime.datetime
+  ) -> Optional[Tuple[datetime.datetime, datetime.datetime]]:
+    """Marks a time range as covered by retrieved logs.
 
     Args:
-      project_id: Project id from which we are going to obtain the logs.
-      start_timestamp: Retrieve logs starting at this timestamp.
-      end_timestamp: Retrieve logs ending at this timestamp.
-      resource_id: Optional resource id
+      start_timestamp: Start of the time range.
+      end_timestamp: End of the time range.
 
     Returns:
-      List of log messages
+      The part of the time range that was not covered yet, or None if it was
+      covered entirely.
     """
-    gcl = gcp_log.GoogleCloudLog(project_ids=[project_id])
-
     if not self.period_covered_by_retrieved_logs.get(
         'start') or not self.period_covered_by_retrieved_logs.get('end'):
       self.period_covered_by_retrieved_logs['start'] = start_timestamp
@@ -373,8 +443,8 @@ class GCPCloudResourceTree(module.BaseModule):
         'start'] and end_timestamp <= self.period_covered_by_retrieved_logs[
             'end']:
       # If the required time range is within the time range already retrieved
-      # before return an empty list
-      return []
+      # before there is nothing to retrieve
+      return None
 
     # Make sure we only request the period that was not retrieved before, for
     # optimization
@@ -388,6 +458,25 @@ class GCPCloudResourceTree(module.BaseModule):
         start_timestamp = self.period_covered_by_retrieved_logs['end']
       self.period_covered_by_retrieved_logs['end'] = end_timestamp
 
+    return start_timestamp, end_timestamp
+
+  def _QueryLogMessages(
+      self,
+      project_id: str,
+      start_timestamp: datetime.datetime,
+      end_timestamp: datetime.datetime,
+      resource_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """Queries GCP logs for a project and time range.
+
+    Args:
+      project_id: Project id from which we are going to obtain the logs.
+      start_timestamp: Retrieve logs starting at this timestamp.
+      end_timestamp: Retrieve logs ending at this timestamp.
+      resource_ids: Optional resource ids to retrieve the logs of.
+
+    Returns:
+      List of log messages
+    """
     self.logger.info(f"""Retrieving logs from {start_timestamp.astimezone(
       datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")} to {
         end_timestamp.astimezone(datetime.timezone.utc).strftime(
@@ -406,15 +495,42 @@ class GCPCloudResourceTree(module.BaseModule):
         ' AND severity=NOTICE' +
         ' AND protoPayload.methodName : ("insert" OR "create" OR "delete")')
 
-    if resource_id:
-      query_filter = f"""{query_filter} AND (resource.labels.instance_id="{
-        resource_id}" OR resource.labels.image_id="{resource_id}")"""
+    if resource_ids:
+      resource_filter = ' OR '.join(
+          f'resource.labels.instance_id="{resource_id}" OR '
+          f'resource.labels.image_id="{resource_id}"'
+          for resource_id in resource_ids)
+      query_filter = f'{query_filter} AND ({resource_filter})'
 
+    gcl = gcp_log.GoogleCloudLog(project_ids=[project_id])
+    self._rate_limiter.Acquire()
     log_messages: List[Dict[str,
                             Any]] = gcl.ExecuteQuery(qfilter=[query_filter])
 
     return log_messages
 
+  def _QueryLogPeriods(
+      self,
+      project_id: str,
+      periods: List[Tuple[datetime.datetime, datetime.datetime,
+                          Optional[List[str]]]]
+  ) -> Iterator[List[Dict[str, Any]]]:
+    """Queries GCP logs for several time ranges concurrently.
+
+    Args:
+      project_id: Project id from which we are going to obtain the logs.
+      periods: Start, end and optional resource ids of each query.
+
+    Yields:
+      List of log messages of each time range, in order.
+    """
+    if not periods:
+      return
+    with futures.ThreadPoolExecutor(
+        min(len(periods), self._MAX_CONCURRENT_REQUESTS)) as executor:
+      yield from executor.map(
+          lambda period: self._QueryLogMessages(project_id, *period), periods)
+
   def _ParseLogMessagesFromFileContainer(
       self, file_container: containers.File) -> None:
     """Parses GCP Cloud log messages supplied in the file container.
@@ -430,20 +546,35 @@ class GCPCloudResourceTree(module.BaseModule):
       self.logger.error('File container path is null or empty')
       return
 
-    with open(file_container.path, 'r') as input_file:
-      log_messages = []
-      file_content = input_file.readline()
-
-      if not file_content:
-        self.logger.warning(f'The supplied file {file_container.path} is empty')
-        return
-
-      while file_content:
-        log_messages.append(json.loads(file_content))
-        file_content = input_file.readline()
+    size = os.path.getsize(file_container.path)
+    if not size:
+      self.logger.warning(f'The supplied file {file_container.path} is empty')
+      return
 
+    # Ranges are small enough for every worker to decode one within the
+    # decode ahead budget.
+    chunk_size = max(1, min(
+        self._CHUNK_SIZE, self._MAX_DECODE_AHEAD_BYTES // self.decode_workers))
+    chunks = [(start, min(start + chunk_size, size))
+              for start in range(0, size, chunk_size)]
+    workers = min(len(chunks), self.decode_workers)
+    line_count = 0
+    parsed_count = 0
+    start_time = time.time()
+    # Chunks are parsed in file order, as later log messages update the
+    # resources created by earlier ones.
+    for log_messages, chunk_line_count in _DecodeLogChunks(
+        file_container.path, chunks, workers,
+        self._MAX_DECODE_AHEAD_BYTES):
+      line_count += chunk_line_count
+      parsed_count += len(log_messages)
       self._ParseLogMessages(log_messages)
 
+    duration = time.time() - start_time
+    self.logger.info(
+        f'Parsed {parsed_count:d} of {line_count:d} log lines from '
+        f'{file_container.path:s} in {duration:.1f}s with {workers:d} workers')
+
   def _ParseLogMessages(self, log_messages: List[Dict[str, Any]]) -> None:
     """Parses supplied GCP Cloud log messages.
 
@@ -673,12 +804,36 @@ class GCPCloudResourceTree(module.BaseModule):
 
   def _BuildResourcesParentRelationships(self) -> None:
     """Builds parent relationship for all resources."""
+    if self.mode == gcp_crt_helper.OperatingMode.ONLINE:
+      self._SearchForDeletedParents()
+
     # Using resource_keys because self.resources_dict changes during the loop
     resource_keys = list(self.resources_dict.keys())
-    for resource_key in resource_keys:
-      resource = self.resources_dict.get(resource_key)
-      if resource:
-        resource.parent = self._GetResourceParentTree(resource)
+    # Parent chains are shared by many resources, so each resource's chain is
+    # only resolved once per build.
+    self._parent_trees = {}
+    try:
+      for resource_key in resource_keys:
+        resource = self.resources_dict.get(resource_key)
+        if resource:
+          resource.parent = self._GetResourceParentTree(resource)
+    finally:
+      self._parent_trees = None
+
+  def _SearchForDeletedParents(self) -> None:
+    """Searches GCP Logs for the deleted parents of all resources at once.
+
+    The logs found are parsed into the resources dictionary, and the log
+    periods searched are marked as covered, so that _GetResourceParentTree
+    does not query them again for each resource.
+    """
+    searches = []
+    for resource in list(self.resources_dict.values()):
+      parent_resource = self._ResolveParent(resource)
+      if (parent_resource and parent_resource.IsDeleted() and
+          resource.creation_timestamp):
+        searches.append((parent_resource, resource.creation_timestamp))
+    self._SearchForDeletedResources(searches)
 
   def _SearchForDeletedResource(
       self, resource: gcp_crt_helper.Resource,
@@ -692,49 +847,102 @@ class GCPCloudResourceTree(module.BaseModule):
     Returns:
       Found resource or None
     """
-    if not resource or not start_timestamp:
-      return None
+    return self._SearchForDeletedResources([(resource, start_timestamp)])[0]
 
-    if resource.project_id != self.project_id:
-      return None
-
-    while start_timestamp > (datetime.datetime.now(datetime.timezone.utc) -
-                             datetime.timedelta(days=400)):
+  def _SearchForDeletedResources(
+      self,
+      searches: List[Tuple[gcp_crt_helper.Resource, datetime.datetime]]
+  ) -> List[Optional[gcp_crt_helper.Resource]]:
+    """Searches for deleted resources in GCP Logs.
 
-      end_timestamp = start_timestamp + datetime.timedelta(minutes=20)
-      start_timestamp = start_timestamp - datetime.timedelta(days=30)
+    Each resource is searched for in 30 day windows of logs, going back from
+    its start timestamp for up to 400 days. The overlapping windows of
+    different resources are retrieved with a single query filtering on all
+    their ids.
 
-      log_messages = self._GetLogMessages(resource.project_id, start_timestamp,
-                                          end_timestamp, resource.id)
-      self._ParseLogMessages(log_messages)
+    Args:
+      searches: resources to search for, with the initial point of time to
+        start each search.
 
-      matched_resource = self._FindResource(resource.name, resource.type)
-      if matched_resource:
-        if (matched_resource.deletion_timestamp and
+    Returns:
+      Found resource or None, for each search.
+    """
+    found: List[Optional[gcp_crt_helper.Resource]] = [None] * len(searches)
+    start_timestamps = {
+        index: start_timestamp
+        for index, (resource, start_timestamp) in enumerate(searches)
+        if resource and start_timestamp and
+        resource.project_id == self.project_id}
+    oldest_timestamp = (
+        datetime.datetime.now(datetime.timezone.utc) -
+        datetime.timedelta(days=400))
+
+    while start_timestamps:
+      windows = []
+      for index, start_timestamp in list(start_timestamps.items()):
+        if start_timestamp <= oldest_timestamp:
+          del start_timestamps[index]
+          continue
+        end_timestamp = start_timestamp + datetime.timedelta(minutes=20)
+        start_timestamp = start_timestamp - datetime.timedelta(days=30)
+        start_timestamps[index] = start_timestamp
+        windows.append((start_timestamp, end_timestamp, index))
+
+      # Merge overlapping windows into queries on several resource ids.
+      groups: List[Tuple[datetime.datetime, datetime.datetime, List[int]]] = []
+      for start_timestamp, end_timestamp, index in sorted(windows):
+        if (groups and start_timestamp <= groups[-1][1] and
+            len(groups[-1][2]) < self._MAX_IDS_PER_FILTER):
+          group_start, group_end, indexes = groups[-1]
+          groups[-1] = (
+              group_start, max(group_end, end_timestamp), indexes + [index])
+        else:
+          groups.append((start_timestamp, end_timestamp, [index]))
+
+      periods = []
+      for group_start, group_end, indexes in groups:
+        period = self._ReserveLogPeriod(group_start, group_end)
+        if period:
+          resource_ids = [searches[index][0].id for index in indexes]
+          # Resources without an id are searched for in all the logs.
+          periods.append((period[0], period[1],
+                          resource_ids if all(resource_ids) else None))
+      for log_messages in self._QueryLogPeriods(self.project_id, periods):
+        self._ParseLogMessages(log_messages)
+
+      for index in list(start_timestamps):
+        resource = searches[index][0]
+        matched_resource = self._FindResource(resource.name, resource.type)
+        if (matched_resource and matched_resource.deletion_timestamp and
             matched_resource.creation_timestamp):
-          return matched_resource
+          found[index] = matched_resource
+          del start_timestamps[index]
 
-    return None
+    return found
 
   def _RetrieveListOfDisks(
-      self, project_id: str,
-      compute_api_client: Any) -> Dict[str, gcp_crt_helper.Resource]:
+      self,
+      project_id: str,
+      compute_api_client: Any,
+      pages: Optional[List[Dict[str, Any]]] = None
+  ) -> Dict[str, gcp_crt_helper.Resource]:
     """Retrieves list of disks in a project.
 
     Args:
       project_id: Project Id to retrieve the list of disks for
       compute_api_client: Compute API object
+      pages: Responses to the list request, fetched if not set.
 
     Returns:
       Dict of disks
     """
     result: Dict[str, gcp_crt_helper.Resource] = {}
 
-    request = compute_api_client.disks().aggregatedList(project=project_id)  # pylint: disable=no-member
-
-    while request is not None:
-      response = request.execute()
+    if pages is None:
+      pages = self._ListPages(
+          project_id, 'disks', 'aggregatedList', compute_api_client)
 
+    for response in pages:
       for zone in response.get('items', {}).values():
 
         for disk in zone.get('disks', {}):
@@ -757,20 +965,20 @@ class GCPCloudResourceTree(module.BaseModule):
 
           result[resource.id] = resource
 
-      # pylint: disable=no-member
-      request = compute_api_client.disks().aggregatedList_next(
-          previous_request=request, previous_response=response)
-
     return result
 
   def _RetrieveListOfDiskImages(
-      self, project_id: str,
-      compute_api_client: Any) -> Dict[str, gcp_crt_helper.Resource]:
+      self,
+      project_id: str,
+      compute_api_client: Any,
+      pages: Optional[List[Dict[str, Any]]] = None
+  ) -> Dict[str, gcp_crt_helper.Resource]:
     """Retrieves list of disk images in a project.
 
     Args:
       project_id: Project Id to retrieve the list of disk images for
       compute_api_client: Compute API object
+      pages: Responses to the list request, fetched if not set.
 
     Returns:
       Dict of disk images
@@ -778,11 +986,11 @@ class GCPCloudResourceTree(module.BaseModule):
     result: Dict[str, gcp_crt_helper.Resource] = {}
 
     # Disk images are not tied to a zone, so there is no aggregatedList
-    request = compute_api_client.images().list(project=project_id)  # pylint: disable=no-member
-
-    while request is not None:
-      response = request.execute()
+    if pages is None:
+      pages = self._ListPages(
+          project_id, 'images', 'list', compute_api_client)
 
+    for response in pages:
       if response:
         for image in response.get('items', {}):
           resource = gcp_crt_helper.Resource()
@@ -800,31 +1008,31 @@ class GCPCloudResourceTree(module.BaseModule):
 
           result[resource.id] = resource
 
-      # pylint: disable=no-member
-      request = compute_api_client.images().list_next(
-          previous_request=request, previous_response=response)
-
     return result
 
   def _RetrieveListOfSnapshots(
-      self, project_id: str,
-      compute_api_client: Any) -> Dict[str, gcp_crt_helper.Resource]:
+      self,
+      project_id: str,
+      compute_api_client: Any,
+      pages: Optional[List[Dict[str, Any]]] = None
+  ) -> Dict[str, gcp_crt_helper.Resource]:
     """Retrieves list of snapshots in a project.
 
     Args:
       project_id: Project Id to retrieve the list of snapshots for
       compute_api_client: Compute API object
+      pages: Responses to the list request, fetched if not set.
 
     Returns:
       Dict of snapshots
     """
     result: Dict[str, gcp_crt_helper.Resource] = {}
 
-    request = compute_api_client.snapshots().list(project=project_id)  # pylint: disable=no-member
-
-    while request is not None:
-      response = request.execute()
+    if pages is None:
+      pages = self._ListPages(
+          project_id, 'snapshots', 'list', compute_api_client)
 
+    for response in pages:
       if response:
         for snapshot in response.get('items', {}):
           resource = gcp_crt_helper.Resource()
@@ -838,31 +1046,31 @@ class GCPCloudResourceTree(module.BaseModule):
 
           result[resource.id] = resource
 
-      # pylint: disable=no-member
-      request = compute_api_client.snapshots().list_next(
-          previous_request=request, previous_response=response)
-
     return result
 
   def _RetrieveListOfInstances(
-      self, project_id: str,
-      compute_api_client: Any) -> Dict[str, gcp_crt_helper.Resource]:
+      self,
+      project_id: str,
+      compute_api_client: Any,
+      pages: Optional[List[Dict[str, Any]]] = None
+  ) -> Dict[str, gcp_crt_helper.Resource]:
     """Retrieves list of instances in a project.
 
     Args:
       project_id: Project Id to retrieve the list of instances for
       compute_api_client: Compute API object
+      pages: Responses to the list request, fetched if not set.
 
     Returns:
       Dict of instances
     """
     result: Dict[str, gcp_crt_helper.Resource] = {}
 
-    request = compute_api_client.instances().aggregatedList(project=project_id)  # pylint: disable=no-member
-
-    while request is not None:
-      response = request.execute()
+    if pages is None:
+      pages = self._ListPages(
+          project_id, 'instances', 'aggregatedList', compute_api_client)
 
+    for response in pages:
       for zone in response['items'].values():
 
         for instance in zone.get('instances', {}):
@@ -915,32 +1123,31 @@ class GCPCloudResourceTree(module.BaseModule):
 
           result[resource.id] = resource
 
-      # pylint: disable=no-member
-      request = compute_api_client.instances().aggregatedList_next(
-          previous_request=request, previous_response=response)
-
     return result
 
   def _RetrieveListOfInstanceTemplates(
-      self, project_id: str,
-      compute_api_client: Any) -> Dict[str, gcp_crt_helper.Resource]:
+      self,
+      project_id: str,
+      compute_api_client: Any,
+      pages: Optional[List[Dict[str, Any]]] = None
+  ) -> Dict[str, gcp_crt_helper.Resource]:
     """Retrieves list of instance templates in a project.
 
     Args:
       project_id: Project Id to retrieve the list of instance templates for
       compute_api_client: Compute API object
+      pages: Responses to the list request, fetched if not set.
 
     Returns:
       Dict of instance templates
     """
     result: Dict[str, gcp_crt_helper.Resource] = {}
 
-    # Retrieve list of instance templates in a project
-    request = compute_api_client.instanceTemplates().list(project=project_id)  # pylint: disable=no-member
-
-    while request is not None:
-      response = request.execute()
+    if pages is None:
+      pages = self._ListPages(
+          project_id, 'instanceTemplates', 'list', compute_api_client)
 
+    for response in pages:
       if response:
         for instance_template in response.get('items', {}):
           resource = gcp_crt_helper.Resource()
@@ -1000,31 +1207,31 @@ class GCPCloudResourceTree(module.BaseModule):
 
           result[resource.id] = resource
 
-      # pylint: disable=no-member
-      request = compute_api_client.instanceTemplates().list_next(
-          previous_request=request, previous_response=response)
-
     return result
 
   def _RetrieveListOfMachineImages(
-      self, project_id: str,
-      compute_api_client: Any) -> Dict[str, gcp_crt_helper.Resource]:
+      self,
+      project_id: str,
+      compute_api_client: Any,
+      pages: Optional[List[Dict[str, Any]]] = None
+  ) -> Dict[str, gcp_crt_helper.Resource]:
     """Retrieves list of machine images in a project.
 
     Args:
       project_id: Project Id to retrieve the list of machine images for
       compute_api_client: Compute API object
+      pages: Responses to the list request, fetched if not set.
 
     Returns:
       Dict of machine images
     """
     result: Dict[str, gcp_crt_helper.Resource] = {}
 
-    request = compute_api_client.machineImages().list(project=project_id)  # pylint: disable=no-member
-
-    while request is not None:
-      response = request.execute()
+    if pages is None:
+      pages = self._ListPages(
+          project_id, 'machineImages', 'list', compute_api_client)
 
+    for response in pages:
       if response:
         for machine_image in response.get('items', {}):
           resource = gcp_crt_helper.Resource()
@@ -1043,11 +1250,87 @@ class GCPCloudResourceTree(module.BaseModule):
 
           result[resource.id] = resource
 
-      # pylint: disable=no-member
-      request = compute_api_client.machineImages().list_next(
-          previous_request=request, previous_response=response)
-
     return result
 
 
+def _DecodeLogChunk(
+    path: str, start: int, end: int) -> Tuple[List[Dict[str, Any]], int]:
+  """Decodes the supported log lines starting within a byte range of a file.
+
+  A line belongs to the range its first byte is in, so that consecutive
+  ranges decode every line exactly once. Runs in worker processes.
+
+  Args:
+    path: path of the log file.
+    start: offset of the first byte of the range.
+    end: offset of the byte following the range.
+
+  Returns:
+    The decoded log messages of supported types, and the number of lines in
+    the range.
+  """
+  log_messages = []
+  line_count = 0
+  with open(path, 'rb') as input_file:
+    if start:
+      # Skip the line started in the previous range.
+      input_file.seek(start - 1)
+      input_file.readline()
+    while input_file.tell() < end:
+      line = input_file.readline()
+      if not line:
+        break
+      line_count += 1
+      if _SUPPORTED_LOG_LINE_RE.search(line):
+        log_messages.append(json.loads(line))
+  return log_messages, line_count
+
+
+def _DecodeLogChunks(
+    path: str,
+    chunks: List[Tuple[int, int]],
+    workers: int,
+    max_ahead_bytes: int) -> Iterator[Tuple[List[Dict[str, Any]], int]]:
+  """Decodes byte ranges of a log file, in order.
+
+  Args:
+    path: path of the log file.
+    chunks: byte ranges of the file, see _DecodeLogChunk.
+    workers: number of processes to decode ranges in.
+    max_ahead_bytes: maximum total size of the ranges being decoded or
+        waiting to be yielded. A larger range is decoded on its own.
+
+  Yields:
+    The decoded log messages of supported types of each range, and the number
+    of lines in the range.
+  """
+  if workers == 1:
+    for start, end in chunks:
+      yield _DecodeLogChunk(path, start, end)
+    return
+
+  # Processes are spawned rather than forked, as forking a process running
+  # other threads can deadlock the child.
+  with futures.ProcessPoolExecutor(
+      max_workers=workers,
+      mp_context=multiprocessing.get_context('spawn')) as executor:
+    pending: collections.deque[Tuple[int, futures.Future[
+        Tuple[List[Dict[str, Any]], int]]]] = collections.deque()
+    pending_bytes = 0
+    try:
+      for start, end in chunks:
+        while pending and pending_bytes + end - start > max_ahead_bytes:
+          size, future = pending.popleft()
+          pending_bytes -= size
+          yield future.result()
+        pending.append(
+            (end - start, executor.submit(_DecodeLogChunk, path, start, end)))
+        pending_bytes += end - start
+      while pending:
+        yield pending.popleft()[1].result()
+    finally:
+      for _, future in pending:
+        future.cancel()
+
+
 modules_manager.ModulesManager.RegisterModule(GCPCloudResourceTree)
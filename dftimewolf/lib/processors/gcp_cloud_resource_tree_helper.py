@@ -4,7 +4,7 @@ import datetime
 import enum
 import io
 import json
-from typing import Dict, List, Optional, Any, Set, Union
+from typing import Dict, List, Optional, Any, Set, Tuple, Union
 import pandas as pd
 
 
@@ -367,6 +367,119 @@ class Resource():
     return df
 
 
+class IndexedResources(Dict[str, Resource]):
+  """Dictionary of resources by ID, indexed by name, type and location.
+
+  Finding a resource by name would otherwise scan every resource, which makes
+  building the trees of large projects quadratic. The indexes are updated
+  whenever a resource is stored, so resources enriched after being stored
+  must be stored again to be found under their new name.
+  """
+
+  def __init__(self, *args: Any, **kwargs: Any) -> None:
+    """Initializes the dictionary, and indexes the initial resources."""
+    super().__init__()
+    # Position of each key in the dictionary, to return the same resource as
+    # a scan of the values when several resources match.
+    self._positions: Dict[str, int] = {}
+    self._next_position = 0
+    self._keys: Dict[str, Tuple[str, str, str]] = {}
+    self._by_name_type: Dict[Tuple[str, str], Dict[str, None]] = {}
+    self._by_name_type_location: Dict[
+        Tuple[str, str, str], Dict[str, None]] = {}
+    self.update(*args, **kwargs)
+
+  def _Unindex(self, key: str) -> None:
+    """Removes a resource from the indexes."""
+    name, resource_type, location = self._keys.pop(key)
+    del self._by_name_type[(name, resource_type)][key]
+    del self._by_name_type_location[(name, resource_type, location)][key]
+
+  def __setitem__(self, key: str, resource: Resource) -> None:
+    """Stores a resource and indexes it under its current attributes."""
+    if key in self._keys:
+      self._Unindex(key)
+    else:
+      self._positions[key] = self._next_position
+      self._next_position += 1
+    super().__setitem__(key, resource)
+    name, resource_type, location = (
+        resource.name, resource.type, resource.location)
+    self._keys[key] = (name, resource_type, location)
+    self._by_name_type.setdefault((name, resource_type), {})[key] = None
+    self._by_name_type_location.setdefault(
+        (name, resource_type, location), {})[key] = None
+
+  def __delitem__(self, key: str) -> None:
+    """Removes a resource."""
+    super().__delitem__(key)
+    self._Unindex(key)
+    del self._positions[key]
+
+  def pop(self, key: str, *default: Any) -> Any:  # type: ignore[override]
+    """Removes a resource and returns it."""
+    if key not in self:
+      return super().pop(key, *default)
+    resource = self[key]
+    del self[key]
+    return resource
+
+  def update(self, *args: Any, **kwargs: Any) -> None:  # type: ignore[override]
+    """Stores several resources."""
+    for key, resource in dict(*args, **kwargs).items():
+      self[key] = resource
+
+  def setdefault(  # type: ignore[override]
+      self, key: str, default: Resource) -> Resource:
+    """Returns a resource, storing the default if the key is missing."""
+    if key not in self:
+      self[key] = default
+    return self[key]
+
+  def clear(self) -> None:
+    """Removes all resources."""
+    super().clear()
+    self._positions.clear()
+    self._keys.clear()
+    self._by_name_type.clear()
+    self._by_name_type_location.clear()
+
+  def Find(self,
+           name: str,
+           resource_type: str,
+           location: Optional[str] = None,
+           project_id: Optional[str] = None) -> Optional[Resource]:
+    """Finds the first stored resource with a name and type.
+
+    Args:
+      name: Resource name.
+      resource_type: Resource type.
+      location (Optional): Resource location, any location if not set.
+      project_id (Optional): Project ID, any project if not set.
+
+    Returns:
+      The first stored resource that matches, or None.
+    """
+    if location:
+      keys = self._by_name_type_location.get((name, resource_type, location))
+    else:
+      keys = self._by_name_type.get((name, resource_type))
+    found: Optional[Resource] = None
+    found_position = self._next_position
+    for key in keys or ():
+      resource = self[key]
+      # Skip resources renamed since they were stored.
+      if resource.name != name or resource.type != resource_type:
+        continue
+      if location and resource.location != location:
+        continue
+      if project_id and resource.project_id != project_id:
+        continue
+      if self._positions[key] < found_position:
+        found, found_position = resource, self._positions[key]
+    return found
+
+
 class ResourceEncoder(json.JSONEncoder):
   """A Class that implements custom json encoding for Resource object."""
 
@@ -38,24 +38,529 @@ The following attributes are extracted by the processor:
   user: user or requester.
 """
 
+from concurrent import futures
 import json
+import multiprocessing
+import os
 import re
+import shutil
 import tempfile
+import time
 from datetime import datetime, timezone
-from typing import Any, Dict, Optional, TYPE_CHECKING
+from typing import Any, Dict, List, Optional, Tuple, Type, TYPE_CHECKING
 
 from dftimewolf.lib.containers import containers
-from dftimewolf.lib.module import BaseModule
+from dftimewolf.lib.containers import interface
+from dftimewolf.lib.module import ThreadAwareModule
 from dftimewolf.lib.modules import manager as modules_manager
 
 if TYPE_CHECKING:
   from dftimewolf.lib import state
 
+try:
+  import orjson
+  HAS_ORJSON = True
+except ImportError:
+  HAS_ORJSON = False
+
+
+# Timesketch data type of the transformed records.
+_DATA_TYPE = 'gcp:log:json'
 
-class GCPLoggingTimesketch(BaseModule):
+
+def _LoadJSON(line: bytes) -> Any:
+  """Parses a JSON document, with orjson if it is installed.
+
+  Args:
+    line: the JSON document.
+
+  Returns:
+    The parsed document.
+
+  Raises:
+    json.decoder.JSONDecodeError: if the document is not valid JSON.
+  """
+  if HAS_ORJSON:
+    # orjson parses integers that do not fit in 64 bits as floats, which is
+    # fine here: 64-bit values are strings in the JSON mapping of log entries.
+    try:
+      return orjson.loads(line)
+    except orjson.JSONDecodeError:
+      # Retry with json for its error message, and the documents orjson is
+      # stricter about, such as NaN.
+      pass
+  return json.loads(line)
+
+
+def _DumpJSON(record: Dict[str, Any]) -> bytes:
+  """Serializes a record to JSON, with orjson if it is installed.
+
+  The document is compact and not ASCII escaped, like those of orjson, so
+  that the output does not depend on whether orjson is installed.
+
+  Args:
+    record: the record to serialize.
+
+  Returns:
+    The UTF-8 encoded JSON document.
+  """
+  if HAS_ORJSON:
+    try:
+      return orjson.dumps(record)
+    except orjson.JSONEncodeError:
+      pass
+  return json.dumps(
+      record, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _TransformLogRecord(
+    log_record: Dict[str, Any], query: str) -> Dict[str, Any]:
+  """Transforms a parsed Google Cloud Platform log record.
+
+  Args:
+    log_record: a parsed GCP log entry.
+    query: the GCP query used to retrieve the log.
+
+  Returns:
+    A Timesketch-friendly version of the log record.
+  """
+
+  # Metadata about how the record was obtained.
+  timesketch_record = {'query': query,
+                       'data_type': _DATA_TYPE}
+
+  # Timestamp related fields.
+  timestamp = log_record.get('timestamp', None)
+  if timestamp:
+    timesketch_record['datetime'] = timestamp
+    timesketch_record['timestamp_desc'] = 'Event Recorded'
+
+  # General resource information.
+  resource = log_record.get('resource', None)
+  if resource:
+    labels = resource.get('labels', None)
+    if labels:
+      for attribute, value in labels.items():
+        timesketch_attribute = attribute
+        timesketch_record[timesketch_attribute] = value
+
+  # Some Cloud logs pass through Severity from the underlying log source
+  severity = log_record.get('severity', None)
+  if severity:
+    timesketch_record['severity'] = severity
+
+  # The log entry will have either a jsonPayload, a protoPayload or a
+  # textPayload.
+  json_payload = log_record.get('jsonPayload', None)
+  if json_payload:
+    _ParseJSONPayload(json_payload, timesketch_record)
+
+  proto_payload = log_record.get('protoPayload', None)
+  if proto_payload:
+    _ParseProtoPayload(proto_payload, timesketch_record)
+
+  text_payload = log_record.get('textPayload', None)
+  if text_payload:
+    timesketch_record['textPayload'] = text_payload
+
+  _BuildMessageString(timesketch_record)
+
+  return timesketch_record
+
+
+def _ParseAuthenticationInfo(
+    proto_payload: Dict[str, Any],
+    timesketch_record: Dict[str, Any]) -> None:
+  """Extracts `protoPayload.authenticationInfo` field in a GCP log.
+
+  Args:
+    proto_payload: the content of a GCP protoPaylaod field.
+    timesketch_record: a dictionary that will be serialized to JSON and
+        uploaded to Timesketch.
+  """
+  authentication_info = proto_payload.get('authenticationInfo', None)
+  if authentication_info:
+    principal_email = authentication_info.get('principalEmail', None)
+    if principal_email:
+      timesketch_record['principal_email'] = principal_email
+
+    principal_subject = authentication_info.get('principalSubject', None)
+    if principal_subject:
+      timesketch_record['principal_subject'] = principal_subject
+
+    service_account_key_name = authentication_info.get(
+        'serviceAccountKeyName', None)
+    if service_account_key_name:
+      timesketch_record['service_account_key_name'] = service_account_key_name
+
+    # Service account delegation information
+    delegations = []
+
+    delegation_info_list = authentication_info.get(
+        'serviceAccountDelegationInfo', [])
+    for delegation_info in delegation_info_list:
+      first_party_principal = delegation_info.get('firstPartyPrincipal', {})
+
+      first_party_principal_email = first_party_principal.get(
+          'principalEmail', None)
+      if first_party_principal_email:
+        delegations.append(first_party_principal_email)
+      else:
+        first_party_principal_subject = first_party_principal.get(
+            'principalSubject', None)
+        if first_party_principal_subject:
+          delegations.append(first_party_principal_subject)
+
+    if delegations:
+      timesketch_record['service_account_delegation'] = delegations
+      timesketch_record['delegation_chain'] = '->'.join(delegations)
+
+
+def _ParseAuthorizationInfo(
+    proto_payload: Dict[str, Any],
+    timesketch_record: Dict[str, Any]) -> None:
+  """Extracts `protoPayload.authorizationInfo` field in a GCP log.
+
+  Args:
+    proto_payload: the content of a GCP protoPaylaod field.
+    timesketch_record: a dictionary that will be serialized to JSON and
+        uploaded to Timesketch.
+  """
+  permissions = []
+
+  authorization_info_list = proto_payload.get('authorizationInfo', [])
+  for authorization_info in authorization_info_list:
+    permission = authorization_info.get('permission', None)
+    if permission:
+      permissions.append(permission)
+
+  if permissions:
+    timesketch_record['permissions'] = permissions
+
+
+def _ParseRequestMetadata(
+    proto_payload: Dict[str, Any],
+    timesketch_record: Dict[str, str]) -> None:
+  """Extracts `protoPayload.requestMetadata` field in a GCP log.
+
+  Args:
+    proto_payload: the content of a GCP protoPaylaod field.
+    timesketch_record: a dictionary that will be serialized to JSON and
+        uploaded to Timesketch.
+  """
+  request_metadata = proto_payload.get('requestMetadata', {})
+
+  # `protoPayload.callerIp` can be empty for some requests.
+  caller_ip = request_metadata.get('callerIp', '')
+  timesketch_record['caller_ip'] = caller_ip
+
+  # `protoPayload.callerSuppliedUserAgent` can be empty for some requests.
+  user_agent = request_metadata.get('callerSuppliedUserAgent', '')
+  timesketch_record['user_agent'] = user_agent
+
+  # Check for gcloud command invocation
+  if user_agent:
+    if 'command/' in user_agent:
+      command_regex = re.search(r'command/([^\s]+)', user_agent)
+      if command_regex:
+        command_string = str(command_regex.group(1))
+        command_string = command_string.replace('.', ' ')
+
+        timesketch_record['gcloud_command_partial'] = command_string
+
+    if 'invocation-id/' in user_agent:
+      invocation_regex = re.search(r'invocation-id/([^\s]+)', user_agent)
+      if invocation_regex:
+        invocation_id = str(invocation_regex.group(1))
+        timesketch_record['gcloud_command_id'] = invocation_id
+
+
+def _ParseProtoPayloadStatus(
+    proto_payload: Dict[str, Any],
+    timesketch_record: Dict[str, str]) -> None:
+  """Extracts `protoPayload.status` field in a GCP log.
+
+  Args:
+    proto_payload: the content of a GCP protoPaylaod field.
+    timesketch_record: a dictionary that will be serialized to JSON and
+        uploaded to Timesketch.
+  """
+  status = proto_payload.get('status', {})
+
+  # `protoPayload.status` can be an empty object which indicates successful
+  # operation.
+  #
+  # Empty `status_code` and `status_message` are added to reflect the same.
+  if not status:
+    timesketch_record['status_code'] = ''
+    timesketch_record['status_message'] = ''
+
+    return
+
+  # A non-empty `protoPayload.status` field could have empty
+  # `protoPayload.status.code` and `protoPayload.status.message` fields.
+  # Empty `code` and `message` fields would indicate the operation was
+  # successful.
+  status_code = str(status.get('code', ''))
+  status_message = status.get('message', '')
+
+  timesketch_record['status_code'] = status_code
+  timesketch_record['status_message'] = status_message
+
+  # `protoPayload.status` struction may contain `details` attribute when
+  # operation fails. The reason attribute contains the reason the operation
+  # failed.
+  status_reasons = []
+
+  status_details = status.get('details', [])
+  for status_detail in status_details:
+    reason = status_detail.get('reason')
+    if reason:
+      status_reasons.append(reason)
+
+  if status_reasons:
+    timesketch_record['status_reason'] = ', '.join(status_reasons)
+
+
+def _ParseServiceData(
+    proto_payload: Dict[str, Any],
+    timesketch_record: Dict[str, Any]) -> None:
+  """Extracts information from `protoPayload.serviceData` field in a GCP log.
+
+  Args:
+    proto_payload: the content of a GCP protoPayload field.
+    timesketch_record: a dictionary that will be serialized to JSON and
+        uploaded to Timesketch.
+  """
+  service_data = proto_payload.get('serviceData', None)
+  if service_data:
+    policy_delta = service_data.get('policyDelta', None)
+    if policy_delta:
+      binding_deltas = policy_delta.get('bindingDeltas', [])
+      if binding_deltas:
+        policy_deltas = []
+        for bd in binding_deltas:
+          policy_deltas.append(
+              '{0:s} {1:s} with role {2:s}'.format(
+                  bd.get('action', ''), bd.get('member', ''),
+                  bd.get('role', '')))
+        timesketch_record['policy_delta'] = ', '.join(policy_deltas)
+
+
+def _ParseProtoPayload(
+    proto_payload: Dict[str, Any],
+    timesketch_record: Dict[str, Any]) -> None:
+  """Extracts information from a protoPayload field in a GCP log.
+
+  protoPayload is set for all cloud audit events.
+
+  Args:
+    proto_payload (dict): the contents of a GCP protoPayload field.
+    timesketch_record (dict): a dictionary that will be serialized to JSON
+      and uploaded to Timesketch.
+  """
+  service_name = proto_payload.get('serviceName', '')
+  if service_name:
+    timesketch_record['service_name'] = service_name
+
+  method_name = proto_payload.get('methodName', '')
+  if service_name:
+    timesketch_record['method_name'] = method_name
+
+  resource_name = proto_payload.get('resourceName', '')
+  if resource_name:
+    timesketch_record['resource_name'] = resource_name
+
+  _ParseAuthenticationInfo(proto_payload, timesketch_record)
+  _ParseAuthorizationInfo(proto_payload, timesketch_record)
+  _ParseRequestMetadata(proto_payload, timesketch_record)
+  _ParseProtoPayloadRequest(proto_payload, timesketch_record)
+  _ParseProtoPayloadStatus(proto_payload, timesketch_record)
+  _ParseServiceData(proto_payload, timesketch_record)
+
+
+def _ParseComputeInstancesInsert(
+    request: Dict[str, Any],
+    timesketch_record: Dict[str, Any]) -> None:
+  """ Extracts information related to compute instances insert.
+
+  Args:
+    request: the `protoPayload.request` field in a GCP log.
+    timesketch_record: a dictionary that will be serialized to JSON and
+        uploaded to Timesketch.
+  """
+  if not request:
+    return
+
+  request_type = request.get('@type', None)
+  if not request_type:
+    return
+
+  if request_type != 'type.googleapis.com/compute.instances.insert':
+    return
+
+  # Source images are useful during investigaions.
+  source_images = []
+
+  disks = request.get('disks', [])
+  for disk in disks:
+    initialize_params = disk.get('initializeParams', {})
+
+    source_image = initialize_params.get('sourceImage', None)
+    if source_image:
+      source_images.append(source_image)
+
+  if source_images:
+    timesketch_record['source_images'] = source_images
+
+  # Default Compute Engine Service Account (dcsa)
+  dcsa_emails = []
+  dcsa_scopes = []
+
+  service_accounts = request.get('serviceAccounts', [])
+  for service_account in service_accounts:
+    email = service_account.get('email', None)
+    if email:
+      dcsa_emails.append(email)
+
+    scopes = service_account.get('scopes', [])
+    if scopes:
+      dcsa_scopes.extend(scopes)
+
+  if dcsa_emails:
+    timesketch_record['dcsa_emails'] = dcsa_emails
+
+  if dcsa_scopes:
+    timesketch_record['dcsa_scopes'] = dcsa_scopes
+
+
+def _ParseProtoPayloadRequest(
+    proto_payload: Dict[str, Any],
+    timesketch_record: Dict[str, Any]) -> None:
+  """Extracts information from the `protoPayload.request` field of a GCP log.
+
+  Args:
+    proto_payload: the contents of a GCP protoPayload field from a
+        protoPayload field.
+    timesketch_record: a dictionary that will be serialized to JSON
+      and uploaded to Timesketch.
+  """
+  request = proto_payload.get('request', {})
+  if not request:
+    return
+
+  request_attributes = [
+      'name', 'description', 'direction', 'member', 'targetTags', 'email',
+      'account_id'
+  ]
+  for attribute in request_attributes:
+    if attribute in request:
+      timesketch_attribute = 'request_{0:s}'.format(attribute)
+      timesketch_record[timesketch_attribute] = request[attribute]
+
+  # Firewall specific attributes.
+  if 'sourceRanges' in request:
+    source_ranges = ', '.join(request['sourceRanges'])
+    timesketch_record['source_ranges'] = source_ranges
+
+  if 'alloweds' in request:
+    for allowed in request['alloweds']:
+      attribute_name = 'allowed_{0:s}_ports'.format(allowed['IPProtocol'])
+      if 'ports' in allowed:
+        timesketch_record[attribute_name] = allowed['ports']
+      else:
+        timesketch_record[attribute_name] = 'all'
+
+  if 'denieds' in request:
+    for denied in request['denieds']:
+      attribute_name = 'denied_{0:s}_ports'.format(denied['IPProtocol'])
+      if 'ports' in denied:
+        timesketch_record[attribute_name] = denied['ports']
+      else:
+        timesketch_record[attribute_name] = 'all'
+
+  # Service account specific attributes
+  if 'service_account' in request:
+    service_account_name = request['service_account'].get('display_name')
+    timesketch_record['service_account_display_name'] = service_account_name
+
+  _ParseComputeInstancesInsert(request, timesketch_record)
+
+
+def _ParseJSONPayload(
+    json_payload: Dict[str, Any],
+    timesketch_record: Dict[str, Any]) -> None:
+  """Extracts information from a json_payload.
+
+  Args:
+    json_payload (dict): the contents of a GCP jsonPayload field.
+    timesketch_record (dict): a dictionary that will be serialized to JSON
+      and uploaded to Timesketch.
+  """
+  json_attributes = [
+      'event_type', 'event_subtype', 'container', 'filename', 'message'
+  ]
+  for attribute in json_attributes:
+    if attribute in json_payload:
+      timesketch_record[attribute] = json_payload[attribute]
+
+  actor = json_payload.get('actor', {})
+  if actor:
+    if 'user' in actor:
+      timesketch_record['user'] = actor['user']
+
+
+def _BuildMessageString(timesketch_record: Dict[str, Any]) -> None:
+  """Builds a Timesketch message string from a Timesketch record.
+
+  Args:
+    timesketch_record (dict): a dictionary that will be serialized to JSON
+      and uploaded to Timesketch.
+  """
+  if 'message' in timesketch_record:
+    return
+  user = ''
+  action = ''
+  resource = ''
+
+  # Ordered from least to most preferred value
+  user_attributes = ['principal_email', 'user']
+  for attribute in user_attributes:
+    if attribute in timesketch_record:
+      user = timesketch_record[attribute]
+
+  # Ordered from least to most preferred value
+  action_attributes = ['method_name', 'event_subtype']
+  for attribute in action_attributes:
+    if attribute in timesketch_record:
+      action = timesketch_record[attribute]
+
+  # Ordered from least to most preferred value
+  resource_attributes = ['resource_label_instance_id', 'resource_name']
+  for attribute in resource_attributes:
+    if attribute in timesketch_record:
+      resource = timesketch_record[attribute]
+
+  # Textpayload records can be anything, so we don't want to try to format
+  # them.
+  if timesketch_record.get('textPayload', False):
+    message = timesketch_record['textPayload']
+  else:
+    message = 'User {0:s} performed {1:s} on {2:s}'.format(
+        user, action, resource)
+
+  timesketch_record['message'] = message
+
+
+
+class GCPLoggingTimesketch(ThreadAwareModule):
   """Transforms Google Cloud Platform logs for Timesketch."""
 
-  DATA_TYPE = 'gcp:log:json'
+  DATA_TYPE = _DATA_TYPE
+
+  # Logs are transformed in chunks of this many bytes, by a pool of processes
+  # when there is more than one chunk.
+  _CHUNK_SIZE = 64 * 1024 * 1024
 
   def __init__(self,
                state: "state.DFTimewolfState",
@@ -78,431 +583,22 @@ class GCPLoggingTimesketch(BaseModule):
     Returns:
       str: a Timesketch-friendly version of the log line.
     """
-    log_record = json.loads(log_line)
-
-    # Metadata about how the record was obtained.
-    timesketch_record = {'query': query,
-                         'data_type': self.DATA_TYPE}
-
-    # Timestamp related fields.
-    timestamp = log_record.get('timestamp', None)
-    if timestamp:
-      timesketch_record['datetime'] = timestamp
-      timesketch_record['timestamp_desc'] = 'Event Recorded'
-
-    # General resource information.
-    resource = log_record.get('resource', None)
-    if resource:
-      labels = resource.get('labels', None)
-      if labels:
-        for attribute, value in labels.items():
-          timesketch_attribute = attribute
-          timesketch_record[timesketch_attribute] = value
-
-    # Some Cloud logs pass through Severity from the underlying log source
-    severity = log_record.get('severity', None)
-    if severity:
-      timesketch_record['severity'] = severity
-
-    # The log entry will have either a jsonPayload, a protoPayload or a
-    # textPayload.
-    json_payload = log_record.get('jsonPayload', None)
-    if json_payload:
-      self._ParseJSONPayload(json_payload, timesketch_record)
-
-    proto_payload = log_record.get('protoPayload', None)
-    if proto_payload:
-      self._parse_proto_payload(proto_payload, timesketch_record)
-
-    text_payload = log_record.get('textPayload', None)
-    if text_payload:
-      timesketch_record['textPayload'] = text_payload
-
-    self._BuildMessageString(timesketch_record)
-
-    return json.dumps(timesketch_record)
-
-  def _ParseAuthenticationInfo(
-      self,
-      proto_payload: Dict[str, Any],
-      timesketch_record: Dict[str, Any]) -> None:
-    """Extracts `protoPayload.authenticationInfo` field in a GCP log.
+    return json.dumps(_TransformLogRecord(json.loads(log_line), query))
 
-    Args:
-      proto_payload: the content of a GCP protoPaylaod field.
-      timesketch_record: a dictionary that will be serialized to JSON and
-          uploaded to Timesketch.
-    """
-    authentication_info = proto_payload.get('authenticationInfo', None)
-    if authentication_info:
-      principal_email = authentication_info.get('principalEmail', None)
-      if principal_email:
-        timesketch_record['principal_email'] = principal_email
-
-      principal_subject = authentication_info.get('principalSubject', None)
-      if principal_subject:
-        timesketch_record['principal_subject'] = principal_subject
-
-      service_account_key_name = authentication_info.get(
-          'serviceAccountKeyName', None)
-      if service_account_key_name:
-        timesketch_record['service_account_key_name'] = service_account_key_name
-
-      # Service account delegation information
-      delegations = []
-
-      delegation_info_list = authentication_info.get(
-          'serviceAccountDelegationInfo', [])
-      for delegation_info in delegation_info_list:
-        first_party_principal = delegation_info.get('firstPartyPrincipal', {})
-
-        first_party_principal_email = first_party_principal.get(
-            'principalEmail', None)
-        if first_party_principal_email:
-          delegations.append(first_party_principal_email)
-        else:
-          first_party_principal_subject = first_party_principal.get(
-              'principalSubject', None)
-          if first_party_principal_subject:
-            delegations.append(first_party_principal_subject)
-
-      if delegations:
-        timesketch_record['service_account_delegation'] = delegations
-        timesketch_record['delegation_chain'] = '->'.join(delegations)
-
-  def _ParseAuthorizationInfo(
-      self,
-      proto_payload: Dict[str, Any],
-      timesketch_record: Dict[str, Any]) -> None:
-    """Extracts `protoPayload.authorizationInfo` field in a GCP log.
-
-    Args:
-      proto_payload: the content of a GCP protoPaylaod field.
-      timesketch_record: a dictionary that will be serialized to JSON and
-          uploaded to Timesketch.
-    """
-    permissions = []
+  def _SplitLogFile(self, path: str) -> List[Tuple[int, int]]:
+    """Splits a log file in byte ranges of about _CHUNK_SIZE bytes.
 
-    authorization_info_list = proto_payload.get('authorizationInfo', [])
-    for authorization_info in authorization_info_list:
-      permission = authorization_info.get('permission', None)
-      if permission:
-        permissions.append(permission)
-
-    if permissions:
-      timesketch_record['permissions'] = permissions
-
-  def _ParseRequestMetadata(
-      self,
-      proto_payload: Dict[str, Any],
-      timesketch_record: Dict[str, str]) -> None:
-    """Extracts `protoPayload.requestMetadata` field in a GCP log.
-
-    Args:
-      proto_payload: the content of a GCP protoPaylaod field.
-      timesketch_record: a dictionary that will be serialized to JSON and
-          uploaded to Timesketch.
-    """
-    request_metadata = proto_payload.get('requestMetadata', {})
-
-    # `protoPayload.callerIp` can be empty for some requests.
-    caller_ip = request_metadata.get('callerIp', '')
-    timesketch_record['caller_ip'] = caller_ip
-
-    # `protoPayload.callerSuppliedUserAgent` can be empty for some requests.
-    user_agent = request_metadata.get('callerSuppliedUserAgent', '')
-    timesketch_record['user_agent'] = user_agent
-
-    # Check for gcloud command invocation
-    if user_agent:
-      if 'command/' in user_agent:
-        command_regex = re.search(r'command/([^\s]+)', user_agent)
-        if command_regex:
-          command_string = str(command_regex.group(1))
-          command_string = command_string.replace('.', ' ')
-
-          timesketch_record['gcloud_command_partial'] = command_string
-
-      if 'invocation-id/' in user_agent:
-        invocation_regex = re.search(r'invocation-id/([^\s]+)', user_agent)
-        if invocation_regex:
-          invocation_id = str(invocation_regex.group(1))
-          timesketch_record['gcloud_command_id'] = invocation_id
-
-  def _ParseProtoPayloadStatus(
-      self,
-      proto_payload: Dict[str, Any],
-      timesketch_record: Dict[str, str]) -> None:
-    """Extracts `protoPayload.status` field in a GCP log.
+    Range boundaries need not fall on line boundaries, see _TransformChunk.
 
     Args:
-      proto_payload: the content of a GCP protoPaylaod field.
-      timesketch_record: a dictionary that will be serialized to JSON and
-          uploaded to Timesketch.
-    """
-    status = proto_payload.get('status', {})
+      path: path of the log file.
 
-    # `protoPayload.status` can be an empty object which indicates successful
-    # operation.
-    #
-    # Empty `status_code` and `status_message` are added to reflect the same.
-    if not status:
-      timesketch_record['status_code'] = ''
-      timesketch_record['status_message'] = ''
-
-      return
-
-    # A non-empty `protoPayload.status` field could have empty
-    # `protoPayload.status.code` and `protoPayload.status.message` fields.
-    # Empty `code` and `message` fields would indicate the operation was
-    # successful.
-    status_code = str(status.get('code', ''))
-    status_message = status.get('message', '')
-
-    timesketch_record['status_code'] = status_code
-    timesketch_record['status_message'] = status_message
-
-    # `protoPayload.status` struction may contain `details` attribute when
-    # operation fails. The reason attribute contains the reason the operation
-    # failed.
-    status_reasons = []
-
-    status_details = status.get('details', [])
-    for status_detail in status_details:
-      reason = status_detail.get('reason')
-      if reason:
-        status_reasons.append(reason)
-
-    if status_reasons:
-      timesketch_record['status_reason'] = ', '.join(status_reasons)
-
-  def _ParseServiceData(
-      self,
-      proto_payload: Dict[str, Any],
-      timesketch_record: Dict[str, Any]) -> None:
-    """Extracts information from `protoPayload.serviceData` field in a GCP log.
-
-    Args:
-      proto_payload: the content of a GCP protoPayload field.
-      timesketch_record: a dictionary that will be serialized to JSON and
-          uploaded to Timesketch.
-    """
-    service_data = proto_payload.get('serviceData', None)
-    if service_data:
-      policy_delta = service_data.get('policyDelta', None)
-      if policy_delta:
-        binding_deltas = policy_delta.get('bindingDeltas', [])
-        if binding_deltas:
-          policy_deltas = []
-          for bd in binding_deltas:
-            policy_deltas.append(
-                '{0:s} {1:s} with role {2:s}'.format(
-                    bd.get('action', ''), bd.get('member', ''),
-                    bd.get('role', '')))
-          timesketch_record['policy_delta'] = ', '.join(policy_deltas)
-
-  def _parse_proto_payload(
-      self,
-      proto_payload: Dict[str, Any],
-      timesketch_record: Dict[str, Any]) -> None:
-    """Extracts information from a protoPayload field in a GCP log.
-
-    protoPayload is set for all cloud audit events.
-
-    Args:
-      proto_payload (dict): the contents of a GCP protoPayload field.
-      timesketch_record (dict): a dictionary that will be serialized to JSON
-        and uploaded to Timesketch.
-    """
-    service_name = proto_payload.get('serviceName', '')
-    if service_name:
-      timesketch_record['service_name'] = service_name
-
-    method_name = proto_payload.get('methodName', '')
-    if service_name:
-      timesketch_record['method_name'] = method_name
-
-    resource_name = proto_payload.get('resourceName', '')
-    if resource_name:
-      timesketch_record['resource_name'] = resource_name
-
-    self._ParseAuthenticationInfo(proto_payload, timesketch_record)
-    self._ParseAuthorizationInfo(proto_payload, timesketch_record)
-    self._ParseRequestMetadata(proto_payload, timesketch_record)
-    self._ParseProtoPayloadRequest(proto_payload, timesketch_record)
-    self._ParseProtoPayloadStatus(proto_payload, timesketch_record)
-    self._ParseServiceData(proto_payload, timesketch_record)
-
-  def _ParseComputeInstancesInsert(
-      self,
-      request: Dict[str, Any],
-      timesketch_record: Dict[str, Any]) -> None:
-    """ Extracts information related to compute instances insert.
-
-    Args:
-      request: the `protoPayload.request` field in a GCP log.
-      timesketch_record: a dictionary that will be serialized to JSON and
-          uploaded to Timesketch.
-    """
-    if not request:
-      return
-
-    request_type = request.get('@type', None)
-    if not request_type:
-      return
-
-    if request_type != 'type.googleapis.com/compute.instances.insert':
-      return
-
-    # Source images are useful during investigaions.
-    source_images = []
-
-    disks = request.get('disks', [])
-    for disk in disks:
-      initialize_params = disk.get('initializeParams', {})
-
-      source_image = initialize_params.get('sourceImage', None)
-      if source_image:
-        source_images.append(source_image)
-
-    if source_images:
-      timesketch_record['source_images'] = source_images
-
-    # Default Compute Engine Service Account (dcsa)
-    dcsa_emails = []
-    dcsa_scopes = []
-
-    service_accounts = request.get('serviceAccounts', [])
-    for service_account in service_accounts:
-      email = service_account.get('email', None)
-      if email:
-        dcsa_emails.append(email)
-
-      scopes = service_account.get('scopes', [])
-      if scopes:
-        dcsa_scopes.extend(scopes)
-
-    if dcsa_emails:
-      timesketch_record['dcsa_emails'] = dcsa_emails
-
-    if dcsa_scopes:
-      timesketch_record['dcsa_scopes'] = dcsa_scopes
-
-  def _ParseProtoPayloadRequest(
-      self,
-      proto_payload: Dict[str, Any],
-      timesketch_record: Dict[str, Any]) -> None:
-    """Extracts information from the `protoPayload.request` field of a GCP log.
-
-    Args:
-      proto_payload: the contents of a GCP protoPayload field from a
-          protoPayload field.
-      timesketch_record: a dictionary that will be serialized to JSON
-        and uploaded to Timesketch.
-    """
-    request = proto_payload.get('request', {})
-    if not request:
-      return
-
-    request_attributes = [
-        'name', 'description', 'direction', 'member', 'targetTags', 'email',
-        'account_id'
-    ]
-    for attribute in request_attributes:
-      if attribute in request:
-        timesketch_attribute = 'request_{0:s}'.format(attribute)
-        timesketch_record[timesketch_attribute] = request[attribute]
-
-    # Firewall specific attributes.
-    if 'sourceRanges' in request:
-      source_ranges = ', '.join(request['sourceRanges'])
-      timesketch_record['source_ranges'] = source_ranges
-
-    if 'alloweds' in request:
-      for allowed in request['alloweds']:
-        attribute_name = 'allowed_{0:s}_ports'.format(allowed['IPProtocol'])
-        if 'ports' in allowed:
-          timesketch_record[attribute_name] = allowed['ports']
-        else:
-          timesketch_record[attribute_name] = 'all'
-
-    if 'denieds' in request:
-      for denied in request['denieds']:
-        attribute_name = 'denied_{0:s}_ports'.format(denied['IPProtocol'])
-        if 'ports' in denied:
-          timesketch_record[attribute_name] = denied['ports']
-        else:
-          timesketch_record[attribute_name] = 'all'
-
-    # Service account specific attributes
-    if 'service_account' in request:
-      service_account_name = request['service_account'].get('display_name')
-      timesketch_record['service_account_display_name'] = service_account_name
-
-    self._ParseComputeInstancesInsert(request, timesketch_record)
-
-  def _ParseJSONPayload(self,
-      json_payload: Dict[str, Any],
-      timesketch_record: Dict[str, Any]) -> None:
-    """Extracts information from a json_payload.
-
-    Args:
-      json_payload (dict): the contents of a GCP jsonPayload field.
-      timesketch_record (dict): a dictionary that will be serialized to JSON
-        and uploaded to Timesketch.
-    """
-    json_attributes = [
-        'event_type', 'event_subtype', 'container', 'filename', 'message'
-    ]
-    for attribute in json_attributes:
-      if attribute in json_payload:
-        timesketch_record[attribute] = json_payload[attribute]
-
-    actor = json_payload.get('actor', {})
-    if actor:
-      if 'user' in actor:
-        timesketch_record['user'] = actor['user']
-
-  def _BuildMessageString(self, timesketch_record: Dict[str, Any]) -> None:
-    """Builds a Timesketch message string from a Timesketch record.
-
-    Args:
-      timesketch_record (dict): a dictionary that will be serialized to JSON
-        and uploaded to Timesketch.
+    Returns:
+      The (start, end) byte offsets of the ranges, in file order.
     """
-    if 'message' in timesketch_record:
-      return
-    user = ''
-    action = ''
-    resource = ''
-
-    # Ordered from least to most preferred value
-    user_attributes = ['principal_email', 'user']
-    for attribute in user_attributes:
-      if attribute in timesketch_record:
-        user = timesketch_record[attribute]
-
-    # Ordered from least to most preferred value
-    action_attributes = ['method_name', 'event_subtype']
-    for attribute in action_attributes:
-      if attribute in timesketch_record:
-        action = timesketch_record[attribute]
-
-    # Ordered from least to most preferred value
-    resource_attributes = ['resource_label_instance_id', 'resource_name']
-    for attribute in resource_attributes:
-      if attribute in timesketch_record:
-        resource = timesketch_record[attribute]
-
-    # Textpayload records can be anything, so we don't want to try to format
-    # them.
-    if timesketch_record.get('textPayload', False):
-      message = timesketch_record['textPayload']
-    else:
-      message = 'User {0:s} performed {1:s} on {2:s}'.format(
-          user, action, resource)
-
-    timesketch_record['message'] = message
+    size = os.path.getsize(path)
+    return [(start, min(start + self._CHUNK_SIZE, size))
+            for start in range(0, max(size, 1), self._CHUNK_SIZE)]
 
   def _ProcessLogContainer(self, logs_container: containers.File) -> None:
     """Processes a GCP logs container.
@@ -514,27 +610,54 @@ class GCPLoggingTimesketch(BaseModule):
       return
 
     output_file = tempfile.NamedTemporaryFile(
-        mode='w', encoding='utf-8', delete=False, suffix='.jsonl')
+        mode='wb', delete=False, suffix='.jsonl')
     output_path = output_file.name
 
     # `project_id` to be used in timeline name.
     project_id = ''
-
-    with open(logs_container.path, 'r') as input_file:
-      for line in input_file:
-        transformed_line = self._ProcessLogLine(
-            line, logs_container.name)
-        if transformed_line:
-          if not project_id:
-            try:
-              json_transformed_line = json.loads(transformed_line)
-              project_id = json_transformed_line.get('project_id', '')
-            except json.decoder.JSONDecodeError:
-              pass
-
-          output_file.write(transformed_line)
-          output_file.write('\n')
-    output_file.close()
+    line_count = 0
+    start_time = time.time()
+
+    chunks = self._SplitLogFile(logs_container.path)
+    workers = min(
+        len(chunks),
+        max(1, (os.cpu_count() or 1) // self.GetThreadPoolSize()))
+    with output_file:
+      if workers == 1:
+        results = (
+            _TransformChunk(logs_container.path, start, end,
+                            logs_container.name)
+            for start, end in chunks)
+      else:
+        # Processes are spawned rather than forked, as forking a process
+        # running other threads can deadlock the child.
+        executor = futures.ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'))
+        results = executor.map(
+            _TransformChunk,
+            [logs_container.path] * len(chunks),
+            [start for start, _ in chunks],
+            [end for _, end in chunks],
+            [logs_container.name] * len(chunks))
+
+      try:
+        # Chunks are appended in file order, so that the output is the same
+        # regardless of the number of workers.
+        for chunk_path, chunk_project_id, chunk_line_count in results:
+          project_id = project_id or chunk_project_id
+          line_count += chunk_line_count
+          with open(chunk_path, 'rb') as chunk_file:
+            shutil.copyfileobj(chunk_file, output_file)
+          os.remove(chunk_path)
+      finally:
+        if workers > 1:
+          executor.shutdown(cancel_futures=True)
+
+    duration = time.time() - start_time
+    self.logger.info(
+        f'Transformed {line_count:d} log lines from {logs_container.path:s} '
+        f'in {duration:.1f}s with {workers:d} workers')
 
     current_timestamp = datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')
     timeline_name = f'{project_id}_{current_timestamp}'
@@ -542,10 +665,72 @@ class GCPLoggingTimesketch(BaseModule):
     container = containers.File(name=timeline_name, path=output_path)
     self.StoreContainer(container)
 
-  def Process(self) -> None:
-    """Processes GCP logs containers for insertion into Timesketch."""
-    for file_container in self.GetContainers(containers.File, pop=True):
-      self._ProcessLogContainer(file_container)
+  # pytype: disable=signature-mismatch
+  def Process(self, container: containers.File) -> None:
+    """Processes a GCP logs container for insertion into Timesketch.
+
+    Args:
+      container: container containing GCPLogsCollector output file.
+    """
+    self._ProcessLogContainer(container)
+  # pytype: enable=signature-mismatch
+
+  def GetThreadOnContainerType(self) -> Type[interface.AttributeContainer]:
+    return containers.File
+
+  def GetThreadPoolSize(self) -> int:
+    return 2
+
+  def KeepThreadedContainersInState(self) -> bool:
+    return False
+
+  def StreamContainers(self) -> bool:
+    return True
+
+  def PreProcess(self) -> None:
+    pass
+
+  def PostProcess(self) -> None:
+    pass
+
+
+def _TransformChunk(
+    path: str, start: int, end: int, query: str) -> Tuple[str, str, int]:
+  """Transforms the log lines starting within a byte range of a log file.
+
+  A line belongs to the range its first byte is in, so that consecutive
+  ranges transform every line exactly once. Runs in worker processes.
+
+  Args:
+    path: path of the log file.
+    start: offset of the first byte of the range.
+    end: offset of the byte following the range.
+    query: the GCP query used to retrieve the logs.
+
+  Returns:
+    The path of a file holding the transformed lines, the first project ID
+    found in them, and the number of lines transformed.
+  """
+  project_id = ''
+  line_count = 0
+  with open(path, 'rb') as input_file, tempfile.NamedTemporaryFile(
+      mode='wb', delete=False, suffix='.jsonl') as output_file:
+    if start:
+      # Skip the line started in the previous range.
+      input_file.seek(start - 1)
+      input_file.readline()
+    while input_file.tell() < end:
+      line = input_file.readline()
+      if not line:
+        break
+      if not line.strip():
+        continue
+      record = _TransformLogRecord(_LoadJSON(line), query)
+      project_id = project_id or record.get('project_id', '')
+      output_file.write(_DumpJSON(record))
+      output_file.write(b'\n')
+      line_count += 1
+  return output_file.name, project_id, line_count
 
 
 modules_manager.ModulesManager.RegisterModule(GCPLoggingTimesketch)
@@ -1,23 +1,651 @@
 # -*- coding: utf-8 -*-
 """Processes artifacts using local grep ."""
 
-import mimetypes
+from concurrent import futures
+import gzip
+import hashlib
+import html
+import mmap
+import multiprocessing
 import os
 import re
+import stat
+import tarfile
 import tempfile
-from typing import TYPE_CHECKING, Optional, Set
+from typing import (
+    TYPE_CHECKING, BinaryIO, Iterator, List, Optional, Set, Tuple, Type)
+import zipfile
+import zlib
 
 import PyPDF2
+import PyPDF2.errors
 
 from dftimewolf.lib import module
 from dftimewolf.lib.modules import manager as modules_manager
 from dftimewolf.lib.containers import containers
 
+try:
+  import ahocorasick
+  HAS_AHOCORASICK = True
+except ImportError:
+  HAS_AHOCORASICK = False
+
 
 if TYPE_CHECKING:
   from dftimewolf.lib import state
   from dftimewolf.lib.containers import interface
 
+# Characters that make a keyword a regular expression rather than a literal.
+_REGEX_METACHARACTERS = re.compile(r'[.^$*+?{}\[\]\\()]')
+
+
+class KeywordMatcher():
+  """Finds pipe separated keywords in bytes, ignoring case.
+
+  Literal keywords are compiled once into an Aho-Corasick automaton if
+  pyahocorasick is installed, and into one regular expression otherwise.
+  Both search bytes lowercased as ASCII. Keywords that use other regular
+  expression syntax are matched as one case insensitive regular expression,
+  in which ^ and $ match at the start and end of each line. As with
+  re.findall, an expression with exactly one group reports the text of that
+  group; others report the whole match. As it matches bytes, case is only
+  ignored for ASCII letters, and classes such as \\w only match ASCII
+  characters.
+
+  Attributes:
+    overlap: number of bytes consecutive chunks of data must share, so that
+        no match across a chunk boundary is missed.
+  """
+
+  # Overlap of consecutive chunks for regular expression keywords, whose
+  # matches have no bounded length.
+  _REGEX_OVERLAP = 4096
+
+  def __init__(self, keywords: str) -> None:
+    """Compiles the keywords.
+
+    Args:
+      keywords: pipe separated keywords, or a regular expression.
+    """
+    literals = keywords.split('|')
+    self._literal = not any(
+        _REGEX_METACHARACTERS.search(keyword) for keyword in literals)
+    self._automaton = None
+    self._pattern: Optional[re.Pattern[bytes]] = None
+    self._keyword_count = 0
+    # Group of the regular expression reported for each match.
+    self._match_group = 0
+
+    if not self._literal:
+      self._pattern = re.compile(
+          keywords.encode('utf-8'), re.IGNORECASE | re.MULTILINE)
+      if self._pattern.groups == 1:
+        self._match_group = 1
+      self.overlap = self._REGEX_OVERLAP
+      return
+
+    encoded = list(dict.fromkeys(
+        keyword.lower().encode('utf-8') for keyword in literals if keyword))
+    self.overlap = max((len(keyword) for keyword in encoded), default=1) - 1
+    self._keyword_count = len(encoded)
+    if not encoded:
+      return
+    if HAS_AHOCORASICK:
+      self._automaton = ahocorasick.Automaton()
+      for keyword in encoded:
+        # Bytes are decoded as latin-1, which maps each byte to one character.
+        self._automaton.add_word(
+            keyword.decode('latin-1'), keyword.decode('utf-8'))
+      self._automaton.make_automaton()
+    else:
+      self._pattern = re.compile(
+          b'|'.join(re.escape(keyword) for keyword in encoded))
+
+  def _MatchText(self, match: re.Match[bytes]) -> str:
+    """Returns the reported text of a regular expression match."""
+    text = match.group(self._match_group) or b''
+    return text.decode('utf-8', 'replace').lower()
+
+  def Search(self, data: bytes, start: int = 0) -> Set[str]:
+    """Searches bytes for the keywords.
+
+    Args:
+      data: the bytes to search.
+      start: offset in data at which to start searching. The bytes before it
+          are only context, e.g. for ^ to tell whether start is at the
+          start of a line.
+
+    Returns:
+      The lowercase keywords, or matches of the regular expression, found.
+    """
+    if self._literal:
+      data = data[start:].lower()
+      if self._automaton is not None:
+        return {
+            keyword
+            for _, keyword in self._automaton.iter(data.decode('latin-1'))}
+      start = 0
+    if self._pattern is None:
+      return set()
+    return {
+        self._MatchText(match)
+        for match in self._pattern.finditer(data, start)}
+
+  def SearchPrefix(
+      self, data: bytes, start: int = 0) -> Tuple[Set[str], int]:
+    """Searches bytes that more bytes follow for the keywords.
+
+    Matches of a regular expression are only reported if they start more
+    than overlap bytes before the end of data, so that none is reported
+    truncated by the end of data. The rest of data must be searched again
+    with the bytes that follow, keeping the byte before the returned offset
+    as context.
+
+    Args:
+      data: the bytes to search.
+      start: offset in data at which to start searching. The bytes before it
+          are only context.
+
+    Returns:
+      The lowercase keywords, or matches of the regular expression, found,
+      and the offset in data from which to search again.
+    """
+    resume = max(start, len(data) - self.overlap)
+    if self._literal or self._pattern is None:
+      return self.Search(data, start), resume
+
+    matches = set()
+    for match in self._pattern.finditer(data, start):
+      if match.start() >= len(data) - self.overlap:
+        break
+      matches.add(self._MatchText(match))
+      # Parts of a reported match are not searched again.
+      resume = max(resume, match.end())
+    return matches, resume
+
+  def FoundAll(self, matches: Set[str]) -> bool:
+    """Checks whether matches contain every keyword.
+
+    Args:
+      matches: the matches found so far.
+
+    Returns:
+      True if every literal keyword was found. Always False for regular
+      expressions, whose matches are not known in advance.
+    """
+    return bool(self._keyword_count) and len(matches) >= self._keyword_count
+
+  def SearchText(self, text: str) -> Set[str]:
+    """Searches text for the keywords.
+
+    Args:
+      text: the text to search.
+
+    Returns:
+      The lowercase keywords, or matches of the regular expression, found.
+    """
+    return self.Search(text.encode('utf-8'))
+
+
+# Bytes read from files and archive members at once.
+_CHUNK_SIZE = 16 * 1024 * 1024
+# Maximum nesting of archives that are extracted, e.g. a zip in a tar.
+_MAX_EXTRACTION_DEPTH = 3
+# Version of the extracted text cache, bumped when extractors change.
+_CACHE_VERSION = 1
+# Maximum total size of the extracted text cache. The least recently used
+# text is evicted past it.
+_MAX_CACHE_SIZE = 1024 * 1024 * 1024
+# Maximum size of an archive member copied to be extracted, and of the text
+# extracted from a file, so that archive bombs are searched as bytes.
+_MAX_MEMBER_SIZE = 1024 * 1024 * 1024
+_MAX_EXTRACTED_SIZE = 4 * 1024 * 1024 * 1024
+
+
+class _ExtractionLimitError(Exception):
+  """Raised when extracting a file exceeds a size limit."""
+
+
+def _ReadChunks(file_object: BinaryIO) -> Iterator[bytes]:
+  """Yields the contents of a file object, one chunk at a time."""
+  while True:
+    chunk = file_object.read(_CHUNK_SIZE)
+    if not chunk:
+      return
+    yield chunk
+
+
+class TextExtractor():
+  """Extracts searchable text from files of a container format.
+
+  Extractors are registered with RegisterExtractor and selected by file name.
+  Text is yielded incrementally, one page or archive member at a time, so
+  that the search can stop once every keyword was found.
+  """
+
+  NAME = ''
+  # Lowercase file name suffixes of the format.
+  SUFFIXES: Tuple[str, ...] = ()
+
+  @classmethod
+  def Supports(cls, name: str) -> bool:
+    """Checks whether the extractor handles a file, based on its name."""
+    return name.lower().endswith(cls.SUFFIXES)
+
+  def Extract(self,
+              file_object: BinaryIO,
+              name: str,
+              depth: int) -> Iterator[bytes]:
+    """Yields the text of a file.
+
+    Args:
+      file_object: the file contents.
+      name: the file name or path.
+      depth: number of archives the file is nested in.
+
+    Yields:
+      Consecutive pieces of the text.
+    """
+    raise NotImplementedError
+
+
+_EXTRACTORS: List[Type[TextExtractor]] = []
+
+
+def RegisterExtractor(extractor_class: Type[TextExtractor]) -> None:
+  """Registers a text extractor. Earlier registrations take precedence."""
+  _EXTRACTORS.append(extractor_class)
+
+
+def GetExtractor(name: str) -> Optional[Type[TextExtractor]]:
+  """Returns the extractor of a file, or None to search its bytes."""
+  for extractor_class in _EXTRACTORS:
+    if extractor_class.Supports(name):
+      return extractor_class
+  return None
+
+
+def _ExtractMember(
+    file_object: BinaryIO, name: str, depth: int) -> Iterator[bytes]:
+  """Yields the text of an archive member, extracting nested formats.
+
+  Args:
+    file_object: the member contents.
+    name: the member name.
+    depth: number of archives the member is nested in.
+
+  Yields:
+    Consecutive pieces of the text.
+
+  Raises:
+    _ExtractionLimitError: if the member is larger than _MAX_MEMBER_SIZE
+        bytes and of a format that is extracted.
+  """
+  extractor_class = GetExtractor(name)
+  if not extractor_class or depth >= _MAX_EXTRACTION_DEPTH:
+    yield from _ReadChunks(file_object)
+    return
+  # Some formats need to seek, which archive members cannot always do, so
+  # members are copied to a temporary file, kept in memory while small.
+  with tempfile.SpooledTemporaryFile(max_size=_CHUNK_SIZE) as member_copy:
+    size = 0
+    for chunk in _ReadChunks(file_object):
+      size += len(chunk)
+      if size > _MAX_MEMBER_SIZE:
+        raise _ExtractionLimitError(
+            f'{name} is larger than {_MAX_MEMBER_SIZE:d} bytes')
+      member_copy.write(chunk)
+    member_copy.seek(0)
+    yield from extractor_class().Extract(
+        member_copy, name, depth)  # type: ignore[arg-type]
+
+
+class PDFExtractor(TextExtractor):
+  """Extracts the text of PDF documents, one page at a time."""
+
+  NAME = 'pdf'
+  SUFFIXES = ('.pdf',)
+
+  def Extract(self,
+              file_object: BinaryIO,
+              name: str,
+              depth: int) -> Iterator[bytes]:
+    """Yields the text of each page."""
+    pdf_reader = PyPDF2.PdfFileReader(file_object)
+    for page in range(pdf_reader.numPages):
+      yield ('\n' + pdf_reader.getPage(page).extractText()).encode('utf-8')
+
+
+class TarExtractor(TextExtractor):
+  """Extracts the members of tar archives, compressed or not."""
+
+  NAME = 'tar'
+  SUFFIXES = (
+      '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+  def Extract(self,
+              file_object: BinaryIO,
+              name: str,
+              depth: int) -> Iterator[bytes]:
+    """Yields the text of each regular file member."""
+    with tarfile.open(fileobj=file_object, mode='r|*') as tar_file:
+      for member in tar_file:
+        member_file = tar_file.extractfile(member) if member.isfile() else None
+        if member_file:
+          yield from _ExtractMember(member_file, member.name, depth + 1)
+
+
+class GzipExtractor(TextExtractor):
+  """Extracts the contents of gzip compressed files."""
+
+  NAME = 'gzip'
+  SUFFIXES = ('.gz',)
+
+  def Extract(self,
+              file_object: BinaryIO,
+              name: str,
+              depth: int) -> Iterator[bytes]:
+    """Yields the decompressed contents."""
+    with gzip.GzipFile(fileobj=file_object, mode='rb') as gzip_file:
+      yield from _ExtractMember(gzip_file, name[:-3], depth + 1)
+
+
+class OfficeXMLExtractor(TextExtractor):
+  """Extracts the text of Office Open XML documents, one part at a time."""
+
+  NAME = 'office_xml'
+  SUFFIXES = ('.docx', '.xlsx', '.pptx')
+
+  # Parts that hold the text of documents, spreadsheets and presentations.
+  _TEXT_PART_RE = re.compile(
+      r'^(word/(document|header\d*|footer\d*|footnotes|comments)|'
+      r'xl/(sharedStrings|worksheets/sheet\d+)|'
+      r'ppt/(slides/slide\d+|notesSlides/notesSlide\d+))\.xml$')
+  # Words are often split across runs of text, so only the ends of
+  # paragraphs, cells and tabs separate text.
+  _BREAK_RE = re.compile(rb'</(w:p|a:p|si|c)>|<w:(tab|br|cr)\b[^>]*>')
+  _TAG_RE = re.compile(rb'<[^>]*>')
+
+  def Extract(self,
+              file_object: BinaryIO,
+              name: str,
+              depth: int) -> Iterator[bytes]:
+    """Yields the text of each part, without XML markup."""
+    with zipfile.ZipFile(file_object) as zip_file:
+      for part_name in sorted(zip_file.namelist()):
+        if self._TEXT_PART_RE.match(part_name):
+          text = self._TAG_RE.sub(
+              b'', self._BREAK_RE.sub(b'\n', zip_file.read(part_name)))
+          yield html.unescape(text.decode('utf-8', 'replace')).encode('utf-8')
+
+
+class ZipExtractor(TextExtractor):
+  """Extracts the members of zip archives."""
+
+  NAME = 'zip'
+  SUFFIXES = ('.zip',)
+
+  def Extract(self,
+              file_object: BinaryIO,
+              name: str,
+              depth: int) -> Iterator[bytes]:
+    """Yields the text of each file member."""
+    with zipfile.ZipFile(file_object) as zip_file:
+      for info in zip_file.infolist():
+        if not info.is_dir():
+          with zip_file.open(info) as member_file:
+            yield from _ExtractMember(member_file, info.filename, depth + 1)
+
+
+RegisterExtractor(PDFExtractor)
+RegisterExtractor(TarExtractor)
+RegisterExtractor(GzipExtractor)
+RegisterExtractor(OfficeXMLExtractor)
+RegisterExtractor(ZipExtractor)
+
+# Errors of malformed, encrypted or too large files, whose bytes are then
+# searched as is. zipfile raises RuntimeError for encrypted members, and
+# PyPDF2 raises KeyError and TypeError for some malformed documents.
+_EXTRACTION_ERRORS = (
+    EOFError, ValueError, zlib.error, tarfile.TarError, zipfile.BadZipFile,
+    gzip.BadGzipFile, PyPDF2.errors.PyPdfError, NotImplementedError,
+    RuntimeError, KeyError, TypeError, _ExtractionLimitError)
+
+
+def _LimitExtracted(pieces: Iterator[bytes]) -> Iterator[bytes]:
+  """Yields pieces of extracted text, up to _MAX_EXTRACTED_SIZE bytes.
+
+  Args:
+    pieces: the extracted text.
+
+  Yields:
+    The pieces of the text.
+
+  Raises:
+    _ExtractionLimitError: if the text is larger than _MAX_EXTRACTED_SIZE
+        bytes.
+  """
+  size = 0
+  for piece in pieces:
+    size += len(piece)
+    if size > _MAX_EXTRACTED_SIZE:
+      raise _ExtractionLimitError(
+          f'Extracted text is larger than {_MAX_EXTRACTED_SIZE:d} bytes')
+    yield piece
+
+
+def _SearchPieces(
+    pieces: Iterator[bytes],
+    matcher: KeywordMatcher,
+    cache_file: Optional[BinaryIO] = None) -> Tuple[Set[str], bool]:
+  """Searches consecutive pieces of data, until every keyword was found.
+
+  Each piece is searched together with the bytes of the previous ones that
+  matcher.SearchPrefix did not search to completion, at most matcher.overlap
+  bytes, so that no match across pieces is missed or reported truncated.
+  The byte before those is kept as context, so that ^ does not match in the
+  middle of a line where pieces join.
+
+  Args:
+    pieces: the data to search.
+    matcher: the keywords to search for.
+    cache_file: file that the searched pieces are written to.
+
+  Returns:
+    The unique matches, and whether every piece was searched.
+  """
+  matches: Set[str] = set()
+  tail = b''
+  start = 0
+  for piece in pieces:
+    if cache_file:
+      cache_file.write(piece)
+    data = tail + piece
+    found, resume = matcher.SearchPrefix(data, start)
+    matches.update(found)
+    if matcher.FoundAll(matches):
+      return matches, False
+    start = min(resume, 1)
+    tail = data[resume - start:]
+  matches.update(matcher.Search(tail, start))
+  return matches, True
+
+
+def _SearchMapped(path: str, matcher: KeywordMatcher) -> Set[str]:
+  """Searches the bytes of a regular file, memory mapped.
+
+  Args:
+    path: path of the file.
+    matcher: the keywords to search for.
+
+  Returns:
+    The unique matches. Files that are not regular files have none.
+  """
+  with open(path, 'rb') as file_object:
+    file_stat = os.fstat(file_object.fileno())
+    if not stat.S_ISREG(file_stat.st_mode) or not file_stat.st_size:
+      return set()
+    with mmap.mmap(
+        file_object.fileno(), 0, access=mmap.ACCESS_READ) as data:
+      matches, _ = _SearchPieces(
+          (data[start:start + _CHUNK_SIZE]
+           for start in range(0, file_stat.st_size, _CHUNK_SIZE)),
+          matcher)
+  return matches
+
+
+def _HashFile(path: str) -> str:
+  """Returns the SHA-256 digest of a file's contents, in hexadecimal."""
+  digest = hashlib.sha256()
+  with open(path, 'rb') as file_object:
+    for chunk in iter(lambda: file_object.read(1024 * 1024), b''):
+      digest.update(chunk)
+  return digest.hexdigest()
+
+
+def _TrimCache(cache_dir: str) -> None:
+  """Evicts the least recently used text from the cache, past its size limit.
+
+  Args:
+    cache_dir: directory of the extracted text cache.
+  """
+  entries = []
+  with os.scandir(cache_dir) as directory:
+    for entry in directory:
+      if not entry.name.endswith('.txt'):
+        continue
+      try:
+        entry_stat = entry.stat()
+      except OSError:
+        continue
+      entries.append((entry_stat.st_mtime, entry_stat.st_size, entry.path))
+
+  size = 0
+  for _, entry_size, entry_path in sorted(entries, reverse=True):
+    size += entry_size
+    if size > _MAX_CACHE_SIZE:
+      try:
+        os.remove(entry_path)
+      except OSError:
+        # Another process evicted it already.
+        pass
+
+
+def _SearchExtracted(path: str,
+                     extractor_class: Type[TextExtractor],
+                     matcher: KeywordMatcher,
+                     cache_dir: Optional[str]) -> Set[str]:
+  """Searches the extracted text of a file, through the extracted text cache.
+
+  The cache holds the text of each file extracted to its end, keyed by the
+  hash of the file's contents, up to _MAX_CACHE_SIZE bytes. Extractions that
+  stop early, once every keyword was found, are not cached.
+
+  Args:
+    path: path of the file.
+    extractor_class: the extractor of the file's format.
+    matcher: the keywords to search for.
+    cache_dir: directory of the extracted text cache, None to not cache.
+
+  Returns:
+    The unique matches.
+  """
+  if not cache_dir:
+    with open(path, 'rb') as file_object:
+      matches, _ = _SearchPieces(
+          _LimitExtracted(extractor_class().Extract(file_object, path, 0)),
+          matcher)
+    return matches
+
+  cache_path = os.path.join(
+      cache_dir,
+      f'{extractor_class.NAME}-{_CACHE_VERSION:d}-{_HashFile(path)}.txt')
+  try:
+    # Marks the text as recently used.
+    os.utime(cache_path)
+    return _SearchMapped(cache_path, matcher)
+  except FileNotFoundError:
+    pass
+
+  os.makedirs(cache_dir, exist_ok=True)
+  complete = False
+  with tempfile.NamedTemporaryFile(
+      'wb', dir=cache_dir, suffix='.tmp', delete=False) as cache_file:
+    try:
+      with open(path, 'rb') as file_object:
+        matches, complete = _SearchPieces(
+            _LimitExtracted(extractor_class().Extract(file_object, path, 0)),
+            matcher, cache_file)
+    finally:
+      cache_file.close()
+      if complete:
+        os.replace(cache_file.name, cache_path)
+      else:
+        os.remove(cache_file.name)
+  if complete:
+    _TrimCache(cache_dir)
+  return matches
+
+
+def SearchPDF(path: str, matcher: KeywordMatcher) -> Set[str]:
+  """Searches the text of a PDF file for keywords.
+
+  Args:
+    path: PDF file path.
+    matcher: the keywords to search for.
+
+  Returns:
+    The unique matches.
+  """
+  return _SearchExtracted(path, PDFExtractor, matcher, None)
+
+
+def SearchFile(path: str,
+               matcher: KeywordMatcher,
+               cache_dir: Optional[str] = None) -> Set[str]:
+  """Searches a file for keywords.
+
+  Files of a format with a registered extractor are searched through their
+  extracted text. Other files, and files that cannot be extracted or whose
+  extraction exceeds the size limits, are searched as memory mapped bytes,
+  one chunk at a time, so their encoding does not matter.
+
+  Args:
+    path: path of the file.
+    matcher: the keywords to search for.
+    cache_dir: directory of the extracted text cache, None to not cache.
+
+  Returns:
+    The unique matches. Files that are not regular files have none.
+  """
+  extractor_class = GetExtractor(os.path.basename(path))
+  if extractor_class and os.path.isfile(path):
+    try:
+      return _SearchExtracted(path, extractor_class, matcher, cache_dir)
+    except _EXTRACTION_ERRORS:
+      pass
+  return _SearchMapped(path, matcher)
+
+
+# Keywords and cache directory of the worker process, set once by
+# _InitSearchWorker.
+_worker_matcher: Optional[KeywordMatcher] = None
+_worker_cache_dir: Optional[str] = None
+
+
+def _InitSearchWorker(keywords: str, cache_dir: Optional[str]) -> None:
+  """Compiles the keywords in a worker process."""
+  global _worker_matcher, _worker_cache_dir  # pylint: disable=global-statement
+  _worker_matcher = KeywordMatcher(keywords)
+  _worker_cache_dir = cache_dir
+
+
+def _SearchFileInWorker(path: str) -> Set[str]:
+  """Searches a file for the keywords of the worker process."""
+  assert _worker_matcher is not None
+  return SearchFile(path, _worker_matcher, _worker_cache_dir)
+
+
 class GrepperSearch(module.BaseModule):
   """Processes a list of file paths with to search for
   specific keywords.
@@ -26,8 +654,14 @@ class GrepperSearch(module.BaseModule):
   output: filepath and keyword match, to stdout (final_output).
   """
 
+  # Files are searched in a process pool if their total size is at least
+  # this many bytes.
+  _MIN_PARALLEL_SIZE = 64 * 1024 * 1024
+
   # For pytype
+  _cache_dir: Optional[str]
   _keywords: str
+  _matcher: KeywordMatcher
   _output_path: str
 
   def __init__(self,
@@ -38,14 +672,75 @@ class GrepperSearch(module.BaseModule):
     super(GrepperSearch, self).__init__(state, name=name, critical=critical)
     self._final_output = ''  # type: str
 
-  def SetUp(self, keywords: str) -> None:  # pylint: disable=arguments-differ
+  def SetUp(self,  # pylint: disable=arguments-differ
+            keywords: str,
+            cache_dir: Optional[str] = None) -> None:
     """Sets up the _keywords attribute.
 
     Args:
       keywords (str): pipe separated keywords to search
+      cache_dir (Optional[str]): directory to cache the text extracted from
+          PDFs, archives and Office documents in, across runs. Extracted text
+          is not cached if not set.
     """
     self._keywords = keywords
+    self._matcher = KeywordMatcher(keywords)
     self._output_path = tempfile.mkdtemp()
+    self._cache_dir = cache_dir or None
+
+  def _ListFiles(self, path: str) -> Tuple[List[str], int]:
+    """Lists the files under a directory, in a deterministic order.
+
+    Args:
+      path: the directory.
+
+    Returns:
+      The absolute paths of the files, and their total size in bytes.
+    """
+    file_paths = []
+    total_size = 0
+    for root, directories, files in os.walk(path):
+      directories.sort()
+      for filename in sorted(files):
+        fullpath = '{0:s}/{1:s}'.format(os.path.abspath(root), filename)
+        file_paths.append(fullpath)
+        try:
+          total_size += os.path.getsize(fullpath)
+        except OSError:
+          pass
+    return file_paths, total_size
+
+  def _SearchFiles(
+      self,
+      file_paths: List[str],
+      total_size: int) -> Iterator[Tuple[str, Set[str]]]:
+    """Searches files for the keywords, in a process pool if worthwhile.
+
+    Args:
+      file_paths: the files to search.
+      total_size: total size of the files in bytes.
+
+    Yields:
+      Each file path and its matches, in the order of file_paths.
+    """
+    workers = min(len(file_paths), os.cpu_count() or 1)
+    if workers < 2 or total_size < self._MIN_PARALLEL_SIZE:
+      for file_path in file_paths:
+        yield file_path, SearchFile(file_path, self._matcher, self._cache_dir)
+      return
+
+    self.logger.debug(
+        f'Searching {len(file_paths):d} files in {workers:d} processes')
+    # Processes are spawned rather than forked, as forking a process that
+    # runs other threads can deadlock the child.
+    with futures.ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_InitSearchWorker,
+        initargs=(self._keywords, self._cache_dir)) as executor:
+      chunksize = max(1, min(256, len(file_paths) // (workers * 8)))
+      yield from zip(file_paths, executor.map(
+          _SearchFileInWorker, file_paths, chunksize=chunksize))
 
   def Process(self) -> None:
     """Executes grep on the module input."""
@@ -58,25 +753,17 @@ class GrepperSearch(module.BaseModule):
         "Walking through dir (absolute) = {0:s}".format(os.path.abspath(path))
       )
       try:
-        for root, _, files in os.walk(path):
-          for filename in sorted(files):
-            found = set()
-            fullpath = '{0:s}/{1:s}'.format(os.path.abspath(root), filename)
-            if mimetypes.guess_type(filename)[0] == 'application/pdf':
-              found = self.GrepPDF(fullpath)
+        file_paths, total_size = self._ListFiles(path)
+        for fullpath, found in self._SearchFiles(file_paths, total_size):
+          if [item for item in found if item]:
+            output = '{0:s}/{1:s}:{2:s}'.format(
+                path, os.path.basename(fullpath),
+                ','.join(filter(None, sorted(found))))
+            if self._final_output:
+              self._final_output += '\n' + output
             else:
-              with open(fullpath, 'r') as fp:
-                for line in fp:
-                  found.update(set(x.lower() for x in re.findall(
-                      self._keywords, line, re.IGNORECASE)))
-            if [item for item in found if item]:
-              output = '{0:s}/{1:s}:{2:s}'.format(path, filename, ','.join(
-                  filter(None, sorted(found))))
-              if self._final_output:
-                self._final_output += '\n' + output
-              else:
-                self._final_output = output
-              self.logger.debug(output)
+              self._final_output = output
+            self.logger.debug(output)
       except OSError as exception:
         self.ModuleError(str(exception), critical=True)
       # Catch all remaining errors since we want to gracefully report them
@@ -90,17 +777,7 @@ class GrepperSearch(module.BaseModule):
     Returns:
       set[str]: unique occurrences of every match.
     """
-    with open(path, 'rb') as pdf_file_obj:
-      matches = set()
-      text = ''
-      pdf_reader = PyPDF2.PdfFileReader(pdf_file_obj)
-      pages = pdf_reader.numPages
-      for page in range(pages):
-        page_obj = pdf_reader.getPage(page)
-        text += '\n' + page_obj.extractText()
-      matches.update(set(x.lower() for x in re.findall(
-          self._keywords, text, re.IGNORECASE)))
-    return matches
+    return SearchPDF(path, self._matcher)
 
 
 modules_manager.ModulesManager.RegisterModule(GrepperSearch)
@@ -1,13 +1,19 @@
 """Processes artifacts using a local plaso process."""
+from concurrent import futures
+import dataclasses
 import os
+import sqlite3
 import subprocess
 import tempfile
+import time
 import uuid
 from typing import Optional
+from typing import Tuple
 from typing import Union
 from typing import List
 import docker
 
+from dftimewolf.lib import errors
 from dftimewolf.lib import module
 from dftimewolf.lib.containers import containers
 from dftimewolf.lib.modules import manager as modules_manager
@@ -16,13 +22,57 @@ from dftimewolf.lib.state import DFTimewolfState
 DOCKER_IMAGE = 'log2timeline/plaso:latest'
 
 
+@dataclasses.dataclass
+class PlasoJob:
+  """A log2timeline run over one container.
+
+  Attributes:
+    container: the File or Directory container to process.
+    workers: number of log2timeline worker processes.
+    storage_file_path: path of the resulting Plaso storage file.
+    wall_time: duration of the run, in seconds.
+    event_count: number of events in the storage file, None if unknown.
+  """
+  container: Union[containers.File, containers.Directory]
+  workers: int
+  storage_file_path: str = ''
+  wall_time: float = 0.0
+  event_count: Optional[int] = None
+
+
+def _CountEvents(storage_file_path: str) -> Optional[int]:
+  """Counts the events in a Plaso SQLite storage file.
+
+  Args:
+    storage_file_path: path of the storage file.
+
+  Returns:
+    The number of events, or None if the file cannot be read.
+  """
+  try:
+    connection = sqlite3.connect(f'file:{storage_file_path}?mode=ro', uri=True)
+    try:
+      return int(connection.execute('SELECT COUNT(*) FROM event').fetchone()[0])
+    finally:
+      connection.close()
+  except sqlite3.Error:
+    return None
+
+
 class LocalPlasoProcessor(module.BaseModule):
   """Processes a list of file paths with Plaso (log2timeline).
 
   input: A list of file paths to process.
   output: The path to the resulting Plaso storage file.
+
+  Containers are processed by concurrent log2timeline runs, which share the
+  CPU budget through their number of workers. Each storage file is stored as
+  a container as soon as its run finishes.
   """
 
+  # Fewest workers given to each log2timeline run, when several run at once.
+  _MIN_WORKERS_PER_JOB = 4
+
   def __init__(
       self,
       state: DFTimewolfState,
@@ -34,6 +84,8 @@ class LocalPlasoProcessor(module.BaseModule):
     self._output_path = str()
     self._plaso_path = str()
     self._use_docker = False
+    self._cpu_budget = 1
+    self._max_jobs = None  # type: Optional[int]
 
   def _DeterminePlasoPath(self) -> bool:
     """Checks if log2timeline is somewhere in the user's PATH."""
@@ -91,14 +143,24 @@ class LocalPlasoProcessor(module.BaseModule):
           ' Check log file for details.')
       self.ModuleError(message, critical=True)
 
-  def SetUp(self, timezone: Optional[str], use_docker: bool) -> None:  # pylint: disable=arguments-differ
+  def SetUp(self,  # pylint: disable=arguments-differ
+            timezone: Optional[str],
+            use_docker: bool,
+            cpu_budget: Optional[int] = None,
+            max_jobs: Optional[int] = None) -> None:
     """Sets up the local time zone with Plaso (log2timeline) should use.
 
     Args:
       timezone: name of the local time zone.
       use_docker: Whether to force usage of the Docker plaso image or not.
+      cpu_budget: number of CPUs shared by all log2timeline runs. Defaults to
+          the number of CPUs of the host.
+      max_jobs: maximum number of concurrent log2timeline runs. Defaults to
+          as many as the CPU budget allows.
     """
     self._timezone = timezone
+    self._cpu_budget = max(1, cpu_budget or os.cpu_count() or 1)
+    self._max_jobs = max_jobs
     self._output_path = tempfile.mkdtemp()
     if use_docker:
       if not self._CheckDockerImage():
@@ -114,14 +176,16 @@ class LocalPlasoProcessor(module.BaseModule):
           f'  "apt install plaso-tools" or "docker pull {DOCKER_IMAGE}"',
           critical=True)
 
-  def _processContainer(
-      self, container: Union[containers.File, containers.Directory]) -> None:
+  def _processContainer(self, job: PlasoJob) -> PlasoJob:
     """ Processes a given container either File or Directory
 
     Args:
-      container: Container to be processed.
+      job: the run over the container to be processed.
+
+    Returns:
+      The job, with its storage file path and statistics.
     """
-    description = container.name
+    container = job.container
     path = container.path
     if self._use_docker:
       plaso_output_dir = '/data/output'
@@ -130,7 +194,10 @@ class LocalPlasoProcessor(module.BaseModule):
       plaso_output_dir = self._output_path
       plaso_input_dir = container.path
 
-    log_file_path = os.path.join(plaso_output_dir, 'plaso.log')
+    # Generate a new storage and log file for each plaso run, since runs
+    # share the output directory.
+    plaso_output_name = uuid.uuid4().hex
+    log_file_path = os.path.join(plaso_output_dir, f'{plaso_output_name}.log')
 
     # Build the plaso command line.
     if self._use_docker:
@@ -141,6 +208,7 @@ class LocalPlasoProcessor(module.BaseModule):
     # Since we might be running alongside another Module, always disable
     # the status view.
     cmd.extend(['-q', '--status_view', 'none'])
+    cmd.extend(['--workers', str(job.workers)])
     if self._timezone:
       cmd.extend(['-z', self._timezone])
 
@@ -151,8 +219,7 @@ class LocalPlasoProcessor(module.BaseModule):
     cmd.extend(['--logfile', log_file_path])
 
     # And now, the crux of the command.
-    # Generate a new storage file for each plaso run
-    plaso_output_file = f'{uuid.uuid4().hex}.plaso'.format()
+    plaso_output_file = f'{plaso_output_name}.plaso'
     plaso_output_path = os.path.join(plaso_output_dir, plaso_output_file)
     cmd.extend(['--storage-file', plaso_output_path, plaso_input_dir])
 
@@ -163,14 +230,55 @@ class LocalPlasoProcessor(module.BaseModule):
     # Run the l2t command
     full_cmd = ' '.join(cmd)
     self.logger.info(f'Running external command: "{full_cmd}"')
+    start = time.perf_counter()
     if self._use_docker:
       self.logger.info(f"Running Docker image {DOCKER_IMAGE}")
       self._DockerPlasoRun(path, full_cmd, plaso_input_dir, plaso_output_dir)
     else:
       self._LocalPlasoRun(cmd)
 
-    new_container = containers.File(description, plaso_storage_file_path)
-    self.StoreContainer(new_container)
+    job.wall_time = time.perf_counter() - start
+    job.storage_file_path = plaso_storage_file_path
+    job.event_count = _CountEvents(plaso_storage_file_path)
+    return job
+
+  def _PlanJobs(
+      self,
+      items: List[Union[containers.File, containers.Directory]]
+  ) -> Tuple[List[PlasoJob], int]:
+    """Divides the CPU budget between concurrent log2timeline runs.
+
+    Args:
+      items: containers to process.
+
+    Returns:
+      One job per container, and the number of jobs to run at once.
+    """
+    concurrent_jobs = max(1, min(
+        len(items),
+        self._max_jobs or len(items),
+        self._cpu_budget // self._MIN_WORKERS_PER_JOB))
+    workers = max(1, self._cpu_budget // concurrent_jobs)
+    return (
+        [PlasoJob(container=item, workers=workers) for item in items],
+        concurrent_jobs)
+
+  def _ReportJob(self, job: PlasoJob) -> None:
+    """Logs the duration and event rate of a finished job."""
+    message = (
+        f'Processed {job.container.path} in {job.wall_time:.1f}s '
+        f'with {job.workers:d} workers')
+    telemetry = {
+        'workers': str(job.workers),
+        'wall_time': f'{job.wall_time:.3f}'}
+    if job.event_count is not None:
+      events_per_second = job.event_count / max(job.wall_time, 1e-6)
+      message += (
+          f': {job.event_count:d} events, {events_per_second:.0f} events/s')
+      telemetry['event_count'] = str(job.event_count)
+      telemetry['events_per_second'] = f'{events_per_second:.1f}'
+    self.logger.info(message)
+    self.LogTelemetry(telemetry)
 
   def Process(self) -> None:
     """Executes log2timeline.py on the module input."""
@@ -184,8 +292,28 @@ class LocalPlasoProcessor(module.BaseModule):
                                                         pop=True):
       combined_list.append(directory_container)
 
-    for item in combined_list:
-      self._processContainer(item)
+    if not combined_list:
+      return
+
+    jobs, concurrent_jobs = self._PlanJobs(combined_list)
+    self.logger.info(
+        f'Processing {len(jobs):d} containers, {concurrent_jobs:d} at a time '
+        f'with {jobs[0].workers:d} workers each')
+    with futures.ThreadPoolExecutor(max_workers=concurrent_jobs) as executor:
+      job_futures = [
+          executor.submit(self._processContainer, job) for job in jobs]
+      try:
+        for done, job_future in enumerate(
+            futures.as_completed(job_futures), start=1):
+          job = job_future.result()
+          self._ReportJob(job)
+          self.StoreContainer(
+              containers.File(job.container.name, job.storage_file_path))
+          self.ProgressUpdate(done, len(jobs))
+      except errors.DFTimewolfError:
+        for job_future in job_futures:
+          job_future.cancel()
+        raise
 
 
 modules_manager.ModulesManager.RegisterModule(LocalPlasoProcessor)
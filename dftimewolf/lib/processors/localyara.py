@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+"""Scans local files with Yara rules."""
+
+from concurrent import futures
+import hashlib
+import mmap
+import multiprocessing
+import os
+import stat
+import tempfile
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from dftimewolf.lib import module
+from dftimewolf.lib import utils
+from dftimewolf.lib.containers import containers
+from dftimewolf.lib.modules import manager as modules_manager
+
+try:
+  import yara
+  HAS_YARA = True
+except ImportError:
+  HAS_YARA = False
+
+
+if TYPE_CHECKING:
+  from dftimewolf.lib import state
+
+
+# Rule names and string identifiers of each rule that matched a file, or the
+# error that prevented scanning it.
+ScanResult = Tuple[List[Tuple[str, List[str]]], Optional[str]]
+
+# Maximum duration of the scan of one file, in seconds.
+_SCAN_TIMEOUT = 300
+
+
+def _StringIdentifiers(match: Any) -> List[str]:
+  """Returns the sorted identifiers of the strings of a Yara match.
+
+  yara-python 4.3 and later report strings as objects, earlier versions as
+  (offset, identifier, data) tuples.
+  """
+  return sorted(set(
+      getattr(string_match, 'identifier', None) or string_match[1]
+      for string_match in match.strings))
+
+
+def ScanFile(path: str, rules: Any) -> ScanResult:
+  """Scans a file with compiled Yara rules.
+
+  The file is memory mapped rather than read, so that large files are not
+  copied into memory.
+
+  Args:
+    path: path of the file.
+    rules: compiled Yara rules.
+
+  Returns:
+    The matching rules, and None or the error that prevented scanning the
+    file. Files that are not regular files, or are empty, have no matches.
+  """
+  try:
+    with open(path, 'rb') as file_object:
+      file_stat = os.fstat(file_object.fileno())
+      if not stat.S_ISREG(file_stat.st_mode) or not file_stat.st_size:
+        return [], None
+      with mmap.mmap(
+          file_object.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        matches = rules.match(data=data, timeout=_SCAN_TIMEOUT)
+  except (OSError, ValueError, yara.Error) as exception:
+    return [], str(exception)
+  return [(match.rule, _StringIdentifiers(match)) for match in matches], None
+
+
+# Compiled rules of the worker process, loaded once by _InitScanWorker.
+_worker_rules: Any = None
+
+
+def _InitScanWorker(rules_path: str) -> None:
+  """Loads the compiled rules in a worker process."""
+  global _worker_rules  # pylint: disable=global-statement
+  _worker_rules = yara.load(rules_path)
+
+
+def _ScanFileInWorker(path: str) -> ScanResult:
+  """Scans a file with the rules of the worker process."""
+  return ScanFile(path, _worker_rules)
+
+
+class LocalYaraScanner(module.BaseModule):
+  """Scans local files and directories with Yara rules.
+
+  All Yara rules are compiled once into one ruleset, which is cached on disk
+  keyed by the hash of the rules. If the cache cannot be written, the ruleset
+  is saved to a temporary file for the duration of the scan.
+
+  input: YaraRule containers, and File or Directory containers to scan.
+  output: A DataFrame container of the Yara hits, in the same columns as the
+      hits of GRRYaraScanner. The process column holds the path of the file
+      that matched; columns about GRR clients and processes are empty.
+  """
+
+  # Files are scanned in a process pool if their total size is at least
+  # this many bytes.
+  _MIN_PARALLEL_SIZE = 64 * 1024 * 1024
+
+  # For pytype
+  _cache_dir: str
+
+  def __init__(self,
+               state: "state.DFTimewolfState",
+               name: Optional[str]=None,
+               critical: bool=False) -> None:
+    super(LocalYaraScanner, self).__init__(
+        state, name=name, critical=critical)
+    self.rule_count = 0
+    self._temporary_rules_paths: List[str] = []
+
+  def SetUp(self,  # pylint: disable=arguments-differ
+            cache_dir: Optional[str] = None) -> None:
+    """Sets up the Yara scanner.
+
+    Args:
+      cache_dir: directory of the cache of compiled rulesets. Defaults to
+          dftimewolf/yara in $XDG_CACHE_HOME or ~/.cache.
+    """
+    if not HAS_YARA:
+      self.ModuleError(
+          'yara-python is not installed. To fix: \n'
+          '  "pip install yara-python"', critical=True)
+    if not cache_dir:
+      cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(
+          os.path.expanduser('~'), '.cache')
+      cache_dir = os.path.join(cache_home, 'dftimewolf', 'yara')
+    self._cache_dir = cache_dir
+
+  def _CompileRules(self, rule_text: str) -> Tuple[Any, str]:
+    """Compiles a ruleset, or loads it from the cache.
+
+    Args:
+      rule_text: the text of the ruleset.
+
+    Returns:
+      The compiled rules, and the path of their file in the cache.
+    """
+    digest = hashlib.sha256(
+        f'{yara.__version__}\n{rule_text}'.encode('utf-8')).hexdigest()
+    rules_path = os.path.join(self._cache_dir, f'{digest}.yarc')
+    if os.path.exists(rules_path):
+      try:
+        rules = yara.load(rules_path)
+        self.logger.debug(f'Loaded compiled Yara rules from {rules_path}')
+        return rules, rules_path
+      except yara.Error as exception:
+        self.logger.warning(
+            f'Compiling Yara rules again, {rules_path} is unreadable: '
+            f'{exception!s}')
+
+    try:
+      rules = yara.compile(source=rule_text)
+    except yara.SyntaxError as exception:
+      self.ModuleError(
+          f'Could not compile Yara rules: {exception!s}', critical=True)
+
+    temporary_path = None
+    try:
+      os.makedirs(self._cache_dir, exist_ok=True)
+      temporary_path = self._SaveRules(rules, self._cache_dir)
+      os.replace(temporary_path, rules_path)
+      return rules, rules_path
+    except (OSError, yara.Error) as exception:
+      self.logger.warning(
+          f'Unable to cache compiled Yara rules in {self._cache_dir}: '
+          f'{exception!s}')
+      if temporary_path and os.path.exists(temporary_path):
+        os.remove(temporary_path)
+
+    # Worker processes load the rules from a file, so they are saved to a
+    # temporary file instead, removed once the scan is done.
+    try:
+      rules_path = self._SaveRules(rules, None)
+    except (OSError, yara.Error) as exception:
+      self.ModuleError(
+          f'Unable to save compiled Yara rules: {exception!s}', critical=True)
+    self._temporary_rules_paths.append(rules_path)
+    return rules, rules_path
+
+  def _SaveRules(self, rules: Any, directory: Optional[str]) -> str:
+    """Saves compiled rules to a new temporary file.
+
+    Args:
+      rules: the compiled rules.
+      directory: directory of the file, None for the default temporary
+          directory.
+
+    Returns:
+      The path of the file.
+
+    Raises:
+      OSError: if the file could not be written.
+      yara.Error: if the rules could not be saved.
+    """
+    with tempfile.NamedTemporaryFile(
+        dir=directory, suffix='.tmp', delete=False) as rules_file:
+      path = rules_file.name
+    try:
+      rules.save(path)
+    except (OSError, yara.Error):
+      os.remove(path)
+      raise
+    return path
+
+  def _ListFiles(self, paths: List[str]) -> Tuple[List[str], int]:
+    """Lists the files at or under paths, in a deterministic order.
+
+    Args:
+      paths: paths of files and directories.
+
+    Returns:
+      The absolute paths of the files, and their total size in bytes.
+    """
+    file_paths = []
+    for path in paths:
+      if os.path.isfile(path):
+        file_paths.append(os.path.abspath(path))
+        continue
+      for root, directories, files in os.walk(path):
+        directories.sort()
+        file_paths.extend(
+            os.path.join(os.path.abspath(root), filename)
+            for filename in sorted(files))
+
+    total_size = 0
+    for file_path in file_paths:
+      try:
+        total_size += os.path.getsize(file_path)
+      except OSError:
+        pass
+    return file_paths, total_size
+
+  def _ScanFiles(self,
+                 file_paths: List[str],
+                 total_size: int,
+                 rules: Any,
+                 rules_path: str) -> Iterator[Tuple[str, ScanResult]]:
+    """Scans files with the rules, in a process pool if worthwhile.
+
+    Args:
+      file_paths: the files to scan.
+      total_size: total size of the files in bytes.
+      rules: the compiled rules.
+      rules_path: path of the compiled rules, loaded by worker processes.
+
+    Yields:
+      Each file path and its scan result, in the order of file_paths.
+    """
+    workers = min(len(file_paths), os.cpu_count() or 1)
+    if workers < 2 or total_size < self._MIN_PARALLEL_SIZE:
+      for file_path in file_paths:
+        yield file_path, ScanFile(file_path, rules)
+      return
+
+    self.logger.debug(
+        f'Scanning {len(file_paths):d} files in {workers:d} processes')
+    # Processes are spawned rather than forked, as forking a process that
+    # runs other threads can deadlock the child.
+    with futures.ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_InitScanWorker,
+        initargs=(rules_path,)) as executor:
+      chunksize = max(1, min(256, len(file_paths) // (workers * 8)))
+      yield from zip(file_paths, executor.map(
+          _ScanFileInWorker, file_paths, chunksize=chunksize))
+
+  def Process(self) -> None:
+    """Scans the input files with the input Yara rules."""
+    yara_containers = self.GetContainers(containers.YaraRule)
+    if not yara_containers:
+      self.logger.warning('No Yara rules found.')
+      return
+
+    paths = [
+        container.path for container in
+        list(self.GetContainers(containers.File)) +
+        list(self.GetContainers(containers.Directory))]
+    if not paths:
+      self.logger.warning('No files or directories to scan.')
+      return
+
+    rules, rules_path = self._CompileRules(utils.BuildYaraRuleset(
+        container.rule_text for container in yara_containers))
+    self.rule_count = len(yara_containers)
+    file_paths, total_size = self._ListFiles(paths)
+    self.logger.info(
+        f'Scanning {len(file_paths):d} files ({total_size:d} bytes) with '
+        f'{self.rule_count:d} Yara rules')
+
+    entries: List[Dict[str, Any]] = []
+    try:
+      for file_path, (hits, error) in self._ScanFiles(
+          file_paths, total_size, rules, rules_path):
+        if error:
+          self.logger.warning(f'Could not scan {file_path}: {error}')
+        for rule_name, string_matches in hits:
+          entries.append({
+              'grr_client': None,
+              'grr_fqdn': None,
+              'pid': None,
+              'username': None,
+              'rule_name': rule_name,
+              'string_matches': string_matches,
+              'cmdline': None,
+              'process': file_path,
+              'cwd': None,
+          })
+    finally:
+      while self._temporary_rules_paths:
+        os.remove(self._temporary_rules_paths.pop())
+
+    if not entries:
+      self.logger.info('No Yara hits on local files')
+      return
+
+    self.logger.info(
+        f'Found {len(entries):d} Yara hits in '
+        f'{len({entry["process"] for entry in entries}):d} files')
+    self.StoreContainer(containers.DataFrame(
+        data_frame=pd.DataFrame(entries),
+        description='List of local files with Yara hits.',
+        name='Yara matches on local files',
+        source='LocalYaraScanner'))
+
+
+modules_manager.ModulesManager.RegisterModule(LocalYaraScanner)
@@ -8,6 +8,7 @@ from openrelik_api_client import api_client, folders, workflows
 
 from dftimewolf.lib import module
 from dftimewolf.lib import state as state_lib
+from dftimewolf.lib import uploads
 from dftimewolf.lib.containers import containers, interface
 from dftimewolf.lib.modules import manager as modules_manager
 
@@ -40,6 +41,7 @@ class OpenRelikProcessor(module.ThreadAwareModule):
     self.template_workflow_id: int | None = None
     self.folder_id: int | None = None
     self.incident_id: str | None = None
+    self.evidence_uploader = uploads.EvidenceUploader()
 
   # pylint: disable=arguments-differ
   def SetUp(
@@ -58,6 +60,9 @@ class OpenRelikProcessor(module.ThreadAwareModule):
       self.openrelik_api, self.openrelik_api_key
     )
     self.openrelik_folder_client = folders.FoldersAPI(self.openrelik_api_client)
+    self.evidence_uploader = uploads.EvidenceUploader.GetShared(
+      self.state, self.openrelik_api
+    )
     self.openrelik_workflow_client = workflows.WorkflowsAPI(
       self.openrelik_api_client
     )
@@ -138,9 +143,17 @@ class OpenRelikProcessor(module.ThreadAwareModule):
   ) -> None:  # pytype: disable=signature-mismatch
     file_ids = []
     self.logger.info(f"Uploading file {container.path}")
-    file_id = self.openrelik_api_client.upload_file(
-      container.path, self.folder_id
+    transport = uploads.ResumableChunkTransport(
+      self.openrelik_api_client.session,
+      f"{self.openrelik_api_client.base_url}/files/upload",
+      {"folder_id": self.folder_id},
     )
+    try:
+      file_id = self.evidence_uploader.Upload(
+        container.path, transport, self.logger
+      )
+    except uploads.UploadError as exception:
+      self.ModuleError(str(exception), critical=True)
     if file_id:
       self.logger.info(f"Uploaded file {container.path}")
       file_ids.append(file_id)
@@ -1,15 +1,22 @@
 """Base class for turbinia interactions."""
 
+import dataclasses
+import functools
 import getpass
+import io
 import json
 import os
+import queue
+import random
 import tarfile
 import tempfile
+import threading
 import time
 import traceback
 import math
 
-from typing import Dict, List, Optional, Tuple, Any, Union, Iterator
+from typing import (
+    Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Set, Tuple, Union)
 from pathlib import Path
 
 from google_auth_oauthlib import flow
@@ -26,11 +33,337 @@ from turbinia_api_lib.api_response import ApiResponse
 
 from dftimewolf.lib.logging_utils import WolfLogger
 from dftimewolf.lib import module
+from dftimewolf.lib import uploads
 # pylint: disable=unused-import
 from dftimewolf.lib import state as state_lib
 
 WAITING_STATES = frozenset(['pending', 'running'])
 
+
+@dataclasses.dataclass
+class _TaskOutput:
+  """Extracted output of a Turbinia task.
+
+  Attributes:
+    pending_paths: saved paths not handed out yet.
+    local_paths: local paths of the extracted files, by saved path. None
+        until the output is downloaded.
+    lock: serializes the download of the task output.
+  """
+  pending_paths: Set[str]
+  local_paths: Optional[Dict[str, str]] = None
+  lock: threading.Lock = dataclasses.field(default_factory=threading.Lock)
+
+
+class TurbiniaTaskOutputCache:
+  """Downloads the output of the tasks of a Turbinia request once per task.
+
+  TurbiniaWait yields each interesting saved path of a task separately. The
+  first path requested for a task downloads the task output archive and
+  extracts all of the task's interesting paths. The task is evicted once all
+  of them were handed out.
+  """
+
+  def __init__(self) -> None:
+    """Initializes a task output cache."""
+    self._lock = threading.Lock()
+    self._tasks: Dict[str, _TaskOutput] = {}
+
+  def Get(self,
+          task_id: str,
+          path: str,
+          task_paths: List[str],
+          download: Callable[[List[str]], Dict[str, str]]) -> Optional[str]:
+    """Returns the local path of a saved path of a task.
+
+    Args:
+      task_id: Turbinia task identifier.
+      path: the saved path to return.
+      task_paths: all the saved paths of the task that will be requested.
+      download: downloads the task output and extracts the given saved
+          paths, returning their local paths.
+
+    Returns:
+      The local path of the extracted file, None if it is not in the task
+      output.
+    """
+    with self._lock:
+      task_output = self._tasks.get(task_id)
+      if not task_output:
+        task_output = _TaskOutput(pending_paths=set(task_paths) | {path})
+        self._tasks[task_id] = task_output
+
+    with task_output.lock:
+      if task_output.local_paths is None:
+        task_output.local_paths = download(sorted(task_output.pending_paths))
+      local_path = task_output.local_paths.get(path)
+      task_output.pending_paths.discard(path)
+      if not task_output.pending_paths:
+        with self._lock:
+          self._tasks.pop(task_id, None)
+    return local_path
+
+class _RequestWatch:
+  """A Turbinia request watched by a TurbiniaRequestWatcher.
+
+  Attributes:
+    request_id: Turbinia request identifier.
+    fetch: returns the decoded status of the request.
+    path_filter: returns the saved paths of a task to hand out.
+    logger: logger of the module waiting on the request.
+    events: (task, path) pairs handed out to the waiting module, then None
+        once the request is done, or the exception that stopped polling.
+    seen_paths: saved paths already handed out.
+    task_versions: last_update of every task, as of the last poll.
+    retries: number of API errors so far.
+    interval: time until the next poll, before jitter, in seconds.
+    next_poll: monotonic time of the next poll.
+  """
+
+  def __init__(self,
+               request_id: str,
+               fetch: Callable[[], Dict[str, Any]],
+               path_filter: Callable[[Dict[str, Any]], List[str]],
+               logger: WolfLogger) -> None:
+    self.request_id = request_id
+    self.fetch = fetch
+    self.path_filter = path_filter
+    self.logger = logger
+    self.events: 'queue.Queue[Union[None, Exception, Tuple[Dict[str, Any], str]]]' = queue.Queue()  # pylint: disable=line-too-long
+    self.seen_paths: Set[str] = set()
+    self.task_versions: Dict[str, Any] = {}
+    self.retries = 0
+    self.interval = 0.0
+    self.next_poll = time.monotonic()
+
+
+class TurbiniaRequestWatcher:
+  """Polls Turbinia requests for all Turbinia modules, from a single thread.
+
+  Each request is polled immediately, then at intervals starting at
+  _MIN_INTERVAL_SEC that reset when tasks of the request change, and grow by
+  _BACKOFF_FACTOR up to _MAX_INTERVAL_SEC otherwise. Tasks whose last_update
+  did not change since the previous poll are skipped, and new saved paths are
+  handed to the waiting module as soon as they are seen. The polling thread
+  exits when no requests are watched, and is restarted on demand.
+  """
+
+  _MIN_INTERVAL_SEC = 5.0
+  _MAX_INTERVAL_SEC = 60.0
+  _BACKOFF_FACTOR = 1.5
+  _JITTER = 0.2
+  _MAX_RETRIES = 3
+  _RETRY_INTERVAL_SEC = 3.0
+
+  _shared_lock = threading.Lock()
+
+  def __init__(self) -> None:
+    """Initializes a Turbinia request watcher."""
+    self._condition = threading.Condition()
+    self._watches: List[_RequestWatch] = []
+    self._thread: Optional[threading.Thread] = None
+
+  @classmethod
+  def GetShared(
+      cls,
+      state: 'state_lib.DFTimewolfState',
+      turbinia_api: str) -> 'TurbiniaRequestWatcher':
+    """Returns the watcher shared by modules of a recipe for a Turbinia server.
+
+    Args:
+      state: The recipe state, whose cache holds the watcher.
+      turbinia_api: URL of the Turbinia API server.
+
+    Returns:
+      The shared watcher.
+    """
+    name = f'turbinia_request_watcher_{turbinia_api}'
+    with cls._shared_lock:
+      watcher = state.GetFromCache(name)
+      if not watcher:
+        watcher = cls()
+        state.AddToCache(name, watcher)
+    return watcher  # type: ignore[no-any-return]
+
+  def Watch(self,
+            request_id: str,
+            fetch: Callable[[], Dict[str, Any]],
+            path_filter: Callable[[Dict[str, Any]], List[str]],
+            logger: WolfLogger) -> _RequestWatch:
+    """Starts watching a request.
+
+    Args:
+      request_id: Turbinia request identifier.
+      fetch: returns the decoded status of the request.
+      path_filter: returns the saved paths of a task to hand out.
+      logger: logger of the module waiting on the request.
+
+    Returns:
+      The watch, whose events queue receives the new saved paths.
+    """
+    watch = _RequestWatch(request_id, fetch, path_filter, logger)
+    with self._condition:
+      self._watches.append(watch)
+      if not self._thread:
+        self._thread = threading.Thread(
+            target=self._Run, name='TurbiniaRequestWatcher', daemon=True)
+        self._thread.start()
+      self._condition.notify()
+    return watch
+
+  def Unwatch(self, watch: _RequestWatch) -> None:
+    """Stops watching a request, if it is still watched.
+
+    Args:
+      watch: the watch returned by Watch.
+    """
+    with self._condition:
+      if watch in self._watches:
+        self._watches.remove(watch)
+
+  def _Run(self) -> None:
+    """Polls requests as they become due, until none are watched."""
+    while True:
+      with self._condition:
+        while True:
+          if not self._watches:
+            self._thread = None
+            return
+          now = time.monotonic()
+          due = [w for w in self._watches if w.next_poll <= now]
+          if due:
+            break
+          self._condition.wait(
+              min(w.next_poll for w in self._watches) - now)
+
+      for watch in due:
+        if self._Poll(watch):
+          self.Unwatch(watch)
+
+  def _Poll(self, watch: _RequestWatch) -> bool:
+    """Polls a request and hands out its new saved paths.
+
+    Args:
+      watch: The request to poll.
+
+    Returns:
+      True if the request no longer needs to be watched.
+    """
+    try:
+      request_data = watch.fetch()
+    except (turbinia_api_lib.exceptions.ApiException,
+        turbinia_api_lib.exceptions.UnauthorizedException) as exception:
+      watch.retries += 1
+      if watch.retries >= self._MAX_RETRIES:
+        watch.logger.warning(f'Giving up on request: {exception.body}')
+        watch.events.put(None)
+        return True
+      watch.logger.warning(
+          f'Retrying after {self._RETRY_INTERVAL_SEC:.0f} seconds: '
+          f'{exception.body}')
+      watch.next_poll = time.monotonic() + self._RETRY_INTERVAL_SEC
+      return False
+    except Exception as exception:  # pylint: disable=broad-except
+      watch.events.put(exception)
+      return True
+
+    status = request_data.get('status')
+    failed_tasks = request_data.get('failed_tasks')
+    successful_tasks = request_data.get('successful_tasks')
+    task_count = request_data.get('task_count')
+    progress = math.ceil(
+        ((failed_tasks + successful_tasks) / task_count) * 100
+    ) if task_count else 0
+    watch.logger.info(
+      f"Turbinia request {watch.request_id} is {status}. Progress: {progress}%"
+    )
+
+    changed = False
+    for task in request_data.get('tasks', []):
+      task_id = task.get('id')
+      version = task.get('last_update')
+      if version is not None and watch.task_versions.get(task_id) == version:
+        continue
+      watch.task_versions[task_id] = version
+      changed = True
+      for path in watch.path_filter(task):
+        if path not in watch.seen_paths:
+          watch.seen_paths.add(path)
+          watch.events.put((task, path))
+
+    if status not in WAITING_STATES:
+      watch.events.put(None)
+      return True
+
+    if changed:
+      watch.interval = self._MIN_INTERVAL_SEC
+    else:
+      watch.interval = min(
+          max(watch.interval * self._BACKOFF_FACTOR, self._MIN_INTERVAL_SEC),
+          self._MAX_INTERVAL_SEC)
+    jitter = random.uniform(1 - self._JITTER, 1 + self._JITTER)
+    watch.next_poll = time.monotonic() + watch.interval * jitter
+    return False
+
+
+class TurbiniaEvidenceTransport(uploads.UploadTransport):
+  """Uploads evidence files to the Turbinia API server.
+
+  The evidence API takes whole files, so uploads are not resumable, but they
+  still share the concurrency limit and deduplication of the uploader.
+  """
+
+  RETRY_EXCEPTIONS = (
+      uploads.UploadError, OSError, turbinia_api_lib.exceptions.ApiException)
+
+  def __init__(self,
+               evidence_api: turbinia_evidence_api.TurbiniaEvidenceApi,
+               turbinia_api: str,
+               incident_id: str) -> None:
+    """Initializes a Turbinia evidence transport.
+
+    Args:
+      evidence_api: Turbinia evidence API instance.
+      turbinia_api: URL of the Turbinia API server.
+      incident_id: The incident ID the evidence is uploaded for.
+    """
+    self._evidence_api = evidence_api
+    self._turbinia_api = turbinia_api
+    self._incident_id = incident_id
+
+  def Destination(self) -> str:
+    """Returns the Turbinia API server and incident ID."""
+    return f'{self._turbinia_api}#{self._incident_id}'
+
+  def Upload(self,
+             path: str,
+             sha256: str,
+             resume_state: Dict[str, Any],
+             checkpoint: Callable[[], None]) -> Any:
+    """Uploads a file.
+
+    Returns:
+      The path of the evidence on the Turbinia server.
+
+    Raises:
+      UploadError: if the server response is not usable.
+    """
+    api_response = self._evidence_api.upload_evidence_with_http_info(
+        [path], self._incident_id)
+    if not api_response:
+      raise uploads.UploadError(f'Error uploading file {path}')
+    try:
+      response = json.loads(str(api_response.raw_data))
+    except json.JSONDecodeError as exception:
+      raise uploads.UploadError(
+          f'Error decoding API response: {exception}') from exception
+    if not response:
+      raise uploads.UploadError(
+          'Did not receive a response from the API server.')
+    # The API supports multiple file upload, but we're only sending one.
+    return response[0]
+
+
 # mypy: disable-error-code="attr-defined"
 # pylint: disable=abstract-method,no-member
 class TurbiniaProcessorBase(module.BaseModule):
@@ -109,6 +442,12 @@ class TurbiniaProcessorBase(module.BaseModule):
     self.turbinia_region = None
     self.turbinia_zone = str()
     self.turbinia_api = str()
+    self._task_output_caches: Dict[str, TurbiniaTaskOutputCache] = {}
+    # Guards refreshing the API client and swapping the API instances, which
+    # the request watcher thread does too.
+    self._client_lock = threading.Lock()
+    self.request_watcher = TurbiniaRequestWatcher()
+    self.evidence_uploader = uploads.EvidenceUploader()
     os.environ['GRPC_POLL_STRATEGY'] = 'poll'
 
   def _decode_api_response(self, data: Any) -> Any:
@@ -135,25 +474,48 @@ class TurbiniaProcessorBase(module.BaseModule):
         return True
     return False
 
-  def _FilterTarMembers(self, tgzfile: tarfile.TarFile,
-                        path_to_collect: str) -> List[tarfile.TarInfo]:
-    """Filters a TarFile object for a specific path.
+  def _GetInterestingPaths(self, task: Dict[str, Any]) -> List[str]:
+    """Returns the saved paths of a task that the processor collects.
 
-    Pre-condition: tgzfile must be a valid TarFile object.
+    Args:
+      task: Turbinia task data.
+
+    Returns:
+      The saved paths that are interesting and under the Turbinia server
+      output path.
+    """
+    return [
+        path for path in task.get('saved_paths') or []
+        if self._isInterestingPath(path) and path.startswith(self.output_path)]
+
+  def _ExtractTarStream(
+      self, fileobj: BinaryIO, paths: List[str]) -> Dict[str, str]:
+    """Extracts saved paths from a Turbinia task output archive in one pass.
+
+    The archive is read as a stream, which stops as soon as all paths are
+    extracted.
 
     Args:
-      tgzfile: A TarFile object of a Turbinia task output file.
-      path_to_collect: A saved path from a Turbinia task.
+      fileobj: the task output archive (tgz).
+      paths: saved paths from the task.
 
     Returns:
-      A list of TarInfo objects.
+      Local paths of the extracted files, by saved path. Paths missing from
+      the archive are left out.
     """
-    members = []
-    names = tgzfile.getnames()
-    path_to_collect = path_to_collect.lstrip('/')
-    if path_to_collect in names:
-      members.append(tgzfile.getmember(path_to_collect))
-    return members
+    wanted = {path.lstrip('/'): path for path in paths}
+    local_paths: Dict[str, str] = {}
+    tempdir = tempfile.mkdtemp()
+    with tarfile.open(fileobj=fileobj, mode='r|*') as tgzfile:
+      for member in tgzfile:
+        path = wanted.get(member.name)
+        if path is None or not member.isfile():
+          continue
+        tgzfile.extract(member, path=tempdir)
+        local_paths[path] = os.path.join(tempdir, member.name)
+        if len(local_paths) == len(wanted):
+          break
+    return local_paths
 
   def _ExtractFiles(self, tgz_path: str, path_to_collect: str) -> str:
     """Extracts files which appear in a Turbinia task's saved_paths attribute
@@ -169,18 +531,13 @@ class TurbiniaProcessorBase(module.BaseModule):
     Returns:
       A local path to the extracted file.
     """
-    local_path = ''
     if not os.path.exists(tgz_path):
       self.logger.error(f'File not found {tgz_path}')
-      return local_path
+      return ''
 
-    tempdir = tempfile.mkdtemp()
-    with tarfile.open(tgz_path) as file:
-      members = self._FilterTarMembers(file, path_to_collect)
-      file.extractall(path=tempdir, members=members)
-
-    local_path = os.path.join(tempdir, path_to_collect.lstrip('/'))
-    return local_path
+    with open(tgz_path, 'rb') as tgz_file:
+      local_paths = self._ExtractTarStream(tgz_file, [path_to_collect])
+    return local_paths.get(path_to_collect, '')
 
   def UploadEvidence(self, file_path: Path) -> Optional[str]:
     """Uploads files to Turbinia via the API server.
@@ -195,29 +552,21 @@ class TurbiniaProcessorBase(module.BaseModule):
     turbinia_evidence_path: str = ''
     if not file_path.exists():
       self.ModuleError(f'File {path_str} not found.', critical=True)
-    if self.RefreshClientCredentials():
-      self.evidence_api_instance = turbinia_evidence_api.TurbiniaEvidenceApi(
-          self.client)
+    with self._client_lock:
+      if self.RefreshClientCredentials():
+        self.evidence_api_instance = turbinia_evidence_api.TurbiniaEvidenceApi(
+            self.client)
     self.logger.info(
         f'Uploading evidence at {path_str} for incident {self.incident_id}'
     )
     self.logger.info(f'Incident ID: {self.incident_id}')
-    api_response = self.evidence_api_instance.upload_evidence_with_http_info(
-        [path_str], self.incident_id
-    )
-    if not api_response:
-      self.ModuleError(f'Error uploading file {path_str}', critical=True)
-    data: str = str(api_response.raw_data)
+    transport = TurbiniaEvidenceTransport(
+        self.evidence_api_instance, self.turbinia_api, self.incident_id)
     try:
-      response = json.loads(data)
-    except json.JSONDecodeError as exception:
-      self.logger.error(f'Error decoding API response: {exception}')
+      file = self.evidence_uploader.Upload(path_str, transport, self.logger)
+    except uploads.UploadError as exception:
+      self.logger.error(str(exception))
       return turbinia_evidence_path
-    if not response:
-      self.logger.error('Did not receive a response from the API server.')
-      return turbinia_evidence_path
-    # The API supports multiple file upload, but we're only sending one.
-    file = response[0]
     turbinia_evidence_path = file.get('file_path')
     self.logger.info(
         f'Uploaded {file.get("original_name")} to {turbinia_evidence_path}'
@@ -228,6 +577,9 @@ class TurbiniaProcessorBase(module.BaseModule):
                            path: str) -> Optional[str]:
     """Downloads task output data from the Turbinia API server.
 
+    While the task's request is being waited on by TurbiniaWait, the task
+    output is downloaded once for all of its interesting saved paths.
+
     Args:
       task_data: Response from a /api/request/{request_id} API call.
       path: A saved path from a Turbinia task.
@@ -236,49 +588,90 @@ class TurbiniaProcessorBase(module.BaseModule):
       A local path to Turbinia task output files or None if files
         could not be downloaded.
     """
-    result = None
-    if self.RefreshClientCredentials():
-      self.results_api_instance = (
-          turbinia_request_results_api.TurbiniaRequestResultsApi(self.client))
-    task_id = task_data.get('id')
-    filename = f'{task_id}-'
-    retries = 0
+    task_id = str(task_data.get('id'))
+    cache = self._task_output_caches.get(str(task_data.get('request_id')))
+    if not cache:
+      return self._DownloadTaskOutput(task_id, [path]).get(path)
+    return cache.Get(
+        task_id, path, self._GetInterestingPaths(task_data),
+        functools.partial(self._DownloadTaskOutput, task_id))
+
+  def _StreamTaskOutput(self, task_id: str, paths: List[str]) -> Dict[str, str]:
+    """Downloads a task output archive and extracts saved paths from it.
+
+    Args:
+      task_id: Turbinia task identifier.
+      paths: saved paths from the task.
+
+    Returns:
+      Local paths of the extracted files, by saved path.
+
+    Raises:
+      turbinia_api_lib.exceptions.ApiException: if the download failed.
+    """
     # pylint: disable=line-too-long
+    download = getattr(
+        self.results_api_instance,
+        'get_task_output_without_preload_content', None)
+    if not download:
+      # Older API clients only return the whole archive, in memory.
+      api_response = self.results_api_instance.get_task_output_with_http_info(
+          task_id,  _preload_content=False, _request_timeout=self.HTTP_TIMEOUT)  # type: ignore
+      if not api_response or not api_response.raw_data:
+        raise turbinia_api_lib.exceptions.ApiException(reason='Empty response')
+      return self._ExtractTarStream(io.BytesIO(api_response.raw_data), paths)
+
+    response = download(task_id, _request_timeout=self.HTTP_TIMEOUT)
+    try:
+      if response.status >= 400:
+        raise turbinia_api_lib.exceptions.ApiException(
+            status=response.status, reason=response.reason)
+      return self._ExtractTarStream(response, paths)
+    finally:
+      # Extraction stops once the saved paths are found, so the archive may
+      # not be read to its end. Closing the connection avoids downloading
+      # the rest of it, and never returns a partly read one to the pool.
+      response.close()
+
+  def _DownloadTaskOutput(
+      self, task_id: str, paths: List[str]) -> Dict[str, str]:
+    """Downloads the output of a task, retrying on API errors.
+
+    Args:
+      task_id: Turbinia task identifier.
+      paths: saved paths from the task.
+
+    Returns:
+      Local paths of the extracted files, by saved path.
+    """
+    with self._client_lock:
+      if self.RefreshClientCredentials():
+        self.results_api_instance = (
+            turbinia_request_results_api.TurbiniaRequestResultsApi(
+                self.client))
+    retries = 0
     self.logger.debug(f"Downloading output for task {task_id}")
     while retries < 3:
       try:
-        api_response = self.results_api_instance.get_task_output_with_http_info(
-            task_id,  _preload_content=False, _request_timeout=self.HTTP_TIMEOUT)  # type: ignore
-
-        # Read the response and write to the file.
-        if api_response and api_response.raw_data:
-          # Create a temporary file to write the response to.
-          file = tempfile.NamedTemporaryFile(
-              mode='wb', prefix=f'{filename}', suffix='.tgz', delete=False)
-          local_path = file.name
-          self.logger.debug(f'Saving output for task {task_id} to {local_path}')
-          file.write(api_response.raw_data)
-          file.close()
-
-          # Extract the files from the tgz file.
-          extracted_path = self._ExtractFiles(local_path, path)
-          if os.path.exists(extracted_path):
-            result = extracted_path
-            self.logger.info(f"Extracted output of task {task_id} to {result}")
-          return result
+        local_paths = self._StreamTaskOutput(task_id, paths)
+        for local_path in local_paths.values():
+          self.logger.info(
+              f"Extracted output of task {task_id} to {local_path}")
+        return local_paths
       except (turbinia_api_lib.exceptions.ApiException,
           turbinia_api_lib.exceptions.UnauthorizedException) as exception:
         retries += 1
         trace = traceback.format_exc()
         self.logger.warning(f'Retrying after 3 seconds: {exception}{trace}')
         time.sleep(3)
-      except OSError as exception:
-        self.ModuleError(f'Unable to write to file: {exception}', critical=True)
-
-    if not result:
-      self.ModuleError(f'Unable to download data for task {task_id}', critical=True)
+      except (OSError, tarfile.TarError) as exception:
+        self.ModuleError(
+            f'Unable to extract output of task {task_id}: {exception}',
+            critical=True)
 
-    return result
+    self.ModuleError(
+        f'Unable to download data for task {task_id}', critical=True)
+    return {}
 
   def GetCredentials(self, credentials_path: str,
                      client_secrets_path: str) -> Optional[Credentials]:
@@ -404,6 +797,10 @@ class TurbiniaProcessorBase(module.BaseModule):
     self.client_config = turbinia_api_lib.configuration.Configuration(
       host=self.turbinia_api)
     self.client = self.InitializeTurbiniaApiClient(self.credentials)
+    self.request_watcher = TurbiniaRequestWatcher.GetShared(
+        self.state, turbinia_api)
+    self.evidence_uploader = uploads.EvidenceUploader.GetShared(
+        self.state, turbinia_api)
     self.requests_api_instance = turbinia_requests_api.TurbiniaRequestsApi(
         self.client)
     self.results_api_instance = (
@@ -479,10 +876,11 @@ class TurbiniaProcessorBase(module.BaseModule):
     # Send the request to the API server.
     try:
       # Refresh token if needed
-      if self.RefreshClientCredentials():
-        self.requests_api_instance = (
-            turbinia_requests_api.TurbiniaRequestsApi(self.client)
-        )
+      with self._client_lock:
+        if self.RefreshClientCredentials():
+          self.requests_api_instance = (
+              turbinia_requests_api.TurbiniaRequestsApi(self.client)
+          )
       api_response = self.requests_api_instance.create_request_with_http_info(
         request) # type: ignore
       decoded_response = self._decode_api_response(api_response)
@@ -509,17 +907,35 @@ class TurbiniaProcessorBase(module.BaseModule):
 
     return request_id
 
+  def _GetRequestStatus(self, request_id: str) -> Dict[str, Any]:
+    """Returns the decoded status of a Turbinia request.
+
+    Args:
+      request_id: Request identifier for the Turbinia Job.
+    """
+    # Refresh token if needed. This runs on the request watcher thread, so
+    # the client is refreshed under the lock shared with the module's thread.
+    with self._client_lock:
+      if self.RefreshClientCredentials():
+        self.requests_api_instance = (
+            turbinia_requests_api.TurbiniaRequestsApi(self.client)
+        )
+    request_data = (
+      self.requests_api_instance.get_request_status_with_http_info(
+        request_id))
+    return self._decode_api_response(request_data)  # type: ignore[no-any-return]
+
   def TurbiniaWait(self,
                    request_id: str) -> Iterator[Tuple[Dict[str, Any], str]]:
     """This method waits until a Turbinia request finishes processing.
 
-    On each iteration, it checks the status of the request and yields each task
-    data and a path that has not been processed in prior iterations. A path
-    is only considered if it is not already processed, if it is interesting
-    (i.e., not a log file or a temporary file), and if its path starts with the
-    Turbinia server configured output path.
+    The request is polled by the request watcher shared by Turbinia modules.
+    This method yields each task data and a path that has not been processed
+    yet, as soon as the watcher sees it. A path is only considered if it is
+    interesting (i.e., not a log file or a temporary file), and if its path
+    starts with the Turbinia server configured output path.
 
-    The method retries 3 times if there is an API exception.
+    Polling stops after 3 API exceptions.
 
     Args:
         request_id: Request identifier for the Turbinia Job.
@@ -527,67 +943,42 @@ class TurbiniaProcessorBase(module.BaseModule):
     Yields:
         A tuple containing the Turbinia task data and the path that has not been
           processed yet.
-    """
 
-    interval = 30
-    retries = 0
-    processed_paths = set()
-    status = 'running'
-    wait_status = ['running', 'pending']
+    Raises:
+        Exception: any unexpected error raised while polling the request.
+    """
     if not request_id:
       self.ModuleError('No request ID provided', critical=True)
 
-    while status in wait_status and retries < 3:
-      time.sleep(interval)
-      try:
-        # Refresh token if needed
-        if self.RefreshClientCredentials():
-          self.requests_api_instance = (
-              turbinia_requests_api.TurbiniaRequestsApi(self.client)
-          )
-        request_data = (
-          self.requests_api_instance.get_request_status_with_http_info(
-            request_id))
-        request_data = self._decode_api_response(request_data)
-        status = request_data.get('status')
-        failed_tasks = request_data.get('failed_tasks')
-        successful_tasks = request_data.get('successful_tasks')
-        task_count = request_data.get('task_count')
-        progress = math.ceil(
-            ((failed_tasks + successful_tasks) / task_count) * 100
-        )
-        self.logger.info(
-          f"Turbinia request {request_id} is {status}. Progress: {progress}%"
-        )
-
-        for task in request_data.get('tasks', []):
-          current_saved_paths = task.get('saved_paths', [])
-          if not current_saved_paths:
-            continue
-          for path in current_saved_paths:
-            if (
-                path not in processed_paths
-                and self._isInterestingPath(path)
-                and path.startswith(self.output_path)
-            ):
-              processed_paths.add(path)
-              yield task, path
-
-      except (turbinia_api_lib.exceptions.ApiException,
-          turbinia_api_lib.exceptions.UnauthorizedException) as exception:
-        retries += 1
-        self.logger.warning(f'Retrying after 3 seconds: {exception.body}')
-        time.sleep(3)
+    # Task outputs are cached while the caller handles the yielded paths.
+    self._task_output_caches[request_id] = TurbiniaTaskOutputCache()
+    watch = self.request_watcher.Watch(
+        request_id,
+        functools.partial(self._GetRequestStatus, request_id),
+        self._GetInterestingPaths,
+        self.logger)
+    try:
+      while True:
+        event = watch.events.get()
+        if event is None:
+          return
+        if isinstance(event, Exception):
+          raise event
+        yield event
+    finally:
+      self.request_watcher.Unwatch(watch)
+      del self._task_output_caches[request_id]
 
   def TurbiniaFinishReport(self,
                            request_id: str,
                            priority_filter: int) -> Optional[str]:
     """This method generates a report for a Turbinia request."""
     # Refresh token if needed
-    if self.RefreshClientCredentials():
-      self.requests_api_instance = turbinia_requests_api.TurbiniaRequestsApi(
-          self.client
-      )
+    with self._client_lock:
+      if self.RefreshClientCredentials():
+        self.requests_api_instance = turbinia_requests_api.TurbiniaRequestsApi(
+            self.client
+        )
     request_data = (
         self.requests_api_instance.get_request_status_with_http_info(
             request_id))
@@ -4,21 +4,50 @@
 import glob
 import io
 import json
+import logging
 import os
+import tempfile
 from io import StringIO, TextIOWrapper
-from typing import List, Union, Dict, TextIO
+from typing import Any, List, Optional, Union, Dict, TextIO
 
 from dftimewolf.lib import errors, resources
 
 
+logger = logging.getLogger('dftimewolf.recipes')
+
+
 class RecipesManager(object):
   """Recipes manager."""
 
   # Allow a previously registered recipe to be overridden.
   ALLOW_RECIPE_OVERRIDE = False
 
+  # Version of the recipe catalog format, bumped when the format changes.
+  _CATALOG_VERSION = 1
+
   _recipes = {}  # type: Dict[str, resources.Recipe]
 
+  def _ReadRecipeFromDict(self, json_dict: Dict[str, Any]) -> resources.Recipe:
+    """Reads a recipe from a decoded JSON recipe.
+
+    Args:
+      json_dict (dict[str, object]): decoded contents of a recipe file.
+
+    Returns:
+      Recipe: recipe.
+    """
+    contents = dict(json_dict)
+
+    description = contents['description']
+    del contents['description']
+
+    args = []
+    for arg_list in contents['args']:
+      args.append(resources.RecipeArgument(*arg_list))
+    del contents['args']
+
+    return resources.Recipe(description, contents, args)
+
   def _ReadRecipeFromFileObject(
       self,
       file_object: Union[StringIO, TextIOWrapper, TextIO]) -> resources.Recipe:
@@ -30,17 +59,89 @@ class RecipesManager(object):
     Returns:
       Recipe: recipe.
     """
-    json_dict = json.load(file_object)
+    return self._ReadRecipeFromDict(json.load(file_object))
 
-    description = json_dict['description']
-    del json_dict['description']
+  def _ReadJSONFile(self, path: str) -> Dict[str, Any]:
+    """Decodes a recipe JSON file.
 
-    args = []
-    for arg_list in json_dict['args']:
-      args.append(resources.RecipeArgument(*arg_list))
-    del json_dict['args']
+    Args:
+      path (str): path of the recipe JSON file.
 
-    return resources.Recipe(description, json_dict, args)
+    Returns:
+      dict[str, object]: decoded contents of the recipe file.
+
+    Raises:
+      RecipeParseError: when the recipe cannot be parsed.
+    """
+    with io.open(path, 'r', encoding='utf-8') as file_object:
+      try:
+        return dict(json.load(file_object))
+      except json.decoder.JSONDecodeError as exception:
+        raise errors.RecipeParseError(
+            'Unable to parse recipe file: {0:s} with error: {1!s}'.format(
+                path, exception))
+
+  def _ReadCatalog(
+      self, catalog_path: str, directory: str,
+      files: Dict[str, List[int]]) -> Optional[Dict[str, Dict[str, Any]]]:
+    """Reads the recipes of a directory from a recipe catalog.
+
+    Args:
+      catalog_path (str): path of the recipe catalog.
+      directory (str): absolute path of the recipes directory.
+      files (dict[str, list[int]]): modification time, in nanoseconds, and
+          size of each recipe file in the directory, by file name.
+
+    Returns:
+      dict[str, dict[str, object]]: decoded contents of each recipe file, by
+          file name, or None if the catalog is missing or out of date.
+    """
+    try:
+      with io.open(catalog_path, 'r', encoding='utf-8') as file_object:
+        catalog = json.load(file_object)
+    except (OSError, ValueError):
+      return None
+
+    if (not isinstance(catalog, dict) or
+        catalog.get('version') != self._CATALOG_VERSION or
+        catalog.get('directory') != directory or
+        catalog.get('files') != files):
+      return None
+    return dict(catalog['recipes'])
+
+  def _WriteCatalog(
+      self, catalog_path: str, directory: str, files: Dict[str, List[int]],
+      recipes: Dict[str, Dict[str, Any]]) -> None:
+    """Writes the recipes of a directory to a recipe catalog.
+
+    The catalog is replaced atomically, so that concurrent invocations never
+    read a partially written catalog. Failures to write it are only logged.
+
+    Args:
+      catalog_path (str): path of the recipe catalog.
+      directory (str): absolute path of the recipes directory.
+      files (dict[str, list[int]]): modification time, in nanoseconds, and
+          size of each recipe file in the directory, by file name.
+      recipes (dict[str, dict[str, object]]): decoded contents of each recipe
+          file, by file name.
+    """
+    catalog = {
+        'version': self._CATALOG_VERSION,
+        'directory': directory,
+        'files': files,
+        'recipes': recipes,
+    }
+    catalog_directory = os.path.dirname(os.path.abspath(catalog_path))
+    try:
+      os.makedirs(catalog_directory, exist_ok=True)
+      with tempfile.NamedTemporaryFile(
+          'w', encoding='utf-8', dir=catalog_directory, suffix='.tmp',
+          delete=False) as file_object:
+        json.dump(catalog, file_object)
+      os.replace(file_object.name, catalog_path)
+    except OSError as exception:
+      logger.debug('Unable to write recipe catalog {0:s}: {1!s}'.format(
+          catalog_path, exception))
 
   def DeregisterRecipe(self, recipe: resources.Recipe) -> None:
     """Deregisters a recipe.
@@ -76,24 +177,45 @@ class RecipesManager(object):
     Raises:
       RecipeParseError: when the recipe cannot be parsed.
     """
-    with io.open(path, 'r', encoding='utf-8') as file_object:
-      try:
-        recipe = self._ReadRecipeFromFileObject(file_object)
-      except json.decoder.JSONDecodeError as exception:
-        raise errors.RecipeParseError(
-            'Unable to parse recipe file: {0:s} with error: {1!s}'.format(
-                path, exception))
-
-    self.RegisterRecipe(recipe)
+    self.RegisterRecipe(self._ReadRecipeFromDict(self._ReadJSONFile(path)))
 
-  def ReadRecipesFromDirectory(self, path: str) -> None:
+  def ReadRecipesFromDirectory(
+      self, path: str, catalog_path: Optional[str] = None) -> None:
     """Reads recipes from a directory containing JSON files.
 
+    If a catalog path is given, the recipes are read from the catalog in a
+    single read while the modification time and size of every recipe file
+    match the catalog. Otherwise the recipe files are parsed and the catalog
+    is rebuilt.
+
     Args:
       path (str): path of the directory containing the recipes JSON files.
+      catalog_path (Optional[str]): path of the recipe catalog.
+
+    Raises:
+      RecipeParseError: when a recipe cannot be parsed.
     """
-    for file_path in glob.glob(os.path.join(path, '*.json')):
-      self.ReadRecipeFromFile(file_path)
+    if not catalog_path:
+      for file_path in glob.glob(os.path.join(path, '*.json')):
+        self.ReadRecipeFromFile(file_path)
+      return
+
+    directory = os.path.abspath(path)
+    files = {}
+    for file_path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+      stat = os.stat(file_path)
+      files[os.path.basename(file_path)] = [stat.st_mtime_ns, stat.st_size]
+
+    recipes = self._ReadCatalog(catalog_path, directory, files)
+    if recipes is None:
+      logger.debug('Rebuilding recipe catalog {0:s}'.format(catalog_path))
+      recipes = {
+          file_name: self._ReadJSONFile(os.path.join(directory, file_name))
+          for file_name in files}
+      self._WriteCatalog(catalog_path, directory, files, recipes)
+
+    for json_dict in recipes.values():
+      self.RegisterRecipe(self._ReadRecipeFromDict(json_dict))
 
   def RegisterRecipe(self, recipe: resources.Recipe) -> None:
     """Registers a recipe.
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""Dependency-aware scheduler for recipe modules."""
+
+from concurrent import futures
+import dataclasses
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from dftimewolf.lib import errors
+
+logger = logging.getLogger('dftimewolf.scheduler')
+
+
+@dataclasses.dataclass
+class ModuleTiming():
+  """Timing information for a scheduled module.
+
+  Attributes:
+    runtime_name: The runtime name of the module.
+    ready: Time at which all the module's dependencies had completed.
+    start: Time at which the module was dispatched to a worker.
+    end: Time at which the module completed.
+  """
+  runtime_name: str
+  ready: float = 0.0
+  start: float = 0.0
+  end: float = 0.0
+
+  @property
+  def duration(self) -> float:
+    """Seconds spent running the module."""
+    return self.end - self.start
+
+  @property
+  def queued(self) -> float:
+    """Seconds spent waiting for a free worker once ready."""
+    return self.start - self.ready
+
+
+class ModuleScheduler():
+  """Runs recipe modules on a bounded worker pool, in dependency order.
+
+  A module is dispatched as soon as all the modules it `wants` have completed.
+  Ready modules are dispatched in order of decreasing critical path length,
+  i.e. the total weight of the longest chain of modules depending on them, so
+  that long chains start first.
+
+  Each module occupies `weight` slots (taken from the `weight` key of its recipe
+  definition, defaulting to 1) out of `max_parallel` slots. A module heavier
+  than `max_parallel` runs on its own.
+
+  Streaming modules (see ThreadAwareModule.StreamContainers) process containers
+  while the modules they want are still running. They are dispatched as soon
+  as the first of those modules has been dispatched, and do not occupy slots,
+  so that they can always drain the streams that upstream modules block on.
+
+  Dependencies on modules that are not scheduled (e.g. preflights) are
+  considered already satisfied.
+
+  Attributes:
+    timings: Timing information for each module, keyed by runtime name.
+  """
+
+  def __init__(
+      self,
+      module_definitions: List[Dict[str, Any]],
+      max_parallel: int = 0,
+      streaming: Optional[Set[str]] = None) -> None:
+    """Initializes the scheduler.
+
+    Args:
+      module_definitions: Recipe module definitions.
+      max_parallel: Maximum number of slots used at any time. 0 means no limit.
+      streaming: Runtime names of streaming modules.
+
+    Raises:
+      errors.RecipeParseError: If the module dependencies contain a cycle.
+    """
+    self._definitions: Dict[str, Dict[str, Any]] = {}
+    for definition in module_definitions:
+      runtime_name = definition.get('runtime_name', definition['name'])
+      self._definitions[runtime_name] = definition
+    self._streaming = set(streaming or []) & set(self._definitions)
+
+    self._wants: Dict[str, List[str]] = {}
+    self._dependents: Dict[str, List[str]] = {
+        name: [] for name in self._definitions}
+    for name, definition in self._definitions.items():
+      wants = [w for w in definition.get('wants', []) if w in self._definitions]
+      self._wants[name] = wants
+      for dependency in wants:
+        self._dependents[dependency].append(name)
+
+    total_weight = sum(
+        self._GetWeight(name, 0) for name in self._definitions
+        if name not in self._streaming)
+    self._capacity = max_parallel if max_parallel > 0 else max(total_weight, 1)
+
+    self._order = self.TopologicalOrder()
+    self._priority = self._ComputePriorities()
+    self.timings: Dict[str, ModuleTiming] = {}
+    self._time_start = 0.0
+
+  def _GetWeight(
+      self, runtime_name: str, capacity: Optional[int] = None) -> int:
+    """Returns the number of slots a module occupies while running.
+
+    Args:
+      runtime_name: The runtime name of the module.
+      capacity: Upper bound for the weight, 0 for none. Defaults to the
+          scheduler capacity.
+
+    Returns:
+      The module weight.
+    """
+    if capacity is None:
+      capacity = self._capacity
+    weight = max(int(self._definitions[runtime_name].get('weight', 1)), 1)
+    if capacity:
+      weight = min(weight, capacity)
+    return weight
+
+  def TopologicalOrder(self) -> List[str]:
+    """Orders modules so that each module comes after the modules it wants.
+
+    Modules with no ordering constraint between them keep their recipe order.
+
+    Returns:
+      Module runtime names, in topological order.
+
+    Raises:
+      errors.RecipeParseError: If the module dependencies contain a cycle.
+    """
+    remaining = {name: len(wants) for name, wants in self._wants.items()}
+    ready = [name for name in self._definitions if not remaining[name]]
+    order = []
+
+    while ready:
+      name = ready.pop(0)
+      order.append(name)
+      for dependent in self._dependents[name]:
+        remaining[dependent] -= 1
+        if not remaining[dependent]:
+          ready.append(dependent)
+
+    if len(order) != len(self._definitions):
+      cycle = sorted(name for name, count in remaining.items() if count)
+      raise errors.RecipeParseError(
+          f'Recipe module dependencies contain a cycle: {", ".join(cycle)}')
+    return order
+
+  def _ComputePriorities(self) -> Dict[str, int]:
+    """Computes the critical path length from each module to the end.
+
+    Returns:
+      The sum of weights along the longest path starting at each module.
+    """
+    priority: Dict[str, int] = {}
+    for name in reversed(self._order):
+      downstream = [priority[d] for d in self._dependents[name]]
+      priority[name] = self._GetWeight(name) + max(downstream, default=0)
+    return priority
+
+  def Run(self, callback: Callable[[Dict[str, Any]], None]) -> None:
+    """Runs the callback on every module definition, in dependency order.
+
+    A module is always dispatched, even if one of its dependencies raised; the
+    callback is responsible for aborting on previous errors.
+
+    Args:
+      callback: Function called with each module definition.
+
+    Raises:
+      Exception: The first exception raised by the callback, once all modules
+          have completed.
+    """
+    remaining = {name: len(wants) for name, wants in self._wants.items()}
+    index = {name: i for i, name in enumerate(self._order)}
+    ready: List[str] = []
+    running: Dict[futures.Future[None], str] = {}
+    in_use = 0
+    first_exception: Optional[BaseException] = None
+
+    self.timings = {name: ModuleTiming(name) for name in self._definitions}
+    self._time_start = time.time()
+
+    def _MarkReady(name: str) -> None:
+      self.timings[name].ready = time.time()
+      ready.append(name)
+      ready.sort(key=lambda n: (-self._priority[n], index[n]))
+
+    for name in self._order:
+      if not remaining[name]:
+        _MarkReady(name)
+
+    max_workers = min(
+        self._capacity + len(self._streaming), max(len(self._definitions), 1))
+    with futures.ThreadPoolExecutor(
+        max_workers=max_workers,
+        thread_name_prefix='ModuleScheduler') as executor:
+      while ready or running:
+        # Dispatch in priority order, streaming modules first. The head of the
+        # queue is never skipped otherwise, so heavy modules cannot be starved
+        # by lighter ones.
+        while ready:
+          name = next((n for n in ready if n in self._streaming), ready[0])
+          weight = 0 if name in self._streaming else self._GetWeight(name)
+          if weight and running and in_use + weight > self._capacity:
+            break
+          ready.remove(name)
+          in_use += weight
+          self.timings[name].start = time.time()
+          logger.debug(f'Dispatching module {name} ({in_use}/{self._capacity} '
+                       'slots in use)')
+          running[executor.submit(callback, self._definitions[name])] = name
+
+          # Streaming modules start as soon as one of their upstream modules
+          # has, as it can block on the stream until they drain it.
+          for dependent in self._dependents[name]:
+            if dependent in self._streaming and remaining[dependent]:
+              remaining[dependent] = 0
+              _MarkReady(dependent)
+
+        done, _ = futures.wait(running, return_when=futures.FIRST_COMPLETED)
+        for future in done:
+          name = running.pop(future)
+          if name not in self._streaming:
+            in_use -= self._GetWeight(name)
+          self.timings[name].end = time.time()
+
+          exception = future.exception()
+          if exception:
+            logger.error(f'Module {name} raised an exception: {exception!s}')
+            first_exception = first_exception or exception
+
+          for dependent in self._dependents[name]:
+            if dependent not in self._streaming:
+              remaining[dependent] -= 1
+              if not remaining[dependent]:
+                _MarkReady(dependent)
+
+    if first_exception:
+      raise first_exception
+
+  def CriticalPath(self) -> List[ModuleTiming]:
+    """Returns the chain of modules that determined the total run time.
+
+    Starting from the module that completed last, walks back through the
+    dependency that completed last at each step.
+
+    Returns:
+      Module timings along the critical path, first module first.
+    """
+    if not self.timings:
+      return []
+
+    path = []
+    name: Optional[str] = max(self.timings, key=lambda n: self.timings[n].end)
+    while name:
+      path.append(self.timings[name])
+      wants = self._wants[name]
+      name = max(wants, key=lambda n: self.timings[n].end) if wants else None
+    return list(reversed(path))
+
+  def FormatCriticalPath(self) -> str:
+    """Formats the critical path timing report.
+
+    Returns:
+      A human-readable, multi-line report.
+    """
+    path = self.CriticalPath()
+    if not path:
+      return 'No modules were run.'
+
+    total = path[-1].end - self._time_start
+    lines = [f'Critical path ({total:.2f}s total, {self._capacity} slots):']
+    for timing in path:
+      lines.append(
+          f'  {timing.runtime_name}: {timing.duration:.2f}s running, '
+          f'{timing.queued:.2f}s waiting for a slot')
+    return '\n'.join(lines)
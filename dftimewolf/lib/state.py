@@ -5,16 +5,18 @@ Use it to track errors, abort on global failures, clean up after modules, etc.
 """
 
 from concurrent.futures import ThreadPoolExecutor, Future
+import functools
 import importlib
 import logging
 import time
 import threading
 import traceback
-from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Sequence, Type, Any, TypeVar, Union  # pylint: disable=line-too-long
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Sequence, Type, Any, TypeVar, Union, cast  # pylint: disable=line-too-long
 from dftimewolf.cli import curses_display_manager as cdm
 
 from dftimewolf.config import Config
 from dftimewolf.lib import errors, utils
+from dftimewolf.lib import scheduler
 from dftimewolf.lib import telemetry
 from dftimewolf.lib.containers import interface
 from dftimewolf.lib.containers import manager as container_manager
@@ -89,6 +91,31 @@ class DFTimewolfState(object):
 
     self.CheckErrors(is_global=True)
 
+  def _InvokeModulesInScheduler(self, callback: Callable[[Any], Any]) -> None:
+    """Invokes the callback function on all the modules, in dependency order.
+
+    Modules are dispatched onto a bounded worker pool once all the modules they
+    want have completed (see scheduler.ModuleScheduler). The pool size is set by
+    the max_parallel_modules command line option, 0 meaning no limit.
+
+    Args:
+      callback (function): callback function to invoke on all the modules.
+    """
+    max_parallel = int(
+        self.command_line_options.get('max_parallel_modules') or 0)
+    streaming = {
+        name for name, module in self._module_pool.items()
+        if self._IsStreamingModule(module)}
+    module_scheduler = scheduler.ModuleScheduler(
+        self.recipe['modules'], max_parallel=max_parallel, streaming=streaming)
+    try:
+      module_scheduler.Run(callback)
+    finally:
+      for line in module_scheduler.FormatCriticalPath().split('\n'):
+        logger.info(line)
+
+    self.CheckErrors(is_global=True)
+
   def ImportRecipeModules(self, module_locations: Dict[str, str]) -> None:
     """Dynamically loads the modules declared in a recipe.
 
@@ -138,6 +165,10 @@ class DFTimewolfState(object):
     preflight_definitions = recipe.get('preflights', [])
     self.ImportRecipeModules(module_locations)
     self._container_manager.ParseRecipe(recipe)
+    memory_limit = self.command_line_options.get('container_memory_limit') or 0
+    self._container_manager.SetMemoryLimit(
+        memory_limit * 1024 * 1024,
+        self.command_line_options.get('container_spill_dir'))
 
     for module_definition in module_definitions + preflight_definitions:
       # Combine CLI args with args from the recipe description
@@ -365,8 +396,84 @@ class DFTimewolfState(object):
       for c in containers:
         logger.debug(f"Launching {module.name}.Process thread with {str(c)}")
         futures.append(executor.submit(module.Process, c))
+
+      if self._IsStreamingModule(module):
+        futures.extend(self._ProcessContainerStream(
+            module, lambda c: executor.submit(module.Process, c)))
     return futures
 
+  def _ProcessContainerStream(
+      self,
+      module: ThreadAwareModule,
+      submit: Callable[[AttributeContainer], Future]  # type: ignore
+  ) -> List[Future]:  # type: ignore
+    """Submits containers streamed to a module until its stream is exhausted.
+
+    The stream is exhausted once all the modules the module depends on have
+    completed.
+
+    Args:
+      module: The streaming module.
+      submit: Function that schedules module.Process on a container.
+
+    Returns:
+      List of futures for the threads that were started.
+    """
+    futures = []
+    while True:
+      streamed = self._container_manager.GetStreamedContainer(module.name)
+      if streamed is None:
+        break
+      container, origin = streamed
+      logger.debug(
+          f'Launching {module.name}.Process thread with streamed '
+          f'{str(container)} from {origin}')
+      future = submit(container)
+      future.add_done_callback(functools.partial(
+          self._StreamedContainerDone,
+          module.name,
+          origin,
+          container if module.KeepThreadedContainersInState() else None))
+      futures.append(future)
+    return futures
+
+  def _StreamedContainerDone(
+      self,
+      module_name: str,
+      origin: str,
+      container: Optional[AttributeContainer],
+      unused_future: Future) -> None:  # type: ignore
+    """Releases the stream slot held by a processed container.
+
+    Args:
+      module_name: The runtime name of the streaming module.
+      origin: The module that generated the container.
+      container: The processed container, if it is to be kept in state.
+      unused_future: The future of the thread that processed the container.
+    """
+    self._container_manager.StreamedContainerDone(
+        module_name, origin, container)
+
+  @staticmethod
+  def _IsStreamingModule(module: BaseModule) -> bool:
+    """Whether a module processes containers as upstream modules store them."""
+    return isinstance(module, ThreadAwareModule) and module.StreamContainers()
+
+  def _RegisterContainerStreams(self) -> None:
+    """Registers container streams for all streaming modules."""
+    for module_definition in self.recipe['modules']:
+      runtime_name = module_definition.get(
+          'runtime_name', module_definition['name'])
+      module = self._module_pool[runtime_name]
+      if self._IsStreamingModule(module):
+        module = cast(ThreadAwareModule, module)
+        logger.debug(f'{runtime_name} will stream containers from upstream')
+        self._container_manager.RegisterStream(
+            module_name=runtime_name,
+            container_type=module.GetThreadOnContainerType(),
+            queue_size=module.GetStreamQueueSize(),
+            in_flight_limit=module.GetStreamInFlightLimit())
+
   def _RunModulePreProcess(self, module: ThreadAwareModule) -> None:
     """Runs PreProcess of a single module.
 
@@ -416,7 +523,8 @@ class DFTimewolfState(object):
     Callback for _InvokeModulesInThreads.
 
     Waits for any blockers to have finished before running Process(), then
-    sets an Event flag declaring the module has completed.
+    sets an Event flag declaring the module has completed. Streaming modules
+    do not wait, and instead process containers as blockers store them.
 
     Args:
       module_definition (dict): module definition.
@@ -424,17 +532,20 @@ class DFTimewolfState(object):
     module_name = module_definition['name']
     runtime_name = module_definition.get('runtime_name', module_name)
 
-    for dependency in module_definition['wants']:
-      self._threading_event_per_module[dependency].wait()
-
     module = self._module_pool[runtime_name]
 
+    if not self._IsStreamingModule(module):
+      for dependency in module_definition['wants']:
+        self._threading_event_per_module[dependency].wait()
+
     # Abort processing if a module has had critical failures before.
     if self._abort_execution:
       logger.critical(
           'Aborting execution of {0:s} due to previous errors'.format(
               module.name))
+      self._container_manager.CloseStream(runtime_name)
       self._threading_event_per_module[runtime_name].set()
+      self._container_manager.CompleteModule(runtime_name)
       self.CleanUp()
       return
 
@@ -466,6 +577,9 @@ class DFTimewolfState(object):
           critical=True,
           unexpected=True)
       self.AddError(error)
+    finally:
+      # Unblocks upstream modules if processing stopped early
+      self._container_manager.CloseStream(runtime_name)
 
     logger.info('Module {0:s} finished execution'.format(runtime_name))
     total_time = utils.CalculateRunTime(time_start)
@@ -528,8 +642,17 @@ class DFTimewolfState(object):
     return None
 
   def RunModules(self) -> None:
-    """Performs the actual processing for each module in the module pool."""
-    self._InvokeModulesInThreads(self._RunModuleThread)
+    """Performs the actual processing for each module in the module pool.
+
+    Modules are run by a dependency-aware scheduler, unless the
+    thread_per_module command line option is set, in which case every module
+    gets its own thread that waits for its dependencies to complete.
+    """
+    self._RegisterContainerStreams()
+    if self.command_line_options.get('thread_per_module'):
+      self._InvokeModulesInThreads(self._RunModuleThread)
+    else:
+      self._InvokeModulesInScheduler(self._RunModuleThread)
 
   def RegisterStreamingCallback(
       self,
@@ -722,6 +845,19 @@ class DFTimewolfStateWithCDM(DFTimewolfState):
         futures.append(
             executor.submit(self._WrapThreads, module.Process, c, module.name))
 
+      if self._IsStreamingModule(module):
+        container_count = len(containers)
+
+        def _Submit(container: AttributeContainer) -> Future:  # type: ignore
+          nonlocal container_count
+          container_count += 1
+          self.cursesdm.SetThreadedModuleContainerCount(
+              module.name, container_count)
+          return executor.submit(
+              self._WrapThreads, module.Process, container, module.name)
+
+        futures.extend(self._ProcessContainerStream(module, _Submit))
+
     return futures
 
   def _RunModulePreProcess(self, module: ThreadAwareModule) -> None:
@@ -1,7 +1,14 @@
 """Telemetry module."""
+import atexit
 import datetime
 from dataclasses import dataclass
 import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
 from typing import Dict, Any, List, Union, Optional
 import uuid as uuid_lib
 
@@ -9,6 +16,11 @@ from dftimewolf import config
 
 logger = logging.getLogger('dftimewolf')
 
+# Schema of the telemetry table, in Spanner DDL.
+DDL_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(
+        __file__)))), 'data', 'TelemetryTable.ddl')
+
 # mypy complains when doing from google.cloud import spanner
 try:
   from google.cloud import spanner  # type: ignore
@@ -69,8 +81,157 @@ class BaseTelemetry():
     self.entries.append(entry)
 
 
-class GoogleCloudSpannerTelemetry(BaseTelemetry):
-  """Sends telemetry data to Google Cloud Spanner."""
+class BatchedTelemetry(BaseTelemetry):
+  """Interface for telemetry written to a database by a background thread.
+
+  LogTelemetry only queues the entry, and never blocks the calling module:
+  entries are written by a writer thread, in batches of up to _BATCH_SIZE
+  entries, at most _FLUSH_INTERVAL_SEC seconds after they were logged. When
+  more than _MAX_PENDING entries are waiting to be written, new entries are
+  dropped. Pending entries are written when the interpreter exits.
+
+  The telemetry table is keyed by workflow UUID and time, so entry times are
+  kept strictly increasing: an entry logged in the same microsecond as the
+  previous one, or while the clock goes back, is timed one microsecond
+  after it. A key collision would otherwise fail its whole batch.
+  """
+
+  _BATCH_SIZE = 500
+  _FLUSH_INTERVAL_SEC = 2.0
+  _MAX_PENDING = 100000
+
+  # Markers queued to make the writer thread write pending entries, or stop.
+  _FLUSH = object()
+  _STOP = object()
+
+  def __init__(self, uuid: Optional[str] = None) -> None:
+    """Initializes a BatchedTelemetry object."""
+    super().__init__(uuid=uuid)
+    self.dropped = 0
+    self._queue: queue.Queue[Any] = queue.Queue(maxsize=self._MAX_PENDING)
+    self._lock = threading.Lock()
+    self._writer: Optional[threading.Thread] = None
+    self._last_time = datetime.datetime.min
+    atexit.register(self.Close)
+
+  def LogTelemetry(
+    self,
+    key: str,
+    value: str,
+    src_module_name: str,
+    recipe_name: str) -> None:
+    """Queues a telemetry event to be written.
+
+    Args:
+      key: Telemetry key.
+      value: Telemetry value.
+      src_module_name: Name of the module that generated the telemetry.
+      recipe_name: Name of the recipe being run.
+    """
+    with self._lock:
+      now = max(datetime.datetime.now(),
+                self._last_time + datetime.timedelta(microseconds=1))
+      self._last_time = now
+    telemetry = {
+      'workflow_uuid': self.uuid,
+      'time': now.strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+      'source_module': src_module_name,
+      'recipe': recipe_name,
+      'key': key,
+      'value': value,
+    }
+    self._StartWriter()
+    try:
+      self._queue.put_nowait(telemetry)
+    except queue.Full:
+      with self._lock:
+        self.dropped += 1
+        if self.dropped == 1:
+          logger.warning('Telemetry is not written fast enough, dropping '
+                         'new entries.')
+
+  def Flush(self) -> None:
+    """Waits until all queued entries are written."""
+    with self._lock:
+      writer = self._writer
+    if writer is None or not writer.is_alive():
+      return
+    self._queue.put(self._FLUSH)
+    self._queue.join()
+
+  def Close(self) -> None:
+    """Writes all queued entries and stops the writer thread."""
+    with self._lock:
+      writer = self._writer
+      self._writer = None
+    if writer is None or not writer.is_alive():
+      return
+    self._queue.put(self._STOP)
+    writer.join()
+
+  def _StartWriter(self) -> None:
+    """Starts the writer thread, if it is not running."""
+    with self._lock:
+      if self._writer is None:
+        self._writer = threading.Thread(
+            target=self._WriterLoop,
+            name=f'{type(self).__name__}Writer',
+            daemon=True)
+        self._writer.start()
+
+  def _WriterLoop(self) -> None:
+    """Writes queued entries in batches until stopped."""
+    rows: List[Dict[str, str]] = []
+    received = 0
+    deadline = 0.0
+    while True:
+      try:
+        timeout = max(0.0, deadline - time.monotonic()) if rows else None
+        item = self._queue.get(timeout=timeout)
+        received += 1
+      except queue.Empty:
+        item = self._FLUSH
+
+      if isinstance(item, dict):
+        if not rows:
+          deadline = time.monotonic() + self._FLUSH_INTERVAL_SEC
+        rows.append(item)
+        if len(rows) < self._BATCH_SIZE:
+          continue
+
+      if rows:
+        try:
+          self._WriteBatch(rows)
+        # The writer thread must outlive errors of the database.
+        except Exception as error:  # pylint: disable=broad-except
+          logger.warning(f'Could not send telemetry: {error}')
+        rows = []
+      for _ in range(received):
+        self._queue.task_done()
+      received = 0
+
+      if item is self._STOP:
+        self._CloseWriter()
+        return
+
+  def _WriteBatch(self, rows: List[Dict[str, str]]) -> None:
+    """Writes telemetry rows to the database, from the writer thread.
+
+    Args:
+      rows: Telemetry rows, by column name.
+    """
+    raise NotImplementedError
+
+  def _CloseWriter(self) -> None:
+    """Releases resources of the writer thread, from the writer thread."""
+
+
+class GoogleCloudSpannerTelemetry(BatchedTelemetry):
+  """Sends telemetry data to Google Cloud Spanner.
+
+  All entries of a batch are inserted in a single transaction, through a
+  Spanner client created once per telemetry object.
+  """
 
   def __init__(
       self,
@@ -83,16 +244,22 @@ class GoogleCloudSpannerTelemetry(BaseTelemetry):
     self.project_name = project_name
     self.instance_name = instance_name
     self.database_name = database_name
+    self._database: Any = None
+    self._database_lock = threading.Lock()
 
   @property
   def database(self) -> Any:
     """Returns the Spanner database object."""
-    spanner_client = spanner.Client(project=self.project_name)
-    instance = spanner_client.instance(self.instance_name)
-    return instance.database(self.database_name)
+    with self._database_lock:
+      if self._database is None:
+        spanner_client = spanner.Client(project=self.project_name)
+        instance = spanner_client.instance(self.instance_name)
+        self._database = instance.database(self.database_name)
+      return self._database
 
   def FormatTelemetry(self) -> str:
     """Gets all telemetry for a given workflow UUID."""
+    self.Flush()
     entries = []  # type: List[str]
     try:
       self.database.run_in_transaction(
@@ -120,67 +287,154 @@ class GoogleCloudSpannerTelemetry(BaseTelemetry):
     for row in result:
       entries.append(f'\t{row[1]}:\t\t{row[2]} - {row[3]}: {row[4]}')
 
-  def LogTelemetry(
-    self,
-    key: str,
-    value: str,
-    src_module_name: str,
-    recipe_name: str) -> None:
-    """Logs a telemetry event.
+  def _WriteBatch(self, rows: List[Dict[str, str]]) -> None:
+    """Inserts telemetry rows in a single transaction.
 
     Args:
-      key: Telemetry key.
-      value: Telemetry value.
-      src_module_name: Name of the module that generated the telemetry.
+      rows: Telemetry rows, by column name.
     """
-
-    telemetry = {
-      'workflow_uuid': self.uuid,
-      'time': datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
-      'source_module': src_module_name,
-      'recipe': recipe_name,
-      'key': key,
-      'value': value,
-    }
     try:
-      self.database.run_in_transaction(self._LogTelemetryTransaction, telemetry)
+      self.database.run_in_transaction(self._LogTelemetryTransaction, rows)
     except exceptions.PermissionDenied as error:
       logger.warning('Permission denied when logging telemetry. '
                      f'Check your Spanner database permissions. {error}')
+
+  def _LogTelemetryTransaction(
+      self, transaction: Any, rows: List[Dict[str, str]]) -> None:
+    # Using keys() provides a stable order for the columns and values, as all
+    # rows are built by LogTelemetry.
+    columns = list(rows[0].keys())
+    values = [[row[column] for column in columns] for row in rows]
+    transaction.insert(table='Telemetry', columns=columns, values=values)
+
+
+class SQLiteTelemetry(BatchedTelemetry):
+  """Stores telemetry data in a local SQLite database.
+
+  The table is created from the Spanner DDL of the telemetry table, so that
+  the same rows can be stored and benchmarked offline.
+  """
+
+  def __init__(
+      self,
+      database_path: str,
+      ddl_path: str = DDL_PATH,
+      uuid: Optional[str] = None) -> None:
+    """Initializes a SQLiteTelemetry object.
+
+    Args:
+      database_path: Path of the SQLite database file.
+      ddl_path: Path of the Spanner DDL of the telemetry table.
+      uuid: Workflow UUID.
+    """
+    super().__init__(uuid=uuid)
+    self.database_path = database_path
+    self.ddl_path = ddl_path
+    self._connection: Optional[sqlite3.Connection] = None
+
+  def _Connect(self) -> sqlite3.Connection:
+    """Opens the database, creating the telemetry table if needed."""
+    with open(self.ddl_path, 'r', encoding='utf-8') as ddl_file:
+      ddl = ddl_file.read()
+    # Spanner declares the primary key after the columns, and sizes strings.
+    ddl = re.sub(r'STRING\(\d+\)', 'TEXT', ddl.strip().rstrip(';'))
+    ddl = re.sub(
+        r'\)\s*PRIMARY KEY\s*(\([^)]*\))\s*$', r',\n  PRIMARY KEY \1\n)', ddl)
+    ddl = ddl.replace('CREATE TABLE', 'CREATE TABLE IF NOT EXISTS', 1)
+    connection = sqlite3.connect(self.database_path, timeout=30)
+    connection.execute(ddl)
+    return connection
+
+  def FormatTelemetry(self) -> str:
+    """Gets all telemetry for a given workflow UUID."""
+    self.Flush()
+    entries = [f'Telemetry information for: {self.uuid}']
+    try:
+      connection = self._Connect()
+      try:
+        result = connection.execute(
+            'SELECT * from Telemetry WHERE workflow_uuid = ? ORDER BY time ASC',
+            (self.uuid,))
+        for row in result:
+          entries.append(f'\t{row[1]}:\t\t{row[2]} - {row[3]}: {row[4]}')
+      finally:
+        connection.close()
     # We want to catch all exceptions and not interfere with runtime.
     except Exception as error:  # pylint: disable=broad-except
-      logger.warning(f'Could not send telemetry: {error}')
+      logger.warning(f'Could not read telemetry: {error}')
+    return '\n'.join(entries)
 
-  def _LogTelemetryTransaction(
-      self, transaction: Any, telemetry: Dict[str, str]) -> None:
-    # Using items() provides a stable order for the columns and values
-    columns = []
-    values = []
-    for key, value in telemetry.items():
-      columns.append(key)
-      values.append(value)
-    transaction.insert(table='Telemetry', columns=columns, values=[values])
+  def _WriteBatch(self, rows: List[Dict[str, str]]) -> None:
+    """Inserts telemetry rows in a single transaction.
+
+    Args:
+      rows: Telemetry rows, by column name.
+    """
+    if self._connection is None:
+      self._connection = self._Connect()
+    columns = list(rows[0].keys())
+    with self._connection:
+      self._connection.executemany(
+          f'INSERT INTO Telemetry ({", ".join(columns)}) '
+          f'VALUES ({", ".join("?" * len(columns))})',
+          [[row[column] for column in columns] for row in rows])
 
+  def _CloseWriter(self) -> None:
+    """Closes the database connection of the writer thread."""
+    if self._connection is not None:
+      self._connection.close()
+      self._connection = None
 
-def GetTelemetry(
+
+_current_telemetry: Optional[BaseTelemetry] = None
+_current_telemetry_lock = threading.Lock()
+
+
+def _CreateTelemetry(
     uuid: Optional[str] = None
-  ) -> Union[BaseTelemetry, GoogleCloudSpannerTelemetry]:
-  """Returns the currently configured Telemetry object."""
+  ) -> Union[BaseTelemetry, GoogleCloudSpannerTelemetry, SQLiteTelemetry]:
+  """Returns a new Telemetry object, as configured."""
   telemetry_config = config.Config.GetExtra('telemetry')
   if telemetry_config.get('type') == 'google_cloud_spanner' and HAS_SPANNER:
     return GoogleCloudSpannerTelemetry(
         **telemetry_config['config'], uuid=uuid)
+  if telemetry_config.get('type') == 'sqlite':
+    return SQLiteTelemetry(**telemetry_config['config'], uuid=uuid)
   return BaseTelemetry(uuid=uuid)
 
 
+def GetTelemetry(
+    uuid: Optional[str] = None
+  ) -> Union[BaseTelemetry, GoogleCloudSpannerTelemetry, SQLiteTelemetry]:
+  """Returns a new Telemetry object, as configured.
+
+  The object becomes the currently configured Telemetry object, which the
+  module-level LogTelemetry and FormatTelemetry functions use.
+  """
+  global _current_telemetry  # pylint: disable=global-statement
+  telemetry = _CreateTelemetry(uuid=uuid)
+  with _current_telemetry_lock:
+    _current_telemetry = telemetry
+  return telemetry
+
+
+def _GetCurrentTelemetry() -> BaseTelemetry:
+  """Returns the currently configured Telemetry object."""
+  global _current_telemetry  # pylint: disable=global-statement
+  with _current_telemetry_lock:
+    if _current_telemetry is None:
+      _current_telemetry = _CreateTelemetry()
+    return _current_telemetry
+
+
 def LogTelemetry(
     key: str, value: str, src_module_name: str, recipe_name: str = '') -> None:
   """"Logs a Telemetry entry using the currently configured Telemetry object."""
-  telemetry = GetTelemetry()
+  telemetry = _GetCurrentTelemetry()
   telemetry.LogTelemetry(key, value, src_module_name, recipe_name)
 
 
 def FormatTelemetry() -> str:
   """Formats the telemetry of the currently configured Telemetry object."""
-  telemetry = GetTelemetry()
+  telemetry = _GetCurrentTelemetry()
   return telemetry.FormatTelemetry()
@@ -0,0 +1,402 @@
+# -*- coding: utf-8 -*-
+"""Concurrent, deduplicated and resumable evidence uploads."""
+
+import abc
+from concurrent import futures
+import dataclasses
+import hashlib
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from logging import Logger
+from typing import Any, Callable, Dict, Optional, Tuple, Type, TYPE_CHECKING
+
+if TYPE_CHECKING:
+  from dftimewolf.lib import state as state_lib
+
+
+class UploadError(Exception):
+  """Raised when a server rejects an upload."""
+
+
+@dataclasses.dataclass
+class UploadStats:
+  """Statistics of the uploads of an EvidenceUploader.
+
+  Attributes:
+    uploaded: Number of files uploaded.
+    skipped: Number of files not uploaded, as they were already uploaded to
+        the same destination during the recipe.
+    failed: Number of files that could not be uploaded.
+    bytes: Number of bytes uploaded.
+    seconds: Time spent uploading, summed over concurrent uploads.
+  """
+  uploaded: int = 0
+  skipped: int = 0
+  failed: int = 0
+  bytes: int = 0
+  seconds: float = 0.0
+
+  @property
+  def bytes_per_second(self) -> float:
+    """Upload throughput of a single upload slot."""
+    return self.bytes / self.seconds if self.seconds else 0.0
+
+
+class UploadTransport(abc.ABC):
+  """Sends files to an evidence server, for an EvidenceUploader.
+
+  Attributes:
+    RESUMABLE: Whether interrupted uploads resume from their resume state.
+    RETRY_EXCEPTIONS: Exceptions after which an upload is attempted again.
+  """
+
+  RESUMABLE = False
+  RETRY_EXCEPTIONS: Tuple[Type[Exception], ...] = (UploadError, OSError)
+
+  @abc.abstractmethod
+  def Destination(self) -> str:
+    """Returns where files are sent, e.g. a server URL and a folder.
+
+    Files with the same content are only uploaded once per destination
+    during a recipe.
+    """
+
+  @abc.abstractmethod
+  def Upload(self,
+             path: str,
+             sha256: str,
+             resume_state: Dict[str, Any],
+             checkpoint: Callable[[], None]) -> Any:
+    """Uploads a file.
+
+    Args:
+      path: Path of the file to upload.
+      sha256: Hex SHA-256 digest of the file.
+      resume_state: Progress of previous attempts to upload the file, which
+          transports that upload in chunks update as chunks are accepted.
+      checkpoint: Persists resume_state, to be called after updating it.
+
+    Returns:
+      The server's reference to the uploaded file.
+    """
+
+
+class ResumableChunkTransport(UploadTransport):
+  """Uploads files in chunks, with the protocol of resumable.js.
+
+  Each chunk is sent as a multipart POST request carrying the resumable.js
+  parameters. The server answers 200 when it stored a chunk, and 201 with the
+  JSON description of the file once it has all chunks. Chunks are identified
+  by the file digest and chunk number, so a failed chunk is sent again and an
+  interrupted upload resumes after the last accepted chunk.
+  """
+
+  RESUMABLE = True
+  CHUNK_SIZE = 32 * 1024 * 1024
+  _MAX_CHUNK_ATTEMPTS = 5
+  _RETRY_DELAY_SEC = 2.0
+
+  def __init__(self,
+               session: Any,
+               url: str,
+               params: Optional[Dict[str, Any]] = None,
+               chunk_size: Optional[int] = None) -> None:
+    """Initializes a resumable chunk transport.
+
+    Args:
+      session: requests session used to send chunks.
+      url: URL of the upload endpoint.
+      params: Additional query parameters of every chunk request.
+      chunk_size: Chunk size in bytes, CHUNK_SIZE if not set.
+    """
+    self._session = session
+    self._url = url
+    self._params = params or {}
+    self._chunk_size = chunk_size or self.CHUNK_SIZE
+
+  def Destination(self) -> str:
+    """Returns the upload URL and its parameters."""
+    return f'{self._url}?{json.dumps(self._params, sort_keys=True)}'
+
+  def _SendChunk(self,
+                 filename: str,
+                 data: bytes,
+                 params: Dict[str, Any]) -> Any:
+    """Sends a chunk, retrying transient failures.
+
+    Returns:
+      The server's JSON response to the last chunk, None for other chunks.
+
+    Raises:
+      UploadError: if the chunk could not be sent.
+    """
+    for attempt in range(1, self._MAX_CHUNK_ATTEMPTS + 1):
+      try:
+        response = self._session.post(
+            self._url, params=params,
+            files={'file': (filename, data, 'application/octet-stream')})
+      except OSError as exception:
+        # requests exceptions are OSErrors.
+        error = str(exception)
+      else:
+        if response.status_code == 201:
+          return response.json()
+        if response.status_code == 200:
+          return None
+        error = f'HTTP {response.status_code}: {response.text}'
+        if response.status_code < 500:
+          break
+      if attempt < self._MAX_CHUNK_ATTEMPTS:
+        time.sleep(self._RETRY_DELAY_SEC * attempt)
+    raise UploadError(
+        f'Chunk {params["resumableChunkNumber"]} of {filename} was not '
+        f'accepted: {error}')
+
+  def Upload(self,
+             path: str,
+             sha256: str,
+             resume_state: Dict[str, Any],
+             checkpoint: Callable[[], None]) -> Any:
+    """Uploads a file in chunks, resuming after the last accepted chunk.
+
+    Returns:
+      The ID of the file on the server.
+    """
+    filename = os.path.basename(path)
+    total_size = os.path.getsize(path)
+    total_chunks = max(1, math.ceil(total_size / self._chunk_size))
+    if resume_state.get('chunk_size') != self._chunk_size:
+      resume_state.clear()
+      resume_state['chunk_size'] = self._chunk_size
+    chunk_number = resume_state.get('next_chunk', 1)
+
+    with open(path, 'rb') as upload_file:
+      upload_file.seek((chunk_number - 1) * self._chunk_size)
+      while chunk_number <= total_chunks:
+        data = upload_file.read(self._chunk_size)
+        params = dict(self._params)
+        params.update({
+            'resumableChunkNumber': chunk_number,
+            'resumableChunkSize': self._chunk_size,
+            'resumableCurrentChunkSize': len(data),
+            'resumableTotalSize': total_size,
+            'resumableTotalChunks': total_chunks,
+            'resumableIdentifier': f'{total_size}-{sha256}',
+            'resumableFilename': filename,
+            'resumableRelativePath': filename,
+        })
+        result = self._SendChunk(filename, data, params)
+        if result is not None:
+          return result.get('id')
+        chunk_number += 1
+        resume_state['next_chunk'] = chunk_number
+        checkpoint()
+    raise UploadError(f'Server did not complete the upload of {filename}')
+
+
+class EvidenceUploader:
+  """Uploads evidence files for all modules of a recipe.
+
+  At most _MAX_CONCURRENT_UPLOADS files are uploaded at any time, so that
+  modules uploading from many threads do not saturate the link or the server.
+  Files are identified by their SHA-256 digest: a file is not uploaded again
+  to a destination that already received the same content during the recipe,
+  and concurrent uploads of the same content wait for the first one. Servers
+  are not asked whether they already have a file. Failed uploads are
+  attempted again up to _MAX_ATTEMPTS times. Resumable transports record
+  their progress in memory, and in a journal file if one is set, so that an
+  interrupted upload resumes where it stopped, including in a later run.
+  """
+
+  _MAX_CONCURRENT_UPLOADS = 4
+  _MAX_ATTEMPTS = 3
+  _RETRY_DELAY_SEC = 5.0
+  _HASH_CHUNK_SIZE = 1024 * 1024
+  # Environment variable setting the journal file of shared uploaders.
+  JOURNAL_PATH_ENVIRONMENT_VARIABLE = 'DFTIMEWOLF_UPLOAD_JOURNAL'
+
+  _shared_lock = threading.Lock()
+
+  def __init__(self, journal_path: Optional[str] = None) -> None:
+    """Initializes an evidence uploader.
+
+    Args:
+      journal_path: Path of the file recording the progress of uploads, None
+          to only keep it in memory.
+    """
+    self.stats = UploadStats()
+    self._journal_path = journal_path
+    self._lock = threading.Lock()
+    self._slots = threading.BoundedSemaphore(self._MAX_CONCURRENT_UPLOADS)
+    self._uploaded: Dict[str, Any] = {}
+    self._in_flight: Dict[str, futures.Future[Any]] = {}
+    self._journal: Dict[str, Dict[str, Any]] = self._LoadJournal()
+
+  @classmethod
+  def GetShared(cls,
+                state: 'state_lib.DFTimewolfState',
+                server_url: str) -> 'EvidenceUploader':
+    """Returns the uploader shared by modules of a recipe for a server.
+
+    The uploader only keeps a journal file if the DFTIMEWOLF_UPLOAD_JOURNAL
+    environment variable sets its path.
+
+    Args:
+      state: The recipe state, whose cache holds the uploader.
+      server_url: URL of the evidence server.
+
+    Returns:
+      The shared uploader.
+    """
+    name = f'evidence_uploader_{server_url}'
+    with cls._shared_lock:
+      uploader = state.GetFromCache(name)
+      if not uploader:
+        uploader = cls(journal_path=os.environ.get(
+            cls.JOURNAL_PATH_ENVIRONMENT_VARIABLE) or None)
+        state.AddToCache(name, uploader)
+    return uploader  # type: ignore[no-any-return]
+
+  def _LoadJournal(self) -> Dict[str, Dict[str, Any]]:
+    """Reads the progress of uploads interrupted in previous runs."""
+    if not self._journal_path or not os.path.exists(self._journal_path):
+      return {}
+    try:
+      with open(self._journal_path, 'r', encoding='utf-8') as journal_file:
+        journal = json.load(journal_file)
+    except (OSError, ValueError):
+      return {}
+    return journal if isinstance(journal, dict) else {}
+
+  def _SaveJournal(self, logger: Logger) -> None:
+    """Writes the progress of uploads. Requires the lock.
+
+    Failures to write the journal are only logged, as they do not affect
+    the uploads of this run.
+
+    Args:
+      logger: The logger to use.
+    """
+    if not self._journal_path:
+      return
+    directory = os.path.dirname(self._journal_path) or '.'
+    try:
+      with tempfile.NamedTemporaryFile(
+          mode='w', encoding='utf-8', dir=directory, suffix='.tmp',
+          delete=False) as journal:
+        json.dump(self._journal, journal)
+      os.replace(journal.name, self._journal_path)
+    except OSError as exception:
+      logger.warning(
+          f'Unable to write upload journal {self._journal_path}: '
+          f'{exception!s}')
+
+  def _Hash(self, path: str) -> str:
+    """Returns the hex SHA-256 digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as upload_file:
+      for chunk in iter(lambda: upload_file.read(self._HASH_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+  def Upload(self,
+             path: str,
+             transport: UploadTransport,
+             logger: Logger) -> Any:
+    """Uploads a file, unless it was already uploaded to its destination.
+
+    Args:
+      path: Path of the file to upload.
+      transport: Protocol and destination of the upload.
+      logger: The logger to use.
+
+    Returns:
+      The server's reference to the uploaded file.
+
+    Raises:
+      Exception: the last error raised by the transport, if all attempts to
+          upload the file failed.
+    """
+    key = f'{transport.Destination()}#{self._Hash(path)}'
+    with self._lock:
+      if key in self._uploaded:
+        self.stats.skipped += 1
+        logger.info(f'Skipping upload of {path}: already uploaded')
+        return self._uploaded[key]
+      upload = self._in_flight.get(key)
+      owner = upload is None
+      if owner:
+        upload = futures.Future()
+        self._in_flight[key] = upload
+    assert upload is not None
+
+    if not owner:
+      logger.info(f'Waiting for the upload of a copy of {path}')
+      result = upload.result()
+      with self._lock:
+        self.stats.skipped += 1
+      return result
+
+    try:
+      with self._slots:
+        result = self._UploadWithRetries(path, key, transport, logger)
+    except Exception as exception:  # pylint: disable=broad-except
+      with self._lock:
+        self.stats.failed += 1
+        del self._in_flight[key]
+      upload.set_exception(exception)
+      raise
+    with self._lock:
+      self._uploaded[key] = result
+      del self._in_flight[key]
+    upload.set_result(result)
+    return result
+
+  def _UploadWithRetries(self,
+                         path: str,
+                         key: str,
+                         transport: UploadTransport,
+                         logger: Logger) -> Any:
+    """Uploads a file with a transport, attempting it again on failures."""
+    resume_state: Dict[str, Any] = {}
+    if transport.RESUMABLE:
+      with self._lock:
+        resume_state = self._journal.setdefault(key, resume_state)
+
+    def _Checkpoint() -> None:
+      if transport.RESUMABLE:
+        with self._lock:
+          self._SaveJournal(logger)
+
+    size = os.path.getsize(path)
+    for attempt in range(1, self._MAX_ATTEMPTS + 1):
+      start = time.monotonic()
+      try:
+        result = transport.Upload(
+            path, key.rsplit('#', 1)[1], resume_state, _Checkpoint)
+        break
+      except transport.RETRY_EXCEPTIONS as exception:
+        if attempt == self._MAX_ATTEMPTS:
+          raise
+        logger.warning(
+            f'Upload of {path} failed, retrying in '
+            f'{self._RETRY_DELAY_SEC:.0f}s: {exception!s}')
+        time.sleep(self._RETRY_DELAY_SEC)
+
+    duration = time.monotonic() - start
+    with self._lock:
+      if transport.RESUMABLE:
+        self._journal.pop(key, None)
+        self._SaveJournal(logger)
+      self.stats.uploaded += 1
+      self.stats.bytes += size
+      self.stats.seconds += duration
+    rate = size / duration if duration else 0.0
+    logger.info(
+        f'Uploaded {path} ({size} bytes) in {duration:.1f}s, '
+        f'{rate / 1024 / 1024:.1f} MiB/s')
+    return result
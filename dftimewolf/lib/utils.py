@@ -8,15 +8,27 @@ import re
 import string
 import tarfile
 import tempfile
+import threading
 import time
-from typing import Any, Dict, Optional, Type
+from typing import Any, Dict, Iterable, Optional, Type, TYPE_CHECKING
 
-import pandas as pd
 from dftimewolf.config import Config
 
+if TYPE_CHECKING:
+  import pandas as pd
+
 
 TOKEN_REGEX = re.compile(r'\@([\w_]+)')
 
+# Imports of the Yara modules that rules may use, by the prefix of the
+# module's identifiers.
+YARA_MODULES = {
+  "hash.": "import \"hash\"",
+  "pe.": "import \"pe\"",
+  "elf.": "import \"elf\"",
+  "math.": "import \"math\"",
+}
+
 
 def CalculateRunTime(time_start: float) -> float:
   """Calculates a time delta used for runtime calulcations.
@@ -63,7 +75,7 @@ def Compress(source_path: str, output_directory: Optional[str]=None) -> str:
   return filepath
 
 
-def WriteDataFrameToJsonl(df: pd.DataFrame) -> str:
+def WriteDataFrameToJsonl(df: 'pd.DataFrame') -> str:
   """Writes a pandas DataFrame to jsonl.
 
   Args:
@@ -80,6 +92,112 @@ def WriteDataFrameToJsonl(df: pd.DataFrame) -> str:
     return output_file.name
 
 
+def BuildYaraRuleset(rule_texts: Iterable[str]) -> str:
+  """Concatenates Yara rules into one ruleset, with the imports they need.
+
+  A module is imported if its identifiers appear anywhere in the rules, so
+  that rules files with several rules, or rules that use a module outside
+  of their condition, still compile.
+
+  Args:
+    rule_texts: the texts of the Yara rules.
+
+  Returns:
+    The text of the ruleset.
+  """
+  rule_texts = list(rule_texts)
+  selected_headers = set()
+  for prefix, header in YARA_MODULES.items():
+    prefix_regex = re.compile(r'\b' + re.escape(prefix))
+    if any(prefix_regex.search(rule_text) for rule_text in rule_texts):
+      selected_headers.add(header)
+
+  concatenated_rules = '\n\n'.join(rule_texts)
+  return '\n'.join(sorted(selected_headers)) + '\n\n' + concatenated_rules
+
+
+class TokenBucket:
+  """Token bucket rate limiter, shared by concurrent requests.
+
+  Attributes:
+    rate: tokens added per second, 0 for no limit.
+    capacity: maximum number of tokens, i.e. of requests in a burst.
+  """
+
+  # Minimum time between two slowdowns, so that concurrent requests failing
+  # together only lower the rate once.
+  _SLOWDOWN_INTERVAL = 60
+
+  def __init__(self, rate: float, capacity: int = 1) -> None:
+    """Initializes a token bucket.
+
+    Args:
+      rate: tokens added per second, 0 for no limit.
+      capacity: maximum number of tokens.
+    """
+    self.rate = rate
+    self.capacity = capacity
+    self._tokens = float(capacity)
+    self._last_refill = time.monotonic()
+    self._last_slowdown = 0.0
+    self._lock = threading.Lock()
+
+  def _Refill(self) -> None:
+    """Adds the tokens accrued since the last refill. Requires the lock."""
+    now = time.monotonic()
+    self._tokens = min(
+        self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+    self._last_refill = now
+
+  def Acquire(self, stop: Optional[threading.Event] = None) -> bool:
+    """Waits for a token and takes it.
+
+    Args:
+      stop: event that ends the wait early when set.
+
+    Returns:
+      True if a token was taken, False if the wait was stopped.
+    """
+    while True:
+      with self._lock:
+        if not self.rate:
+          return True
+        self._Refill()
+        if self._tokens >= 1:
+          self._tokens -= 1
+          return True
+        wait = (1 - self._tokens) / self.rate
+      if stop is None:
+        time.sleep(wait)
+      elif stop.wait(wait):
+        return False
+
+  def SlowDown(self, multiplier: float) -> bool:
+    """Divides the rate by multiplier, unless it was just lowered.
+
+    A bucket without limit is limited to one token per second instead.
+
+    Args:
+      multiplier: factor to divide the rate by.
+
+    Returns:
+      True if the rate was lowered.
+    """
+    with self._lock:
+      now = time.monotonic()
+      if now - self._last_slowdown < self._SLOWDOWN_INTERVAL:
+        return False
+      if self.rate:
+        self._Refill()
+        self.rate /= multiplier
+      else:
+        self.rate = 1.0
+        self._last_refill = now
+      self._tokens = 0
+      self._last_slowdown = now
+      return True
+
+
 # preserve python2 compatibility
 # pylint: disable=unnecessary-pass
 class DFTimewolfFormatterClass(
@@ -1,12 +1,20 @@
 # -*- coding: utf-8 -*-
-"""This file imports Python modules that register validators."""
-from dftimewolf.lib.validators import aws_region
-from dftimewolf.lib.validators import azure_region
-from dftimewolf.lib.validators import datetime_validator
-from dftimewolf.lib.validators import gcp_zone
-from dftimewolf.lib.validators import grr_host
-from dftimewolf.lib.validators import hostname
-from dftimewolf.lib.validators import regex
-from dftimewolf.lib.validators import subnet
-from dftimewolf.lib.validators import url
-from dftimewolf.lib.validators import integer
+"""This file declares the Python modules that register validators.
+
+The modules are imported when their validator is first used.
+"""
+from dftimewolf.lib.validators import manager
+
+manager.ValidatorsManager.RegisterValidatorModules({
+    'aws_region': 'dftimewolf.lib.validators.aws_region',
+    'azure_region': 'dftimewolf.lib.validators.azure_region',
+    'datetime': 'dftimewolf.lib.validators.datetime_validator',
+    'datetime_end': 'dftimewolf.lib.validators.datetime_validator',
+    'gcp_zone': 'dftimewolf.lib.validators.gcp_zone',
+    'grr_host': 'dftimewolf.lib.validators.grr_host',
+    'hostname': 'dftimewolf.lib.validators.hostname',
+    'integer': 'dftimewolf.lib.validators.integer',
+    'regex': 'dftimewolf.lib.validators.regex',
+    'subnet': 'dftimewolf.lib.validators.subnet',
+    'url': 'dftimewolf.lib.validators.url',
+})
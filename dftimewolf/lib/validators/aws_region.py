@@ -22,14 +22,14 @@ REGIONS = frozenset({
     'us-west-1', 'us-west-2'})
 
 
-class AWSRegionValidator(args_validator.AbstractValidator):
-  """Validates a correct AWS region."""
+class AWSRegionValidator(args_validator.CommaSeparatedValidator):
+  """Validates a correct AWS region, or a comma separated list of regions."""
 
   NAME = 'aws_region'
 
-  def Validate(self,
-               argument_value: Any,
-               recipe_argument: resources.RecipeArgument) -> str:
+  def ValidateSingle(self,
+                     argument_value: Any,
+                     recipe_argument: resources.RecipeArgument) -> str:
     """Validate operand is a valid AWS region.
 
     Args:
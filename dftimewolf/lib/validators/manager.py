@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 """Manager class for validators."""
+import importlib
 from typing import Any, Dict, List, Optional, Sequence, Type
 
 from dftimewolf.lib import errors, resources, args_validator
@@ -10,14 +11,52 @@ class ValidatorsManager:
 
   _validator_classes = {}  # type: Dict[str, Type['args_validator.AbstractValidator']] # pylint: disable=line-too-long
 
+  # Python modules that register a validator when imported, by validator name.
+  _validator_modules = {}  # type: Dict[str, str]
+
   @classmethod
   def ListValidators(cls) -> List[str]:
     """Returns a list of all registered validators.
 
+    Validators declared with RegisterValidatorModules are listed before their
+    module is imported.
+
     Returns:
       A list of all registered validators.
     """
-    return list(cls._validator_classes.keys())
+    names = list(cls._validator_classes.keys())
+    names.extend(
+        name for name in cls._validator_modules
+        if name not in cls._validator_classes)
+    return names
+
+  @classmethod
+  def RegisterValidatorModules(cls, validator_modules: Dict[str, str]) -> None:
+    """Declares the Python modules that register validators.
+
+    A module is only imported when its validator is first used, so that
+    dependencies of unused validators are not loaded at startup.
+
+    Args:
+      validator_modules: A validator name - Python module mapping. e.g.:
+          {'url': 'dftimewolf.lib.validators.url'}
+    """
+    cls._validator_modules.update(validator_modules)
+
+  @classmethod
+  def _LoadValidatorClass(
+      cls, name: str) -> Optional[Type['args_validator.AbstractValidator']]:
+    """Retrieves a validator class, importing its module if needed.
+
+    Args:
+      name: name of the validator.
+
+    Returns:
+      The validator class, or None if no corresponding validator was found.
+    """
+    if name not in cls._validator_classes and name in cls._validator_modules:
+      importlib.import_module(cls._validator_modules[name])
+    return cls._validator_classes.get(name, None)
 
   @classmethod
   def RegisterValidator(
@@ -86,7 +125,7 @@ class ValidatorsManager:
       type: the module class, which is a subclass of BaseModule, or None if
           no corresponding module was found.
     """
-    return cls._validator_classes.get(name, None)
+    return cls._LoadValidatorClass(name)
 
   @classmethod
   def Validate(cls,
@@ -112,11 +151,11 @@ class ValidatorsManager:
     if not validator_name:
       return argument_value
 
-    if validator_name not in cls._validator_classes:
+    validator_class = cls._LoadValidatorClass(validator_name)
+    if not validator_class:
       raise errors.RecipeArgsValidatorError(
           f'{validator_name} is not a registered validator')
 
-    validator_class = cls._validator_classes[validator_name]
     validator = validator_class(dry_run)
 
     return validator.Validate(argument_value, recipe_argument)
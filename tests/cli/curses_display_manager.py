@@ -5,6 +5,7 @@
 from contextlib import redirect_stdout
 import curses
 import io
+import textwrap
 import unittest
 from unittest import mock
 
@@ -737,6 +738,61 @@ class CursesDisplayManagerTest(unittest.TestCase):
           mock.call(9, 0, '  [ source ] Another standard message')])
       self.assertEqual(mock_addstr.call_count, 9)
 
+  def testIncrementalDraw(self):
+    """Tests that only changed lines are redrawn after the first frame."""
+    with mock.patch('curses.cbreak'), \
+        mock.patch('curses.noecho'), \
+        mock.patch('curses.initscr'):
+      self.cdm.StartCurses()
+    self.cdm._stdscr.getmaxyx.return_value = 30, 60
+
+    with mock.patch.object(self.cdm, 'Draw'):
+      self.cdm.SetRecipe('Recipe name')
+      self.cdm.EnqueueModule('First Module', [], '1st Module')
+      self.cdm.EnqueueModule('Second Module', [], '2nd Module')
+      self.cdm.EnqueueMessage('source', 'First message')
+
+    self.cdm.Draw()
+
+    with mock.patch.object(self.cdm._stdscr, 'clear') as mock_clear, \
+        mock.patch.object(self.cdm._stdscr, 'addstr') as mock_addstr, \
+        mock.patch('textwrap.wrap', wraps=textwrap.wrap) as mock_wrap:
+      self.cdm.UpdateModuleStatus('2nd Module', Status.RUNNING)
+      self.cdm.EnqueueMessage('source', 'Second message')
+
+      mock_clear.assert_not_called()
+      # Running modules are listed before pending ones, and the first message
+      # did not move.
+      self.assertEqual(mock_addstr.call_args_list, [
+          mock.call(2, 0, '     2nd Module: Running'),
+          mock.call(3, 0, '     1st Module: Pending'),
+          mock.call(7, 0, '  [ source ] Second message')])
+      # Only the new message is wrapped.
+      mock_wrap.assert_called_once()
+
+  def testRenderThread(self):
+    """Tests that the render thread draws updates made since its last frame
+    together."""
+    cdm = CursesDisplayManager(frame_rate=10)
+    with mock.patch('curses.cbreak'), \
+        mock.patch('curses.noecho'), \
+        mock.patch('curses.initscr'):
+      cdm.StartCurses()
+    cdm._stdscr.getmaxyx.return_value = 30, 60
+
+    with mock.patch.object(cdm, 'Draw', wraps=cdm.Draw) as mock_draw, \
+        mock.patch('curses.nocbreak'), \
+        mock.patch('curses.echo'), \
+        mock.patch('curses.endwin'):
+      for i in range(500):
+        cdm.EnqueueMessage('source', f'Message {i}')
+      cdm.EndCurses()
+
+    self.assertLess(mock_draw.call_count, 10)
+    self.assertIsNone(cdm._render_thread)
+    self.assertEqual(
+        cdm.PrepareMessagesForDisplay(1), ['  [ source ] Message 499'])
+
 
 class CDMStringIOWrapperTest(unittest.TestCase):
   """Tests for the CDMStringIOWrapper class."""
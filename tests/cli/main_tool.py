@@ -4,7 +4,11 @@
 
 import logging
 import inspect
+import os
+import shutil
+import tempfile
 
+import mock
 from absl.testing import absltest
 from absl.testing import parameterized
 
@@ -62,12 +66,24 @@ NO_ARG_RECIPE = {
 }
 
 
+# The recipe catalog is written here rather than in the user cache directory.
+_CATALOG_DIRECTORY = tempfile.mkdtemp(prefix='dftimewolf-catalog')
+
+
+def tearDownModule():  # pylint: disable=invalid-name
+  """Deletes the recipe catalog."""
+  shutil.rmtree(_CATALOG_DIRECTORY, ignore_errors=True)
+
+
 def _CreateToolObject():
   """Creates a DFTimewolfTool object instance."""
   tool = dftimewolf_recipes.DFTimewolfTool()
   tool.LoadConfiguration()
+  catalog_path = os.path.join(_CATALOG_DIRECTORY, 'recipes.json')
   try:
-    tool.ReadRecipes()
+    with mock.patch.dict(
+        os.environ, {'DFTIMEWOLF_RECIPE_CATALOG': catalog_path}):
+      tool.ReadRecipes()
   except KeyError:
     # Prevent conflicts from other tests where recipes are still registered.
     pass
@@ -4,6 +4,8 @@
 
 
 import datetime
+import json
+import os
 import unittest
 from unittest import mock
 from datetime import datetime as dt
@@ -13,6 +15,7 @@ from botocore import exceptions as boto_exceptions
 from dftimewolf.lib.collectors import aws_logging
 from dftimewolf.lib.containers import containers
 from dftimewolf.lib import errors
+from dftimewolf.lib import utils
 from tests.lib import modules_test_base
 
 
@@ -22,6 +25,8 @@ class AWSLoggingTest(modules_test_base.ModuleTestBase):
   def setUp(self):
     self._module: aws_logging.AWSLogsCollector
     self._InitModule(aws_logging.AWSLogsCollector)
+    # Do not wait on the CloudTrail request rate limit.
+    self._module._REQUEST_RATE = 1000.0  # pylint: disable=protected-access
     super().setUp()
 
   def testSetup(self):
@@ -44,6 +49,79 @@ class AWSLoggingTest(modules_test_base.ModuleTestBase):
         self._module._end_time,
         dt.fromisoformat('2021-01-02 00:00:00'))
 
+  def testSliceTimeWindow(self):
+    """Tests that the lookup window is split in contiguous slices."""
+    self._module.SetUp(
+        region='us-east-1,eu-west-1',
+        start_time=datetime.datetime(2021, 1, 1, 0, 0, 0),
+        end_time=datetime.datetime(2021, 1, 1, 4, 0, 0))
+
+    slices = self._module.SliceTimeWindow()
+    self.assertEqual(len(slices), 8)
+    self.assertEqual(
+        [trail_slice.region for trail_slice in slices],
+        ['us-east-1'] * 4 + ['eu-west-1'] * 4)
+    region_slices = slices[:4]
+    self.assertEqual(
+        region_slices[0].start_time,
+        dt.fromisoformat('2021-01-01 00:00:00+00:00'))
+    self.assertEqual(
+        region_slices[-1].end_time,
+        dt.fromisoformat('2021-01-01 04:00:00+00:00'))
+    for previous, trail_slice in zip(region_slices, region_slices[1:]):
+      self.assertEqual(previous.end_time, trail_slice.start_time)
+      self.assertFalse(previous.include_end_time)
+    self.assertTrue(region_slices[-1].include_end_time)
+    for trail_slice in slices:
+      os.remove(trail_slice.output_path)
+
+  def testCollectSliceResumes(self):
+    """Tests that a slice resumes from its checkpoint when throttled."""
+    self._module.SetUp(
+        region='us-east-1',
+        start_time=datetime.datetime(2021, 1, 1, 0, 0, 0),
+        end_time=datetime.datetime(2021, 1, 1, 2, 0, 0))
+    slices = self._module.SliceTimeWindow()
+    trail_slice = slices[0]
+    os.remove(slices[1].output_path)
+
+    def _Event(event_id, hour, minute):
+      return {
+          'EventId': event_id,
+          'EventTime': datetime.datetime(
+              2021, 1, 1, hour, minute, tzinfo=datetime.timezone.utc)}
+
+    throttling = boto_exceptions.ClientError(
+        {'Error': {'Code': 'ThrottlingException'}}, 'LookupEvents')
+    mock_client = mock.MagicMock(spec=['lookup_events'])
+    mock_client.lookup_events.side_effect = [
+        # The event at the end of the slice belongs to the next slice.
+        {'Events': [_Event('c', 1, 0), _Event('b', 0, 30)], 'NextToken': 't1'},
+        throttling,
+        {'Events': [_Event('a', 0, 0)]},
+    ]
+    rate_limiter = utils.TokenBucket(1000, capacity=10)
+    # pylint: disable=protected-access
+    with mock.patch.object(self._module, '_stop_slices') as mock_stop:
+      mock_stop.is_set.return_value = False
+      mock_stop.wait.return_value = False
+      self._module.CollectSlice(trail_slice, mock_client, rate_limiter)
+
+    self.assertEqual(trail_slice.event_count, 2)
+    self.assertEqual(trail_slice.next_token, '')
+    self.assertEqual(
+        mock_client.lookup_events.call_args_list[2],
+        mock.call(
+            StartTime=dt.fromisoformat('2021-01-01 00:00:00+00:00'),
+            EndTime=dt.fromisoformat('2021-01-01 01:00:00+00:00'),
+            NextToken='t1'))
+    self.assertEqual(rate_limiter.rate, 500)
+    mock_stop.wait.assert_any_call(2)
+    with open(trail_slice.output_path, 'r', encoding='utf-8') as slice_file:
+      event_ids = [json.loads(line)['EventId'] for line in slice_file]
+    self.assertEqual(event_ids, ['b', 'a'])
+    os.remove(trail_slice.output_path)
+
   @mock.patch('boto3.session.Session')
   def testProcess(self, mock_boto3):
     """Tests the process method."""
@@ -62,15 +140,16 @@ class AWSLoggingTest(modules_test_base.ModuleTestBase):
 
     mock_session.client.assert_called_with(
         'cloudtrail', region_name='fake-region')
-    mock_client.lookup_events.assert_called_with(
+    self.assertEqual(mock_client.lookup_events.call_count, 8)
+    mock_client.lookup_events.assert_any_call(
         LookupAttributes=[
           {
             'AttributeKey': 'Username',
             'AttributeValue': 'fakename'
           }
         ],
-        StartTime=dt.fromisoformat('2021-01-01 00:00:00'),
-        EndTime=dt.fromisoformat('2021-01-02 00:00:00'))
+        StartTime=dt.fromisoformat('2021-01-01 21:00:00+00:00'),
+        EndTime=dt.fromisoformat('2021-01-02 00:00:00+00:00'))
 
     aws_containers = self._module.GetContainers(containers.File)
     self.assertTrue(aws_containers)
@@ -88,6 +167,91 @@ class AWSLoggingTest(modules_test_base.ModuleTestBase):
       self._ProcessModule()
     mock_client.lookup_events.side_effect = None
 
+  @mock.patch('boto3.session.Session')
+  def testProcessStopsOnError(self, mock_boto3):
+    """Tests that a failed slice stops the others and removes their files."""
+    throttling = boto_exceptions.ClientError(
+        {'Error': {'Code': 'ThrottlingException'}}, 'LookupEvents')
+
+    def _LookupEvents(StartTime, **unused_kwargs):  # pylint: disable=invalid-name
+      if StartTime.hour == 0:
+        raise boto_exceptions.ClientError(
+            {'Error': {'Code': 'AccessDenied'}}, 'LookupEvents')
+      raise throttling
+
+    mock_session = mock.MagicMock(spec=['client'])
+    mock_client = mock.MagicMock(spec=['lookup_events', 'get_caller_identity'])
+    mock_client.lookup_events.side_effect = _LookupEvents
+    mock_session.client.return_value = mock_client
+    mock_boto3.return_value = mock_session
+
+    self._module.SetUp(
+        region='fake-region',
+        start_time=datetime.datetime(2021, 1, 1, 0, 0, 0),
+        end_time=datetime.datetime(2021, 1, 2, 0, 0, 0))
+    # pylint: disable=protected-access
+    self._module._MAX_WORKERS = 2
+    slice_output_path = self._module._SliceOutputPath
+    output_paths = []
+
+    def _SliceOutputPath():
+      output_paths.append(slice_output_path())
+      return output_paths[-1]
+
+    with mock.patch.object(
+        self._module, '_SliceOutputPath', side_effect=_SliceOutputPath):
+      with self.assertRaises(errors.DFTimewolfError):
+        self._ProcessModule()
+
+    self.assertEqual(len(output_paths), 8)
+    # The throttled slice stops, and the pending slices are not collected.
+    self.assertLess(mock_client.lookup_events.call_count, 8)
+    for output_path in output_paths:
+      self.assertFalse(os.path.exists(output_path))
+
+  @mock.patch('boto3.session.Session')
+  def testProcessMergesRegions(self, mock_boto3):
+    """Tests that events of all regions are merged newest first."""
+    events = {
+        'us-east-1': ['2021-01-01T03:00:00', '2021-01-01T01:00:00'],
+        'eu-west-1': ['2021-01-01T02:00:00', '2021-01-01T00:30:00'],
+    }
+
+    def _Client(service_name, region_name=None):
+      del service_name  # Unused.
+      client = mock.MagicMock(spec=['lookup_events', 'get_caller_identity'])
+
+      def _LookupEvents(StartTime, EndTime, **unused_kwargs):  # pylint: disable=invalid-name
+        event_times = [
+            dt.fromisoformat(event_time).replace(tzinfo=datetime.timezone.utc)
+            for event_time in events.get(region_name, [])]
+        return {'Events': [
+            {'EventId': f'{region_name}-{event_time.hour}',
+             'EventTime': event_time}
+            for event_time in event_times
+            if StartTime <= event_time <= EndTime]}
+
+      client.lookup_events.side_effect = _LookupEvents
+      return client
+
+    mock_session = mock.MagicMock(spec=['client'])
+    mock_session.client.side_effect = _Client
+    mock_boto3.return_value = mock_session
+
+    self._module.SetUp(
+        region='us-east-1,eu-west-1',
+        start_time=datetime.datetime(2021, 1, 1, 0, 0, 0),
+        end_time=datetime.datetime(2021, 1, 1, 4, 0, 0))
+    self._ProcessModule()
+
+    aws_containers = self._module.GetContainers(containers.File)
+    with open(aws_containers[0].path, 'r', encoding='utf-8') as output_file:
+      event_ids = [json.loads(line)['EventId'] for line in output_file]
+    self.assertEqual(
+        event_ids,
+        ['us-east-1-3', 'eu-west-1-2', 'us-east-1-1', 'eu-west-1-0'])
+    os.remove(aws_containers[0].path)
+
 
 if __name__ == '__main__':
   unittest.main()
@@ -2,13 +2,22 @@
 # -*- coding: utf-8 -*-
 """Tests the GRR base collector."""
 
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
 import unittest
 import logging
 import mock
 
 from grr_api_client import errors as grr_errors
+from grr_response_proto import flows_pb2
 
+from dftimewolf import config
 from dftimewolf.lib import errors
+from dftimewolf.lib import state
 from dftimewolf.lib.collectors import grr_base
 
 
@@ -69,6 +78,24 @@ class GRRBaseModuleTest(unittest.TestCase):
                      ['approver1@example.com', 'approver2@example.com'])
     self.assertEqual(grr_base_module.output_path, '/fake')
 
+  @mock.patch('grr_api_client.api.InitHttp')
+  def testSetupDownloadDir(self, _):
+    """Tests that results are downloaded to the same directory every run."""
+    download_dir = os.path.join(tempfile.mkdtemp(), 'grr')
+    for _ in range(2):
+      grr_base_module = grr_base.GRRBaseModule()
+      grr_base_module.GrrSetUp(
+          reason='random reason',
+          grr_server_url='http://fake/endpoint',
+          grr_username='admin1',
+          grr_password='admin2',
+          message_callback=mock.MagicMock(),
+          download_dir=download_dir
+      )
+      self.assertEqual(grr_base_module.output_path, download_dir)
+      self.assertTrue(os.path.isdir(download_dir))
+    shutil.rmtree(os.path.dirname(download_dir))
+
   @mock.patch('grr_api_client.api.InitHttp')
   def testApprovalWrapper(self, _):
     """Tests that the approval wrapper works correctly."""
@@ -168,5 +195,210 @@ class GRRBaseModuleTest(unittest.TestCase):
     )
 
 
+class GRRClientResolverTest(unittest.TestCase):
+  """Tests for the GRR client resolver."""
+
+  def testSearchIsCached(self):
+    """Tests that search results are cached until they expire."""
+    mock_api = mock.Mock()
+    mock_api.SearchClients.return_value = iter(['client'])
+    resolver = grr_base.GRRClientResolver(mock_api)
+
+    self.assertEqual(resolver.Search('host1'), ['client'])
+    self.assertEqual(resolver.Search('host1'), ['client'])
+    self.assertEqual(mock_api.SearchClients.call_count, 1)
+
+    # pylint: disable=protected-access,invalid-name
+    resolver._CACHE_TTL_SEC = 0
+    mock_api.SearchClients.return_value = iter(['other_client'])
+    self.assertEqual(resolver.Search('host1'), ['other_client'])
+    self.assertEqual(mock_api.SearchClients.call_count, 2)
+
+  def testConcurrentSearches(self):
+    """Tests that searches for the same selector are only run once."""
+    release = threading.Event()
+    started = []
+
+    def _SearchClients(selector):
+      started.append(selector)
+      release.wait(5)
+      return [selector.upper()]
+
+    mock_api = mock.Mock()
+    mock_api.SearchClients.side_effect = _SearchClients
+    resolver = grr_base.GRRClientResolver(mock_api)
+
+    resolver.Prefetch(['host1', 'host2', 'host1'])
+    results = []
+    waiter = threading.Thread(
+        target=lambda: results.append(resolver.Search('host1')))
+    waiter.start()
+    release.set()
+    waiter.join()
+
+    self.assertEqual(results, [['HOST1']])
+    self.assertEqual(resolver.Search('host2'), ['HOST2'])
+    self.assertEqual(sorted(started), ['host1', 'host2'])
+
+  def testFailedSearchIsNotCached(self):
+    """Tests that failed searches are retried."""
+    mock_api = mock.Mock()
+    mock_api.SearchClients.side_effect = [
+        grr_errors.UnknownError, iter(['client'])]
+    resolver = grr_base.GRRClientResolver(mock_api)
+
+    with self.assertRaises(grr_errors.UnknownError):
+      resolver.Search('host1')
+    self.assertEqual(resolver.Search('host1'), ['client'])
+
+  @mock.patch('grr_api_client.api.InitHttp')
+  def testSharedResolver(self, mock_grr_inithttp):
+    """Tests that modules of a recipe share the resolver for a GRR server."""
+    test_state = state.DFTimewolfState(config.Config)
+    resolvers = []
+    for url in ['http://fake/endpoint', 'http://fake/endpoint', 'http://other']:
+      grr_base_module = grr_base.GRRBaseModule()
+      grr_base_module.GrrSetUp(
+          reason='random reason',
+          grr_server_url=url,
+          grr_username='admin1',
+          grr_password='admin2',
+          message_callback=mock.MagicMock(),
+          state=test_state)
+      resolvers.append(grr_base_module.client_resolver)
+
+    self.assertIs(resolvers[0], resolvers[1])
+    self.assertIsNot(resolvers[0], resolvers[2])
+    self.assertIs(resolvers[0].api, mock_grr_inithttp.return_value)
+
+
+class GRRFlowWatcherTest(unittest.TestCase):
+  """Tests for the GRR flow watcher."""
+
+  def setUp(self):
+    super().setUp()
+    self._watcher = grr_base.GRRFlowWatcher()
+    # pylint: disable=protected-access,invalid-name
+    self._watcher._MIN_INTERVAL_SEC = 0.01
+
+  def _MockClient(self, states, last_seen_at=None):
+    """Returns a mock client whose flow goes through states."""
+    mock_client = mock.Mock()
+    mock_client.data.last_seen_at = last_seen_at or time.time() * 1000000
+    statuses = []
+    for flow_state in states:
+      status = mock.Mock()
+      status.data.state = flow_state
+      statuses.append(status)
+    mock_client.Flow.return_value.Get.side_effect = statuses
+    return mock_client
+
+  def testWatch(self):
+    """Tests that flows are polled until they complete."""
+    running = flows_pb2.FlowContext.RUNNING
+    clients = [
+        self._MockClient([running, running, flows_pb2.FlowContext.TERMINATED]),
+        self._MockClient([running, flows_pb2.FlowContext.ERROR]),
+    ]
+    watches = [
+        self._watcher.Watch(c, f'F:{i}', 0.05) for i, c in enumerate(clients)]
+
+    self.assertEqual(
+        watches[0].result(5).state, flows_pb2.FlowContext.TERMINATED)
+    self.assertEqual(watches[1].result(5).state, flows_pb2.FlowContext.ERROR)
+    clients[0].Flow.assert_called_with('F:0')
+    self.assertEqual(clients[0].Flow.return_value.Get.call_count, 3)
+
+  def testWatchOfflineClient(self):
+    """Tests that flows on offline clients are skipped."""
+    mock_client = self._MockClient(
+        [flows_pb2.FlowContext.RUNNING], last_seen_at=1)
+    watch = self._watcher.Watch(mock_client, 'F:1', 1, max_offline_time=3600)
+    self.assertIsNone(watch.result(5))
+
+  def testWatchError(self):
+    """Tests that polling errors are raised to the waiting module."""
+    mock_client = mock.Mock()
+    mock_client.Flow.return_value.Get.side_effect = grr_errors.UnknownError
+    watch = self._watcher.Watch(mock_client, 'F:1', 1)
+    with self.assertRaises(grr_errors.UnknownError):
+      watch.result(5)
+
+
+class GRRBlobDownloaderTest(unittest.TestCase):
+  """Tests for the GRR blob downloader."""
+
+  def setUp(self):
+    super().setUp()
+    self._downloader = grr_base.GRRBlobDownloader()
+    self._logger = logging.getLogger('null')
+    self._output_dir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    super().tearDown()
+    shutil.rmtree(self._output_dir)
+
+  def testClientConnectionLimit(self):
+    """Tests downloads from a client are limited."""
+    lock = threading.Lock()
+    active = [0]
+    peak = [0]
+
+    def _WriteToStream(out):
+      with lock:
+        active[0] += 1
+        peak[0] = max(peak[0], active[0])
+      time.sleep(0.02)
+      out.write(b'data')
+      with lock:
+        active[0] -= 1
+
+    mock_client = mock.Mock(client_id='C.0000000000000001')
+    mock_client.File.return_value.GetBlob.return_value.WriteToStream = (
+        _WriteToStream)
+    blobs = [grr_base.GRRBlob(f'fs/os/file{i}', 4) for i in range(12)]
+    stats = self._downloader.Download(
+        mock_client, blobs, self._output_dir, self._logger)
+
+    self.assertEqual(stats.downloaded, 12)
+    self.assertEqual(stats.bytes, 48)
+    self.assertLessEqual(
+        peak[0], grr_base.GRRBlobDownloader._MAX_CONNECTIONS_PER_CLIENT)  # pylint: disable=protected-access
+    self.assertGreater(stats.bytes_per_second, 0)
+
+  def testHashMismatch(self):
+    """Tests files whose digest does not match are downloaded again."""
+    mock_client = mock.Mock(client_id='C.0000000000000001')
+    mock_client.File.return_value.GetBlob.return_value.WriteToStream = (
+        lambda out: out.write(b'data'))
+    os.makedirs(os.path.join(self._output_dir, 'fs', 'os'))
+    for name in ('good', 'bad'):
+      with open(os.path.join(self._output_dir, 'fs', 'os', name), 'wb') as f:
+        f.write(b'data' if name == 'good' else b'atad')
+
+    sha256 = hashlib.sha256(b'data').digest()
+    blobs = [grr_base.GRRBlob('fs/os/good', 4, sha256),
+             grr_base.GRRBlob('fs/os/bad', 4, sha256)]
+    stats = self._downloader.Download(
+        mock_client, blobs, self._output_dir, self._logger)
+
+    self.assertEqual(stats.skipped, 1)
+    self.assertEqual(stats.downloaded, 1)
+    mock_client.File.assert_called_once_with('fs/os/bad')
+    with open(os.path.join(self._output_dir, 'fs', 'os', 'bad'), 'rb') as f:
+      self.assertEqual(f.read(), b'data')
+
+  def testNotFound(self):
+    """Tests missing files are reported and leave no partial file."""
+    mock_client = mock.Mock(client_id='C.0000000000000001')
+    mock_client.File.return_value.GetBlob.side_effect = (
+        grr_errors.ResourceNotFoundError('gone'))
+    stats = self._downloader.Download(
+        mock_client, [grr_base.GRRBlob('fs/os/file', 4)], self._output_dir,
+        self._logger)
+    self.assertEqual(stats.failed, 1)
+    self.assertEqual(os.listdir(os.path.join(self._output_dir, 'fs', 'os')), [])
+
+
 if __name__ == '__main__':
   unittest.main()
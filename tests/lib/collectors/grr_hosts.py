@@ -130,6 +130,42 @@ class GRRFlowTests(modules_test_base.ModuleTestBase):
               os.path.join(local_path, mock_client.data.os_info.fqdn.lower(),
                            'F:12345', 'fs', 'os', 'directory', 'file')))
 
+  @mock.patch('grr_api_client.flow.FlowBase.Get')
+  def testDownloadFilesResume(self, mock_Get):
+    """Tests that files already downloaded are not downloaded again."""
+    mock_Get.return_value.data.name = 'ClientFileFinder'
+    mock_Get.return_value.ListResults.return_value = (
+        mock_grr_hosts.MOCK_CFF_RESULTS)
+
+    mock_client = client.Client(
+        data=text_format.Parse(mock_grr_hosts.client_proto1,
+                               client_pb2.ApiClient()),
+        context=True)
+    mock_client.File = mock.MagicMock()
+    mock_write = mock.MagicMock(side_effect=_MOCK_WRITE_TO_STREAM)
+    mock_client.File.return_value.GetBlob.return_value.WriteToStream = (
+        mock_write)
+
+    with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as local_path:
+      self._module.output_path = local_path
+
+      self._module._DownloadFiles(mock_client, 'F:12345')
+      mock_Get.return_value.ListResults.assert_called_once()
+      mock_write.assert_called_once()
+
+      self._module._DownloadFiles(mock_client, 'F:12345')
+      mock_write.assert_called_once()
+
+      # A truncated file is downloaded again.
+      path = os.path.join(local_path, mock_client.data.os_info.fqdn.lower(),
+                          'F:12345', 'fs', 'os', 'directory', 'file')
+      with open(path, 'wb') as truncated:
+        truncated.write(b'\0' * 10)
+      self._module._DownloadFiles(mock_client, 'F:12345')
+      self.assertEqual(mock_write.call_count, 2)
+      self.assertEqual(os.path.getsize(path), 1024)
+      self.assertFalse(os.path.exists(path + '.part'))
+
   @mock.patch("os.remove")
   @mock.patch('os.makedirs')
   @mock.patch("zipfile.ZipFile")
@@ -2,6 +2,9 @@
 """Tests the GRR hunt collectors."""
 
 
+import io
+import os
+import tempfile
 import unittest
 import zipfile
 import mock
@@ -16,6 +19,20 @@ from tests.lib.collectors.test_data import mock_grr_hosts
 from tests.lib import modules_test_base
 
 
+class _NonSeekableWriter(io.RawIOBase):
+  """Write-only stream that cannot seek, to build streamed ZIP archives."""
+
+  def __init__(self, output: io.BytesIO) -> None:
+    super().__init__()
+    self._output = output
+
+  def writable(self) -> bool:
+    return True
+
+  def write(self, data) -> int:  # type: ignore[override]
+    return self._output.write(data)
+
+
 # pylint: disable=invalid-name,arguments-differ
 class GRRHuntArtifactCollectorTest(modules_test_base.ModuleTestBase):
   """Tests for the GRR artifact collector."""
@@ -190,17 +207,131 @@ class GRRHuntDownloader(modules_test_base.ModuleTestBase):
 
   @mock.patch('dftimewolf.lib.collectors.grr_hunt.GRRHuntDownloader._ExtractHuntResults')  # pylint: disable=line-too-long
   @mock.patch('dftimewolf.lib.collectors.grr_hunt.GRRHuntDownloader._GetAndWriteArchive')  # pylint: disable=line-too-long
+  @mock.patch('dftimewolf.lib.collectors.grr_hunt.GRRHuntDownloader._StreamHuntResults')  # pylint: disable=line-too-long
   def testCollectHuntResults(self,
+                             mock_stream_results,
                              mock_get_write_archive,
                              mock_ExtractHuntResults):
     """Tests that hunt results are downloaded to the correct file."""
     self.mock_grr_api.Hunt.return_value.Get.return_value = \
         mock_grr_hosts.MOCK_HUNT
+    # pylint: disable=protected-access
+    mock_stream_results.side_effect = grr_hunt._UnsupportedArchiveError(
+        'Encrypted member')
     self._ProcessModule()
+    mock_stream_results.assert_called_with(mock_grr_hosts.MOCK_HUNT)
     mock_get_write_archive.assert_called_with(mock_grr_hosts.MOCK_HUNT,
                                               '/tmp/test/H:12345.zip')
     mock_ExtractHuntResults.assert_called_with('/tmp/test/H:12345.zip')
 
+  def testStreamHuntResults(self):
+    """Tests that hunt results are extracted while the archive downloads."""
+    self._module.output_path = tempfile.mkdtemp()
+    with open('tests/lib/collectors/test_data/hunt.zip', 'rb') as archive:
+      data = archive.read()
+    mock_hunt = mock.Mock(hunt_id='H:12345')
+    mock_hunt.GetFilesArchive.return_value.GenerateChunks.return_value = (
+        data[i:i + 1000] for i in range(0, len(data), 1000))
+
+    # pylint: disable=protected-access
+    self._module._StreamHuntResults(mock_hunt)
+
+    hunt_dir = os.path.join(self._module.output_path, 'hunt_H_A43ABF9D')
+    expected = sorted([
+        ('greendale-student04.c.greendale.internal',
+         os.path.join(hunt_dir, 'C.4c4223a2ea9cf6f1')),
+        ('greendale-admin.c.greendale.internal',
+         os.path.join(hunt_dir, 'C.ba6b63df5d330589')),
+        ('greendale-student05.c.greendale.internal',
+         os.path.join(hunt_dir, 'C.fc693a148af801d5'))
+    ])
+    files = self._module.GetContainers(containers.File)
+    self.assertEqual(sorted((f.name, f.path) for f in files), expected)
+    self.assertEqual(
+        os.path.getsize(os.path.join(
+            hunt_dir, 'C.ba6b63df5d330589', 'fs', 'os', 'home', 'tomchop',
+            '.bash_history')),
+        6829)
+    self.assertFalse(os.path.exists(os.path.join(
+        hunt_dir, 'C.ba6b63df5d330589', 'client_info.yaml')))
+
+  def _StreamArchive(self, members):
+    """Extracts a hunt archive of members written as a stream.
+
+    Args:
+      members (list[tuple[str, bytes]]): names and contents of the members.
+
+    Returns:
+      list[tuple[str, str]]: names and paths of the stored File containers.
+    """
+    output = io.BytesIO()
+    with zipfile.ZipFile(
+        _NonSeekableWriter(output), 'w', zipfile.ZIP_DEFLATED) as archive:
+      for name, contents in members:
+        with archive.open(name, 'w') as member:
+          member.write(contents)
+    data = output.getvalue()
+    mock_hunt = mock.Mock(hunt_id='H:12345')
+    mock_hunt.GetFilesArchive.return_value.GenerateChunks.return_value = (
+        data[i:i + 100] for i in range(0, len(data), 100))
+
+    # pylint: disable=protected-access
+    self._module._StreamHuntResults(mock_hunt)
+    files = self._module.GetContainers(containers.File)
+    return sorted((f.name, f.path) for f in files)
+
+  def testStreamHuntResultsInterleaved(self):
+    """Tests that clients whose files are interleaved are stored complete."""
+    self._module.output_path = tempfile.mkdtemp()
+    files = self._StreamArchive([
+        ('hunt/C.1111111111111111/client_info.yaml',
+         b'client_id: C.1111111111111111\nos_info: {fqdn: one}\n'),
+        ('hunt/C.1111111111111111/fs/a', b'a1'),
+        ('hunt/C.2222222222222222/client_info.yaml',
+         b'client_id: C.2222222222222222\nos_info: {fqdn: two}\n'),
+        ('hunt/C.2222222222222222/fs/a', b'a2'),
+        ('hunt/C.1111111111111111/fs/b', b'b1'),
+    ])
+
+    hunt_dir = os.path.join(self._module.output_path, 'hunt')
+    self.assertEqual(files, [
+        ('one', os.path.join(hunt_dir, 'C.1111111111111111')),
+        ('two', os.path.join(hunt_dir, 'C.2222222222222222'))])
+    with open(os.path.join(
+        hunt_dir, 'C.1111111111111111', 'fs', 'b'), 'rb') as extracted:
+      self.assertEqual(extracted.read(), b'b1')
+
+  def testStreamHuntResultsClientInfoLast(self):
+    """Tests that clients are named by a client_info.yaml after their files."""
+    self._module.output_path = tempfile.mkdtemp()
+    files = self._StreamArchive([
+        ('hunt/C.1111111111111111/fs/a', b'a1'),
+        ('hunt/C.1111111111111111/client_info.yaml',
+         b'client_id: C.1111111111111111\nos_info: {fqdn: one}\n'),
+    ])
+
+    self.assertEqual(files, [
+        ('one', os.path.join(
+            self._module.output_path, 'hunt', 'C.1111111111111111'))])
+
+  def testStreamingZipReader(self):
+    """Tests that archives written as a stream are decoded in order."""
+    output = io.BytesIO()
+    # Writing through a non-seekable file makes zipfile use data descriptors,
+    # as GRR does.
+    with zipfile.ZipFile(
+        _NonSeekableWriter(output), 'w', zipfile.ZIP_DEFLATED) as archive:
+      for name, contents in [('a', b''), ('b', b'x' * 100000)]:
+        with archive.open(name, 'w', force_zip64=True) as member:
+          member.write(contents)
+    data = output.getvalue()
+
+    # pylint: disable=protected-access
+    reader = grr_hunt._StreamingZipReader(
+        data[i:i + 7] for i in range(0, len(data), 7))
+    members = [(m.filename, b''.join(m.Read())) for m in reader.Members()]
+    self.assertEqual(members, [('a', b''), ('b', b'x' * 100000)])
+
   @mock.patch('os.remove')
   @mock.patch('zipfile.ZipFile.extract')
   def testExtractHuntResults(self, _, mock_remove):
@@ -2,9 +2,16 @@
 # -*- coding: utf-8 -*-
 """Tests the Google Cloud Platform (GCP) logging collector."""
 
+import datetime
+import json
+import os
 import unittest
 
+import mock
+from google.api_core import exceptions as google_api_exceptions
+
 from dftimewolf.lib import state
+from dftimewolf.lib import utils
 from dftimewolf.lib.collectors import gcp_logging
 
 from dftimewolf import config
@@ -18,6 +25,96 @@ class GCPLoggingTest(unittest.TestCase):
     gcp_logging_collector = gcp_logging.GCPLogsCollector(test_state)
     self.assertIsNotNone(gcp_logging_collector)
 
+  def _SetUpCollector(
+      self,
+      backoff=True,
+      filter_expression=(
+          'resource.type="gce_instance" AND timestamp >= "<START_TIME>" AND '
+          'timestamp <= "<END_TIME>"')):
+    """Returns a collector for a one hour window."""
+    test_state = state.DFTimewolfState(config.Config)
+    collector = gcp_logging.GCPLogsCollector(test_state)
+    collector.SetUp(
+        project_name='ketchup-research',
+        filter_expression=filter_expression,
+        backoff=backoff,
+        delay='0',
+        start_time=datetime.datetime(
+            2024, 1, 1, 0, 0, tzinfo=datetime.timezone.utc),
+        end_time=datetime.datetime(
+            2024, 1, 1, 1, 0, tzinfo=datetime.timezone.utc))
+    return collector
+
+  def testSliceTimeWindow(self):
+    """Tests that the query window is split in contiguous slices."""
+    collector = self._SetUpCollector()
+    slices = collector.SliceTimeWindow()
+    self.assertEqual(len(slices), 6)
+    self.assertEqual(slices[0].start_time, collector.start_time)
+    self.assertEqual(slices[-1].end_time, collector.end_time)
+    for previous, log_slice in zip(slices, slices[1:]):
+      self.assertEqual(previous.end_time, log_slice.start_time)
+      self.assertFalse(previous.include_end_time)
+    self.assertTrue(slices[-1].include_end_time)
+    self.assertEqual(
+        collector.SliceFilter(slices[0]),
+        '(resource.type="gce_instance" AND '
+        'timestamp >= "2024-01-01T00:00:00+0000" AND '
+        'timestamp <= "2024-01-01T01:00:00+0000") AND '
+        'timestamp >= "2024-01-01T00:00:00+00:00" AND '
+        'timestamp < "2024-01-01T00:10:00+00:00"')
+    for log_slice in slices:
+      os.remove(log_slice.output_path)
+
+  def testSliceTimeWindowWithoutPlaceholders(self):
+    """Tests that filters not using the time window are not restricted."""
+    collector = self._SetUpCollector(
+        filter_expression='resource.type="gce_instance"')
+    slices = collector.SliceTimeWindow()
+    self.assertEqual(len(slices), 1)
+    self.assertEqual(
+        collector.SliceFilter(slices[0]), '(resource.type="gce_instance")')
+    os.remove(slices[0].output_path)
+
+  @mock.patch('time.sleep')
+  def testCollectSliceResumes(self, _):
+    """Tests that a slice resumes from its checkpoint on quota errors."""
+    collector = self._SetUpCollector()
+    slices = collector.SliceTimeWindow()
+    log_slice = slices[-1]
+    for other_slice in slices[:-1]:
+      os.remove(other_slice.output_path)
+
+    def _Entry(timestamp, insert_id):
+      entry = mock.Mock()
+      entry.to_api_repr.return_value = {
+          'timestamp': timestamp, 'insertId': insert_id}
+      return entry
+
+    def _FailingPages():
+      yield [_Entry('2024-01-01T00:55:00Z', 'a'),
+             _Entry('2024-01-01T00:55:00Z', 'b')]
+      raise google_api_exceptions.TooManyRequests('quota')
+
+    pages = [_FailingPages(), iter([[_Entry('2024-01-01T00:56:00Z', 'c')]])]
+    rate_limiter = utils.TokenBucket(1000, capacity=10)
+    with mock.patch.object(collector, 'SetupLoggingClient'), \
+        mock.patch.object(
+            collector, 'ListPages', side_effect=pages) as mock_list_pages:
+      collector.CollectSlice(log_slice, rate_limiter, 2)
+
+    self.assertEqual(log_slice.entry_count, 3)
+    resume_filter = mock_list_pages.call_args_list[1][0][1]
+    self.assertIn(
+        '(timestamp > "2024-01-01T00:55:00Z" OR '
+        '(timestamp = "2024-01-01T00:55:00Z" AND insertId > "b"))',
+        resume_filter)
+    self.assertEqual(rate_limiter.rate, 500)
+    with open(log_slice.output_path, 'r', encoding='utf-8') as slice_file:
+      insert_ids = [json.loads(line)['insertId'] for line in slice_file]
+    self.assertEqual(insert_ids, ['a', 'b', 'c'])
+    os.remove(log_slice.output_path)
+
 
 if __name__ == '__main__':
   unittest.main()
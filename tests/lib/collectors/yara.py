@@ -1,9 +1,13 @@
 #!/usr/bin/env python
 """Tests the Yeti YaraCollector collectors (YetiYaraCollector)."""
 
+import os
+import shutil
+import tempfile
 from unittest import mock
 import unittest
 
+from dftimewolf.lib import errors
 from dftimewolf.lib.collectors import yara
 from dftimewolf.lib.containers import containers
 from tests.lib import modules_test_base
@@ -36,23 +40,27 @@ class YetiYaraCollectorTest(modules_test_base.ModuleTestBase):
     self._InitModule(yara.YetiYaraCollector)
     super().setUp()
 
-  @mock.patch('requests.post')
-  def testProcess(self, mock_post):
-    """Tests that Process() runs as expected."""
-    mock_post.return_value.status_code = 200
-    mock_post.return_value.json.return_value = MOCK_RESPONSE
-
+  def _SetUpModule(self):
+    """Sets up the module with a test API."""
     self._module.SetUp(
         rule_name_filter='rulefilter',
         api_key='d34db33f',
         api_root='http://localhost:8080/api/'
     )
+
+  @mock.patch('requests.Session.post')
+  def testProcess(self, mock_post):
+    """Tests that Process() runs as expected."""
+    mock_post.return_value.status_code = 200
+    mock_post.return_value.json.return_value = MOCK_RESPONSE
+
+    self._SetUpModule()
     self._ProcessModule()
 
     mock_post.assert_called_with(
         'http://localhost:8080/api/indicators/filter/',
-        json={'name': 'rulefilter', 'type': 'x-yara'},
-        headers={'X-Yeti-API': 'd34db33f'},
+        json={'name': 'rulefilter', 'type': 'x-yara', 'page': 1,
+              'count': 500},
     )
     yara_containers = self._module.GetContainers(
       containers.YaraRule)
@@ -70,17 +78,61 @@ class YetiYaraCollectorTest(modules_test_base.ModuleTestBase):
         '}'
     )
 
-  @mock.patch('requests.post')
+  @mock.patch('requests.Session.post')
+  def testPagination(self, mock_post):
+    """Tests that indicators are listed page by page."""
+    indicators = [
+        dict(MOCK_RESPONSE[0], id=f'x-yara--{index}', name=f'Rule {index}')
+        for index in range(5)]
+    pages = [indicators[0:2], indicators[2:4], indicators[4:]]
+    mock_post.return_value.status_code = 200
+    mock_post.return_value.json.side_effect = pages
+
+    self._SetUpModule()
+    # pylint: disable=protected-access
+    self._module._PAGE_SIZE = 2
+    self._ProcessModule()
+
+    self.assertEqual(
+        [call[1]['json']['page'] for call in mock_post.call_args_list],
+        [1, 2, 3])
+    self.assertEqual(
+        [container.name for container in
+         self._module.GetContainers(containers.YaraRule)],
+        [f'Rule {index}' for index in range(5)])
+
+  @mock.patch('requests.Session.get')
+  @mock.patch('requests.Session.post')
+  def testFetchMissingRules(self, mock_post, mock_get):
+    """Tests that only the rules missing from the listing are fetched."""
+    missing = dict(
+        {key: value for key, value in MOCK_RESPONSE[0].items()
+         if key != 'pattern'},
+        id='x-yara--missing')
+    mock_post.return_value.status_code = 200
+    mock_post.return_value.json.return_value = [MOCK_RESPONSE[0], missing]
+    mock_get.return_value.status_code = 200
+    mock_get.return_value.json.return_value = dict(
+        missing, name='Missing rule', pattern='rule missing {}')
+
+    self._SetUpModule()
+    self._ProcessModule()
+
+    mock_get.assert_called_once_with(
+        'http://localhost:8080/api/indicators/x-yara--missing')
+    yara_containers = self._module.GetContainers(containers.YaraRule)
+    self.assertEqual(
+        [container.name for container in yara_containers],
+        ['Some random rule', 'Missing rule'])
+    self.assertEqual(yara_containers[1].rule_text, 'rule missing {}')
+
+  @mock.patch('requests.Session.post')
   def testProcessBadRequest(self, mock_post):
     """Tests that Process() handles errors correctly."""
     mock_post.return_value.status_code = 519
     mock_post.return_value.json.return_value = 'BAD_RESPONSE'
 
-    self._module.SetUp(
-        rule_name_filter='rulefilter',
-        api_key='d34db33f',
-        api_root='http://localhost:8080/api/'
-    )
+    self._SetUpModule()
     with self.assertLogs(self._module.logger, level='ERROR') as lc:
       self._ProcessModule()
 
@@ -95,5 +147,60 @@ class YetiYaraCollectorTest(modules_test_base.ModuleTestBase):
         containers.YaraRule)
       self.assertEqual(len(yara_containers), 0)
 
+
+class LocalYaraCollectorTest(modules_test_base.ModuleTestBase):
+  """Tests for the local Yara collector."""
+
+  def setUp(self):
+    self._InitModule(yara.LocalYaraCollector)
+    super().setUp()
+    self._path = tempfile.mkdtemp()
+    os.makedirs(os.path.join(self._path, 'rules', 'windows'))
+    for name, text in (
+        (os.path.join('rules', 'a.yar'),
+         'rule a { condition: true }\nprivate rule b { condition: true }'),
+        (os.path.join('rules', 'windows', 'c.yara'),
+         '// a rule about rules\nglobal rule c { condition: true }'),
+        (os.path.join('rules', 'README.md'), 'rule notarule'),
+        ('d.yar', 'rule d { condition: true }')):
+      with open(os.path.join(self._path, name), 'w') as rules_file:
+        rules_file.write(text)
+
+  def tearDown(self):
+    shutil.rmtree(self._path)
+
+  def testProcessFile(self):
+    """Tests collecting rules from a file."""
+    self._module.SetUp(rules_path=os.path.join(self._path, 'd.yar'))
+    self._ProcessModule()
+    yara_containers = self._module.GetContainers(containers.YaraRule)
+    self.assertEqual(len(yara_containers), 1)
+    self.assertEqual(yara_containers[0].name, 'd.yar')
+    self.assertEqual(
+        yara_containers[0].rule_text, 'rule d { condition: true }')
+
+  def testProcessDirectoriesAndGlobs(self):
+    """Tests collecting rules from directories and glob patterns."""
+    self._module.SetUp(rules_path=','.join([
+        os.path.join(self._path, 'rules'),
+        os.path.join(self._path, '*.yar'),
+        os.path.join(self._path, 'rules', 'a.yar')]))
+    with self.assertLogs(self._module.logger, level='INFO') as logs:
+      self._ProcessModule()
+    self.assertEqual(
+        [container.name for container in
+         self._module.GetContainers(containers.YaraRule)],
+        ['a.yar', 'c.yara', 'd.yar'])
+    self.assertIn(
+        'Collected 4 Yara rules from 3 files',
+        [record.getMessage() for record in logs.records][-1])
+
+  def testProcessNoFiles(self):
+    """Tests that a path without rules files is a critical error."""
+    self._module.SetUp(rules_path=os.path.join(self._path, '*.yaml'))
+    with self.assertRaises(errors.DFTimewolfError):
+      self._ProcessModule()
+
+
 if __name__ == '__main__':
   unittest.main()
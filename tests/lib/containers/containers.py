@@ -139,6 +139,44 @@ class OsqueryResultDataTest(unittest.TestCase):
 
     self.assertEqual(attribute_names, expected_attribute_names)
 
+class FingerprintTest(unittest.TestCase):
+  """Tests for the AttributeContainer Fingerprint method."""
+
+  def testFingerprint(self):
+    """Tests that equal containers have equal fingerprints."""
+    file_1 = containers.File(name='name', path='/path')
+    file_2 = containers.File(name='name', path='/path')
+    file_2.SetMetadata('key', 'value')
+    file_3 = containers.File(name='name', path='/other')
+
+    self.assertIsNotNone(file_1.Fingerprint())
+    self.assertEqual(file_1.Fingerprint(), file_2.Fingerprint())
+    self.assertNotEqual(file_1.Fingerprint(), file_3.Fingerprint())
+
+  def testDataFrameFingerprint(self):
+    """Tests fingerprinting of containers with DataFrame members."""
+    df_1 = pandas.DataFrame(columns=['a', 'b'], data=[[1, 2], [3, 4]])
+    df_2 = pandas.DataFrame(columns=['a', 'b'], data=[[1, 2], [3, 4]])
+    df_3 = pandas.DataFrame(columns=['a', 'b'], data=[[3, 4], [1, 2]])
+    df_4 = pandas.DataFrame(columns=['c', 'd'], data=[[1, 2], [3, 4]])
+
+    fingerprints = [
+        containers.DataFrame(
+            data_frame=df, description='description', name='name').Fingerprint()
+        for df in (df_1, df_2, df_3, df_4)]
+
+    self.assertEqual(fingerprints[0], fingerprints[1])
+    self.assertNotEqual(fingerprints[0], fingerprints[2])
+    self.assertNotEqual(fingerprints[0], fingerprints[3])
+
+  def testUnhashableFingerprint(self):
+    """Tests that containers with unhashable members have no fingerprint."""
+    df = pandas.DataFrame(columns=['a'], data=[[[1, 2]]])
+    container = containers.DataFrame(
+        data_frame=df, description='description', name='name')
+    self.assertIsNone(container.Fingerprint())
+
+
 class TicketAttributeTest(unittest.TestCase):
   """Tests for the TicketAttribute attribute container."""
   def TestEquality(self):
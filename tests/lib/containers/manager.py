@@ -1,8 +1,11 @@
 """Tests for the ContainerManager."""
 
+import gc
 import logging
+import threading
 import unittest
 from unittest import mock
+import weakref
 
 import pandas as pd
 
@@ -605,6 +608,56 @@ class ContainerManagerTest(unittest.TestCase):
     self.assertIn(containers.DataFrame(
         data_frame=df3, description='Description', name='name'), actual)
 
+  def test_StoreDuplicateUnfingerprintedContainers(self):
+    """Tests duplicate detection for containers without a fingerprint."""
+    self._container_manager.ParseRecipe(_TEST_RECIPE)
+
+    with mock.patch.object(_TestContainer1, 'Fingerprint', return_value=None):
+      self._container_manager.StoreContainer(
+          source_module='Preflight1', container=_TestContainer1('param1'))
+    self._container_manager.StoreContainer(
+        source_module='Preflight1', container=_TestContainer1('param1'))
+    self._container_manager.StoreContainer(
+        source_module='Preflight1', container=_TestContainer1('param2'))
+    with mock.patch.object(_TestContainer1, 'Fingerprint', return_value=None):
+      self._container_manager.StoreContainer(
+          source_module='Preflight1', container=_TestContainer1('param2'))
+
+    actual = self._container_manager.GetContainers(
+        requesting_module='ModuleA', container_class=_TestContainer1)
+    self.assertEqual(len(actual), 2)
+    self.assertEqual(actual[0], _TestContainer1('param1'))
+    self.assertEqual(actual[1], _TestContainer1('param2'))
+
+  def test_PopManyContainers(self):
+    """Tests popping a large number of containers keeps ordering intact."""
+    self._container_manager.ParseRecipe(_TEST_RECIPE)
+
+    for i in range(1000):
+      self._container_manager.StoreContainer(
+          source_module='ModuleA', container=_TestContainer1(f'ModuleA {i}'))
+    self._container_manager.StoreContainer(
+        source_module='Preflight1', container=_TestContainer1('Preflight1'))
+
+    actual = self._container_manager.GetContainers(
+        requesting_module='ModuleA', container_class=_TestContainer1, pop=True)
+    self.assertEqual(len(actual), 1001)
+    self.assertEqual(actual[0], _TestContainer1('ModuleA 0'))
+    self.assertEqual(actual[999], _TestContainer1('ModuleA 999'))
+
+    # Only the container stored by Preflight1 remains
+    actual = self._container_manager.GetContainers(
+        requesting_module='ModuleA', container_class=_TestContainer1)
+    self.assertEqual(len(actual), 1)
+    self.assertEqual(actual[0], _TestContainer1('Preflight1'))
+
+    # Popped containers can be stored again
+    self._container_manager.StoreContainer(
+        source_module='ModuleA', container=_TestContainer1('ModuleA 0'))
+    actual = self._container_manager.GetContainers(
+        requesting_module='ModuleA', container_class=_TestContainer1)
+    self.assertEqual(len(actual), 2)
+
   def test_ContainerStreaming(self):
     """Tests that container streaming operates as expected."""
     # Preflight1 will generate containers
@@ -676,6 +729,197 @@ class ContainerManagerTest(unittest.TestCase):
     self.assertEqual(len(actual), 1)
     self.assertEqual(actual[0], _TestContainer3('From Preflight1'))
 
+  def test_RegisteredStream(self):
+    """Tests containers from upstream modules are delivered via the stream."""
+    self._container_manager.ParseRecipe(_TEST_RECIPE)
+    self._container_manager.RegisterStream(
+        module_name='ModuleD',
+        container_type=_TestContainer1,
+        queue_size=10,
+        in_flight_limit=10)
+
+    self._container_manager.StoreContainer(
+        source_module='ModuleB', container=_TestContainer1('Stream 1'))
+    self._container_manager.StoreContainer(
+        source_module='ModuleC', container=_TestContainer1('Stream 2'))
+    self._container_manager.StoreContainer(
+        source_module='ModuleC', container=_TestContainer1('Stream 2'))
+    self._container_manager.StoreContainer(
+        source_module='ModuleC', container=_TestContainer2('Not streamed'))
+
+    # Streamed containers are not stored for the streaming module...
+    self.assertEqual(
+        self._container_manager.GetContainers(
+            requesting_module='ModuleD', container_class=_TestContainer1),
+        [])
+    self.assertEqual(
+        len(self._container_manager.GetContainers(
+            requesting_module='ModuleD', container_class=_TestContainer2)),
+        1)
+    # ... but still are for other dependent modules.
+    self.assertEqual(
+        len(self._container_manager.GetContainers(
+            requesting_module='ModuleE', container_class=_TestContainer1)),
+        1)
+
+    self.assertEqual(
+        self._container_manager.GetStreamedContainer('ModuleD'),
+        (_TestContainer1('Stream 1'), 'ModuleB'))
+    self.assertEqual(
+        self._container_manager.GetStreamedContainer('ModuleD'),
+        (_TestContainer1('Stream 2'), 'ModuleC'))
+
+    self._container_manager.CompleteModule('ModuleB')
+    self._container_manager.CompleteModule('ModuleC')
+    self.assertIsNone(self._container_manager.GetStreamedContainer('ModuleD'))
+
+  def test_StreamBackpressure(self):
+    """Tests producers block once their in-flight limit is reached."""
+    self._container_manager.ParseRecipe(_TEST_RECIPE)
+    self._container_manager.RegisterStream(
+        module_name='ModuleD',
+        container_type=_TestContainer1,
+        queue_size=10,
+        in_flight_limit=1)
+
+    self._container_manager.StoreContainer(
+        source_module='ModuleB', container=_TestContainer1('First'))
+    stored = threading.Event()
+
+    def _Produce():
+      self._container_manager.StoreContainer(
+          source_module='ModuleB', container=_TestContainer1('Second'))
+      stored.set()
+
+    producer = threading.Thread(target=_Produce)
+    producer.start()
+
+    # Retrieving the container is not enough, it must also be processed.
+    self._container_manager.GetStreamedContainer('ModuleD')
+    self.assertFalse(stored.wait(0.1))
+
+    self._container_manager.StreamedContainerDone('ModuleD', 'ModuleB')
+    self.assertTrue(stored.wait(5))
+    producer.join()
+    self.assertEqual(
+        self._container_manager.GetStreamedContainer('ModuleD'),
+        (_TestContainer1('Second'), 'ModuleB'))
+
+  def test_StreamHoldsNoReferences(self):
+    """Tests the stream dedupes without keeping delivered containers alive."""
+    # pylint: disable=protected-access
+    stream = manager._ContainerStream('test1', ['ModuleB'], 10, 10)
+    container = _TestContainer1('Streamed')
+    reference = weakref.ref(container)
+    self.assertTrue(stream.Put(container, 'ModuleB', container.Fingerprint()))
+    self.assertIs(stream.Get()[0], container)
+    stream.TaskDone('ModuleB')
+    del container
+    gc.collect()
+    self.assertIsNone(reference())
+
+    duplicate = _TestContainer1('Streamed')
+    self.assertTrue(stream.Put(duplicate, 'ModuleB', duplicate.Fingerprint()))
+    stream.CloseProducer('ModuleB')
+    self.assertIsNone(stream.Get())
+
+  def test_CloseStream(self):
+    """Tests unconsumed containers are stored when a stream is closed."""
+    self._container_manager.ParseRecipe(_TEST_RECIPE)
+    self._container_manager.RegisterStream(
+        module_name='ModuleD',
+        container_type=_TestContainer1,
+        queue_size=10,
+        in_flight_limit=10)
+
+    self._container_manager.StoreContainer(
+        source_module='ModuleB', container=_TestContainer1('Unconsumed'))
+    self._container_manager.CloseStream('ModuleD')
+    self._container_manager.StoreContainer(
+        source_module='ModuleC', container=_TestContainer1('After close'))
+
+    actual = self._container_manager.GetContainers(
+        requesting_module='ModuleD', container_class=_TestContainer1)
+    self.assertEqual(len(actual), 2)
+    self.assertIn(_TestContainer1('Unconsumed'), actual)
+    self.assertIn(_TestContainer1('After close'), actual)
+
+    with self.assertRaises(RuntimeError):
+      self._container_manager.GetStreamedContainer('ModuleD')
+
+  def test_MemoryLimit(self):
+    """Tests DataFrames are spilled to disk once the memory limit is reached."""
+    self._container_manager.ParseRecipe(_TEST_RECIPE)
+    data_frame = pd.DataFrame({'a': range(1000)})
+    size = int(data_frame.memory_usage(deep=True).sum())
+    self._container_manager.SetMemoryLimit(size + 1)
+
+    self._container_manager.StoreContainer(
+        source_module='ModuleB',
+        container=containers.DataFrame(data_frame.copy(), 'first', 'first'))
+    self._container_manager.StoreContainer(
+        source_module='ModuleB',
+        container=containers.DataFrame(data_frame.copy(), 'second', 'second'))
+
+    # Containers are shared between modules, but counted for each of them.
+    # Nothing is spilled while the source module may still use the containers.
+    self.assertEqual(
+        self._container_manager.GetResidentBytes(),
+        {'Preflight1': 0, 'Preflight2_1': 0, 'Preflight2_2': 0,
+         'ModuleA': 0, 'ModuleB': 2 * size, 'ModuleC': 0,
+         'ModuleD': 2 * size, 'ModuleE': 2 * size})
+
+    self._container_manager.CompleteModule('ModuleB')
+    self.assertEqual(
+        self._container_manager.GetResidentBytes(),
+        {'Preflight1': 0, 'Preflight2_1': 0, 'Preflight2_2': 0,
+         'ModuleA': 0, 'ModuleB': 0, 'ModuleC': 0, 'ModuleD': size,
+         'ModuleE': size})
+
+    # Spilled DataFrames are read back when the containers are retrieved, and
+    # are not stored again.
+    self._container_manager.StoreContainer(
+        source_module='ModuleB',
+        container=containers.DataFrame(data_frame.copy(), 'first', 'first'))
+    actual = self._container_manager.GetContainers(
+        requesting_module='ModuleD', container_class=containers.DataFrame)
+    self.assertEqual(len(actual), 2)
+    for container in actual:
+      pd.testing.assert_frame_equal(container.data_frame, data_frame)
+
+    self._container_manager.CompleteModule('ModuleD')
+    self._container_manager.CompleteModule('ModuleE')
+    self._container_manager.CompleteModule('ModuleB')
+    self.assertEqual(
+        sum(self._container_manager.GetResidentBytes().values()), 0)
+
+  def test_MemoryLimitSourceModule(self):
+    """Tests containers are not spilled while their source module runs."""
+    self._container_manager.ParseRecipe(_TEST_RECIPE)
+    data_frame = pd.DataFrame({'a': range(1000)})
+    self._container_manager.SetMemoryLimit(1)
+
+    container = containers.DataFrame(data_frame.copy(), 'first', 'first')
+    self._container_manager.StoreContainer(
+        source_module='ModuleB', container=container)
+    self._container_manager.StoreContainer(
+        source_module='ModuleB',
+        container=containers.DataFrame(data_frame.copy(), 'second', 'second'))
+    self._container_manager.GetContainers(
+        requesting_module='ModuleD', container_class=containers.DataFrame)
+    self._container_manager.CompleteModule('ModuleD')
+
+    # ModuleB still holds the container it stored.
+    pd.testing.assert_frame_equal(container.data_frame, data_frame)
+
+    self._container_manager.CompleteModule('ModuleB')
+    self.assertIsNone(container.data_frame)
+    actual = self._container_manager.GetContainers(
+        requesting_module='ModuleE', container_class=containers.DataFrame)
+    self.assertEqual(len(actual), 2)
+    for stored in actual:
+      pd.testing.assert_frame_equal(stored.data_frame, data_frame)
+
   def test_SelfStreamContainer(self):
     """A modules streaming callback does not invoke the callback recursively."""
     mock_callback = mock.MagicMock()
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""Tests for the container spill store."""
+
+import logging
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from dftimewolf.lib.containers import containers
+from dftimewolf.lib.containers import spill
+
+
+def _MakeContainer(rows: int, name: str = 'frame') -> containers.DataFrame:
+  """Returns a DataFrame container holding rows rows."""
+  data_frame = pd.DataFrame(
+      {'a': range(rows), 'b': [f'value {i}' for i in range(rows)]})
+  return containers.DataFrame(data_frame, 'description', name)
+
+
+class SpillStoreTest(unittest.TestCase):
+  """Tests for the SpillStore class."""
+
+  def setUp(self):
+    super().setUp()
+    self._scratch_dir = tempfile.mkdtemp()
+    self._logger = logging.getLogger('null')
+    self._logger.addHandler(logging.NullHandler())
+
+  def tearDown(self):
+    super().tearDown()
+    os.rmdir(self._scratch_dir)
+
+  def testSpillAndLoad(self):
+    """Tests least recently used containers are spilled and read back."""
+    first = _MakeContainer(100, 'first')
+    second = _MakeContainer(100, 'second')
+    expected = first.data_frame.copy()
+    size = spill.DataFrameBytes(first)
+
+    store = spill.SpillStore(size + 1, self._logger, self._scratch_dir)
+    store.Add(first)
+    store.Add(second)
+    store.Enforce()
+
+    self.assertTrue(store.IsSpilled(first))
+    self.assertIsNone(first.data_frame)
+    self.assertFalse(store.IsSpilled(second))
+    self.assertEqual(store.resident_bytes, size)
+    self.assertEqual(store.ResidentBytes(first), 0)
+
+    store.Load(first)
+    self.assertFalse(store.IsSpilled(first))
+    pd.testing.assert_frame_equal(first.data_frame, expected)
+
+    store.Close()
+
+  def testSpillIsLossless(self):
+    """Tests DataFrames read back exactly as spilled, dtypes included."""
+    container = containers.DataFrame(
+        pd.DataFrame({
+            'objects': pd.Series([1, None], dtype=object),
+            'dicts': [{'a': 1}, {'b': 2}],
+            'mixed': [1, 'one']}),
+        'description', 'name')
+    expected = container.data_frame.copy()
+    store = spill.SpillStore(1, self._logger, self._scratch_dir)
+    store.Add(container)
+    store.Enforce()
+    self.assertTrue(store.IsSpilled(container))
+
+    store.Load(container)
+    pd.testing.assert_frame_equal(container.data_frame, expected)
+    self.assertEqual(list(container.data_frame['dicts']), [{'a': 1}, {'b': 2}])
+    self.assertIsNone(container.data_frame['objects'][1])
+
+    store.Close()
+
+  def testPinnedContainersAreNotSpilled(self):
+    """Tests containers pinned by a running module stay in memory."""
+    container = _MakeContainer(100)
+    store = spill.SpillStore(1, self._logger, self._scratch_dir)
+    store.Add(container)
+    store.Pin(container, 'ModuleA')
+    store.Enforce()
+    self.assertFalse(store.IsSpilled(container))
+
+    store.Unpin('ModuleA')
+    store.Enforce()
+    self.assertTrue(store.IsSpilled(container))
+
+    store.Close()
+
+  def testDiscard(self):
+    """Tests spill files are deleted once a container is no longer stored."""
+    container = _MakeContainer(100)
+    store = spill.SpillStore(1, self._logger, self._scratch_dir)
+    store.Add(container)
+    store.Add(container)
+    store.Enforce()
+    spill_dir = os.path.join(self._scratch_dir, os.listdir(self._scratch_dir)[0])
+    self.assertEqual(len(os.listdir(spill_dir)), 1)
+
+    store.Discard(container)
+    self.assertEqual(len(os.listdir(spill_dir)), 1)
+    store.Discard(container)
+    self.assertEqual(os.listdir(spill_dir), [])
+    self.assertEqual(store.resident_bytes, 0)
+
+    store.Close()
+
+
+if __name__ == '__main__':
+  unittest.main()
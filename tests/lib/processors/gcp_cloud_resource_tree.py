@@ -2,13 +2,15 @@
 # -*- coding: utf-8 -*-
 """Tests the GCP Cloud Tree module."""
 
+from concurrent import futures
 import os
 import unittest
 import json
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone
 import mock
 
 from dftimewolf.lib import state
+from dftimewolf.lib.containers import containers
 from dftimewolf.lib.processors import gcp_cloud_resource_tree as gcp_crt
 from dftimewolf.lib.processors import gcp_cloud_resource_tree_helper as gcp_crt_helper # pylint: disable=line-too-long
 
@@ -41,9 +43,9 @@ class GCPCloudResourceTreeModuleTest(unittest.TestCase):
     self.assertEqual(processor.resource_type, 'gcp_instance')
     self.assertEqual(processor.mode, gcp_crt_helper.OperatingMode.OFFLINE)
 
-  @mock.patch('dftimewolf.lib.processors.gcp_cloud_resource_tree.GCPCloudResourceTree._GetLogMessages') # pylint: disable=line-too-long
+  @mock.patch('dftimewolf.lib.processors.gcp_cloud_resource_tree.GCPCloudResourceTree._QueryLogMessages') # pylint: disable=line-too-long
   # pylint: disable=invalid-name
-  def testGetResourcesMetaDataFromLogs(self, _mock_GetLogMessages) -> None:
+  def testGetResourcesMetaDataFromLogs(self, _mock_QueryLogMessages) -> None:
     """Tests creation of time ranges for logs query."""
     test_state = state.DFTimewolfState(config.Config)
     processor = gcp_crt.GCPCloudResourceTree(test_state)
@@ -62,16 +64,89 @@ class GCPCloudResourceTreeModuleTest(unittest.TestCase):
     # pylint: disable=protected-access
     processor._GetResourcesMetaDataFromLogs('test-project-hkhalifa')
 
-    _mock_GetLogMessages.assert_has_calls([
+    # The second time range starts where the logs retrieved before end.
+    _mock_QueryLogMessages.assert_has_calls([
         mock.call('test-project-hkhalifa',
                   r2.creation_timestamp - timedelta(hours=1),
-                  r1.creation_timestamp + timedelta(hours=1)),
+                  r1.creation_timestamp + timedelta(hours=1), None),
         mock.call('test-project-hkhalifa',
-                  r3.creation_timestamp - timedelta(hours=1),
-                  r3.creation_timestamp + timedelta(hours=1))
+                  r1.creation_timestamp + timedelta(hours=1),
+                  r3.creation_timestamp + timedelta(hours=1), None)
     ],
                                           any_order=True)
 
+  @mock.patch('dftimewolf.lib.processors.gcp_cloud_resource_tree.GCPCloudResourceTree._QueryLogMessages') # pylint: disable=line-too-long
+  # pylint: disable=invalid-name
+  def testSearchForDeletedResources(self, _mock_QueryLogMessages) -> None:
+    """Tests that deleted resources are searched for with shared queries."""
+    test_state = state.DFTimewolfState(config.Config)
+    processor = gcp_crt.GCPCloudResourceTree(test_state)
+    processor.project_id = 'test-project'
+    _mock_QueryLogMessages.return_value = []
+    searches = []
+    for resource_id in ('1', '2', '3'):
+      resource = gcp_crt_helper.Resource()
+      resource.resource_name = (
+          f'projects/test-project/zones/us-central1-a/disks/disk{resource_id}')
+      resource.id = resource_id
+      searches.append((resource, datetime.now(timezone.utc) -
+                       timedelta(days=10, hours=int(resource_id))))
+    searches[2][0].project_id = 'other-project'
+
+    # pylint: disable=protected-access
+    found = processor._SearchForDeletedResources(searches)
+
+    self.assertEqual(found, [None, None, None])
+    # One query per 30 day window, for both resources of the project.
+    self.assertEqual(_mock_QueryLogMessages.call_count, 13)
+    for call in _mock_QueryLogMessages.call_args_list:
+      self.assertEqual(call.args[3], ['2', '1'])
+
+  @mock.patch('dftimewolf.lib.processors.gcp_cloud_resource_tree.gcp_common.CreateService') # pylint: disable=line-too-long
+  # pylint: disable=invalid-name
+  def testGetListOfResources(self, _mock_CreateService) -> None:
+    """Tests that concurrent listings are parsed as sequential ones."""
+    listings = {
+        'disks': 'compute_api_disks_response.jsonl',
+        'images': 'compute_api_disk_images_response.jsonl',
+        'snapshots': 'compute_api_snapshots_response.jsonl',
+        'instances': 'compute_api_instances_response.jsonl',
+        'instanceTemplates': 'compute_api_instance_templates_response.jsonl',
+        'machineImages': 'compute_api_machine_images_response.jsonl',
+    }
+    compute_api_client = _mock_CreateService.return_value
+    for collection, file_name in listings.items():
+      with open(os.path.join(current_dir, 'test_data', file_name)) as json_file:
+        response = json.load(json_file)
+      api = getattr(compute_api_client, collection)()
+      method = 'aggregatedList' if collection in (
+          'disks', 'instances') else 'list'
+      getattr(api, method)().execute.return_value = response
+      getattr(api, f'{method}_next').return_value = None
+
+    test_state = state.DFTimewolfState(config.Config)
+    processor = gcp_crt.GCPCloudResourceTree(test_state)
+    # pylint: disable=protected-access
+    processor._GetListOfResources('test-project-hkhalifa')
+
+    sequential_processor = gcp_crt.GCPCloudResourceTree(test_state)
+    for retrieve in (
+        sequential_processor._RetrieveListOfDisks,
+        sequential_processor._RetrieveListOfDiskImages,
+        sequential_processor._RetrieveListOfSnapshots,
+        sequential_processor._RetrieveListOfInstances,
+        sequential_processor._RetrieveListOfInstanceTemplates,
+        sequential_processor._RetrieveListOfMachineImages):
+      sequential_processor.resources_dict.update(
+          retrieve('test-project-hkhalifa', compute_api_client))
+
+    self.assertEqual(
+        json.dumps(processor.resources_dict,
+                   cls=gcp_crt_helper.ResourceEncoder),
+        json.dumps(sequential_processor.resources_dict,
+                   cls=gcp_crt_helper.ResourceEncoder))
+    self.assertEqual(len(processor.resources_dict), 18)
+
   @mock.patch('dftimewolf.lib.processors.gcp_cloud_resource_tree.gcp_common.CreateService') # pylint: disable=line-too-long
   # pylint: disable=invalid-name
   def testRetrieveListOfSnapshots(self, _mock_CreateService) -> None:
@@ -312,6 +387,35 @@ class GCPCloudResourceTreeModuleTest(unittest.TestCase):
     self.assertIsNotNone(parent_resource_of_vm10)
     _mock_SearchForDeletedResource.assert_called()
 
+  def testFindResource(self) -> None:
+    """Tests finding resources by name through the resource indexes."""
+    test_state = state.DFTimewolfState(config.Config)
+    processor = gcp_crt.GCPCloudResourceTree(test_state)
+    disk_a = gcp_crt_helper.Resource()
+    disk_a.resource_name = 'projects/project-a/zones/us-central1-a/disks/vm1'
+    disk_b = gcp_crt_helper.Resource()
+    disk_b.resource_name = 'projects/project-b/zones/us-central1-b/disks/vm1'
+    processor.resources_dict['2'] = disk_b
+    processor.resources_dict['1'] = disk_a
+
+    # pylint: disable=protected-access
+    # The first stored resource wins, as when scanning the dictionary.
+    self.assertIs(processor._FindResource('vm1', 'gce_disk'), disk_b)
+    self.assertIs(
+        processor._FindResource('vm1', 'gce_disk', 'us-central1-a'), disk_a)
+    self.assertIs(
+        processor._FindResource('vm1', 'gce_disk', project_id='project-a'),
+        disk_a)
+    self.assertIsNone(processor._FindResource('vm1', 'gce_instance'))
+
+    # Storing an enriched resource again updates the indexes.
+    disk_b.resource_name = 'projects/project-b/zones/us-central1-b/disks/vm2'
+    processor.resources_dict['2'] = disk_b
+    self.assertIs(processor._FindResource('vm1', 'gce_disk'), disk_a)
+    self.assertIs(processor._FindResource('vm2', 'gce_disk'), disk_b)
+    del processor.resources_dict['1']
+    self.assertIsNone(processor._FindResource('vm1', 'gce_disk'))
+
   def testParseLogMessages(self) -> None:
     """Tests parse log messages."""
     test_state = state.DFTimewolfState(config.Config)
@@ -335,3 +439,55 @@ class GCPCloudResourceTreeModuleTest(unittest.TestCase):
     current_resources_dict = json.loads(current_resources_dict)
     self.assertEqual(len(processor.resources_dict), 32)
     self.assertEqual(stored_resources_dict, current_resources_dict)
+
+  def testParseLogMessagesFromFileContainer(self) -> None:
+    """Tests parse log messages from a file, in several byte ranges."""
+    test_state = state.DFTimewolfState(config.Config)
+    processor = gcp_crt.GCPCloudResourceTree(test_state)
+    file_path_resources_dict = os.path.join(current_dir, 'test_data',
+                             'resources_dict_dump.jsonl')
+    with open(file_path_resources_dict) as resources_dict_file:
+      stored_resources_dict = json.loads(resources_dict_file.read())
+
+    file_path_logs = os.path.join(current_dir, 'test_data',
+                             'gcp-project-logs.jsonl')
+    # Ranges end within lines, which belong to the range they start in.
+    processor._CHUNK_SIZE = 5000  # pylint: disable=protected-access
+    # pylint: disable=protected-access
+    processor._ParseLogMessagesFromFileContainer(
+        containers.File(name='logs', path=file_path_logs))
+
+    current_resources_dict = json.dumps(processor.resources_dict, cls=gcp_crt_helper.ResourceEncoder) # pylint: disable=line-too-long
+    current_resources_dict = json.loads(current_resources_dict)
+    self.assertEqual(len(processor.resources_dict), 32)
+    self.assertEqual(stored_resources_dict, current_resources_dict)
+
+  def testDecodeLogChunksBudget(self) -> None:
+    """Tests that ranges are decoded ahead within a byte budget, in order."""
+    file_path_logs = os.path.join(current_dir, 'test_data',
+                             'gcp-project-logs.jsonl')
+    size = os.path.getsize(file_path_logs)
+    chunks = [(start, min(start + 1000, size))
+              for start in range(0, size, 1000)]
+    # pylint: disable=protected-access
+    expected = [gcp_crt._DecodeLogChunk(file_path_logs, start, end)
+                for start, end in chunks]
+
+    submitted = []
+    executor = futures.ThreadPoolExecutor(max_workers=2)
+    submit = executor.submit
+
+    def _Submit(function, *args):
+      submitted.append(args)
+      return submit(function, *args)
+
+    decoded = []
+    with mock.patch.object(executor, 'submit', _Submit), \
+        mock.patch.object(
+            gcp_crt.futures, 'ProcessPoolExecutor', return_value=executor):
+      for result in gcp_crt._DecodeLogChunks(
+          file_path_logs, chunks, 2, 2500):
+        # At most two ranges of 1000 bytes are decoded ahead.
+        self.assertLessEqual(len(submitted) - len(decoded), 2)
+        decoded.append(result)
+    self.assertEqual(decoded, expected)
@@ -3,9 +3,14 @@
 """Tests the GCP logging timesketch processor."""
 
 import json
+import os
+import tempfile
 import unittest
 
+import mock
+
 from dftimewolf.lib import state
+from dftimewolf.lib.containers import containers
 from dftimewolf.lib.processors import gcp_logging_timesketch
 
 from dftimewolf import config
@@ -835,5 +840,86 @@ class GCPLoggingTimesketchTest(unittest.TestCase):
     actual_timesketch_record = json.loads(actual_timesketch_record)
     self.assertDictEqual(expected_timesketch_record, actual_timesketch_record)
 
+  def testProcessLogContainerChunks(self):
+    """Tests that chunked transformation keeps every line, in order."""
+    test_state = state.DFTimewolfState(config.Config)
+    processor = gcp_logging_timesketch.GCPLoggingTimesketch(test_state)
+    # pylint: disable=protected-access
+    processor._CHUNK_SIZE = 100
+
+    log_lines = []
+    for i in range(50):
+      log_record = {
+          'resource': {'labels': {'project_id': 'ketchup-research'}},
+          'timestamp': f'2019-06-06T09:00:{i:02d}.000000Z',
+          'textPayload': f'line {i:d}' + ' ' * (i % 7),
+      }
+      log_lines.append(json.dumps(log_record))
+    with tempfile.NamedTemporaryFile(
+        mode='w', delete=False, suffix='.jsonl') as input_file:
+      input_file.write('\n'.join(log_lines) + '\n')
+
+    with mock.patch.object(processor, 'StoreContainer') as mock_store:
+      processor._ProcessLogContainer(
+          containers.File(name='test_query', path=input_file.name))
+
+    output_container = mock_store.call_args[0][0]
+    self.assertTrue(output_container.name.startswith('ketchup-research_'))
+    with open(output_container.path, 'r', encoding='utf-8') as output_file:
+      actual_records = [json.loads(line) for line in output_file]
+    expected_records = [
+        json.loads(processor._ProcessLogLine(line, 'test_query'))
+        for line in log_lines]
+    self.assertEqual(expected_records, actual_records)
+    os.remove(input_file.name)
+    os.remove(output_container.path)
+  def testProcessLogContainerWorkers(self):
+    """Tests that worker processes transform chunks like the module."""
+    test_state = state.DFTimewolfState(config.Config)
+    processor = gcp_logging_timesketch.GCPLoggingTimesketch(test_state)
+    # pylint: disable=protected-access
+    processor._CHUNK_SIZE = 200
+
+    log_lines = [json.dumps({
+        'resource': {'labels': {'project_id': 'ketchup-research'}},
+        'timestamp': f'2019-06-06T09:00:{i:02d}.000000Z',
+        'protoPayload': {
+            'methodName': 'v1.compute.instances.insert',
+            'serviceName': 'compute.googleapis.com',
+            'authenticationInfo': {'principalEmail': f'user{i:d}@example.com'},
+        },
+    }) for i in range(10)]
+    with tempfile.NamedTemporaryFile(
+        mode='w', delete=False, suffix='.jsonl') as input_file:
+      input_file.write('\n'.join(log_lines) + '\n')
+
+    with mock.patch.object(processor, 'StoreContainer') as mock_store, \
+        mock.patch('os.cpu_count', return_value=4):
+      processor._ProcessLogContainer(
+          containers.File(name='test_query', path=input_file.name))
+
+    output_container = mock_store.call_args[0][0]
+    with open(output_container.path, 'r', encoding='utf-8') as output_file:
+      actual_records = [json.loads(line) for line in output_file]
+    expected_records = [
+        json.loads(processor._ProcessLogLine(line, 'test_query'))
+        for line in log_lines]
+    self.assertEqual(expected_records, actual_records)
+    os.remove(input_file.name)
+    os.remove(output_container.path)
+
+  def testDumpJSON(self):
+    """Tests that records are serialized the same with or without orjson."""
+    record = {'message': 'User \u00e9l\u00e8ve performed \u2603', 'ports': [22]}
+    # pylint: disable=protected-access
+    with mock.patch.object(gcp_logging_timesketch, 'HAS_ORJSON', False):
+      dumped = gcp_logging_timesketch._DumpJSON(record)
+    self.assertEqual(
+        dumped.decode('utf-8'),
+        '{"message":"User \u00e9l\u00e8ve performed \u2603","ports":[22]}')
+    if gcp_logging_timesketch.HAS_ORJSON:
+      self.assertEqual(gcp_logging_timesketch._DumpJSON(record), dumped)
+
+
 if __name__ == '__main__':
   unittest.main()
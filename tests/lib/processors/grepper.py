@@ -2,6 +2,15 @@
 # -*- coding: utf-8 -*-
 """Tests the activity_triage recipe and grepper processor."""
 
+import gzip
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+import zipfile
+from unittest import mock
 
 from dftimewolf.lib.containers import containers
 from dftimewolf.lib.processors import grepper
@@ -15,11 +24,16 @@ class GrepperTest(modules_test_base.ModuleTestBase):
     self._module: grepper.GrepperSearch
     self._InitModule(grepper.GrepperSearch)
     super().setUp()
+    self._cache_dir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self._cache_dir)
 
   def testSingleGrep(self):
     """Test just single keyword grep search on text files."""
     self._module.SetUp(
-        keywords='foo|lorem|meow|triage|bar|homebrew'
+        keywords='foo|lorem|meow|triage|bar|homebrew',
+        cache_dir=self._cache_dir
     )
     # Put here a path to a test directory where you have files to grep on the
     # above keyword. This is to simulate the path received an input from GRR
@@ -38,3 +52,267 @@ class GrepperTest(modules_test_base.ModuleTestBase):
         'tests/lib/collectors/test_data/grepper_test_dir/1test.pdf:homebrew\n'
         'tests/lib/collectors/test_data/grepper_test_dir/grepper_test.txt:bar,foo,lorem,triage\n'
         'tests/lib/collectors/test_data/grepper_test_dir/grepper_test2.txt:foo')
+
+  def testNoCacheByDefault(self):
+    """Tests that extracted text is not cached unless a directory is set."""
+    self._module.SetUp(keywords='homebrew')
+    self._module.StoreContainer(containers.File(
+        name='Test description',
+        path='tests/lib/collectors/test_data/grepper_test_dir'
+    ))
+    with mock.patch.object(grepper.tempfile, 'NamedTemporaryFile') as cache:
+      self._ProcessModule()
+    cache.assert_not_called()
+    # pylint: disable=protected-access
+    self.assertIsNone(self._module._cache_dir)
+
+  def testParallelGrep(self):
+    """Tests that files searched in a process pool keep their order."""
+    self._module.SetUp(
+        keywords='foo|lorem|meow|triage|bar|homebrew',
+        cache_dir=self._cache_dir)
+    self._module.StoreContainer(containers.File(
+        name='Test description',
+        path='tests/lib/collectors/test_data/grepper_test_dir'
+    ))
+    # pylint: disable=protected-access
+    self._module._MIN_PARALLEL_SIZE = 0
+    with mock.patch('os.cpu_count', return_value=2):
+      self._ProcessModule()
+
+    # pylint: disable=line-too-long
+    self.assertEqual(
+        self._module._final_output,
+        'tests/lib/collectors/test_data/grepper_test_dir/1test.pdf:homebrew\n'
+        'tests/lib/collectors/test_data/grepper_test_dir/grepper_test.txt:bar,foo,lorem,triage\n'
+        'tests/lib/collectors/test_data/grepper_test_dir/grepper_test2.txt:foo')
+
+
+class KeywordMatcherTest(unittest.TestCase):
+  """Tests the keyword matcher."""
+
+  def testLiteralKeywords(self):
+    """Tests that literal keywords are found ignoring case."""
+    data = b'\xff\xfeFOO and Bar\x00\x81 meow'
+    matcher = grepper.KeywordMatcher('foo|bar|baz|')
+    self.assertEqual(matcher.overlap, 2)
+    self.assertEqual(matcher.Search(data), {'foo', 'bar'})
+    with mock.patch.object(grepper, 'HAS_AHOCORASICK', False):
+      matcher = grepper.KeywordMatcher('foo|bar|baz|')
+    self.assertEqual(matcher.Search(data), {'foo', 'bar'})
+
+  def testRegexKeywords(self):
+    """Tests that keywords using regular expression syntax still work."""
+    matcher = grepper.KeywordMatcher(r'pass(?:word)?=\w+|secret')
+    self.assertEqual(
+        matcher.Search(b'PASSWORD=Hunter2 password=x\xff'),
+        {'password=hunter2', 'password=x'})
+    self.assertEqual(matcher.SearchText('Top SECRET'), {'secret'})
+
+  def testRegexGroups(self):
+    """Tests that like re.findall, only a single group is reported."""
+    self.assertEqual(
+        grepper.KeywordMatcher(r'user=(\w+)').Search(b'user=Bob user=eve'),
+        {'bob', 'eve'})
+    self.assertEqual(
+        grepper.KeywordMatcher(r'(\w+)=(\w+)').Search(b'a=b'), {'a=b'})
+
+  def testAnchoredKeywords(self):
+    """Tests that ^ and $ match at the start and end of each line."""
+    with tempfile.NamedTemporaryFile(suffix='.txt', delete=False) as test_file:
+      test_file.write(b'hello\nerror: x\nfoo\nno error\n')
+    try:
+      self.assertEqual(
+          grepper.SearchFile(
+              test_file.name, grepper.KeywordMatcher('^error|^foo|x$')),
+          {'error', 'foo', 'x'})
+    finally:
+      os.remove(test_file.name)
+
+  def testAnchoredKeywordsChunkBoundaries(self):
+    """Tests that ^ does not match in the middle of a line at chunk joins."""
+    matcher = grepper.KeywordMatcher('^error|^foo')
+    with tempfile.NamedTemporaryFile(suffix='.bin', delete=False) as test_file:
+      test_file.write(b'abcerror\nfoo\n')
+    try:
+      # The second chunk is searched from the "e" of "error".
+      with mock.patch.object(grepper, '_CHUNK_SIZE', 8), \
+          mock.patch.object(matcher, 'overlap', 5):
+        self.assertEqual(grepper.SearchFile(test_file.name, matcher), {'foo'})
+    finally:
+      os.remove(test_file.name)
+
+  def testSearchFileChunkBoundaries(self):
+    """Tests that matches across chunk boundaries are found."""
+    matcher = grepper.KeywordMatcher('homebrew|triage')
+    with tempfile.NamedTemporaryFile(suffix='.bin', delete=False) as test_file:
+      test_file.write(b'\x00' * 5 + b'homebrew' + b'\xff' * 7 + b'TRIAGE')
+    try:
+      with mock.patch.object(grepper, '_CHUNK_SIZE', 8):
+        self.assertEqual(
+            grepper.SearchFile(test_file.name, matcher),
+            {'homebrew', 'triage'})
+    finally:
+      os.remove(test_file.name)
+
+  def testSearchFileRegexChunkBoundaries(self):
+    """Tests that regex matches across chunks are not reported truncated."""
+    matcher = grepper.KeywordMatcher(r'password=\w+')
+    with tempfile.NamedTemporaryFile(suffix='.bin', delete=False) as test_file:
+      test_file.write(
+          b'\x00' * 4 + b'password=hunter2' + b'\x00' * 20 + b'PASSWORD=ab')
+    try:
+      with mock.patch.object(grepper, '_CHUNK_SIZE', 16), \
+          mock.patch.object(matcher, 'overlap', 24):
+        self.assertEqual(
+            grepper.SearchFile(test_file.name, matcher),
+            {'password=hunter2', 'password=ab'})
+    finally:
+      os.remove(test_file.name)
+
+
+class ExtractorTest(unittest.TestCase):
+  """Tests searching the text extracted from archives and documents."""
+
+  def setUp(self):
+    self._path = tempfile.mkdtemp()
+    self._cache_dir = os.path.join(self._path, 'cache')
+
+  def tearDown(self):
+    shutil.rmtree(self._path)
+
+  def _WriteZip(self, name, members):
+    """Writes a zip file of members, a dict of member name to bytes."""
+    path = os.path.join(self._path, name)
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+      for member_name, data in members.items():
+        zip_file.writestr(member_name, data)
+    return path
+
+  def testSearchArchives(self):
+    """Tests that members of archives, nested or not, are searched."""
+    matcher = grepper.KeywordMatcher('foo|bar|lorem|meow')
+    tar_path = os.path.join(self._path, 'logs.tar.gz')
+    with tarfile.open(tar_path, 'w:gz') as tar_file:
+      data = b'nothing here\nFOO was here'
+      info = tarfile.TarInfo('var/log/syslog')
+      info.size = len(data)
+      tar_file.addfile(info, io.BytesIO(data))
+    zip_path = self._WriteZip(
+        'evidence.zip', {'a/notes.txt.gz': gzip.compress(b'a BAR b')})
+    docx_path = self._WriteZip(
+        'report.docx',
+        {'word/document.xml':
+             b'<w:p><w:r><w:t>Lo</w:t></w:r><w:r><w:t>rem</w:t></w:r></w:p>',
+         'docProps/app.xml': b'<Application>meow</Application>'})
+
+    self.assertEqual(
+        grepper.SearchFile(tar_path, matcher, self._cache_dir), {'foo'})
+    self.assertEqual(
+        grepper.SearchFile(zip_path, matcher, self._cache_dir), {'bar'})
+    self.assertEqual(
+        grepper.SearchFile(docx_path, matcher, self._cache_dir), {'lorem'})
+
+  def testCache(self):
+    """Tests that text extracted to the end is searched from the cache."""
+    zip_path = self._WriteZip(
+        'evidence.zip', {'a.txt': b'foo', 'b.txt': b'bar'})
+    self.assertEqual(
+        grepper.SearchFile(
+            zip_path, grepper.KeywordMatcher('foo|meow'), self._cache_dir),
+        {'foo'})
+    self.assertEqual(len(os.listdir(self._cache_dir)), 1)
+
+    with mock.patch.object(
+        grepper.ZipExtractor, 'Extract',
+        side_effect=AssertionError('extracted again')):
+      self.assertEqual(
+          grepper.SearchFile(
+              zip_path, grepper.KeywordMatcher('bar|meow'), self._cache_dir),
+          {'bar'})
+
+  def testCacheSize(self):
+    """Tests that the least recently used text is evicted from the cache."""
+    first_path = self._WriteZip('first.zip', {'a.txt': b'foo'})
+    second_path = self._WriteZip('second.zip', {'a.txt': b'bar'})
+    matcher = grepper.KeywordMatcher('foo|bar')
+    with mock.patch.object(grepper, '_MAX_CACHE_SIZE', 4):
+      grepper.SearchFile(first_path, matcher, self._cache_dir)
+      first_entry = os.path.join(
+          self._cache_dir, os.listdir(self._cache_dir)[0])
+      os.utime(first_entry, (0, 0))
+      grepper.SearchFile(second_path, matcher, self._cache_dir)
+    entries = os.listdir(self._cache_dir)
+    self.assertEqual(len(entries), 1)
+    self.assertNotEqual(os.path.join(self._cache_dir, entries[0]), first_entry)
+
+  def testEarlyStop(self):
+    """Tests that extraction stops once every keyword was found."""
+    zip_path = self._WriteZip(
+        'evidence.zip', {'a.txt': b'foo', 'b.txt': b'bar', 'c.txt': b'baz'})
+    extracted = []
+    extract = grepper.ZipExtractor.Extract
+
+    def _Extract(extractor, file_object, name, depth):
+      for piece in extract(extractor, file_object, name, depth):
+        extracted.append(piece)
+        yield piece
+
+    with mock.patch.object(grepper.ZipExtractor, 'Extract', _Extract):
+      self.assertEqual(
+          grepper.SearchFile(
+              zip_path, grepper.KeywordMatcher('foo|bar'), self._cache_dir),
+          {'foo', 'bar'})
+    self.assertEqual(extracted, [b'foo', b'bar'])
+    # Text that was not extracted to the end is not cached.
+    self.assertEqual(os.listdir(self._cache_dir), [])
+
+  def testMalformedArchive(self):
+    """Tests that the bytes of malformed archives are searched as is."""
+    path = os.path.join(self._path, 'broken.zip')
+    with open(path, 'wb') as broken_file:
+      broken_file.write(b'PK\x03\x04 not really a zip, but FOO')
+    self.assertEqual(
+        grepper.SearchFile(
+            path, grepper.KeywordMatcher('foo'), self._cache_dir),
+        {'foo'})
+    self.assertEqual(os.listdir(self._cache_dir), [])
+
+  def testEncryptedArchive(self):
+    """Tests that the bytes of encrypted archives are searched as is."""
+    path = self._WriteZip('encrypted.zip', {})
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED) as zip_file:
+      zip_file.writestr('a.txt', b'FOO')
+    with open(path, 'rb') as zip_file:
+      data = bytearray(zip_file.read())
+    # Sets the encrypted flag of the local and central directory headers.
+    data[data.index(b'PK\x03\x04') + 6] |= 1
+    data[data.index(b'PK\x01\x02') + 8] |= 1
+    with open(path, 'wb') as zip_file:
+      zip_file.write(data)
+    self.assertEqual(
+        grepper.SearchFile(
+            path, grepper.KeywordMatcher('foo'), self._cache_dir),
+        {'foo'})
+
+  def testExtractionLimits(self):
+    """Tests that archives extracting to too many bytes are not extracted."""
+    nested = io.BytesIO()
+    with zipfile.ZipFile(nested, 'w', zipfile.ZIP_STORED) as zip_file:
+      zip_file.writestr('b.txt', b'\x00' * 1000)
+    zip_path = self._WriteZip(
+        'bomb.zip',
+        {'nested.zip': nested.getvalue(),
+         'a.txt': b'\x00' * 1000 + b'FOO'})
+    matcher = grepper.KeywordMatcher('foo')
+    for limit in ('_MAX_EXTRACTED_SIZE', '_MAX_MEMBER_SIZE'):
+      with mock.patch.object(grepper, limit, 100), \
+          mock.patch.object(
+              grepper, '_SearchMapped', return_value=set()) as search_mapped:
+        self.assertEqual(
+            grepper.SearchFile(zip_path, matcher, self._cache_dir), set())
+      # The bytes of the archive are searched instead.
+      search_mapped.assert_called_once_with(zip_path, matcher)
+      self.assertEqual(os.listdir(self._cache_dir), [])
+    self.assertEqual(
+        grepper.SearchFile(zip_path, matcher, self._cache_dir), {'foo'})
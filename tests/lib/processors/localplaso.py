@@ -2,6 +2,9 @@
 # -*- coding: utf-8 -*-
 """Tests the localplaso processor."""
 
+import os
+import sqlite3
+import tempfile
 import unittest
 import re
 import mock
@@ -43,12 +46,84 @@ class LocalPlasoTest(modules_test_base.ModuleTestBase):
     self._ProcessModule()
     mock_Popen.assert_called_once()
     args = mock_Popen.call_args[0][0]  # Get positional arguments of first call
-    self.assertEqual(args[10], '/notexist/test')
-    plaso_path = args[9]  # Dynamically generated path to the plaso file
+    self.assertEqual(args[-1], '/notexist/test')
+    plaso_path = args[-2]  # Dynamically generated path to the plaso file
     self.assertEqual(
         self._module.GetContainers(containers.File)[0].path,
         plaso_path)
 
+  # pylint: disable=invalid-name
+  @mock.patch('os.path.isfile')
+  @mock.patch('subprocess.Popen')
+  def testConcurrentProcessing(self, mock_Popen, mock_exists):
+    """Tests that containers are processed concurrently, sharing the CPUs."""
+    mock_popen_object = mock.Mock()
+    mock_popen_object.communicate.return_value = (None, None)
+    mock_popen_object.wait.return_value = False
+    mock_Popen.return_value = mock_popen_object
+    mock_exists.return_value = True
+
+    for index in range(3):
+      self._module.StoreContainer(
+          containers.File(name=f'test{index}', path=f'/notexist/test{index}'))
+    self._module.StoreContainer(
+        containers.Directory(name='dir', path='/notexist/dir'))
+    self._module.SetUp(timezone=None, use_docker=False, cpu_budget=8)
+    self._ProcessModule()
+
+    self.assertEqual(mock_Popen.call_count, 4)
+    commands = [call[0][0] for call in mock_Popen.call_args_list]
+    for command in commands:
+      self.assertEqual(command[command.index('--workers') + 1], '4')
+    self.assertEqual(
+        len({command[command.index('--logfile') + 1] for command in commands}),
+        4)
+    self.assertCountEqual(
+        [(container.name, container.path)
+         for container in self._module.GetContainers(containers.File)],
+        [(command[-1].rsplit('/', 1)[-1], command[-2])
+         for command in commands])
+
+  def testPlanJobs(self):
+    """Tests that the CPU budget is divided between concurrent runs."""
+    items = [
+        containers.File(name=f'test{index}', path=f'/notexist/test{index}')
+        for index in range(40)]
+    # pylint: disable=protected-access
+    self._module._cpu_budget = 64
+    jobs, concurrent_jobs = self._module._PlanJobs(items)
+    self.assertEqual(len(jobs), 40)
+    self.assertEqual(concurrent_jobs, 16)
+    self.assertEqual({job.workers for job in jobs}, {4})
+
+    jobs, concurrent_jobs = self._module._PlanJobs(items[:2])
+    self.assertEqual(concurrent_jobs, 2)
+    self.assertEqual(jobs[0].workers, 32)
+
+    self._module._max_jobs = 5
+    jobs, concurrent_jobs = self._module._PlanJobs(items)
+    self.assertEqual(concurrent_jobs, 5)
+    self.assertEqual(jobs[0].workers, 12)
+
+    self._module._cpu_budget = 2
+    jobs, concurrent_jobs = self._module._PlanJobs(items)
+    self.assertEqual(concurrent_jobs, 1)
+    self.assertEqual(jobs[0].workers, 2)
+
+  def testCountEvents(self):
+    """Tests counting the events of a Plaso storage file."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+      storage_file_path = os.path.join(temp_dir, 'test.plaso')
+      connection = sqlite3.connect(storage_file_path)
+      connection.execute('CREATE TABLE event (_identifier INTEGER)')
+      connection.executemany(
+          'INSERT INTO event VALUES (?)', [(1,), (2,), (3,)])
+      connection.commit()
+      connection.close()
+      self.assertEqual(localplaso._CountEvents(storage_file_path), 3)
+      self.assertIsNone(
+          localplaso._CountEvents(os.path.join(temp_dir, 'missing.plaso')))
+
   @mock.patch('docker.from_env')
   def testProcessingDockerized(self, mock_docker):
     """Tests that plaso processing is called using Docker."""
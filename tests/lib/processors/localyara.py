@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests the local Yara scanner processor."""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import yara
+
+from dftimewolf.lib import errors
+from dftimewolf.lib import utils
+from dftimewolf.lib.containers import containers
+from dftimewolf.lib.processors import localyara
+from tests.lib import modules_test_base
+
+
+_RULE_FOO = """rule Foo
+{
+  strings:
+    $foo = "foo"
+    $bar = "bar"
+  condition:
+    any of them
+}"""
+
+_RULE_HASH = """rule HelloMd5
+{
+  condition:
+    hash.md5(0, filesize) == "5d41402abc4b2a76b9719d911017c592"
+}"""
+
+
+class LocalYaraScannerTest(modules_test_base.ModuleTestBase):
+  """Tests for the local Yara scanner."""
+
+  # For Pytype
+  _module: localyara.LocalYaraScanner
+
+  def setUp(self):
+    self._InitModule(localyara.LocalYaraScanner)
+    super().setUp()
+    self._path = tempfile.mkdtemp()
+    self._cache_dir = os.path.join(self._path, 'cache')
+    self._evidence_path = os.path.join(self._path, 'evidence')
+    os.makedirs(os.path.join(self._evidence_path, 'sub'))
+    for name, data in (('a.txt', b'xx foo bar'),
+                       ('b.txt', b'nothing'),
+                       ('empty', b''),
+                       (os.path.join('sub', 'hello'), b'hello')):
+      with open(os.path.join(self._evidence_path, name), 'wb') as test_file:
+        test_file.write(data)
+
+  def tearDown(self):
+    shutil.rmtree(self._path)
+
+  def _StoreInput(self):
+    """Stores the rules and evidence to scan."""
+    self._module.StoreContainer(
+        containers.YaraRule(name='foo', rule_text=_RULE_FOO))
+    self._module.StoreContainer(
+        containers.YaraRule(name='hash', rule_text=_RULE_HASH))
+    self._module.StoreContainer(
+        containers.Directory(name='evidence', path=self._evidence_path))
+
+  def _AssertHits(self):
+    """Checks the DataFrame container of the hits."""
+    data_frames = self._module.GetContainers(containers.DataFrame)
+    self.assertEqual(len(data_frames), 1)
+    data_frame = data_frames[0].data_frame
+    self.assertEqual(
+        list(data_frame.columns),
+        ['grr_client', 'grr_fqdn', 'pid', 'username', 'rule_name',
+         'string_matches', 'cmdline', 'process', 'cwd'])
+    self.assertEqual(
+        [(os.path.relpath(row.process, self._evidence_path), row.rule_name,
+          row.string_matches) for row in data_frame.itertuples()],
+        [('a.txt', 'Foo', ['$bar', '$foo']),
+         (os.path.join('sub', 'hello'), 'HelloMd5', [])])
+
+  def testScan(self):
+    """Tests that files are scanned and hits stored as a DataFrame."""
+    self._StoreInput()
+    self._module.SetUp(cache_dir=self._cache_dir)
+    self._ProcessModule()
+    self._AssertHits()
+
+  def testParallelScan(self):
+    """Tests that files scanned in a process pool keep their order."""
+    self._StoreInput()
+    self._module.SetUp(cache_dir=self._cache_dir)
+    # pylint: disable=protected-access
+    self._module._MIN_PARALLEL_SIZE = 0
+    with mock.patch('os.cpu_count', return_value=2):
+      self._ProcessModule()
+    self._AssertHits()
+
+  def testCompiledRulesCache(self):
+    """Tests that compiled rules are loaded from the cache."""
+    self._module.SetUp(cache_dir=self._cache_dir)
+    rule_text = utils.BuildYaraRuleset([_RULE_FOO])
+    # pylint: disable=protected-access
+    _, rules_path = self._module._CompileRules(rule_text)
+    self.assertEqual(os.listdir(self._cache_dir), [
+        os.path.basename(rules_path)])
+
+    with mock.patch.object(
+        yara, 'compile', side_effect=AssertionError('compiled again')):
+      rules, cached_path = self._module._CompileRules(rule_text)
+    self.assertEqual(cached_path, rules_path)
+    self.assertTrue(rules.match(data=b'foo'))
+
+  def testUnwritableCache(self):
+    """Tests that files are scanned when rules cannot be cached."""
+    self._StoreInput()
+    self._module.SetUp(cache_dir=self._cache_dir)
+    # pylint: disable=protected-access
+    self._module._MIN_PARALLEL_SIZE = 0
+    save = self._module._SaveRules
+    saved_paths = []
+
+    def _SaveRules(rules, directory):
+      if directory == self._cache_dir:
+        raise OSError('Read-only file system')
+      saved_paths.append(save(rules, directory))
+      return saved_paths[-1]
+
+    with mock.patch.object(self._module, '_SaveRules', _SaveRules), \
+        mock.patch('os.cpu_count', return_value=2):
+      self._ProcessModule()
+    self._AssertHits()
+    self.assertEqual(len(saved_paths), 1)
+    self.assertFalse(os.path.exists(saved_paths[0]))
+    self.assertEqual(os.listdir(self._cache_dir), [])
+
+  def testInvalidRules(self):
+    """Tests that rules that do not compile are a critical error."""
+    self._module.StoreContainer(containers.YaraRule(
+        name='broken', rule_text='rule Broken { condition: nope }'))
+    self._module.StoreContainer(
+        containers.Directory(name='evidence', path=self._evidence_path))
+    self._module.SetUp(cache_dir=self._cache_dir)
+    with self.assertRaises(errors.DFTimewolfError) as error:
+      self._ProcessModule()
+    self.assertIn('Could not compile Yara rules', error.exception.message)
+
+  def testMissingYara(self):
+    """Tests that SetUp fails when yara-python is not installed."""
+    with mock.patch.object(localyara, 'HAS_YARA', False):
+      with self.assertRaises(errors.DFTimewolfError):
+        self._module.SetUp(cache_dir=self._cache_dir)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -58,7 +58,7 @@ class OpenRelikProcessorTest(modules_test_base.ModuleTestBase):
   @mock.patch("openrelik_api_client.folders.FoldersAPI.update_folder")
   @mock.patch("openrelik_api_client.api_client.APIClient.download_file")
   @mock.patch("openrelik_api_client.workflows.WorkflowsAPI.create_workflow")
-  @mock.patch("openrelik_api_client.api_client.APIClient.upload_file")
+  @mock.patch("dftimewolf.lib.uploads.EvidenceUploader.Upload")
   @mock.patch("openrelik_api_client.folders.FoldersAPI.folder_exists")
   @mock.patch(
     "dftimewolf.lib.processors.openrelik.OpenRelikProcessor.PollWorkflowStatus"
@@ -1,8 +1,10 @@
 """Tests the Turbinia processor."""
 
+import io
 import unittest
 import json
 import os
+import tarfile
 import mock
 
 import turbinia_api_lib
@@ -149,6 +151,39 @@ class TurbiniaBaseTest(unittest.TestCase):
         file_path, TEST_TASK_PATH)
     self.assertEqual(local_path, expected_local_path)
 
+  def testDownloadFilesFromAPIOncePerTask(self):
+    """Tests that a task output is downloaded once for all its paths."""
+    task_dir = os.path.dirname(TEST_TASK_PATH)
+    paths = [TEST_TASK_PATH, f'{task_dir}/hashes.json']
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode='w:gz') as tgz_file:
+      for path in [f'{task_dir}/worker-log.txt'] + paths:
+        contents = path.encode('utf-8')
+        member = tarfile.TarInfo(path.lstrip('/'))
+        member.size = len(contents)
+        tgz_file.addfile(member, io.BytesIO(contents))
+
+    response = mock.MagicMock(status=200)
+    response.read.side_effect = io.BytesIO(archive.getvalue()).read
+    self.turbinia_processor.results_api_instance = mock.MagicMock()
+    download = (self.turbinia_processor.results_api_instance
+                .get_task_output_without_preload_content)
+    download.return_value = response
+    self.turbinia_processor.output_path = '/mnt/turbiniavolume/output'
+    task = {'id': TASK_ID, 'request_id': 'request', 'saved_paths': paths}
+
+    # pylint: disable=protected-access
+    cache = turbinia_base.TurbiniaTaskOutputCache()
+    self.turbinia_processor._task_output_caches['request'] = cache
+    for path in paths:
+      local_path = self.turbinia_processor.DownloadFilesFromAPI(task, path)
+      with open(local_path, 'rb') as local_file:
+        self.assertEqual(local_file.read(), path.encode('utf-8'))
+    download.assert_called_once()
+    response.close.assert_called_once()
+    response.release_conn.assert_not_called()
+    self.assertEqual(cache._tasks, {})
+
   @mock.patch('dftimewolf.lib.processors.turbinia_base.TurbiniaProcessorBase.GetCredentials')
   @mock.patch('dftimewolf.lib.processors.turbinia_base.TurbiniaProcessorBase.InitializeTurbiniaApiClient')
   def testRefreshClientCredentials(self,
@@ -166,6 +201,22 @@ class TurbiniaBaseTest(unittest.TestCase):
     self.assertTrue(result_auth)
     self.assertFalse(result_noauth)
 
+  def testGetRequestStatusRefreshesUnderLock(self):
+    """Tests that the watcher thread refreshes the client under the lock."""
+    # pylint: disable=protected-access
+    lock = self.turbinia_processor._client_lock
+    locked_during_refresh = []
+    def _Refresh():
+      locked_during_refresh.append(lock.locked())
+      return False
+    self.turbinia_processor.RefreshClientCredentials = _Refresh
+    self.turbinia_processor.requests_api_instance = mock.MagicMock()
+    self.turbinia_processor._decode_api_response = mock.MagicMock(
+        return_value={})
+    self.turbinia_processor._GetRequestStatus('request')
+    self.assertEqual(locked_during_refresh, [True])
+    self.assertFalse(lock.locked())
+
   @mock.patch('dftimewolf.lib.processors.turbinia_base.TurbiniaProcessorBase.GetCredentials')
   def testInitializeTurbiniaApiClientNoCreds(self, mock_get_credentials):
     """Tests the InitializeTurbiniaApiClient method."""
@@ -194,5 +245,63 @@ class TurbiniaBaseTest(unittest.TestCase):
     mock_get_credentials.assert_not_called()
     self.assertIsInstance(result, turbinia_api_lib.api_client.ApiClient)
 
+class TurbiniaRequestWatcherTest(unittest.TestCase):
+  """Tests for the Turbinia request watcher."""
+
+  def setUp(self):
+    super().setUp()
+    self._watcher = turbinia_base.TurbiniaRequestWatcher()
+    # pylint: disable=protected-access,invalid-name
+    self._watcher._MIN_INTERVAL_SEC = 0.01
+    self._watcher._MAX_INTERVAL_SEC = 0.05
+    self._watcher._RETRY_INTERVAL_SEC = 0.01
+
+  def _Status(self, status, saved_paths, last_update):
+    """Returns the status of a request with a single task."""
+    return {
+        'status': status,
+        'failed_tasks': 0,
+        'successful_tasks': 0 if status == 'running' else 1,
+        'task_count': 1,
+        'tasks': [{
+            'id': TASK_ID,
+            'last_update': last_update,
+            'saved_paths': saved_paths,
+        }],
+    }
+
+  def _Events(self, watch):
+    """Returns the events of a watch, until the request is done."""
+    events = []
+    while True:
+      event = watch.events.get(timeout=5)
+      if event is None:
+        return events
+      events.append(event)
+
+  def testWatch(self):
+    """Tests that new saved paths are handed out once, as they appear."""
+    fetch = mock.Mock(side_effect=[
+        self._Status('running', [], 1),
+        self._Status('running', ['/a.plaso'], 2),
+        self._Status('running', ['/a.plaso'], 2),
+        self._Status('successful', ['/a.plaso', '/b.plaso'], 3),
+    ])
+    watch = self._watcher.Watch(
+        'request', fetch, lambda task: task['saved_paths'], mock.Mock())
+    paths = [path for _, path in self._Events(watch)]
+    self.assertEqual(paths, ['/a.plaso', '/b.plaso'])
+    self.assertEqual(fetch.call_count, 4)
+
+  def testWatchRetries(self):
+    """Tests that polling stops after repeated API errors."""
+    fetch = mock.Mock(
+        side_effect=turbinia_api_lib.exceptions.ApiException(status=500))
+    watch = self._watcher.Watch(
+        'request', fetch, lambda task: [], mock.Mock())
+    self.assertEqual(self._Events(watch), [])
+    self.assertEqual(fetch.call_count, 3)
+
+
 if __name__ == "__main__":
   unittest.main()
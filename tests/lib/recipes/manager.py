@@ -3,7 +3,11 @@
 """Tests for the recipes manager."""
 
 import io
+import json
+import os
+import tempfile
 import unittest
+from unittest import mock
 
 from dftimewolf.lib import resources
 from dftimewolf.lib.recipes import manager
@@ -73,7 +77,46 @@ class RecipesManagerTest(unittest.TestCase):
     self.assertEqual(recipe.contents['modules'][0]['name'], 'TestModule')
     self.assertEqual(len(recipe.args), 1)
 
-  # TODO: add tests for ReadRecipesFromDirectory.
+  def testReadRecipesFromDirectory(self):
+    """Tests the ReadRecipesFromDirectory function with a recipe catalog."""
+    test_manager = manager.RecipesManager()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+      recipes_path = os.path.join(temp_dir, 'recipes')
+      os.mkdir(recipes_path)
+      recipe_path = os.path.join(recipes_path, 'test.json')
+      with open(recipe_path, 'w', encoding='utf-8') as recipe_file:
+        recipe_file.write(self._JSON)
+      catalog_path = os.path.join(temp_dir, 'cache', 'recipes.json')
+
+      test_manager.ReadRecipesFromDirectory(
+          recipes_path, catalog_path=catalog_path)
+      self.assertTrue(os.path.exists(catalog_path))
+      recipe = test_manager._recipes['test']
+      self.assertEqual(recipe.description, 'test recipe')
+      self.assertEqual(recipe.contents['modules'][0]['name'], 'TestModule')
+      self.assertEqual(len(recipe.args), 1)
+      test_manager.DeregisterRecipe(recipe)
+
+      # An up to date catalog is read without parsing the recipe files.
+      with mock.patch.object(
+          test_manager, '_ReadJSONFile') as mock_read_json_file:
+        test_manager.ReadRecipesFromDirectory(
+            recipes_path, catalog_path=catalog_path)
+      mock_read_json_file.assert_not_called()
+      self.assertEqual(test_manager._recipes['test'].description, 'test recipe')
+      test_manager.DeregisterRecipe(test_manager._recipes['test'])
+
+      # A modified recipe file invalidates the catalog.
+      json_dict = json.loads(self._JSON)
+      json_dict['description'] = 'modified recipe'
+      with open(recipe_path, 'w', encoding='utf-8') as recipe_file:
+        json.dump(json_dict, recipe_file)
+      test_manager.ReadRecipesFromDirectory(
+          recipes_path, catalog_path=catalog_path)
+      self.assertEqual(
+          test_manager._recipes['test'].description, 'modified recipe')
+      test_manager.DeregisterRecipe(test_manager._recipes['test'])
 
   def testRecipeRegistration(self):
     """Tests the RegisterRecipe and DeregisterRecipe functions."""
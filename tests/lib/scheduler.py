@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests the module scheduler."""
+
+import logging
+import threading
+import time
+import unittest
+
+from dftimewolf.lib import errors
+from dftimewolf.lib import scheduler
+from dftimewolf.lib.containers import containers
+from dftimewolf.lib.containers import manager
+
+
+# ModuleA -> ModuleB -> ModuleD
+#         -> ModuleC --^
+# ModuleE
+_MODULES = [
+    {'name': 'ModuleE', 'wants': []},
+    {'name': 'ModuleA', 'wants': ['Preflight']},
+    {'name': 'ModuleB', 'wants': ['ModuleA']},
+    {'name': 'ModuleC', 'wants': ['ModuleA']},
+    {'name': 'Module', 'runtime_name': 'ModuleD',
+     'wants': ['ModuleB', 'ModuleC']},
+]
+
+
+class _ConcurrencyTracker():
+  """Callback that records execution order and maximum concurrency."""
+
+  def __init__(self, sleep: float = 0.05) -> None:
+    self._lock = threading.Lock()
+    self._sleep = sleep
+    self._running = 0
+    self.max_running = 0
+    self.order = []
+
+  def __call__(self, definition):
+    with self._lock:
+      self._running += 1
+      self.max_running = max(self.max_running, self._running)
+      self.order.append(definition.get('runtime_name', definition['name']))
+    time.sleep(self._sleep)
+    with self._lock:
+      self._running -= 1
+
+
+class ModuleSchedulerTest(unittest.TestCase):
+  """Tests for the ModuleScheduler class."""
+
+  def testTopologicalOrder(self):
+    """Tests that modules are ordered after their dependencies."""
+    module_scheduler = scheduler.ModuleScheduler(_MODULES)
+    self.assertEqual(
+        module_scheduler.TopologicalOrder(),
+        ['ModuleE', 'ModuleA', 'ModuleB', 'ModuleC', 'ModuleD'])
+
+  def testCycle(self):
+    """Tests that dependency cycles are reported."""
+    modules = [
+        {'name': 'ModuleA', 'wants': ['ModuleB']},
+        {'name': 'ModuleB', 'wants': ['ModuleA']},
+        {'name': 'ModuleC', 'wants': []},
+    ]
+    with self.assertRaisesRegex(
+        errors.RecipeParseError, 'cycle: ModuleA, ModuleB'):
+      scheduler.ModuleScheduler(modules)
+
+  def testRunRespectsDependencies(self):
+    """Tests that modules only run once their dependencies have completed."""
+    tracker = _ConcurrencyTracker()
+    module_scheduler = scheduler.ModuleScheduler(_MODULES)
+    module_scheduler.Run(tracker)
+
+    self.assertCountEqual(
+        tracker.order,
+        ['ModuleA', 'ModuleB', 'ModuleC', 'ModuleD', 'ModuleE'])
+    timings = module_scheduler.timings
+    self.assertGreaterEqual(timings['ModuleB'].start, timings['ModuleA'].end)
+    self.assertGreaterEqual(timings['ModuleC'].start, timings['ModuleA'].end)
+    self.assertGreaterEqual(timings['ModuleD'].start, timings['ModuleB'].end)
+    self.assertGreaterEqual(timings['ModuleD'].start, timings['ModuleC'].end)
+    # With no limit, independent modules run at the same time.
+    self.assertEqual(tracker.max_running, 2)
+
+  def testMaxParallel(self):
+    """Tests the global parallelism limit and critical path priority."""
+    tracker = _ConcurrencyTracker(sleep=0.01)
+    module_scheduler = scheduler.ModuleScheduler(_MODULES, max_parallel=1)
+    module_scheduler.Run(tracker)
+
+    self.assertEqual(tracker.max_running, 1)
+    # ModuleA starts the longest chain, so is dispatched before ModuleE. Ties
+    # are broken by topological order.
+    self.assertEqual(
+        tracker.order,
+        ['ModuleA', 'ModuleB', 'ModuleC', 'ModuleE', 'ModuleD'])
+
+  def testWeight(self):
+    """Tests that heavy modules occupy several slots."""
+    modules = [
+        {'name': 'Heavy', 'wants': [], 'weight': 2},
+        {'name': 'Light1', 'wants': []},
+        {'name': 'Light2', 'wants': []},
+    ]
+    tracker = _ConcurrencyTracker()
+    module_scheduler = scheduler.ModuleScheduler(modules, max_parallel=2)
+    module_scheduler.Run(tracker)
+
+    timings = module_scheduler.timings
+    self.assertGreaterEqual(timings['Light1'].start, timings['Heavy'].end)
+    self.assertGreaterEqual(timings['Light2'].start, timings['Heavy'].end)
+    self.assertEqual(tracker.max_running, 2)
+
+  def testStreaming(self):
+    """Tests streaming modules run alongside the modules they want."""
+    tracker = _ConcurrencyTracker()
+    module_scheduler = scheduler.ModuleScheduler(
+        _MODULES, max_parallel=1, streaming={'ModuleD'})
+    module_scheduler.Run(tracker)
+
+    timings = module_scheduler.timings
+    # ModuleD starts once the first of ModuleB and ModuleC has started, not
+    # completed, and does not take a slot.
+    self.assertGreaterEqual(timings['ModuleD'].start, timings['ModuleB'].start)
+    self.assertLess(timings['ModuleD'].start, timings['ModuleB'].end)
+    self.assertEqual(tracker.max_running, 2)
+
+  def testStreamingBackpressure(self):
+    """Tests a producer blocked on a full stream does not deadlock the run."""
+    modules = [
+        {'name': 'ProducerA', 'wants': []},
+        {'name': 'ProducerB', 'wants': []},
+        {'name': 'Streaming', 'wants': ['ProducerA', 'ProducerB']},
+    ]
+    container_manager = manager.ContainerManager(logging.getLogger('test'))
+    container_manager.ParseRecipe({'modules': modules})
+    container_manager.RegisterStream('Streaming', containers.File, 2, 4)
+    consumed = []
+
+    def _Callback(definition):
+      name = definition['name']
+      if name == 'Streaming':
+        while True:
+          streamed = container_manager.GetStreamedContainer(name)
+          if not streamed:
+            break
+          consumed.append(streamed[0].name)
+          container_manager.StreamedContainerDone(name, streamed[1])
+      else:
+        # More containers than the stream can hold.
+        for index in range(10):
+          container_manager.StoreContainer(
+              name, containers.File(f'{name}{index}', f'/{name}/{index}'))
+      container_manager.CompleteModule(name)
+
+    module_scheduler = scheduler.ModuleScheduler(
+        modules, max_parallel=1, streaming={'Streaming'})
+    runner = threading.Thread(
+        target=module_scheduler.Run, args=(_Callback,), daemon=True)
+    runner.start()
+    runner.join(10)
+    self.assertFalse(runner.is_alive(), 'Scheduler deadlocked')
+    self.assertEqual(len(consumed), 20)
+
+  def testCriticalPath(self):
+    """Tests the critical path report."""
+    def _Callback(definition):
+      if definition['name'] == 'ModuleC':
+        time.sleep(0.1)
+
+    module_scheduler = scheduler.ModuleScheduler(_MODULES)
+    module_scheduler.Run(_Callback)
+
+    path = [t.runtime_name for t in module_scheduler.CriticalPath()]
+    self.assertEqual(path, ['ModuleA', 'ModuleC', 'ModuleD'])
+    report = module_scheduler.FormatCriticalPath()
+    self.assertIn('Critical path', report)
+    self.assertIn('ModuleC: 0.1', report)
+
+  def testRunException(self):
+    """Tests that exceptions are raised once every module has run."""
+    tracker = _ConcurrencyTracker(sleep=0)
+
+    def _Callback(definition):
+      tracker(definition)
+      if definition['name'] == 'ModuleA':
+        raise RuntimeError('ModuleA failed')
+
+    module_scheduler = scheduler.ModuleScheduler(_MODULES)
+    with self.assertRaisesRegex(RuntimeError, 'ModuleA failed'):
+      module_scheduler.Run(_Callback)
+    self.assertEqual(len(tracker.order), 5)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -193,6 +193,33 @@ class StateTest(unittest.TestCase):
     mock_process1.assert_called_with()
     mock_process2.assert_called_with()
 
+  @mock.patch('tests.test_modules.modules.DummyModule2.Process')
+  @mock.patch('tests.test_modules.modules.DummyModule1.Process')
+  def testProcessModulesThreadPerModule(self, mock_process1, mock_process2):
+    """Tests processing modules with one thread per module."""
+    test_state = state.DFTimewolfState(config.Config)
+    test_state.command_line_options = {'thread_per_module': True}
+    test_state.LoadRecipe(test_recipe.contents, TEST_MODULES)
+    test_state.SetupModules()
+    with mock.patch.object(
+        test_state, '_InvokeModulesInScheduler') as mock_scheduler:
+      test_state.RunModules()
+      mock_scheduler.assert_not_called()
+    mock_process1.assert_called_with()
+    mock_process2.assert_called_with()
+
+  @mock.patch('tests.test_modules.modules.DummyModule2.Process')
+  @mock.patch('tests.test_modules.modules.DummyModule1.Process')
+  def testProcessModulesMaxParallel(self, mock_process1, mock_process2):
+    """Tests processing modules with a parallelism limit."""
+    test_state = state.DFTimewolfState(config.Config)
+    test_state.command_line_options = {'max_parallel_modules': 1}
+    test_state.LoadRecipe(test_recipe.contents, TEST_MODULES)
+    test_state.SetupModules()
+    test_state.RunModules()
+    mock_process1.assert_called_with()
+    mock_process2.assert_called_with()
+
   @mock.patch('tests.test_modules.modules.DummyModule2.Process')
   @mock.patch('tests.test_modules.modules.DummyModule1.Process')
   def testProcessNamedModules(self, mock_process1, mock_process2):
@@ -274,6 +301,39 @@ class StateTest(unittest.TestCase):
 
     self.assertEqual(sorted(values), sorted(expected_values))
 
+  @mock.patch(
+      'tests.test_modules.thread_aware_modules.ThreadAwareConsumerModule.'
+      'StreamContainers', return_value=True)
+  def testThreadAwareModuleStreaming(self, unused_mock_stream):
+    """Tests that a streaming ThreadAwareModule handles containers correctly."""
+    test_state = state.DFTimewolfState(config.Config)
+    test_state.command_line_options = {}
+    test_state.LoadRecipe(test_recipe.threaded_no_preflights, TEST_MODULES)
+    # Keep the consumer's containers, but let the generator close the stream.
+    container_manager = test_state._container_manager  # pylint: disable=protected-access
+    complete_module = container_manager.CompleteModule
+    container_manager.CompleteModule = mock.MagicMock(
+        side_effect=lambda name: (
+            name != 'ThreadAwareConsumerModule' and complete_module(name)))
+
+    test_state.SetupModules()
+    test_state.RunModules()
+
+    self.assertEqual(len(test_state.errors), 0)
+
+    # Streamed containers are kept in state once processed.
+    values = [container.value for container in test_state.GetContainers(
+        container_class=thread_aware_modules.TestContainer,
+        requesting_module='ThreadAwareConsumerModule')]
+    expected_values = ['one appended', 'two appended', 'three appended']
+    self.assertEqual(sorted(values), sorted(expected_values))
+
+    values = [container.value for container in test_state.GetContainers(
+        container_class=thread_aware_modules.TestContainerThree,
+        requesting_module='ThreadAwareConsumerModule')]
+    expected_values = ['output one', 'output two', 'output three']
+    self.assertEqual(sorted(values), sorted(expected_values))
+
   # pylint: disable=line-too-long
   @mock.patch('tests.test_modules.thread_aware_modules.ThreadAwareConsumerModule.PreProcess')
   @mock.patch('tests.test_modules.thread_aware_modules.ThreadAwareConsumerModule.Process')
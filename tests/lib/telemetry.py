@@ -2,6 +2,11 @@
 # -*- coding: utf-8 -*-
 """Tests for the Telemetry modules."""
 
+import datetime
+import os
+import shutil
+import sqlite3
+import tempfile
 import unittest
 import mock
 
@@ -131,24 +136,30 @@ class GoogleCloudSpannerTelemetryTest(unittest.TestCase):
         instance_name='test_instance',
         database_name='test_database')
     mock_transaction = mock.Mock()
-    fake_telemetry = {
+    fake_telemetry = [{
         'test_key1': 'test_value1',
         'test_key4': 'test_value4',
         'test_key2': 'test_value2',
         'test_key3': 'test_value3',
-    }
+    }, {
+        'test_key1': 'other_value1',
+        'test_key4': 'other_value4',
+        'test_key2': 'other_value2',
+        'test_key3': 'other_value3',
+    }]
     # pylint: disable=protected-access
     telemetry1._LogTelemetryTransaction(mock_transaction, fake_telemetry)
     mock_transaction.insert.assert_called_once()
     args = mock_transaction.insert.call_args
     self.assertEqual(args.kwargs['table'], 'Telemetry')
+    self.assertEqual(len(args.kwargs['values']), 2)
     # Here we're testing that columns are mapped to their correct value by
     # comparing the last character of the column name and the last character
     # of the value.
-    for i in range(0, 4):
-      column = args.kwargs['columns'][i]
-      value = args.kwargs['values'][0][i]
-      self.assertEqual(column[-1], value[-1])
+    for values in args.kwargs['values']:
+      for i in range(0, 4):
+        column = args.kwargs['columns'][i]
+        self.assertEqual(column[-1], values[i][-1])
 
   @mock.patch('uuid.uuid4', return_value='test_uuid')
   def testLogTelemetryRunInTransaction(self, unused_mock_uuid):
@@ -159,18 +170,118 @@ class GoogleCloudSpannerTelemetryTest(unittest.TestCase):
         database_name='test_database')
     telemetry1.LogTelemetry(
       'test_key', 'test_value', 'random_module', 'random_recipe')
+    telemetry1.LogTelemetry(
+      'test_key2', 'test_value2', 'random_module', 'random_recipe')
+    telemetry1.Flush()
     instance = self.mock_spanner_client.return_value.instance.return_value
     database = instance.database.return_value
-    database.run_in_transaction.assert_called_with(
+    database.run_in_transaction.assert_called_once_with(
         telemetry1._LogTelemetryTransaction,  # pylint: disable=protected-access
-        {
+        [{
             'workflow_uuid': 'test_uuid',
             'time': mock.ANY,
             'recipe': 'random_recipe',
             'source_module': 'random_module',
             'key': 'test_key',
             'value': 'test_value'
-        })
+        }, {
+            'workflow_uuid': 'test_uuid',
+            'time': mock.ANY,
+            'recipe': 'random_recipe',
+            'source_module': 'random_module',
+            'key': 'test_key2',
+            'value': 'test_value2'
+        }])
+    self.mock_spanner_client.assert_called_once_with(project='test_project')
+    telemetry1.Close()
+
+
+class SQLiteTelemetryTest(unittest.TestCase):
+  """Tests for the SQLiteTelemetry class."""
+
+  def setUp(self):
+    self.temp_dir = tempfile.mkdtemp(prefix='dftimewolf-telemetry')
+    self.database_path = os.path.join(self.temp_dir, 'telemetry.db')
+
+  def tearDown(self):
+    shutil.rmtree(self.temp_dir)
+
+  @mock.patch('uuid.uuid4', return_value='test_uuid')
+  def testLogTelemetry(self, unused_mock_uuid):
+    """Tests that entries are written in batches, in the background."""
+    telemetry1 = telemetry.SQLiteTelemetry(self.database_path)
+    telemetry1._BATCH_SIZE = 2  # pylint: disable=protected-access
+    with mock.patch.object(
+        telemetry1, '_WriteBatch', wraps=telemetry1._WriteBatch) as write:
+      for i in range(5):
+        telemetry1.LogTelemetry(
+            f'key{i}', f'value{i}', 'random_module', 'random_recipe')
+      telemetry1.Flush()
+    self.assertEqual(
+        [len(call.args[0]) for call in write.call_args_list], [2, 2, 1])
+    telemetry1.Close()
+
+    connection = sqlite3.connect(self.database_path)
+    rows = connection.execute(
+        'SELECT workflow_uuid, recipe, source_module, key, value '
+        'FROM Telemetry ORDER BY time').fetchall()
+    connection.close()
+    self.assertEqual(rows, [
+        ('test_uuid', 'random_recipe', 'random_module', f'key{i}', f'value{i}')
+        for i in range(5)])
+
+  @mock.patch('uuid.uuid4', return_value='test_uuid')
+  def testLogTelemetrySameTime(self, unused_mock_uuid):
+    """Tests that entries logged at the same time are all written."""
+
+    class _FixedDatetime(datetime.datetime):
+      """Datetime whose clock is stopped."""
+
+      @classmethod
+      def now(cls, tz=None):
+        return cls(2024, 1, 1, tzinfo=tz)
+
+    telemetry1 = telemetry.SQLiteTelemetry(self.database_path)
+    with mock.patch('datetime.datetime', _FixedDatetime):
+      for i in range(12):
+        telemetry1.LogTelemetry(
+            f'key{i}', f'value{i}', 'random_module', 'random_recipe')
+    telemetry1.Close()
+
+    connection = sqlite3.connect(self.database_path)
+    rows = connection.execute(
+        'SELECT time, key FROM Telemetry ORDER BY time').fetchall()
+    connection.close()
+    self.assertEqual([key for _, key in rows], [f'key{i}' for i in range(12)])
+    self.assertEqual(rows[0][0], '2024-01-01T00:00:00.000000Z')
+    self.assertEqual(rows[11][0], '2024-01-01T00:00:00.000011Z')
+
+  @mock.patch('uuid.uuid4', return_value='test_uuid')
+  def testFormatTelemetry(self, unused_mock_uuid):
+    """Tests that queued entries are written before being formatted."""
+    telemetry1 = telemetry.SQLiteTelemetry(self.database_path)
+    telemetry1.LogTelemetry(
+      'test_key', 'test_value', 'random_module', 'random_recipe')
+    # Rows are formatted like GoogleCloudSpannerTelemetry formats them.
+    lines = telemetry1.FormatTelemetry().split('\n')
+    self.assertEqual(lines[0], 'Telemetry information for: test_uuid')
+    self.assertEqual(len(lines), 2)
+    self.assertTrue(
+        lines[1].endswith(':\t\trandom_recipe - random_module: test_key'))
+    telemetry1.Close()
+
+  def testWriteErrors(self):
+    """Tests that database errors do not stop the writer thread."""
+    telemetry1 = telemetry.SQLiteTelemetry(
+        os.path.join(self.temp_dir, 'missing', 'telemetry.db'))
+    telemetry1.LogTelemetry('key', 'value', 'random_module', 'random_recipe')
+    telemetry1.Flush()
+    telemetry1.database_path = self.database_path
+    telemetry1.LogTelemetry('key2', 'value2', 'random_module', 'random_recipe')
+    telemetry1.Close()
+    lines = telemetry1.FormatTelemetry().split('\n')
+    self.assertEqual(len(lines), 2)
+    self.assertTrue(lines[1].endswith(': key2'))
 
 
 if __name__ == '__main__':
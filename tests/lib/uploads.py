@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests the uploads module."""
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from unittest import mock
+
+from dftimewolf.lib import uploads
+
+
+class FakeTransport(uploads.UploadTransport):
+  """Transport that records uploads, for tests."""
+
+  def __init__(self, failures=0, delay_event=None):
+    self.failures = failures
+    self.delay_event = delay_event
+    self.uploaded = []
+    self.active = 0
+    self.max_active = 0
+    self._lock = threading.Lock()
+
+  def Destination(self):
+    return 'fake://server'
+
+  def Upload(self, path, sha256, resume_state, checkpoint):
+    with self._lock:
+      self.active += 1
+      self.max_active = max(self.max_active, self.active)
+    try:
+      if self.delay_event:
+        self.delay_event.wait(5)
+      if self.failures:
+        self.failures -= 1
+        raise uploads.UploadError('Server error')
+      self.uploaded.append(path)
+      return f'id-{sha256[:8]}'
+    finally:
+      with self._lock:
+        self.active -= 1
+
+
+class FakeResponse:
+  """Response of the fake resumable.js server."""
+
+  def __init__(self, status_code, body=None):
+    self.status_code = status_code
+    self.text = json.dumps(body)
+    self._body = body
+
+  def json(self):
+    return self._body
+
+
+class FakeChunkSession:
+  """Session storing chunks like the OpenRelik upload endpoint, for tests."""
+
+  def __init__(self, fail_chunks=()):
+    self.fail_chunks = set(fail_chunks)
+    self.chunks = {}
+    self.requests = []
+
+  def post(self, url, params, files):  # pylint: disable=unused-argument
+    chunk_number = params['resumableChunkNumber']
+    self.requests.append(chunk_number)
+    if chunk_number in self.fail_chunks:
+      self.fail_chunks.remove(chunk_number)
+      return FakeResponse(503)
+    self.chunks[chunk_number] = files['file'][1]
+    if len(self.chunks) == params['resumableTotalChunks']:
+      return FakeResponse(201, {'id': 42})
+    return FakeResponse(200)
+
+
+class EvidenceUploaderTest(unittest.TestCase):
+  """Tests for the EvidenceUploader."""
+
+  def setUp(self):
+    self.temp_dir = tempfile.mkdtemp(prefix='dftimewolf-uploads')
+    self.logger = logging.getLogger('test')
+    self.paths = []
+    for index in range(6):
+      path = os.path.join(self.temp_dir, f'evidence{index}')
+      with open(path, 'wb') as evidence_file:
+        evidence_file.write(f'evidence {index}'.encode() * 1000)
+      self.paths.append(path)
+
+  def tearDown(self):
+    shutil.rmtree(self.temp_dir)
+
+  def testDeduplicate(self):
+    """Tests that files with the same content are only uploaded once."""
+    copy_path = os.path.join(self.temp_dir, 'copy')
+    shutil.copy(self.paths[0], copy_path)
+    uploader = uploads.EvidenceUploader()
+    transport = FakeTransport()
+
+    first = uploader.Upload(self.paths[0], transport, self.logger)
+    second = uploader.Upload(copy_path, transport, self.logger)
+
+    self.assertEqual(first, second)
+    self.assertEqual(transport.uploaded, [self.paths[0]])
+    self.assertEqual(uploader.stats.uploaded, 1)
+    self.assertEqual(uploader.stats.skipped, 1)
+    self.assertEqual(uploader.stats.bytes, os.path.getsize(self.paths[0]))
+
+  def testConcurrencyLimit(self):
+    """Tests that concurrent uploads are bounded."""
+    uploader = uploads.EvidenceUploader()
+    release = threading.Event()
+    transport = FakeTransport(delay_event=release)
+    threads = [
+        threading.Thread(
+            target=uploader.Upload, args=(path, transport, self.logger))
+        for path in self.paths]
+    for thread in threads:
+      thread.start()
+    threading.Timer(0.5, release.set).start()
+    for thread in threads:
+      thread.join()
+
+    self.assertEqual(len(transport.uploaded), len(self.paths))
+    self.assertLessEqual(
+        transport.max_active, uploader._MAX_CONCURRENT_UPLOADS)
+
+  @mock.patch('time.sleep')
+  def testRetry(self, _):
+    """Tests that failed uploads are attempted again."""
+    uploader = uploads.EvidenceUploader()
+    transport = FakeTransport(failures=2)
+    uploader.Upload(self.paths[0], transport, self.logger)
+    self.assertEqual(transport.uploaded, [self.paths[0]])
+
+    transport = FakeTransport(failures=3)
+    with self.assertRaises(uploads.UploadError):
+      uploader.Upload(self.paths[1], transport, self.logger)
+    self.assertEqual(uploader.stats.failed, 1)
+
+  @mock.patch('time.sleep')
+  def testResumableChunks(self, _):
+    """Tests that chunked uploads resume after the last accepted chunk."""
+    journal_path = os.path.join(self.temp_dir, 'journal.json')
+    session = FakeChunkSession(fail_chunks=[3])
+    transport = uploads.ResumableChunkTransport(
+        session, 'http://fake/files/upload', {'folder_id': 1},
+        chunk_size=1000)
+    # Chunk 3 fails on every attempt of the first run.
+    transport._MAX_CHUNK_ATTEMPTS = 1
+    uploader = uploads.EvidenceUploader(journal_path=journal_path)
+    uploader._MAX_ATTEMPTS = 1
+    with self.assertRaises(uploads.UploadError):
+      uploader.Upload(self.paths[0], transport, self.logger)
+    with open(journal_path, 'r', encoding='utf-8') as journal_file:
+      journal = json.load(journal_file)
+    self.assertEqual(list(journal.values()), [
+        {'chunk_size': 1000, 'next_chunk': 3}])
+
+    session.requests = []
+    uploader = uploads.EvidenceUploader(journal_path=journal_path)
+    file_id = uploader.Upload(self.paths[0], transport, self.logger)
+
+    self.assertEqual(file_id, 42)
+    self.assertEqual(session.requests[0], 3)
+    with open(self.paths[0], 'rb') as evidence_file:
+      content = evidence_file.read()
+    self.assertEqual(
+        b''.join(session.chunks[number] for number in sorted(session.chunks)),
+        content)
+    with open(journal_path, 'r', encoding='utf-8') as journal_file:
+      self.assertEqual(json.load(journal_file), {})
+
+
+  def testNoJournalForWholeFileUploads(self):
+    """Tests that transports that are not resumable write no journal."""
+    journal_path = os.path.join(self.temp_dir, 'journal.json')
+    uploader = uploads.EvidenceUploader(journal_path=journal_path)
+    uploader.Upload(self.paths[0], FakeTransport(), self.logger)
+    self.assertFalse(os.path.exists(journal_path))
+
+  def testUnwritableJournal(self):
+    """Tests that failing to write the journal does not fail uploads."""
+    journal_path = os.path.join(self.temp_dir, 'missing', 'journal.json')
+    transport = uploads.ResumableChunkTransport(
+        FakeChunkSession(), 'http://fake/files/upload', chunk_size=1000)
+    uploader = uploads.EvidenceUploader(journal_path=journal_path)
+    with self.assertLogs(self.logger, level='WARNING') as logs:
+      file_id = uploader.Upload(self.paths[0], transport, self.logger)
+    self.assertEqual(file_id, 42)
+    self.assertEqual(uploader.stats.uploaded, 1)
+    self.assertIn('Unable to write upload journal', logs.output[0])
+
+  def testSharedJournal(self):
+    """Tests that shared uploaders only keep a journal if one is set."""
+    state = mock.Mock()
+    state.GetFromCache.return_value = None
+    with mock.patch.dict(os.environ):
+      os.environ.pop('DFTIMEWOLF_UPLOAD_JOURNAL', None)
+      uploader = uploads.EvidenceUploader.GetShared(state, 'http://server')
+      self.assertIsNone(uploader._journal_path)
+
+      journal_path = os.path.join(self.temp_dir, 'journal.json')
+      os.environ['DFTIMEWOLF_UPLOAD_JOURNAL'] = journal_path
+      uploader = uploads.EvidenceUploader.GetShared(state, 'http://server')
+      self.assertEqual(uploader._journal_path, journal_path)
+
+
+if __name__ == '__main__':
+  unittest.main()
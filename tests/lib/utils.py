@@ -8,6 +8,7 @@ import os
 import shutil
 import tarfile
 import tempfile
+import threading
 import unittest
 
 import mock
@@ -63,3 +64,34 @@ class UtilsTest(unittest.TestCase):
       contents = ''.join(f.readlines())
 
     self.assertEqual(contents, expected_jsonl)
+
+  def testBuildYaraRuleset(self):
+    """Tests that rulesets import the modules used anywhere in the rules."""
+    rules_file = (
+        'rule a { condition: true }\n'
+        'rule b { condition: hash.md5(0, filesize) == "x" }')
+    no_condition = 'rule c { strings: $a = "xpe.y" }'
+    self.assertEqual(
+        utils.BuildYaraRuleset([no_condition, rules_file]),
+        'import "hash"\n\n' + no_condition + '\n\n' + rules_file)
+    self.assertEqual(
+        utils.BuildYaraRuleset(['rule d { condition: pe.is_dll() }']),
+        'import "pe"\n\nrule d { condition: pe.is_dll() }')
+
+  def testTokenBucketWithoutLimit(self):
+    """Tests that a bucket without rate limit is only limited once slowed."""
+    rate_limiter = utils.TokenBucket(0, capacity=1)
+    with mock.patch('time.sleep') as mock_sleep:
+      for _ in range(10):
+        rate_limiter.Acquire()
+      mock_sleep.assert_not_called()
+    self.assertTrue(rate_limiter.SlowDown(2))
+    self.assertEqual(rate_limiter.rate, 1.0)
+
+  def testTokenBucketStop(self):
+    """Tests that waiting for a token ends once the stop event is set."""
+    rate_limiter = utils.TokenBucket(0.001, capacity=1)
+    stop = threading.Event()
+    self.assertTrue(rate_limiter.Acquire(stop))
+    stop.set()
+    self.assertFalse(rate_limiter.Acquire(stop))
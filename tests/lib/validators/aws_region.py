@@ -37,6 +37,16 @@ class AWSRegionValidatorTest(unittest.TestCase):
           'Invalid AWS Region name'):
         self.validator.Validate(r, self.recipe_argument)
 
+  def testValidateCommaSeparated(self):
+    """Tests that comma separated regions are validated individually."""
+    self.recipe_argument.validation_params = {'comma_separated': True}
+    val = self.validator.Validate('us-east-1,eu-west-1', self.recipe_argument)
+    self.assertEqual(val, 'us-east-1,eu-west-1')
+
+    with self.assertRaisesRegex(
+        errors.RecipeArgsValidationFailure, 'Invalid AWS Region name'):
+      self.validator.Validate('us-east-1,invalid', self.recipe_argument)
+
 
 if __name__ == '__main__':
   unittest.main()
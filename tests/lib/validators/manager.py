@@ -2,6 +2,7 @@
 """Tests for the validator manager."""
 
 import unittest
+from unittest import mock
 
 from dftimewolf.lib import args_validator, errors, resources
 from dftimewolf.lib.validators import manager
@@ -86,6 +87,29 @@ class ValidatorsManagerTest(unittest.TestCase):
     self.assertIn(_TestValidator.NAME, registered_validators)
     manager.ValidatorsManager.DeregisterValidator(_TestValidator)
 
+  def testRegisterValidatorModules(self):
+    """Tests that declared validator modules are imported on first use."""
+    manager.ValidatorsManager.RegisterValidatorModules(
+        {'test2': 'tests.lib.validators.lazy'})
+    self.assertIn('test2', manager.ValidatorsManager.ListValidators())
+    self.assertNotIn('test2', manager.ValidatorsManager._validator_classes)
+
+    recipe_argument = resources.RecipeArgument()
+    recipe_argument.validation_params = {'format': 'test2'}
+    with mock.patch(
+        'importlib.import_module',
+        side_effect=lambda _: manager.ValidatorsManager.RegisterValidator(
+            _TestValidator2)) as mock_import:
+      self.assertEqual(
+          manager.ValidatorsManager.Validate('test', recipe_argument), 'test')
+      self.assertEqual(
+          manager.ValidatorsManager.GetValidatorByName('test2'),
+          _TestValidator2)
+    mock_import.assert_called_once_with('tests.lib.validators.lazy')
+
+    manager.ValidatorsManager.DeregisterValidator(_TestValidator2)
+    del manager.ValidatorsManager._validator_modules['test2']
+
 
 if __name__ == '__main__':
   unittest.main()